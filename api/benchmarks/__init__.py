@@ -0,0 +1 @@
+"""Reproducible latency and throughput benchmarks; run with `manage.py benchmark`."""
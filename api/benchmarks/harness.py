@@ -0,0 +1,147 @@
+"""
+Timing, reporting and baseline comparison for the benchmark suites.
+
+Every benchmark produces a flat result with latency percentiles in
+milliseconds and throughput, keyed by a stable name such as
+``faiss.search.n100000``, so reports from different runs can be compared
+entry by entry.
+"""
+import json
+import os
+import platform
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+REPORT_VERSION = 1
+
+
+def latency_stats(samples: List[float], wall_time: float, operations: int) -> Dict:
+    """
+    Summarize per-call latencies.
+
+    Args:
+        samples: Duration of each timed call in seconds.
+        wall_time: Seconds from the first call starting to the last finishing.
+        operations: Units of work done (e.g. queries or images), for throughput.
+    Returns:
+        Dict with count, mean/p50/p95/p99/max in milliseconds and ops per second.
+    """
+    ms = np.asarray(samples, dtype=np.float64) * 1000
+    return {
+        "count": len(samples),
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "max_ms": float(ms.max()),
+        "qps": operations / wall_time if wall_time > 0 else 0.0,
+    }
+
+
+def measure(fn: Callable[[int], None], iterations: int, warmup: int = 3,
+            ops_per_call: int = 1) -> Dict:
+    """
+    Call ``fn(i)`` sequentially and time each call.
+
+    Warmup calls are run first and not recorded.
+    """
+    for i in range(warmup):
+        fn(i)
+    samples = []
+    wall_start = time.perf_counter()
+    for i in range(iterations):
+        start = time.perf_counter()
+        fn(i)
+        samples.append(time.perf_counter() - start)
+    return latency_stats(samples, time.perf_counter() - wall_start, iterations * ops_per_call)
+
+
+def measure_concurrent(fn: Callable[[int], None], requests: int, concurrency: int,
+                       warmup: int = 3) -> Dict:
+    """Call ``fn(i)`` ``requests`` times from ``concurrency`` threads and time each call."""
+    for i in range(warmup):
+        fn(i)
+
+    def timed(i: int) -> float:
+        start = time.perf_counter()
+        fn(i)
+        return time.perf_counter() - start
+
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        samples = list(pool.map(timed, range(requests)))
+    return {**latency_stats(samples, time.perf_counter() - wall_start, requests),
+            "concurrency": concurrency}
+
+
+def environment() -> Dict:
+    """Describe the machine and library versions a report was produced on."""
+    info = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+    }
+    for module in ("faiss", "torch"):
+        try:
+            info[module] = __import__(module).__version__
+        except Exception:
+            info[module] = None
+    return info
+
+
+def make_report(results: Dict[str, Dict], params: Dict) -> Dict:
+    """Wrap benchmark results with run parameters and environment details."""
+    return {
+        "version": REPORT_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "params": params,
+        "environment": environment(),
+        "results": results,
+    }
+
+
+def load_report(path: Path) -> Dict:
+    report = json.loads(Path(path).read_text())
+    if report.get("version") != REPORT_VERSION:
+        raise ValueError(f"Unsupported benchmark report version in {path}")
+    return report
+
+
+def compare(baseline: Dict, current: Dict, tolerance: float = 0.10) -> List[Dict]:
+    """
+    Find benchmarks that got slower than the baseline.
+
+    A benchmark regresses when its p95 or p99 latency grows, or its
+    throughput drops, by more than ``tolerance`` (a fraction).
+
+    Returns:
+        One entry per regressed metric, with baseline and current values.
+    """
+    regressions = []
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            continue
+        for metric in ("p95_ms", "p99_ms"):
+            if result[metric] > base[metric] * (1 + tolerance):
+                regressions.append(_regression(name, metric, base[metric], result[metric]))
+        if result["qps"] < base["qps"] * (1 - tolerance):
+            regressions.append(_regression(name, "qps", base["qps"], result["qps"]))
+    return regressions
+
+
+def _regression(name: str, metric: str, baseline: float, current: float) -> Dict:
+    return {
+        "benchmark": name,
+        "metric": metric,
+        "baseline": baseline,
+        "current": current,
+        "change": (current - baseline) / baseline if baseline else None,
+    }
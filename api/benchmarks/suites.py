@@ -0,0 +1,193 @@
+"""
+Benchmark suites for the vector stores, the CLIP encoder and the search API.
+
+Store benchmarks run on synthetic corpora of random unit vectors generated
+from a fixed seed, so runs on the same machine are comparable.
+"""
+import logging
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+import numpy as np
+
+from .harness import measure, measure_concurrent
+
+logger = logging.getLogger(__name__)
+
+STORE_BACKENDS = ("numpy", "faiss")
+
+
+def synthetic_vectors(count: int, dimension: int, seed: int) -> np.ndarray:
+    """Return ``count`` random unit vectors as float32, generated in chunks to bound memory."""
+    rng = np.random.default_rng(seed)
+    vectors = np.empty((count, dimension), dtype=np.float32)
+    for start in range(0, count, 100000):
+        chunk = rng.standard_normal((min(100000, count - start), dimension), dtype=np.float32)
+        chunk /= np.linalg.norm(chunk, axis=1, keepdims=True)
+        vectors[start:start + len(chunk)] = chunk
+    return vectors
+
+
+def _build_store(backend: str, store_dir: Path, vectors: np.ndarray, index_factory: str):
+    paths = [f"synthetic/{i:08d}.jpg" for i in range(len(vectors))]
+    if backend == "numpy":
+        import torch
+        from v1.ml.models.store_handlers.numpy_store import EmbeddingStore
+
+        store = EmbeddingStore(store_dir)
+        store.add_embeddings(torch.from_numpy(vectors), paths)
+        return store
+
+    from v1.ml.models.store_handlers.faiss_store import FaissVectorStore
+
+    store = FaissVectorStore(vectors.shape[1], store_dir, index_factory=index_factory)
+    store.add_embeddings(vectors, [{"path": path} for path in paths])
+    return store
+
+
+def run_store_benchmarks(sizes: Iterable[int], dimension: int = 512, queries: int = 200,
+                         top_k: int = 10, batch_sizes: Iterable[int] = (32,),
+                         backends: Iterable[str] = STORE_BACKENDS,
+                         index_factory: str = "Flat", seed: int = 0) -> Dict[str, Dict]:
+    """
+    Time building and searching each store over synthetic corpora.
+
+    Returns:
+        Results keyed "<backend>.build.n<size>", "<backend>.search.n<size>"
+        and "<backend>.search_batch<b>.n<size>".
+    """
+    import torch
+
+    results = {}
+    query_vectors = synthetic_vectors(queries, dimension, seed + 1)
+    for size in sizes:
+        vectors = synthetic_vectors(size, dimension, seed)
+        for backend in backends:
+            logger.info(f"Benchmarking {backend} store with {size} vectors")
+            with tempfile.TemporaryDirectory(prefix=f"bench-{backend}-") as tmp:
+                holder = {}
+
+                def build(_):
+                    holder["store"] = _build_store(backend, Path(tmp) / "store", vectors,
+                                                   index_factory)
+
+                results[f"{backend}.build.n{size}"] = measure(
+                    build, iterations=1, warmup=0, ops_per_call=size)
+                store = holder["store"]
+                as_query = torch.from_numpy if backend == "numpy" else (lambda array: array)
+
+                results[f"{backend}.search.n{size}"] = measure(
+                    lambda i: store.search(as_query(query_vectors[i % queries][None, :]),
+                                           top_k=top_k),
+                    iterations=queries)
+                for batch in batch_sizes:
+                    batches = [as_query(np.take(query_vectors, range(i * batch, (i + 1) * batch),
+                                                axis=0, mode="wrap"))
+                               for i in range(max(1, queries // batch))]
+                    results[f"{backend}.search_batch{batch}.n{size}"] = measure(
+                        lambda i: store.search_many(batches[i % len(batches)], top_k=top_k),
+                        iterations=len(batches), ops_per_call=batch)
+    return results
+
+
+def run_model_benchmarks(batch_sizes: Iterable[int] = (1, 8, 32), iterations: int = 10,
+                         seed: int = 0, backends: Iterable[str] = ("eager",)) -> Dict[str, Dict]:
+    """
+    Time CLIP text and image encoding on CPU at several batch sizes.
+
+    Each non-eager backend is loaded with its probe agreement check; results
+    record the backend actually used (a rejected backend falls back to eager)
+    and its cosine agreement with fp32.
+
+    Returns:
+        Results keyed "clip.encode_text.b<batch>" and "clip.encode_image.b<batch>"
+        for eager, "clip.<backend>.encode_text.b<batch>" etc. for other
+        backends; throughput is in texts or images per second.
+    """
+    from django.conf import settings
+    from PIL import Image
+    from v1.ml.models.clip.config import CLIPConfig
+    from v1.ml.models.clip.model import CLIPModelHandler
+
+    clip_settings = settings.ML_SETTINGS['MODELS']['clip']
+    words = ["dog", "beach", "city", "sunset", "forest", "car", "portrait", "mountain"]
+    results = {}
+    for backend in backends:
+        model = CLIPModelHandler(CLIPConfig(
+            model_name=clip_settings['name'],
+            embedding_dim=clip_settings['embedding_dim'],
+            device="cpu",
+            backend=backend,
+        ))
+        prefix = "clip" if backend == "eager" else f"clip.{backend}"
+        details = {"backend": model.backend.name, "agreement": model.agreement}
+        rng = np.random.default_rng(seed)
+        for batch in batch_sizes:
+            texts = [[f"a photo of a {words[(i + j) % len(words)]} number {i * batch + j}"
+                      for j in range(batch)] for i in range(iterations)]
+            results[f"{prefix}.encode_text.b{batch}"] = {**measure(
+                lambda i: model.encode_texts(texts[i % iterations]),
+                iterations=iterations, warmup=1, ops_per_call=batch), **details}
+
+            images = [Image.fromarray(rng.integers(0, 255, (224, 224, 3), dtype=np.uint8))
+                      for _ in range(batch)]
+            results[f"{prefix}.encode_image.b{batch}"] = {**measure(
+                lambda i: model.encode_image(images),
+                iterations=iterations, warmup=1, ops_per_call=batch), **details}
+    return results
+
+
+def run_api_benchmarks(concurrency_levels: Iterable[int] = (1, 4), requests: int = 200,
+                       top_k: int = 5) -> Dict[str, Dict]:
+    """
+    Drive POST /api/v1/search/ through the Django test client.
+
+    Every request uses a distinct query so the query and result caches miss
+    and the full path (encoding, search, tracking) is measured. Searches are
+    tracked like real traffic, so run this against a non-production database.
+
+    Returns:
+        Results keyed "api.search.c<concurrency>".
+    """
+    from django.conf import settings
+    from django.test import Client, override_settings
+    from django.urls import reverse
+
+    url = reverse("image-search")
+    local = threading.local()
+    counter = iter(range(10 ** 9))
+    lock = threading.Lock()
+
+    def search(_):
+        client = getattr(local, "client", None)
+        if client is None:
+            client = local.client = Client()
+        with lock:
+            n = next(counter)
+        response = client.post(url, {"query": f"benchmark query {n}", "top_k": top_k},
+                               content_type="application/json")
+        if response.status_code != 200:
+            raise RuntimeError(f"Search returned {response.status_code}: {response.content[:200]}")
+
+    results = {}
+    with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]):
+        for concurrency in concurrency_levels:
+            logger.info(f"Benchmarking search API at concurrency {concurrency}")
+            results[f"api.search.c{concurrency}"] = measure_concurrent(
+                search, requests=requests, concurrency=concurrency)
+    return results
+
+
+def parse_sizes(value: str) -> List[int]:
+    """Parse "10k,100k,1M" into [10000, 100000, 1000000]."""
+    multipliers = {"k": 1000, "m": 1000000}
+    sizes = []
+    for part in value.split(","):
+        part = part.strip().lower()
+        if part[-1:] in multipliers:
+            sizes.append(int(float(part[:-1]) * multipliers[part[-1]]))
+        elif part:
+            sizes.append(int(part))
+    return sizes
@@ -30,6 +30,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'middleware.monitoring.MonitoringMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -142,7 +143,13 @@ ML_SETTINGS = {
             'embedding_dim': 512,
             'enabled': True,
             'batch_size': 32,
-            'api_token': None
+            'api_token': None,
+            # CPU inference backend: eager (fp32), int8, compile, torchscript
+            # or onnx (needs onnx and onnxruntime). A backend whose probe
+            # embeddings fall below min_agreement cosine similarity with fp32
+            # is rejected in favour of eager.
+            'backend': os.getenv('CLIP_BACKEND', 'eager'),
+            'min_agreement': float(os.getenv('CLIP_MIN_AGREEMENT', 0.99)),
         },
         'blip2': {
             'name': 'Salesforce/blip2-opt-2.7b',
@@ -154,9 +161,106 @@ ML_SETTINGS = {
     },
     'BATCH_SIZE': 32,
     'TOP_K': 5,
+    # Largest number of queries accepted by the batch search endpoint.
+    'MAX_BATCH_QUERIES': int(os.getenv('MAX_BATCH_QUERIES', 256)),
+    # Largest image accepted by the query-by-example endpoint, in bytes.
+    'MAX_QUERY_IMAGE_BYTES': int(os.getenv('MAX_QUERY_IMAGE_BYTES', 10 * 1024 * 1024)),
     'DEFAULT_MODEL': 'clip',
     'HF_API_TOKEN': None,
-    'VECTORSTORE': 'faiss'
+    # 'faiss', 'sharded' (FAISS split into SHARDING['SHARDS'] indexes searched
+    # in parallel), 'compressed' (see COMPRESSED) or 'numpy'.
+    'VECTORSTORE': os.getenv('VECTORSTORE', 'faiss'),
+    # FAISS index type as a factory string, e.g. 'Flat', 'IVF4096,PQ64' or
+    # 'HNSW32'. Indexes that need training use up to TRAIN_SAMPLE_SIZE vectors.
+    'FAISS': {
+        'INDEX_FACTORY': os.getenv('FAISS_INDEX_FACTORY', 'Flat'),
+        'TRAIN_SAMPLE_SIZE': 100000,
+    },
+    # Compressed store: the index holds only INDEX_FACTORY codes ('SQ4' is 8x
+    # smaller than float32, 'PQ64' 32x); each search re-scores RERANK_DEPTH
+    # candidates against the full vectors, memory-mapped from disk.
+    'COMPRESSED': {
+        'INDEX_FACTORY': os.getenv('COMPRESSED_INDEX_FACTORY', 'SQ4'),
+        'RERANK_DEPTH': int(os.getenv('COMPRESSED_RERANK_DEPTH', 256)),
+    },
+    # Sharded store: number of FAISS shards (a store on disk never loses
+    # shards; raising the count adds empty ones that take new vectors first)
+    # and threads searching them concurrently (None: one per shard).
+    'SHARDING': {
+        'SHARDS': int(os.getenv('VECTORSTORE_SHARDS', 4)),
+        'SEARCH_THREADS': None,
+    },
+    # Index-build ingestion: image decode workers and model batching. None
+    # picks a value from the CPU count / available memory.
+    'INGEST': {
+        'WORKERS': None,
+        'BATCH_SIZE': None,
+        'PREFETCH_BATCHES': 4,
+        'TORCH_THREADS': None,
+    },
+    # Concurrent searches' query encodes are coalesced into one forward pass:
+    # after the first request the scheduler waits up to MAX_WAIT_MS for more,
+    # or until MAX_BATCH texts (query templates) are queued.
+    'TEXT_BATCHING': {
+        'ENABLED': os.getenv('TEXT_BATCHING', 'True') == 'True',
+        'MAX_BATCH': int(os.getenv('TEXT_BATCH_MAX_SIZE', 64)),
+        'MAX_WAIT_MS': float(os.getenv('TEXT_BATCH_MAX_WAIT_MS', 2.0)),
+    },
+    # Hybrid search: text queries also run a BM25 lookup over file names and
+    # captions, fused with the vector results by reciprocal rank fusion
+    # (score = sum of 1 / (RRF_K + rank)). Requests can override ENABLED.
+    'HYBRID_SEARCH': {
+        'ENABLED': os.getenv('HYBRID_SEARCH', 'False') == 'True',
+        'RRF_K': int(os.getenv('HYBRID_RRF_K', 60)),
+        'BM25_K1': 1.2,
+        'BM25_B': 0.75,
+    },
+    # Prompt ensemble used to encode each search query; {query} is substituted.
+    'QUERY_TEMPLATES': [
+        'a photograph of {query}',
+        'a photo showing {query}',
+        'a clear image of {query}',
+        'a scene with {query}',
+    ],
+}
+
+# Search caches: query embeddings and search results. Entries are bounded,
+# LRU-evicted and expire after TIMEOUT seconds. They are per-process by
+# default; set REDIS_URL to share them across workers (bound the Redis side
+# with maxmemory and an allkeys-lru eviction policy).
+REDIS_URL = os.getenv('REDIS_URL')
+
+
+def _search_cache(location, timeout, max_entries):
+    if REDIS_URL:
+        return {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': location,
+            'TIMEOUT': timeout,
+        }
+    return {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': location,
+        'TIMEOUT': timeout,
+        'OPTIONS': {'MAX_ENTRIES': max_entries},
+    }
+
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'query_embeddings': _search_cache(
+        'query-embeddings',
+        int(os.getenv('QUERY_EMBEDDING_CACHE_TTL', 3600)),
+        int(os.getenv('QUERY_EMBEDDING_CACHE_SIZE', 10000)),
+    ),
+    'search_results': _search_cache(
+        'search-results',
+        int(os.getenv('SEARCH_RESULTS_CACHE_TTL', 300)),
+        int(os.getenv('SEARCH_RESULTS_CACHE_SIZE', 10000)),
+    ),
 }
 
 # # TODO: reminder to update path and use a new path to download the data.
@@ -167,9 +271,117 @@ ML_SETTINGS = {
 #     'SAMPLE_SIZE': 500,
 # }
 
+# LABELS_FILE is an optional CSV with file_name and label columns (like the
+# Kaggle dataset's train.csv); its labels become filterable in searches, with
+# 0/1 read as human/ai. CAPTIONS_FILE is an optional CSV with file_name and
+# caption columns; captions are indexed for lexical search next to file names.
 DATASET_SETTINGS = {
     'DATA_PATH': BASE_DIR / os.getenv('DATA_PATH', 'data/dataset'),
     'SAMPLE_SIZE': int(os.getenv('SAMPLE_SIZE', 500)),
+    'LABELS_FILE': os.getenv('DATASET_LABELS_FILE') or None,
+    'CAPTIONS_FILE': os.getenv('DATASET_CAPTIONS_FILE') or None,
+}
+
+# Resized variants served by ImageFileView (?w=256&fmt=webp). Variants are
+# cached on disk by content hash, width and format and the least recently
+# served ones are evicted above MAX_BYTES. PREGENERATE lists the (width,
+# format) variants rendered for every image when the index is synced.
+THUMBNAIL_SETTINGS = {
+    'CACHE_DIR': BASE_DIR / os.getenv('THUMBNAIL_CACHE_DIR', 'cache/thumbnails'),
+    'MAX_BYTES': int(os.getenv('THUMBNAIL_CACHE_MAX_BYTES', 1024 ** 3)),
+    'WIDTHS': [64, 128, 256, 512, 1024],
+    'FORMATS': ['webp', 'jpeg', 'png'],
+    'QUALITY': 80,
+    'WORKERS': None,
+    'PREGENERATE': [(256, 'webp'), (512, 'webp')],
+}
+
+# How ImageFileView sends file bytes. SENDFILE 'x-accel' returns an nginx
+# X-Accel-Redirect to the matching internal location in ACCEL_LOCATIONS and
+# 'x-sendfile' returns an X-Sendfile path (Apache, lighttpd); unset streams
+# from Django. Responses for URLs without a matching ?v=<content hash> may be
+# cached for MAX_AGE seconds before revalidating with the ETag.
+IMAGE_SERVING = {
+    'SENDFILE': os.getenv('IMAGE_SENDFILE') or None,
+    'ACCEL_LOCATIONS': [
+        (DATASET_SETTINGS['DATA_PATH'], '/protected/dataset/'),
+        (THUMBNAIL_SETTINGS['CACHE_DIR'], '/protected/thumbnails/'),
+    ],
+    'MAX_AGE': int(os.getenv('IMAGE_MAX_AGE', 3600)),
+}
+
+# Search interaction tracking runs in a background writer per process. Records
+# are flushed in batches of BATCH_SIZE or every FLUSH_INTERVAL seconds; when
+# the queue is full or the database is failing they are spilled to SPILL_DIR
+# (at most SPILL_MAX_BYTES per process) and replayed later.
+INTERACTION_TRACKING = {
+    'QUEUE_SIZE': int(os.getenv('TRACKING_QUEUE_SIZE', 10000)),
+    'BATCH_SIZE': 500,
+    'FLUSH_INTERVAL': float(os.getenv('TRACKING_FLUSH_INTERVAL', 1.0)),
+    'SPILL_DIR': BASE_DIR / 'cache' / 'interactions',
+    'SPILL_MAX_BYTES': 64 * 1024 * 1024,
+}
+
+# Prometheus metrics served at /metrics. With several worker processes set
+# METRICS_DIR to a directory shared by the workers (and emptied on deploy);
+# each worker writes its snapshot there every FLUSH_INTERVAL seconds and
+# /metrics merges them. Unset, only the answering process is reported.
+METRICS = {
+    'DIR': os.getenv('METRICS_DIR') or None,
+    'FLUSH_INTERVAL': float(os.getenv('METRICS_FLUSH_INTERVAL', 5.0)),
+}
+
+# Background warm-up started by config.wsgi / config.asgi (see
+# v1.ai_engine.startup). With WARMUP off, CLIP and the vector store load on the
+# first search instead. Searches arriving during warm-up wait up to
+# SEARCH_WAIT_SECONDS, then get a 503 with Retry-After.
+STARTUP = {
+    'WARMUP': os.getenv('STARTUP_WARMUP', 'True') == 'True',
+    'DOWNLOAD_DATASET': os.getenv('STARTUP_DOWNLOAD_DATASET', 'True') == 'True',
+    'SEARCH_WAIT_SECONDS': float(os.getenv('STARTUP_SEARCH_WAIT_SECONDS', 10.0)),
+    'RETRY_AFTER': 5,
+    # A failing warm-up stage is retried after RETRY_BACKOFF_SECONDS, doubling
+    # up to RETRY_BACKOFF_MAX_SECONDS, at most MAX_RETRIES times; after that
+    # the liveness probe fails so the worker gets restarted.
+    'MAX_RETRIES': int(os.getenv('STARTUP_MAX_RETRIES', 5)),
+    'RETRY_BACKOFF_SECONDS': 5.0,
+    'RETRY_BACKOFF_MAX_SECONDS': 300.0,
+}
+
+# Limits applied by middleware.rate_limiting.RateLimitMiddleware (add it
+# after AuthenticationMiddleware to enable). LIMITS are requests per WINDOW seconds
+# for each kind of client; only API keys listed in API_KEYS (sent in the
+# API_KEY_HEADER header) get the api_key limit. Counters live in CACHE, which
+# must be shared by all workers in production (Redis or Memcached). Each worker
+# flushes up to LOCAL_BATCH requests per client at least every SYNC_INTERVAL
+# seconds while the client is well below its limit.
+RATE_LIMIT = {
+    'PATH_PREFIXES': ['/api/v1/search/'],
+    'WINDOW': int(os.getenv('API_RATE_LIMIT_WINDOW', 3600)),
+    'LIMITS': {
+        'ip': int(os.getenv('API_RATE_LIMIT', 100)),
+        'user': int(os.getenv('API_RATE_LIMIT_USER', 1000)),
+        'api_key': int(os.getenv('API_RATE_LIMIT_API_KEY', 10000)),
+    },
+    'API_KEY_HEADER': 'X-API-Key',
+    'API_KEYS': [key for key in os.getenv('API_KEYS', '').split(',') if key],
+    'CACHE': 'default',
+    'LOCAL_BATCH': 10,
+    'SYNC_INTERVAL': 1.0,
+}
+
+# Search analytics rollups (minute/hour/day) maintained by the interaction
+# writer. Rollups older than RETENTION_DAYS for their granularity are removed
+# by `manage.py rollup_analytics --prune` (None keeps them forever).
+# MAX_BUCKETS bounds how many buckets one analytics request may span.
+ANALYTICS = {
+    'SKETCH_RELATIVE_ACCURACY': 0.01,
+    'RETENTION_DAYS': {
+        'minute': int(os.getenv('ANALYTICS_MINUTE_RETENTION_DAYS', 7)),
+        'hour': int(os.getenv('ANALYTICS_HOUR_RETENTION_DAYS', 90)),
+        'day': None,
+    },
+    'MAX_BUCKETS': 1500,
 }
 
 LOGGING = {
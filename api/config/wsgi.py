@@ -2,6 +2,7 @@
 WSGI config for config project.
 
 It exposes the WSGI callable as a module-level variable named ``application``.
+Loading it also starts the background warm-up of the search stack.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/wsgi/
@@ -14,3 +15,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings.base')
 
 application = get_wsgi_application()
+
+from v1.ai_engine.startup import start_warmup  # noqa: E402
+
+start_warmup()
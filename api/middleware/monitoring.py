@@ -4,22 +4,39 @@ import logging
 import time
 from typing import Callable
 
+from v1.metrics import HTTP_REQUEST_DURATION, get_metrics_exporter
+
 logger = logging.getLogger(__name__)
 
 class MonitoringMiddleware:
-    """Middleware to monitor API endpoint performance and errors."""
+    """Middleware to monitor API endpoint performance and errors.
+
+    Besides logging each request, records its latency in the
+    ``http_request_duration_seconds`` histogram, labelled by method, URL
+    route pattern (not the raw path, to keep label cardinality bounded) and
+    status code.
+    """
 
     def __init__(self, get_response: Callable):
         self.get_response = get_response
+        # Starts the per-process snapshot writer used to aggregate workers.
+        get_metrics_exporter()
 
     def __call__(self, request: HttpRequest) -> HttpResponse:
         if request.path.startswith('/api/'):
-            start_time = time.time()
+            start_time = time.perf_counter()
             
             response = self.get_response(request)
             
             # Calculate request duration
-            duration = time.time() - start_time
+            duration = time.perf_counter() - start_time
+            match = request.resolver_match
+            HTTP_REQUEST_DURATION.observe(
+                duration,
+                method=request.method,
+                route=match.route if match is not None else 'unmatched',
+                status=response.status_code,
+            )
             
             log_data = {
                 'path': request.path,
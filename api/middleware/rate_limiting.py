@@ -1,76 +1,235 @@
-"""Rate limiting middleware for API endpoints."""
-from django.conf import settings
-from django.http import HttpResponse
-from django.core.cache import cache
-import time
-from typing import Optional, Callable
-from django.http import HttpRequest
+"""
+Rate limiting middleware for API endpoints.
+
+Requests are counted with a sliding window counter: each client has one
+integer counter per fixed window in the shared cache, and the current rate is
+estimated as the previous window's count, weighted by how much of it still
+overlaps the sliding window, plus the current window's count. Counters only
+ever change through the cache's atomic ``add``/``incr``/``decr``, so
+concurrent workers never lose increments.
+
+Each process also counts requests locally and flushes them to the cache in
+batches while a client is well below its limit, so most requests cost a dict
+lookup and no cache round trip. Close to the limit every request goes to the
+cache. Across P processes a client can overshoot by at most P * LOCAL_BATCH
+requests per SYNC_INTERVAL.
+"""
+import hashlib
 import logging
+import math
+import threading
+import time
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpRequest, HttpResponse
 
 logger = logging.getLogger(__name__)
 
+
+class RateLimitResult(NamedTuple):
+    allowed: bool
+    limit: int
+    remaining: int
+    retry_after: int
+
+
+class _KeyState:
+    """Per-process view of one client's counters."""
+    __slots__ = ("window", "prev", "shared", "pending", "synced_at")
+
+    def __init__(self, window: int):
+        self.window = window
+        self.prev = None
+        self.shared = 0
+        self.pending = 0
+        self.synced_at = -math.inf
+
+
+class SlidingWindowRateLimiter:
+    """Sliding window counter over atomic cache counters with batched local updates."""
+
+    # Local states kept before those of past windows are dropped.
+    MAX_LOCAL_KEYS = 10000
+
+    def __init__(self, cache, window: int, local_batch: int = 10,
+                 sync_interval: float = 1.0, clock: Callable[[], float] = time.time):
+        """
+        Args:
+            cache: Django cache shared by all workers; must implement atomic
+                   incr/decr (locmem, Redis, Memcached).
+            window: Window length in seconds.
+            local_batch: Requests counted locally before flushing to the cache;
+                         0 sends every request to the cache.
+            sync_interval: Maximum seconds between flushes for a client.
+            clock: Wall-clock time source shared by all workers.
+        """
+        self.cache = cache
+        self.window = window
+        self.local_batch = local_batch
+        self.sync_interval = sync_interval
+        self.clock = clock
+        self._states: Dict[str, _KeyState] = {}
+        self._lock = threading.Lock()
+
+    def _cache_key(self, key: str, window: int) -> str:
+        return f"rl:{key}:{window}"
+
+    def _incr(self, cache_key: str, delta: int) -> int:
+        try:
+            return self.cache.incr(cache_key, delta)
+        except ValueError:
+            # Keep the previous window readable while the next one is current.
+            if self.cache.add(cache_key, delta, 2 * self.window + 60):
+                return delta
+            return self.cache.incr(cache_key, delta)
+
+    def _state(self, key: str, window: int) -> Tuple[_KeyState, int]:
+        """Return the local state for the current window and any unflushed count of an older one."""
+        state = self._states.get(key)
+        if state is not None and state.window == window:
+            return state, 0
+        stale = state.pending if state is not None and state.window == window - 1 else 0
+        if state is None and len(self._states) >= self.MAX_LOCAL_KEYS:
+            self._states = {k: s for k, s in self._states.items() if s.window >= window - 1}
+        state = self._states[key] = _KeyState(window)
+        return state, stale
+
+    def _retry_after(self, prev: int, count: int, limit: int, offset: float) -> int:
+        """Seconds until the estimated rate falls below the limit."""
+        if count < limit and prev > 0:
+            wait = self.window * (1 - (limit - count) / prev) - offset
+        else:
+            # The current count only starts decaying in the next window.
+            wait = (self.window - offset) + self.window * max(0.0, 1 - limit / max(count, 1))
+        return max(1, math.ceil(wait))
+
+    def hit(self, key: str, limit: int) -> RateLimitResult:
+        """
+        Count a request for key and decide whether it is allowed.
+
+        Args:
+            key: Client identity, e.g. "ip:10.0.0.1".
+            limit: Requests allowed per window.
+        Returns:
+            RateLimitResult; denied requests are not counted.
+        """
+        now = self.clock()
+        window, offset = divmod(now, self.window)
+        window = int(window)
+        weight = 1 - offset / self.window
+
+        with self._lock:
+            state, stale = self._state(key, window)
+            if state.prev is not None:
+                estimate = state.prev * weight + state.shared + state.pending
+                if (estimate + 1 + self.local_batch <= limit
+                        and state.pending < self.local_batch
+                        and now - state.synced_at < self.sync_interval):
+                    state.pending += 1
+                    return RateLimitResult(True, limit, int(limit - estimate - 1), 0)
+            delta = state.pending + 1
+            state.pending = 0
+
+        if stale:
+            self._incr(self._cache_key(key, window - 1), stale)
+        cache_key = self._cache_key(key, window)
+        count = self._incr(cache_key, delta)
+        prev = state.prev
+        if prev is None:
+            prev = self.cache.get(self._cache_key(key, window - 1), 0)
+        estimate = prev * weight + count
+        allowed = estimate <= limit
+        if not allowed:
+            count = self.cache.decr(cache_key, 1)
+            estimate -= 1
+
+        with self._lock:
+            state.prev = prev
+            state.shared = max(state.shared, count) if allowed else count
+            state.synced_at = now
+        if allowed:
+            return RateLimitResult(True, limit, max(int(limit - estimate), 0), 0)
+        return RateLimitResult(False, limit, 0, self._retry_after(prev, count, limit, offset))
+
+
 class RateLimitMiddleware:
-    """Middleware to implement rate limiting for API endpoints."""
-    
+    """
+    Middleware to implement rate limiting for API endpoints.
+
+    Clients are identified by authenticated user, then by a configured API
+    key, then by IP address, each with its own limit from ``RATE_LIMIT``.
+    Place it after AuthenticationMiddleware so per-user limits apply.
+    """
+
     def __init__(self, get_response: Callable):
         self.get_response = get_response
-        # Default rate limits (can be overridden in settings)
-        self.rate_limit = getattr(settings, 'API_RATE_LIMIT', 100) 
-        self.time_window = getattr(settings, 'API_RATE_LIMIT_WINDOW', 3600) 
+        config = getattr(settings, 'RATE_LIMIT', {})
+        self.path_prefixes = tuple(config.get('PATH_PREFIXES', ['/api/v1/search/']))
+        self.limits = {'ip': 100, **config.get('LIMITS', {})}
+        self.api_key_header = config.get('API_KEY_HEADER', 'X-API-Key')
+        # Only known keys get their own limit; anything else is limited by IP.
+        self.api_key_hashes = {self._hash_key(key) for key in config.get('API_KEYS', [])}
+        self.limiter = SlidingWindowRateLimiter(
+            caches[config.get('CACHE', 'default')],
+            window=config.get('WINDOW', 3600),
+            local_batch=config.get('LOCAL_BATCH', 10),
+            sync_interval=config.get('SYNC_INTERVAL', 1.0),
+        )
 
     def __call__(self, request: HttpRequest) -> HttpResponse:
-        if request.path.startswith('/api/v1/search/'):
-            if not self._check_rate_limit(request):
-                return HttpResponse(
-                    'Rate limit exceeded. Please try again later.',
-                    status=429
-                )
-        return self.get_response(request)
-
-    def _check_rate_limit(self, request: HttpRequest) -> bool:
+        if not request.path.startswith(self.path_prefixes):
+            return self.get_response(request)
+
+        result = self._check_rate_limit(request)
+        if result is None:
+            return self.get_response(request)
+        if not result.allowed:
+            response = HttpResponse(
+                'Rate limit exceeded. Please try again later.',
+                status=429
+            )
+            response['Retry-After'] = str(result.retry_after)
+        else:
+            response = self.get_response(request)
+        response['X-RateLimit-Limit'] = str(result.limit)
+        response['X-RateLimit-Remaining'] = str(result.remaining)
+        return response
+
+    def _check_rate_limit(self, request: HttpRequest) -> Optional[RateLimitResult]:
         """
-        Check if the request is within rate limits.
-        Returns True if request is allowed, False if rate limit exceeded.
+        Count the request against its client's limit.
+
+        Returns:
+            The limiter's decision, or None if the client cannot be identified.
         """
-        # Use IP address as identifier (can be extended to use API keys/user IDs)
-        client_ip = self._get_client_ip(request)
-        if not client_ip:
-            logger.warning("Could not determine client IP - allowing request")
-            return True
-
-        cache_key = f"rate_limit:{client_ip}"
-        
-        # Get current request count and timestamp
-        request_history = cache.get(cache_key)
-        current_time = time.time()
-
-        if request_history is None:
-            # First request from this IP
-            cache.set(
-                cache_key,
-                {'count': 1, 'window_start': current_time},
-                self.time_window
-            )
-            return True
-
-        # Check if we're in a new time window
-        if current_time - request_history['window_start'] > self.time_window:
-            cache.set(
-                cache_key,
-                {'count': 1, 'window_start': current_time},
-                self.time_window
-            )
-            return True
+        identity = self._get_identity(request)
+        if identity is None:
+            logger.warning("Could not determine client identity - allowing request")
+            return None
+        kind, key = identity
+        result = self.limiter.hit(f"{kind}:{key}", self.limits.get(kind, self.limits['ip']))
+        if not result.allowed:
+            logger.warning(f"Rate limit exceeded for {kind}: {key}")
+        return result
 
-        # Check if rate limit is exceeded
-        if request_history['count'] >= self.rate_limit:
-            logger.warning(f"Rate limit exceeded for IP: {client_ip}")
-            return False
+    @staticmethod
+    def _hash_key(api_key: str) -> str:
+        return hashlib.sha256(api_key.encode()).hexdigest()[:32]
 
-        # Increment request count
-        request_history['count'] += 1
-        cache.set(cache_key, request_history, self.time_window)
-        return True
+    def _get_identity(self, request: HttpRequest) -> Optional[Tuple[str, str]]:
+        """Return (kind, key) for the user, API key or IP making the request."""
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return 'user', str(user.pk)
+        api_key = request.headers.get(self.api_key_header)
+        if api_key:
+            key_hash = self._hash_key(api_key)
+            if key_hash in self.api_key_hashes:
+                return 'api_key', key_hash
+        client_ip = self._get_client_ip(request)
+        return ('ip', client_ip) if client_ip else None
 
     def _get_client_ip(self, request: HttpRequest) -> Optional[str]:
         """Get client IP address from request."""
@@ -0,0 +1,113 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework import status
+from v1.ai_engine.analytics import LatencySketch, update_rollups
+from v1.ai_engine.models import ImageRollup, QueryRollup, SearchRollup
+from v1.ai_engine.tracking import write_interactions
+
+NOW = datetime(2024, 5, 1, 12, 30, 15, tzinfo=timezone.utc)
+
+
+def _record(query, processing_time, results=(("a.jpg", 0.9), ("b.jpg", 0.8)),
+            created_at=NOW, model_used="clip"):
+    return {"user_id": None, "query": query, "model_used": model_used,
+            "processing_time": processing_time, "client_ip": None,
+            "created_at": created_at.isoformat(),
+            "results": [list(result) for result in results]}
+
+
+def test_sketch_quantiles_within_relative_accuracy():
+    """Sketch percentiles stay within the configured relative error."""
+    values = np.random.default_rng(0).lognormal(mean=-2.0, sigma=1.0, size=20000)
+    sketch = LatencySketch(0.01)
+    for value in values:
+        sketch.add(float(value))
+
+    for q in (0.5, 0.95, 0.99):
+        exact = np.quantile(values, q, method="lower")
+        assert sketch.quantile(q) == pytest.approx(exact, rel=0.02)
+
+
+def test_sketch_merge_matches_single_sketch():
+    """Merging sketches gives the same percentiles as sketching all values at once."""
+    values = np.random.default_rng(1).exponential(0.2, size=2000).tolist()
+    whole, left, right = LatencySketch(), LatencySketch(), LatencySketch()
+    for value in values:
+        whole.add(value)
+    for value in values[:700]:
+        left.add(value)
+    for value in values[700:]:
+        right.add(value)
+
+    merged = LatencySketch.from_dict(left.to_dict())
+    merged.merge(LatencySketch.from_dict(right.to_dict()))
+    assert merged.count == whole.count
+    assert merged.quantile(0.95) == whole.quantile(0.95)
+
+
+@pytest.mark.django_db
+def test_written_interactions_update_rollups():
+    """Each written batch is added to the minute, hour and day rollups."""
+    write_interactions([_record("A  Dog", 0.1), _record("a dog", 0.3, results=())])
+    write_interactions([_record("cat", 0.2, created_at=NOW + timedelta(minutes=1))])
+
+    day = SearchRollup.objects.get(granularity="day")
+    assert day.bucket_start == datetime(2024, 5, 1, tzinfo=timezone.utc)
+    assert day.search_count == 3
+    assert day.results_total == 4
+    assert day.processing_time_sum == pytest.approx(0.6)
+    assert SearchRollup.objects.filter(granularity="minute").count() == 2
+
+    dog = QueryRollup.objects.get(granularity="hour", query="a dog")
+    assert (dog.search_count, dog.zero_result_count) == (2, 1)
+
+    image = ImageRollup.objects.get(granularity="day", image_path="b.jpg")
+    assert (image.result_count, image.rank_sum) == (2, 4)
+
+
+@pytest.mark.django_db
+def test_analytics_endpoints(api_client):
+    """The read-only endpoints serve aggregates over the requested window."""
+    update_rollups([_record("dog", 0.1), _record("dog", 0.2), _record("cat", 0.4)])
+    window = {"granularity": "minute", "since": (NOW - timedelta(minutes=5)).isoformat(),
+              "until": (NOW + timedelta(minutes=5)).isoformat()}
+
+    response = api_client.get(reverse("analytics-queries"), {**window, "limit": 1})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data["results"] == [
+        {"query": "dog", "searches": 2, "zero_result_searches": 0}]
+
+    response = api_client.get(reverse("analytics-images"), window)
+    assert response.data["results"][0]["path"] == "a.jpg"
+    assert response.data["results"][0]["mean_rank"] == 1
+
+    response = api_client.get(reverse("analytics-latency"), window)
+    [clip] = response.data["models"]
+    assert clip["searches"] == 3
+    assert clip["p50"] == pytest.approx(0.2, rel=0.01)
+    assert clip["max_processing_time"] == pytest.approx(0.4)
+    assert len(response.data["series"]) == 1
+
+
+@pytest.mark.django_db
+def test_analytics_rejects_too_many_buckets(api_client):
+    """Fine-grained requests over long windows must use a coarser granularity."""
+    response = api_client.get(reverse("analytics-latency"), {
+        "granularity": "minute", "since": "2024-01-01T00:00:00Z", "until": "2024-03-01T00:00:00Z"})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+def test_rebuild_command_recomputes_rollups():
+    """Rollups can be rebuilt from the raw interaction tables."""
+    write_interactions([_record("dog", 0.1), _record("cat", 0.2)])
+    SearchRollup.objects.all().delete()
+
+    call_command("rollup_analytics", rebuild_since="2024-05-01")
+
+    assert SearchRollup.objects.get(granularity="day").search_count == 2
+    assert QueryRollup.objects.get(granularity="day", query="dog").search_count == 1
@@ -0,0 +1,143 @@
+import io
+import numpy as np
+import pytest
+from django.urls import reverse
+from PIL import Image
+from rest_framework import status
+from v1.ai_engine import utils
+from v1.ml.dataset_handler import thumbnails
+from v1.ml.dataset_handler.indexer import FileManifest, FileRecord, content_hash
+
+
+@pytest.fixture
+def image_dir(tmp_path, settings, monkeypatch):
+    """Fixture for a dataset directory holding one PNG image."""
+    data_dir = tmp_path / "images"
+    data_dir.mkdir()
+    rng = np.random.default_rng(0)
+    Image.fromarray(rng.integers(0, 255, (100, 300, 3), dtype=np.uint8)).save(
+        data_dir / "photo.png")
+    settings.DATASET_SETTINGS = {'DATA_PATH': data_dir, 'SAMPLE_SIZE': 10}
+    settings.THUMBNAIL_SETTINGS = {**settings.THUMBNAIL_SETTINGS,
+                                   'CACHE_DIR': tmp_path / "thumbnails"}
+    monkeypatch.setattr(thumbnails, "_thumbnail_cache", None)
+    store_dir = tmp_path / "faiss_store"
+    store_dir.mkdir()
+    monkeypatch.setattr(utils, "get_store_dir", lambda backend: store_dir)
+    return data_dir
+
+
+@pytest.fixture
+def indexed_hash(image_dir, tmp_path):
+    """Fixture recording the image in the indexer manifest; returns its content hash."""
+    path = image_dir / "photo.png"
+    digest = content_hash(path)
+    stat = path.stat()
+    FileManifest(tmp_path / "faiss_store" / "file_manifest.sqlite3").apply(
+        [FileRecord(str(path), 0, stat.st_size, stat.st_mtime_ns, digest)], [], [])
+    return digest
+
+
+def _body(response):
+    return b"".join(response.streaming_content)
+
+
+def test_original_served_with_its_content_type(api_client, image_dir):
+    """Without parameters the original file is returned."""
+    response = api_client.get(reverse('serve-image', args=["photo.png"]))
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response["Content-Type"] == "image/png"
+    assert _body(response) == (image_dir / "photo.png").read_bytes()
+
+
+def test_resized_variant(api_client, image_dir):
+    """w and fmt return a resized variant in the requested format."""
+    response = api_client.get(reverse('serve-image', args=["photo.png"]),
+                              {"w": 64, "fmt": "webp"})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response["Content-Type"] == "image/webp"
+    with Image.open(io.BytesIO(_body(response))) as img:
+        assert img.size == (64, 21)
+
+
+def test_unsupported_width_rejected(api_client, image_dir):
+    """Widths outside THUMBNAIL_SETTINGS are a client error."""
+    response = api_client.get(reverse('serve-image', args=["photo.png"]), {"w": 65})
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_missing_image(api_client, image_dir):
+    """Unknown files are a 404."""
+    response = api_client.get(reverse('serve-image', args=["missing.png"]))
+
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_indexed_image_has_strong_etag(api_client, image_dir, indexed_hash):
+    """The ETag is the content hash recorded at index time."""
+    url = reverse('serve-image', args=["photo.png"])
+    response = api_client.get(url)
+
+    assert response["ETag"] == f'"{indexed_hash}"'
+    assert response["Accept-Ranges"] == "bytes"
+    assert "immutable" not in response["Cache-Control"]
+    assert "immutable" in api_client.get(url, {"v": indexed_hash})["Cache-Control"]
+
+
+def test_conditional_requests_return_304(api_client, image_dir):
+    """Matching If-None-Match or If-Modified-Since skips the body."""
+    url = reverse('serve-image', args=["photo.png"])
+    first = api_client.get(url, {"w": 64})
+
+    by_etag = api_client.get(url, {"w": 64}, HTTP_IF_NONE_MATCH=first["ETag"])
+    by_date = api_client.get(url, HTTP_IF_MODIFIED_SINCE=first["Last-Modified"])
+
+    assert first["ETag"].startswith('W/"')
+    assert by_etag.status_code == status.HTTP_304_NOT_MODIFIED
+    assert by_date.status_code == status.HTTP_304_NOT_MODIFIED
+
+
+def test_byte_ranges(api_client, image_dir):
+    """Single byte ranges return 206 with the requested slice."""
+    url = reverse('serve-image', args=["photo.png"])
+    data = (image_dir / "photo.png").read_bytes()
+
+    partial = api_client.get(url, HTTP_RANGE="bytes=10-19")
+    suffix = api_client.get(url, HTTP_RANGE="bytes=-5")
+    beyond = api_client.get(url, HTTP_RANGE=f"bytes={len(data)}-")
+
+    assert partial.status_code == status.HTTP_206_PARTIAL_CONTENT
+    assert partial["Content-Range"] == f"bytes 10-19/{len(data)}"
+    assert _body(partial) == data[10:20]
+    assert _body(suffix) == data[-5:]
+    assert beyond.status_code == status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE
+
+
+def test_x_accel_redirect(api_client, image_dir, settings):
+    """In x-accel mode the proxy is told which internal location to send."""
+    settings.IMAGE_SERVING = {'SENDFILE': 'x-accel',
+                              'ACCEL_LOCATIONS': [(image_dir, '/protected/dataset/')]}
+
+    response = api_client.get(reverse('serve-image', args=["photo.png"]))
+
+    assert response["X-Accel-Redirect"] == "/protected/dataset/photo.png"
+    assert response.content == b""
+
+
+def test_file_manifest_is_reused_until_replaced(image_dir, indexed_hash, tmp_path):
+    """Requests share one manifest instance; a replaced manifest file is reopened."""
+    manifest = utils.get_file_manifest()
+    assert utils.get_file_manifest() is manifest
+    assert manifest.get(str(image_dir / "photo.png")).content_hash == indexed_hash
+
+    manifest_file = tmp_path / "faiss_store" / "file_manifest.sqlite3"
+    replacement = manifest_file.with_name("replacement.sqlite3")
+    FileManifest(replacement)
+    replacement.replace(manifest_file)
+
+    reopened = utils.get_file_manifest()
+    assert reopened is not manifest
+    assert reopened.get(str(image_dir / "photo.png")) is None
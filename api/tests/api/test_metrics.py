@@ -0,0 +1,98 @@
+import json
+import os
+import time
+
+import pytest
+from django.urls import reverse
+from rest_framework import status
+from v1 import metrics
+from v1.metrics import MetricsExporter, MetricsRegistry, merge_snapshots, render
+
+
+@pytest.fixture
+def registry():
+    """Fixture for an empty metrics registry."""
+    return MetricsRegistry()
+
+
+def test_histogram_renders_cumulative_buckets(registry):
+    """Histograms are exposed with cumulative buckets, sum and count."""
+    histogram = registry.histogram("latency_seconds", "Latency.", ["route"], buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 3.0):
+        histogram.observe(value, route="search/")
+
+    text = render(registry.snapshot())
+    assert "# TYPE latency_seconds histogram" in text
+    assert 'latency_seconds_bucket{route="search/",le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{route="search/",le="1.0"} 3' in text
+    assert 'latency_seconds_bucket{route="search/",le="+Inf"} 4' in text
+    assert 'latency_seconds_count{route="search/"} 4' in text
+    assert 'latency_seconds_sum{route="search/"} 4.05' in text
+
+
+def test_collectors_run_before_snapshot(registry):
+    """Collector-backed metrics reflect state at snapshot time."""
+    gauge = registry.gauge("queue_depth", "Queue depth.")
+    state = {"depth": 3}
+    registry.add_collector(lambda: gauge.set(state["depth"]))
+    state["depth"] = 7
+    assert "queue_depth 7" in render(registry.snapshot())
+
+
+def test_merge_sums_counters_and_ignores_dead_gauges(registry):
+    """Counters add up across processes; gauges only count live ones."""
+    counter = registry.counter("requests_total", "Requests.", ["status"])
+    gauge = registry.gauge("vectors", "Vectors.")
+    counter.inc(2, status="200")
+    gauge.set(10)
+    first = registry.snapshot()
+    gauge.set(99)
+    second = {**registry.snapshot(), "pid": -1}
+
+    merged = render(merge_snapshots([first, second], live_pids={first["pid"]}))
+    assert 'requests_total{status="200"} 4' in merged
+    assert "vectors 10" in merged
+
+
+def test_exporter_merges_worker_files(registry, tmp_path):
+    """The exporter combines its own snapshot with those other workers wrote."""
+    counter = registry.counter("searches_total", "Searches.")
+    counter.inc(3)
+    other = registry.snapshot()
+    other["pid"] = 2 ** 22 + 1  # Not a running process.
+    (tmp_path / f"metrics-{other['pid']}.json").write_text(json.dumps(other))
+
+    exporter = MetricsExporter(registry, directory=tmp_path, start=False)
+    assert "searches_total 6" in exporter.render()
+    assert exporter.snapshot_file.exists()
+
+
+def test_forked_workers_write_their_own_snapshots(registry, tmp_path, monkeypatch):
+    """A worker forked after the exporter was created runs its own snapshot writer."""
+    parent = MetricsExporter(registry, directory=tmp_path, flush_interval=0.05, start=False)
+    monkeypatch.setattr(metrics, "_exporter_instance", parent)
+    pid = os.fork()
+    if pid == 0:
+        exporter = metrics.get_metrics_exporter()
+        deadline = time.monotonic() + 5
+        while not exporter.snapshot_file.exists() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        os._exit(0 if exporter is not parent and exporter.snapshot_file.exists() else 1)
+    _, exit_status = os.waitpid(pid, 0)
+
+    assert os.waitstatus_to_exitcode(exit_status) == 0
+    assert (tmp_path / f"metrics-{pid}.json").exists()
+
+
+@pytest.mark.django_db
+def test_metrics_endpoint(api_client):
+    """Request latencies are recorded by route and served at /metrics."""
+    api_client.get(reverse("analytics-queries"))
+
+    response = api_client.get(reverse("metrics"))
+    assert response.status_code == status.HTTP_200_OK
+    assert response["Content-Type"].startswith("text/plain; version=0.0.4")
+    body = response.content.decode()
+    assert ('http_request_duration_seconds_count{method="GET",'
+            'route="api/v1/analytics/queries/",status="200"}') in body
+    assert "search_cache_events_total" in body
@@ -0,0 +1,111 @@
+import threading
+import time
+
+import pytest
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache.backends.locmem import LocMemCache
+from django.http import HttpResponse
+from django.test import RequestFactory
+from middleware.rate_limiting import RateLimitMiddleware, SlidingWindowRateLimiter
+
+
+class FakeClock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def cache():
+    """Fixture for an empty in-memory cache."""
+    cache = LocMemCache("rate-limit-tests", {})
+    cache.clear()
+    return cache
+
+
+def test_concurrent_hits_never_lose_increments(cache):
+    """Threads hitting the shared counter together admit exactly the limit."""
+    limiter = SlidingWindowRateLimiter(cache, window=60, local_batch=0)
+    allowed = []
+
+    def worker():
+        allowed.extend(limiter.hit("ip:1.2.3.4", 100).allowed for _ in range(50))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sum(allowed) == 100
+
+
+def test_separate_limiters_share_counters(cache):
+    """Per-process batching still converges on the shared limit."""
+    clock = FakeClock()
+    workers = [SlidingWindowRateLimiter(cache, window=60, local_batch=5, clock=clock)
+               for _ in range(3)]
+    allowed = sum(workers[i % 3].hit("user:1", 60).allowed for i in range(200))
+    assert 60 <= allowed <= 60 + 3 * 5
+
+
+def test_sliding_window_weights_previous_window(cache):
+    """Half way into the next window, half of the previous window's count still applies."""
+    clock = FakeClock(now=600.0)
+    limiter = SlidingWindowRateLimiter(cache, window=60, local_batch=0, clock=clock)
+    assert sum(limiter.hit("ip:a", 10).allowed for _ in range(15)) == 10
+
+    clock.now += 90  # Half way through the following window.
+    assert sum(limiter.hit("ip:a", 10).allowed for _ in range(15)) == 5
+
+
+def test_denied_hit_reports_retry_after(cache):
+    """A denied request is not counted and says when to retry."""
+    clock = FakeClock(now=600.0)
+    limiter = SlidingWindowRateLimiter(cache, window=60, local_batch=0, clock=clock)
+    for _ in range(3):
+        limiter.hit("ip:a", 3)
+    result = limiter.hit("ip:a", 3)
+    assert not result.allowed
+    assert 0 < result.retry_after <= 120
+    assert cache.get("rl:ip:a:10") == 3
+
+
+def test_fast_path_is_cheap(cache):
+    """Requests well below the limit are decided locally in well under 100us."""
+    limiter = SlidingWindowRateLimiter(cache, window=3600, local_batch=1000)
+    start = time.perf_counter()
+    for _ in range(20000):
+        limiter.hit("ip:a", 10 ** 9)
+    assert (time.perf_counter() - start) / 20000 < 50e-6
+
+
+def test_middleware_limits_by_identity(settings):
+    """Users, known API keys and IPs are limited separately with their own limits."""
+    settings.RATE_LIMIT = {
+        'LIMITS': {'ip': 1, 'user': 2, 'api_key': 3},
+        'API_KEYS': ['secret'],
+        'LOCAL_BATCH': 0,
+    }
+    settings.CACHES = {**settings.CACHES, 'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'rate-limit-middleware'}}
+    middleware = RateLimitMiddleware(lambda request: HttpResponse("ok"))
+    factory = RequestFactory()
+
+    def status(**headers):
+        request = factory.get("/api/v1/search/", **headers)
+        request.user = AnonymousUser()
+        return middleware(request).status_code
+
+    assert [status() for _ in range(2)] == [200, 429]
+    assert [status(HTTP_X_API_KEY="secret") for _ in range(4)] == [200, 200, 200, 429]
+    # Unknown keys fall back to the (exhausted) IP limit.
+    assert status(HTTP_X_API_KEY="guess") == 429
+
+    request = factory.get("/api/v1/search/")
+    request.user = AnonymousUser()
+    response = middleware(request)
+    assert response["Retry-After"]
+    assert response["X-RateLimit-Remaining"] == "0"
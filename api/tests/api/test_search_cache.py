@@ -0,0 +1,80 @@
+from types import SimpleNamespace
+
+import pytest
+import torch
+from v1.ai_engine.cache import SearchCache
+from v1.ai_engine.utils import ImageSearchService
+from v1.ml.models.batching import MicroBatcher
+
+
+@pytest.fixture
+def search_cache():
+    """Fixture to provide an empty search cache."""
+    cache = SearchCache()
+    cache.clear()
+    yield cache
+    cache.clear()
+
+
+def test_query_embedding_round_trip(search_cache):
+    """Equivalent queries share one cached embedding."""
+    embedding = torch.nn.functional.normalize(torch.randn(1, 512), dim=1)
+
+    assert search_cache.get_query_embedding("A  Dog", "clip") is None
+    search_cache.set_query_embedding("A  Dog", "clip", embedding)
+
+    cached = search_cache.get_query_embedding("a dog", "clip")
+    assert torch.equal(cached, embedding)
+    assert search_cache.get_query_embedding("a dog", "blip2") is None
+
+
+def test_query_embeddings_are_keyed_by_backend(search_cache):
+    """An embedding cached by one inference backend is not served to another."""
+    embedding = torch.randn(1, 512)
+    search_cache.set_query_embedding("a dog", "clip", embedding, backend="eager")
+
+    assert torch.equal(search_cache.get_query_embedding("a dog", "clip", "eager"), embedding)
+    assert search_cache.get_query_embedding("a dog", "clip", "onnx") is None
+
+
+def test_batched_encoder_keys_embeddings_by_its_backend(search_cache):
+    """Searches through the micro-batcher cache under the wrapped handler's backend."""
+    class OnnxHandler:
+        backend = SimpleNamespace(name="onnx")
+
+        def encode_texts(self, texts):
+            return torch.ones(len(texts), 512)
+
+    stale = torch.zeros(1, 512)
+    search_cache.set_query_embedding("a dog", "clip", stale, backend="eager")
+    batcher = MicroBatcher(OnnxHandler(), start=False)
+    batcher.stop()
+    service = ImageSearchService(batcher, vectorstore=None, cache=search_cache)
+
+    assert not torch.equal(service.get_query_embeddings(["a dog"]), stale)
+    assert search_cache.get_query_embedding("a dog", "clip", "onnx") is not None
+
+
+def test_results_invalidated_by_store_version(search_cache):
+    """Results cached for one store version are not served for another."""
+    embedding = torch.randn(1, 512)
+    results = [{"path": "a.jpg", "similarity": 0.9}]
+
+    search_cache.set_results(embedding, 5, "v1", results)
+
+    assert search_cache.get_results(embedding, 5, "v1") == results
+    assert search_cache.get_results(embedding, 10, "v1") is None
+    assert search_cache.get_results(embedding, 5, "v2") is None
+
+
+def test_stats_count_hits_and_misses(search_cache):
+    """Hit and miss counters are exposed with hit rates."""
+    embedding = torch.randn(1, 512)
+    search_cache.get_results(embedding, 5, "v1")
+    search_cache.set_results(embedding, 5, "v1", [])
+    search_cache.get_results(embedding, 5, "v1")
+
+    stats = search_cache.stats()
+    assert stats["result_hits"] == 1
+    assert stats["result_misses"] == 1
+    assert stats["result_hit_rate"] == 0.5
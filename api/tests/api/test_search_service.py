@@ -0,0 +1,173 @@
+import pytest
+import torch
+from unittest.mock import MagicMock
+from v1.ai_engine.utils import ImageSearchService
+
+
+@pytest.fixture
+def model_handler():
+    """Fixture for a mocked model handler returning normalized embeddings."""
+    handler = MagicMock()
+    handler.encode_texts.side_effect = lambda texts: torch.nn.functional.normalize(
+        torch.randn(len(texts), 512), dim=1)
+    return handler
+
+
+def test_query_templates_encoded_in_one_batch(model_handler, settings):
+    """All prompt templates go through a single encode_texts call."""
+    settings.ML_SETTINGS = {**settings.ML_SETTINGS,
+                            'QUERY_TEMPLATES': ['{query}', 'a photo of {query}']}
+    service = ImageSearchService(model_handler, MagicMock())
+
+    embedding = service.encode_query("a dog")
+
+    model_handler.encode_texts.assert_called_once_with(["a dog", "a photo of a dog"])
+    assert embedding.shape == (1, 512)
+    assert torch.allclose(embedding.norm(dim=-1), torch.ones(1))
+
+
+def test_batch_queries_encoded_in_one_pass(model_handler, settings):
+    """Every template of every query goes through a single encode_texts call."""
+    settings.ML_SETTINGS = {**settings.ML_SETTINGS,
+                            'QUERY_TEMPLATES': ['{query}', 'a photo of {query}']}
+    service = ImageSearchService(model_handler, MagicMock())
+
+    embeddings = service.encode_queries(["a dog", "a cat", "a car"])
+
+    model_handler.encode_texts.assert_called_once()
+    assert len(model_handler.encode_texts.call_args[0][0]) == 6
+    assert embeddings.shape == (3, 512)
+    assert torch.allclose(embeddings.norm(dim=-1), torch.ones(3))
+
+
+def test_queries_without_templates_are_encoded_as_written(model_handler, settings):
+    """An empty template list encodes each raw query once."""
+    settings.ML_SETTINGS = {**settings.ML_SETTINGS, 'QUERY_TEMPLATES': []}
+    service = ImageSearchService(model_handler, MagicMock())
+
+    embeddings = service.encode_queries(["a dog", "a cat"])
+
+    model_handler.encode_texts.assert_called_once_with(["a dog", "a cat"])
+    assert embeddings.shape == (2, 512)
+
+
+@pytest.mark.django_db
+def test_search_many_runs_one_index_search(model_handler, settings, tmp_path):
+    """A batch request searches the store once and queues every query for tracking."""
+    from rest_framework.parsers import JSONParser
+    from rest_framework.request import Request
+    from rest_framework.test import APIRequestFactory
+    from v1.ai_engine.cache import SearchCache
+    from v1.ai_engine.models import ImageInteraction, SearchInteraction
+    from v1.ai_engine.tracking import InteractionWriter
+    from v1.metrics import SEARCH_STAGE_DURATION
+
+    settings.ML_SETTINGS = {**settings.ML_SETTINGS, 'TOP_K': 5}
+    vectorstore = MagicMock()
+    vectorstore.version = "v1"
+    vectorstore.search_many.side_effect = lambda embeddings, **kwargs: [
+        [{"path": f"{i}.jpg", "similarity": 0.9}] for i in range(len(embeddings))]
+    cache = SearchCache()
+    cache.clear()
+    tracker = InteractionWriter(tmp_path, start=False)
+    service = ImageSearchService(model_handler, vectorstore, cache=cache, tracker=tracker)
+    request = Request(
+        APIRequestFactory().post("/", {"queries": ["dog", "cat", "dog"]}, format="json"),
+        parsers=[JSONParser()])
+
+    response = service.search_many(request)
+
+    assert response.status_code == 200
+    assert [item["query"] for item in response.data["results"]] == ["dog", "cat", "dog"]
+    vectorstore.search_many.assert_called_once()
+    assert model_handler.encode_texts.call_count == 1
+    assert SearchInteraction.objects.count() == 0
+    assert tracker.flush() == 3
+    assert SearchInteraction.objects.count() == 3
+    assert ImageInteraction.objects.count() == 3
+    stages = {stage for stage, in SEARCH_STAGE_DURATION.values()}
+    assert {"validation", "text_encoding", "tracking", "serialization"} <= stages
+    cache.clear()
+
+
+@pytest.mark.django_db
+def test_filters_are_passed_to_the_store(model_handler, settings):
+    """Validated filters reach the store search in a canonical form."""
+    from rest_framework.parsers import JSONParser
+    from rest_framework.request import Request
+    from rest_framework.test import APIRequestFactory
+    from v1.ai_engine.cache import SearchCache
+
+    vectorstore = MagicMock()
+    vectorstore.version = "v1"
+    vectorstore.search_many.return_value = [[{"path": "cats/a.jpg", "similarity": 0.9}]]
+    cache = SearchCache()
+    cache.clear()
+    service = ImageSearchService(model_handler, vectorstore, cache=cache, tracker=MagicMock())
+    body = {"query": "a cat", "filters": {"file_types": ["png", "jpg", "png"],
+                                          "folders": ["cats"]}}
+    request = Request(APIRequestFactory().post("/", body, format="json"),
+                      parsers=[JSONParser()])
+
+    response = service.search_images(request)
+
+    assert response.status_code == 200
+    assert vectorstore.search_many.call_args.kwargs["filters"] == {
+        "folders": ["cats"], "file_types": ["jpg", "png"]}
+    cache.clear()
+
+
+@pytest.mark.parametrize("filters", [
+    {"modified_after": "2024-02-01T00:00:00Z", "modified_before": "2024-01-01T00:00:00Z"},
+    {"labels": []},
+    "not json",
+])
+def test_invalid_filters_are_rejected(filters):
+    """Empty predicate lists, inverted date ranges and malformed JSON fail validation."""
+    from v1.ai_engine.serializers import ImageSearchRequestSerializer
+
+    serializer = ImageSearchRequestSerializer(data={"query": "a cat", "filters": filters})
+    assert not serializer.is_valid()
+    assert "filters" in serializer.errors
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("hybrid", [True, False])
+def test_file_name_matches_are_fused_into_results(tmp_path, hybrid):
+    """A query naming a file returns it with its cosine similarity unless hybrid is off."""
+    import numpy as np
+    from rest_framework.parsers import JSONParser
+    from rest_framework.request import Request
+    from rest_framework.test import APIRequestFactory
+    from v1.ai_engine.cache import SearchCache
+    from v1.ml.models.store_handlers.faiss_store import FaissVectorStore
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((50, 512)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    store = FaissVectorStore(512, tmp_path / "faiss_store")
+    store.add_embeddings(vectors, [{"path": f"photos/DSC_{i:04d}.jpg"} for i in range(50)])
+    query = vectors[:5].mean(axis=0)
+    query /= np.linalg.norm(query)
+    handler = MagicMock()
+    handler.encode_texts.side_effect = lambda texts: torch.from_numpy(
+        np.tile(query, (len(texts), 1)))
+    cache = SearchCache()
+    cache.clear()
+    service = ImageSearchService(handler, store, cache=cache, tracker=MagicMock())
+    body = {"query": "DSC_0042.jpg", "top_k": 3, "hybrid": hybrid}
+    request = Request(APIRequestFactory().post("/", body, format="json"),
+                      parsers=[JSONParser()])
+
+    response = service.search_images(request)
+
+    assert response.status_code == 200
+    paths = [result["path"] for result in response.data["results"]]
+    semantic = [result["path"] for result in store.search(query[None], top_k=3)]
+    if hybrid:
+        assert paths == [semantic[0], "photos/DSC_0042.jpg", semantic[1]]
+        assert response.data["results"][1]["similarity"] == pytest.approx(
+            float(vectors[42] @ query), abs=1e-5)
+    else:
+        assert paths == semantic
+    cache.clear()
@@ -0,0 +1,135 @@
+import io
+
+import numpy as np
+import pytest
+import torch
+from unittest.mock import MagicMock
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from PIL import Image
+from rest_framework import status
+from v1.ai_engine import utils, views
+from v1.ai_engine.cache import SearchCache
+from v1.ml.dataset_handler.indexer import stream_hash
+from v1.ml.models.store_handlers.faiss_store import FaissVectorStore
+
+
+def _unit_vectors(n, dim=16, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _png_bytes(color):
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8), color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def embeddings():
+    """Fixture for the stored image vectors."""
+    return _unit_vectors(50)
+
+
+@pytest.fixture
+def model_handler(embeddings):
+    """Fixture for a model handler whose images all encode to stored vector 12."""
+    handler = MagicMock()
+    handler.encode_image.side_effect = lambda images: torch.from_numpy(
+        embeddings[[12] * len(images)])
+    return handler
+
+
+@pytest.fixture
+def similar_api(monkeypatch, tmp_path, embeddings, model_handler):
+    """Fixture routing the similar search view to a small FAISS store."""
+    store = FaissVectorStore(16, tmp_path / "faiss_store")
+    store.add_embeddings(embeddings, [{"path": f"image{i}.jpg"} for i in range(50)])
+    cache = SearchCache()
+    cache.clear()
+    monkeypatch.setattr(views, "get_vector_store", lambda: store)
+    monkeypatch.setattr(views, "get_text_encoder", lambda: model_handler)
+    monkeypatch.setattr(utils, "get_search_cache", lambda: cache)
+    yield store
+    cache.clear()
+
+
+def _expected(embeddings, query, exclude, top_k):
+    order = np.argsort(-(embeddings @ embeddings[query]), kind="stable")
+    return [f"image{i}.jpg" for i in order if i != exclude][:top_k]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("body", [{"id": 12, "top_k": 4}, {"path": "image12.jpg", "top_k": 4}])
+def test_indexed_image_reuses_stored_vector(api_client, similar_api, model_handler,
+                                            embeddings, body):
+    """Indexed queries make no model calls and leave the query image out."""
+    response = api_client.post(reverse('image-search-similar'), body, format='json')
+
+    assert response.status_code == status.HTTP_200_OK
+    paths = [result["path"] for result in response.data["results"]]
+    assert paths == _expected(embeddings, 12, 12, 4)
+    model_handler.encode_image.assert_not_called()
+
+
+@pytest.mark.django_db
+def test_unknown_image_returns_404(api_client, similar_api):
+    """Ids and paths that are not indexed are reported as not found."""
+    for body in ({"id": 999}, {"path": "missing.jpg"}):
+        response = api_client.post(reverse('image-search-similar'), body, format='json')
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+def test_exactly_one_query_image_is_required(api_client, similar_api):
+    """Requests must name exactly one of id, path or image."""
+    for body in ({}, {"id": 1, "path": "image1.jpg"}):
+        response = api_client.post(reverse('image-search-similar'), body, format='json')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+def test_upload_is_encoded_once_and_excluded(api_client, similar_api, model_handler,
+                                             embeddings, monkeypatch):
+    """An uploaded image is encoded once; indexed copies of it are left out."""
+    data = _png_bytes("red")
+    manifest = MagicMock()
+    manifest.content_hashes.side_effect = lambda paths: {
+        path: stream_hash(io.BytesIO(data)) if path == "image12.jpg" else "other"
+        for path in paths}
+    monkeypatch.setattr(utils, "get_file_manifest", lambda: manifest)
+
+    response = api_client.post(
+        reverse('image-search-similar'),
+        {"image": SimpleUploadedFile("query.png", data, content_type="image/png"),
+         "top_k": 3},
+        format='multipart')
+
+    assert response.status_code == status.HTTP_200_OK
+    paths = [result["path"] for result in response.data["results"]]
+    assert paths == _expected(embeddings, 12, 12, 3)
+    model_handler.encode_image.assert_called_once()
+
+
+@pytest.mark.django_db
+def test_oversized_upload_is_rejected(api_client, similar_api, settings):
+    """Uploads above MAX_QUERY_IMAGE_BYTES fail validation."""
+    settings.ML_SETTINGS = {**settings.ML_SETTINGS, 'MAX_QUERY_IMAGE_BYTES': 10}
+    response = api_client.post(
+        reverse('image-search-similar'),
+        {"image": SimpleUploadedFile("query.png", _png_bytes("red"),
+                                     content_type="image/png")},
+        format='multipart')
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+def test_multipart_filters_are_applied(api_client, similar_api):
+    """Filters sent as a JSON string with a form request restrict the results."""
+    response = api_client.post(
+        reverse('image-search-similar'),
+        {"id": 12, "filters": '{"file_types": ["png"]}'}, format='multipart')
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data["results"] == []
@@ -0,0 +1,156 @@
+import os
+import subprocess
+import sys
+import threading
+
+import pytest
+from django.urls import reverse
+from rest_framework import status
+from v1.ai_engine import startup
+from v1.ai_engine.startup import WarmupManager
+
+
+@pytest.fixture
+def gate():
+    """Fixture for an event that holds a warm-up stage until set."""
+    event = threading.Event()
+    yield event
+    event.set()
+
+
+@pytest.fixture
+def warming(monkeypatch, gate, settings):
+    """Fixture installing a process-wide warm-up stuck in its model stage."""
+    settings.STARTUP = {'WARMUP': True, 'SEARCH_WAIT_SECONDS': 0.05, 'RETRY_AFTER': 7}
+    manager = WarmupManager([("dataset", lambda: None), ("model", gate.wait)])
+    monkeypatch.setattr(startup, "_warmup_instance", manager)
+    manager.start()
+    return manager
+
+
+def test_stages_run_in_order_until_ready():
+    """Stages run in order in the background and are reported with durations."""
+    calls = []
+    manager = WarmupManager([("dataset", lambda: calls.append("dataset")),
+                             ("model", lambda: calls.append("model"))])
+    assert manager.start()
+    assert manager.wait(5)
+    assert calls == ["dataset", "model"]
+
+    status_ = manager.status()
+    assert status_["state"] == startup.READY
+    assert all(stage["state"] == "done" and stage["seconds"] >= 0
+               for stage in status_["stages"].values())
+    assert not manager.start()
+
+
+def test_failed_stage_stops_warmup_and_can_be_retried():
+    """A failing stage marks warm-up failed, skips later stages and allows a retry."""
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("download failed")
+
+    later = []
+    manager = WarmupManager([("dataset", flaky), ("model", lambda: later.append(1))])
+    manager.start()
+    assert not manager.wait(5)
+    assert manager.status()["error"] == "dataset: download failed"
+    assert manager.status()["stages"]["model"]["state"] == "pending"
+    assert later == []
+
+    assert manager.start()
+    assert manager.wait(5)
+    assert later == [1]
+
+
+def test_failed_stage_is_retried_with_backoff(monkeypatch):
+    """A failing stage is retried with doubling delays; finished stages are not rerun."""
+    delays = []
+    monkeypatch.setattr(startup.time, "sleep", delays.append)
+    calls = []
+
+    def flaky():
+        calls.append("model")
+        if len(calls) < 4:
+            raise RuntimeError("out of memory")
+
+    dataset = []
+    manager = WarmupManager([("dataset", lambda: dataset.append(1)), ("model", flaky)],
+                            max_retries=3, retry_backoff=1.0, max_retry_backoff=3.0)
+    manager.start()
+    assert manager.wait(5)
+    assert dataset == [1]
+    assert delays == [1.0, 2.0, 3.0]
+    assert manager.status()["retries"] == 3
+
+
+@pytest.mark.django_db
+def test_liveness_fails_once_retries_are_exhausted(api_client, monkeypatch):
+    """Liveness answers 503 when warm-up failed after its last retry."""
+    monkeypatch.setattr(startup.time, "sleep", lambda seconds: None)
+
+    def broken():
+        raise RuntimeError("download failed")
+
+    manager = WarmupManager([("dataset", broken)], max_retries=2)
+    monkeypatch.setattr(startup, "_warmup_instance", manager)
+    manager.start()
+    assert not manager.wait(5)
+
+    live = api_client.get(reverse('health-live'))
+    assert live.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert live.data["warmup"]["state"] == startup.FAILED
+    assert live.data["warmup"]["retries"] == 2
+
+
+def test_without_warmup_searches_are_not_blocked():
+    """A manager that was never started (tests, commands) lets searches load lazily."""
+    manager = WarmupManager([("model", lambda: None)])
+    assert manager.wait(0)
+    manager.disable()
+    assert manager.status()["state"] == startup.DISABLED
+    assert manager.ready
+
+
+@pytest.mark.django_db
+def test_probes_follow_warmup(api_client, warming, gate):
+    """Liveness is 200 while warming; readiness is 503 until warm-up completes."""
+    live = api_client.get(reverse('health-live'))
+    assert live.status_code == status.HTTP_200_OK
+    assert live.data["warmup"]["stages"]["model"]["state"] == "running"
+
+    assert api_client.get(reverse('health-ready')).status_code == \
+        status.HTTP_503_SERVICE_UNAVAILABLE
+
+    gate.set()
+    assert warming.wait(5)
+    ready = api_client.get(reverse('health-ready'))
+    assert ready.status_code == status.HTTP_200_OK
+    assert ready.data["status"] == "ready"
+
+
+@pytest.mark.django_db
+def test_search_during_warmup_returns_503(api_client, warming):
+    """Searches that outlast SEARCH_WAIT_SECONDS get a 503 with Retry-After."""
+    for name, body in (('image-search', {'query': 'a dog'}),
+                       ('image-search-batch', {'queries': ['a dog']})):
+        response = api_client.post(reverse(name), body, format='json')
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        assert response["Retry-After"] == "7"
+        assert response.data["warmup"]["state"] == startup.WARMING
+
+
+def test_url_configuration_does_not_import_ml_libraries():
+    """Management commands load the URLconf without importing torch or kagglehub."""
+    code = (
+        "import sys, django; django.setup(); import config.urls; "
+        "print(','.join(m for m in ('torch', 'transformers', 'kagglehub', 'faiss') "
+        "if m in sys.modules))"
+    )
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                            env=os.environ.copy(), timeout=120)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == ""
@@ -0,0 +1,72 @@
+import pytest
+from unittest.mock import patch
+from v1.ai_engine.models import ImageInteraction, SearchInteraction
+from v1.ai_engine.tracking import InteractionWriter, interaction_record
+
+
+def _record(query="a dog", n_results=3):
+    results = [{"path": f"{i}.jpg", "similarity": 0.9 - i * 0.1} for i in range(n_results)]
+    return interaction_record(None, query, results, "clip", 0.05, "127.0.0.1")
+
+
+@pytest.fixture
+def writer(tmp_path):
+    """Fixture for a writer without its background thread."""
+    return InteractionWriter(tmp_path / "spill", queue_size=4, batch_size=2, start=False)
+
+
+@pytest.mark.django_db
+def test_flush_bulk_writes_queued_records(writer):
+    """Queued records are written in batches with their ranked results."""
+    for i in range(3):
+        writer.submit(_record(f"query {i}"))
+    assert writer.stats()["queue_depth"] == 3
+
+    assert writer.flush() == 3
+
+    assert writer.stats()["queue_depth"] == 0
+    assert SearchInteraction.objects.count() == 3
+    search = SearchInteraction.objects.get(query="query 0")
+    assert search.top_similarity == pytest.approx(0.9)
+    assert list(search.image_interactions.order_by("rank_position")
+                .values_list("image_path", flat=True)) == ["0.jpg", "1.jpg", "2.jpg"]
+
+
+@pytest.mark.django_db
+def test_full_queue_spills_and_replays(writer):
+    """Records beyond the queue bound go to the spill file and are written later."""
+    for i in range(6):
+        writer.submit(_record(f"query {i}"))
+
+    stats = writer.stats()
+    assert stats["queue_depth"] == 4
+    assert stats["spilled"] == 2
+    assert stats["spill_bytes"] > 0
+
+    assert writer.flush() == 6
+    assert SearchInteraction.objects.count() == 6
+    assert writer.stats()["spill_bytes"] == 0
+
+
+@pytest.mark.django_db
+def test_failed_flush_spills_until_database_recovers(writer):
+    """A database error keeps the records on disk instead of losing them."""
+    writer.submit(_record())
+    with patch("v1.ai_engine.tracking.write_interactions", side_effect=RuntimeError("locked")):
+        assert writer.flush() == 0
+    assert writer.stats()["failed_flushes"] == 1
+    assert SearchInteraction.objects.count() == 0
+
+    assert writer.flush() == 1
+    assert ImageInteraction.objects.count() == 3
+
+
+def test_spill_file_is_bounded(tmp_path):
+    """Records that do not fit in the spill file are dropped and counted."""
+    writer = InteractionWriter(tmp_path, queue_size=1, spill_max_bytes=300, start=False)
+    for _ in range(5):
+        writer.submit(_record())
+
+    stats = writer.stats()
+    assert stats["spill_bytes"] <= 300
+    assert stats["dropped"] == 4 - stats["spilled"]
@@ -0,0 +1,83 @@
+import os
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+from v1.ml.models.store_handlers.attributes import AttributeStore, load_labels
+from v1.ml.models.store_handlers.metadata import MetadataStore
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    """Fixture for image files in nested folders with known mtimes and labels."""
+    root = tmp_path / "dataset"
+    files = ["a.jpg", "cats/b.png", "cats/kittens/c.JPEG", "dogs/d.jpg"]
+    for i, name in enumerate(files):
+        path = root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"x")
+        os.utime(path, (1_700_000_000 + i * 86400,) * 2)
+    labels = tmp_path / "labels.csv"
+    labels.write_text(",file_name,label\n0,train_data/a.jpg,1\n1,train_data/b.png,0\n")
+    return root, [str(root / name) for name in files], labels
+
+
+@pytest.fixture
+def attributes(tmp_path, dataset):
+    """Fixture for an attribute store holding the dataset files as ids 0-3."""
+    root, paths, labels = dataset
+    store = AttributeStore(tmp_path / "attributes", root=root, labels_file=labels)
+    store.add(range(4), paths)
+    return store
+
+
+def test_attributes_are_derived_from_paths(attributes):
+    """Folders are relative to the root, jpeg counts as jpg and labels come from the CSV."""
+    assert attributes.get(2) == {"folder": "cats/kittens", "file_type": "jpg", "label": "",
+                                 "mtime": 1_700_000_000 + 2 * 86400}
+    assert attributes.get(0)["label"] == "ai"
+    assert attributes.get(1)["label"] == "human"
+
+
+@pytest.mark.parametrize("filters, expected", [
+    ({"folders": ["cats"]}, [1, 2]),
+    ({"folders": ["cats/kittens", "dogs"]}, [2, 3]),
+    ({"folders": [""]}, [0, 1, 2, 3]),
+    ({"file_types": ["jpg"]}, [0, 2, 3]),
+    ({"labels": ["ai", "human"], "file_types": ["png"]}, [1]),
+    ({"modified_after": datetime.fromtimestamp(1_700_000_000 + 86400, timezone.utc),
+      "modified_before": datetime.fromtimestamp(1_700_000_000 + 3 * 86400, timezone.utc)},
+     [1, 2]),
+])
+def test_filters_become_id_masks(attributes, filters, expected):
+    """Every predicate is evaluated over the whole table at once."""
+    assert np.flatnonzero(attributes.mask(filters)).tolist() == expected
+
+
+def test_masks_follow_changes(attributes, dataset):
+    """Cached masks are dropped when vectors are added or removed."""
+    _, paths, _ = dataset
+    assert np.flatnonzero(attributes.mask({"folders": ["dogs"]})).tolist() == [3]
+
+    attributes.remove([3])
+    attributes.add([7], [paths[3]])
+    assert np.flatnonzero(attributes.mask({"folders": ["dogs"]})).tolist() == [7]
+
+
+def test_saved_attributes_reload_and_backfill(tmp_path, attributes, dataset):
+    """Attributes persist, and stored paths without attributes are filled in on demand."""
+    _, paths, _ = dataset
+    attributes.save()
+    reopened = AttributeStore(tmp_path / "attributes", root=attributes.root)
+    assert reopened.get(1)["folder"] == "cats"
+
+    metadata = MetadataStore(tmp_path / "paths")
+    metadata.add(range(6), paths + paths[:2])
+    assert reopened.backfill(metadata) == 2
+    assert reopened.get(5)["folder"] == "cats"
+
+
+def test_labels_csv_maps_binary_labels(dataset):
+    """The dataset's 0/1 labels are read as human/ai, keyed by file name."""
+    _, _, labels = dataset
+    assert load_labels(labels) == {"a.jpg": "ai", "b.png": "human"}
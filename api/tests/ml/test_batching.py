@@ -0,0 +1,107 @@
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import pytest
+import torch
+from v1.ml.models.batching import MicroBatcher
+
+
+class RecordingHandler:
+    """Encodes each text as (length, character sum) and records every batch."""
+
+    def __init__(self, delay: float = 0.0, fail: bool = False):
+        self.batches = []
+        self.delay = delay
+        self.fail = fail
+        self._lock = threading.Lock()
+
+    def encode_texts(self, texts):
+        with self._lock:
+            self.batches.append(list(texts))
+        if self.fail:
+            raise RuntimeError("model crashed")
+        time.sleep(self.delay)
+        return torch.stack([torch.tensor([float(len(text)), float(sum(map(ord, text)))])
+                            for text in texts])
+
+
+def expected(texts):
+    return RecordingHandler().encode_texts(texts)
+
+
+@pytest.fixture
+def handler():
+    """Fixture for a slow handler so concurrent requests pile up."""
+    return RecordingHandler(delay=0.02)
+
+
+def test_concurrent_requests_are_coalesced(handler):
+    """Concurrent callers share forward passes and each get their own rows back."""
+    batcher = MicroBatcher(handler, max_batch=64, max_wait_ms=10)
+    requests = [[f"query {i} template {j}" for j in range(4)] for i in range(16)]
+    try:
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            results = list(pool.map(batcher.encode_texts, requests))
+    finally:
+        batcher.stop()
+
+    for texts, result in zip(requests, results):
+        assert torch.equal(result, expected(texts))
+    assert len(handler.batches) < len(requests)
+    stats = batcher.stats()
+    assert stats["requests"] == 16
+    assert stats["mean_requests_per_batch"] > 1
+
+
+def test_batches_stop_at_max_batch(handler):
+    """Collection stops once max_batch texts are queued."""
+    batcher = MicroBatcher(handler, max_batch=8, max_wait_ms=50)
+    try:
+        with ThreadPoolExecutor(max_workers=12) as pool:
+            list(pool.map(batcher.encode_texts, [[f"q{i}a", f"q{i}b"] for i in range(12)]))
+    finally:
+        batcher.stop()
+    assert max(len(batch) for batch in handler.batches) <= 8
+
+
+def test_duplicate_texts_are_encoded_once(handler):
+    """Requests for the same query share their template encodes."""
+    batcher = MicroBatcher(handler, max_batch=64, max_wait_ms=20, start=False)
+    futures = [batcher.submit(["a dog", "a photo of a dog"]) for _ in range(5)]
+    batcher.start()
+    try:
+        results = [future.result(timeout=5) for future in futures]
+    finally:
+        batcher.stop()
+    assert handler.batches == [["a dog", "a photo of a dog"]]
+    assert all(torch.equal(result, results[0]) for result in results)
+
+
+def test_errors_reach_every_caller():
+    """A failed forward pass raises in every request of the batch."""
+    batcher = MicroBatcher(RecordingHandler(fail=True), max_wait_ms=20, start=False)
+    futures = [batcher.submit([f"query {i}"]) for i in range(3)]
+    batcher.start()
+    try:
+        for future in futures:
+            with pytest.raises(RuntimeError, match="model crashed"):
+                future.result(timeout=5)
+    finally:
+        batcher.stop()
+
+
+def test_stopped_batcher_encodes_inline(handler):
+    """After stop, calls bypass the queue instead of hanging."""
+    batcher = MicroBatcher(handler)
+    batcher.stop()
+    assert torch.equal(batcher.encode_texts(["late"]), expected(["late"]))
+
+
+def test_stop_resolves_requests_left_in_the_queue(handler):
+    """A request queued as the worker exits is encoded by stop instead of hanging."""
+    batcher = MicroBatcher(handler, start=False)
+    late = Future()
+    batcher._queue.put((["late"], late))
+    batcher.stop()
+    assert torch.equal(late.result(timeout=1), expected(["late"]))
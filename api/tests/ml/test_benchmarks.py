@@ -0,0 +1,40 @@
+import pytest
+from benchmarks.harness import compare, latency_stats, make_report
+from benchmarks.suites import parse_sizes, run_store_benchmarks
+
+
+def test_latency_stats():
+    """Percentiles are reported in milliseconds and throughput per second."""
+    stats = latency_stats([0.001] * 98 + [0.010, 0.020], wall_time=0.5, operations=100)
+    assert stats["count"] == 100
+    assert stats["p50_ms"] == pytest.approx(1.0)
+    assert stats["max_ms"] == pytest.approx(20.0)
+    assert stats["qps"] == pytest.approx(200.0)
+
+
+def test_compare_flags_regressions_beyond_tolerance():
+    """Slower p95/p99 or lower QPS than the baseline are regressions."""
+    base = {"p95_ms": 10.0, "p99_ms": 20.0, "qps": 100.0}
+    baseline = make_report({"a": base, "b": base}, {})
+    current = make_report({
+        "a": {"p95_ms": 10.5, "p99_ms": 21.0, "qps": 95.0},
+        "b": {"p95_ms": 13.0, "p99_ms": 20.0, "qps": 70.0},
+        "new": base,
+    }, {})
+
+    regressions = compare(baseline, current, tolerance=0.10)
+    assert {(r["benchmark"], r["metric"]) for r in regressions} == {("b", "p95_ms"), ("b", "qps")}
+
+
+def test_parse_sizes():
+    """Corpus sizes accept k and M suffixes."""
+    assert parse_sizes("10k,100K,1M,500") == [10000, 100000, 1000000, 500]
+
+
+def test_store_suite_on_small_corpus():
+    """The store suite reports build, single and batched search for each backend."""
+    results = run_store_benchmarks([500], dimension=32, queries=8, batch_sizes=[4])
+    assert set(results) == {f"{backend}.{name}.n500" for backend in ("numpy", "faiss")
+                            for name in ("build", "search", "search_batch4")}
+    assert results["faiss.search.n500"]["count"] == 8
+    assert results["numpy.build.n500"]["qps"] > 0
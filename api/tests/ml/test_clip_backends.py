@@ -0,0 +1,134 @@
+import pytest
+import torch
+from transformers import CLIPConfig as HFCLIPConfig, CLIPModel
+from v1.ml.models.clip import model as clip_model
+from v1.ml.models.clip.backends import (
+    EagerBackend,
+    build_backend,
+    check_agreement,
+    cosine_agreement,
+    probe_images,
+)
+from v1.ml.models.clip.config import CLIPConfig
+from v1.ml.models.clip.model import CLIPModelHandler
+
+IMAGE_SIZE = 32
+
+
+@pytest.fixture(scope="module")
+def tiny_model():
+    """Fixture for a small randomly initialized CLIP model."""
+    torch.manual_seed(0)
+    config = HFCLIPConfig(
+        text_config=dict(vocab_size=100, hidden_size=32, intermediate_size=64,
+                         num_hidden_layers=2, num_attention_heads=2,
+                         max_position_embeddings=77, bos_token_id=0, eos_token_id=1,
+                         pad_token_id=1),
+        vision_config=dict(hidden_size=32, intermediate_size=64, num_hidden_layers=2,
+                           num_attention_heads=2, image_size=IMAGE_SIZE, patch_size=8),
+        projection_dim=16,
+    )
+    return CLIPModel(config).eval()
+
+
+class TinyProcessor:
+    """Tokenizes words by hash and resizes images, standing in for CLIPProcessor."""
+
+    def __call__(self, text=None, images=None, **kwargs):
+        if text is not None:
+            tokens = [[0] + [2 + hash(word) % 97 for word in t.split()] + [1] for t in text]
+            length = max(len(t) for t in tokens)
+            return {
+                "input_ids": torch.tensor([t + [1] * (length - len(t)) for t in tokens]),
+                "attention_mask": torch.tensor(
+                    [[1] * len(t) + [0] * (length - len(t)) for t in tokens]),
+            }
+        pixels = torch.stack([
+            torch.from_numpy(__import__("numpy").asarray(
+                image.resize((IMAGE_SIZE, IMAGE_SIZE)), dtype="float32") / 255).permute(2, 0, 1)
+            for image in images])
+        return {"pixel_values": pixels}
+
+
+@pytest.fixture
+def probe(tiny_model):
+    """Fixture for probe text inputs and pixel values."""
+    processor = TinyProcessor()
+    text_inputs = processor(text=["a photo of a dog", "a red car on a long street", "sunset"])
+    return text_inputs, processor(images=probe_images(count=4))["pixel_values"]
+
+
+@pytest.fixture
+def tiny_handler(monkeypatch, tiny_model):
+    """Fixture patching model loading so CLIPModelHandler builds on the tiny model."""
+    monkeypatch.setattr(clip_model.CLIPModel, "from_pretrained",
+                        lambda name: tiny_model)
+    monkeypatch.setattr(clip_model.CLIPProcessor, "from_pretrained",
+                        lambda name: TinyProcessor())
+
+    def make(backend, **kwargs):
+        return CLIPModelHandler(CLIPConfig(model_name="tiny", embedding_dim=16,
+                                           device="cpu", backend=backend, **kwargs))
+    return make
+
+
+@pytest.mark.parametrize("backend", ["int8", "torchscript"])
+def test_backends_agree_with_fp32(tiny_model, probe, backend):
+    """Quantized and traced towers reproduce the fp32 embeddings."""
+    text_inputs, pixel_values = probe
+    candidate = build_backend(backend, tiny_model, text_inputs, pixel_values)
+    agreement = check_agreement(candidate, EagerBackend(tiny_model), text_inputs, pixel_values)
+    assert agreement["text"]["min"] > 0.99
+    assert agreement["image"]["min"] > 0.99
+
+
+def test_traced_text_tower_handles_other_lengths(tiny_model, probe):
+    """A tower traced on one batch shape still works for other batch and sequence sizes."""
+    text_inputs, pixel_values = probe
+    traced = build_backend("torchscript", tiny_model, text_inputs, pixel_values)
+    other = TinyProcessor()(text=["one", "two words", "and three more words here", "x"])
+    eager = EagerBackend(tiny_model).encode_text(other["input_ids"], other["attention_mask"])
+    result = traced.encode_text(other["input_ids"], other["attention_mask"])
+    assert result.shape == (4, 16)
+    assert cosine_agreement(eager, result)["min"] > 0.999
+
+
+def test_onnx_backend_exports_once(tiny_model, probe, tmp_path):
+    """The ONNX export is written once and reused; outputs match fp32."""
+    pytest.importorskip("onnxruntime")
+    text_inputs, pixel_values = probe
+    backend = build_backend("onnx", tiny_model, text_inputs, pixel_values,
+                            model_name="org/tiny", export_dir=tmp_path)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["org_tiny-onnx-opset17-text.onnx",
+                                                          "org_tiny-onnx-opset17-vision.onnx"]
+    agreement = check_agreement(backend, EagerBackend(tiny_model), text_inputs, pixel_values)
+    assert agreement["text"]["min"] > 0.999
+
+
+def test_unknown_backend_is_rejected(tiny_model, probe):
+    """Backend names are validated."""
+    with pytest.raises(ValueError):
+        build_backend("tensorrt", tiny_model, *probe)
+
+
+def test_handler_uses_configured_backend(tiny_handler):
+    """The handler runs searches through the backend chosen in CLIPConfig."""
+    handler = tiny_handler("int8")
+    assert handler.backend.name == "int8"
+    assert handler.agreement["text"]["min"] > 0.99
+
+    embeddings = handler.encode_texts(["a dog", "a cat on a sofa"])
+    assert embeddings.shape == (2, 16)
+    assert torch.allclose(embeddings.norm(dim=-1), torch.ones(2), atol=1e-5)
+
+
+def test_handler_falls_back_to_eager(tiny_handler):
+    """Backends below min_agreement or failing to build are replaced by eager."""
+    assert tiny_handler("int8", min_agreement=1.01).backend.name == "eager"
+    assert tiny_handler("no-such-backend").backend.name == "eager"
+
+
+def test_probe_images_are_deterministic():
+    """The probe set is fixed so agreement checks are comparable between runs."""
+    first, second = probe_images(), probe_images()
+    assert [image.tobytes() for image in first] == [image.tobytes() for image in second]
@@ -0,0 +1,116 @@
+import numpy as np
+import pytest
+from v1.ml.models.store_handlers.compressed_store import CompressedVectorStore
+from v1.ml.models.store_handlers.faiss_store import FaissVectorStore
+from v1.ml.models.store_handlers.vector_file import VectorFile
+
+
+def _unit_vectors(n, dim=32, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _metadata(n, start=0):
+    return [{"path": f"image{i}.jpg", "index": i} for i in range(start, start + n)]
+
+
+def _paths(results):
+    return [result["path"] for result in results]
+
+
+@pytest.fixture
+def store_dir(tmp_path):
+    """Fixture to provide a temporary compressed store directory."""
+    return tmp_path / "compressed_store"
+
+
+def test_results_match_exact_search(store_dir, tmp_path):
+    """Re-ranked results have the ranking and exact similarities of a flat index."""
+    embeddings = _unit_vectors(2000)
+    compressed = CompressedVectorStore(32, store_dir)
+    compressed.add_embeddings(embeddings, _metadata(2000))
+    flat = FaissVectorStore(32, tmp_path / "flat")
+    flat.add_embeddings(embeddings, _metadata(2000))
+
+    queries = _unit_vectors(20, seed=1)
+    for got, expected in zip(compressed.search_many(queries, top_k=10, threshold=-1.0),
+                             flat.search_many(queries, top_k=10, threshold=-1.0)):
+        assert _paths(got) == _paths(expected)
+        assert [r["similarity"] for r in got] == pytest.approx(
+            [r["similarity"] for r in expected], abs=1e-5)
+
+
+def test_index_holds_codes_and_vectors_stay_exact(store_dir):
+    """The index keeps 4-bit codes while stored vectors come back bit for bit."""
+    embeddings = _unit_vectors(500)
+    store = CompressedVectorStore(32, store_dir)
+    store.add_embeddings(embeddings, _metadata(500))
+
+    np.testing.assert_array_equal(store.get_vectors([7, 3]), embeddings[[7, 3]])
+    report = store.build_report(embeddings)
+    assert report["code_bytes_per_vector"] == 16
+    assert report["compression"] == 8.0
+    assert report["curve"][0]["recall@10"] >= 0.98
+
+
+def test_removal_and_reopen(store_dir):
+    """Removed vectors disappear, and reopened stores keep appending to the vector file."""
+    embeddings = _unit_vectors(60)
+    store = CompressedVectorStore(32, store_dir)
+    store.add_embeddings(embeddings[:40], _metadata(40))
+    store.remove_embeddings([5])
+    store._save_store()
+
+    reopened = CompressedVectorStore(32, store_dir)
+    assert len(reopened) == 39
+    assert "image5.jpg" not in _paths(reopened.search(embeddings[5:6], top_k=5))
+    with pytest.raises(KeyError):
+        reopened.get_vectors([5])
+
+    reopened.add_embeddings(embeddings[40:], _metadata(20, start=40))
+    reopened._save_store()
+    again = CompressedVectorStore(32, store_dir)
+    np.testing.assert_array_equal(again.get_vectors([0, 45, 59]), embeddings[[0, 45, 59]])
+    assert _paths(again.search(embeddings[45:46], top_k=1)) == ["image45.jpg"]
+
+
+def test_filters_use_exact_vectors(store_dir):
+    """Filtered searches return only matching vectors, through either search path."""
+    embeddings = _unit_vectors(60)
+    metadata = [{"path": f"image{i}.{'png' if i % 3 == 0 else 'jpg'}"} for i in range(60)]
+    store = CompressedVectorStore(32, store_dir, exact_filter_limit=10)
+    store.add_embeddings(embeddings, metadata)
+
+    for limit in (10, 100):
+        store.exact_filter_limit = limit
+        results = store.search(embeddings[3:4], top_k=30, threshold=-1.0,
+                               filters={"file_types": ["png"]})
+        assert len(results) == 20
+        assert all(path.endswith(".png") for path in _paths(results))
+        assert results[0] == {"path": "image3.png", "similarity": pytest.approx(1.0, abs=1e-5)}
+
+
+def test_untrainable_codes_fall_back_to_sq8(store_dir):
+    """Codes that need more training vectors than the first batch has fall back to SQ8."""
+    embeddings = _unit_vectors(20)
+    store = CompressedVectorStore(32, store_dir, index_factory="PQ8")
+    store.add_embeddings(embeddings, _metadata(20))
+
+    assert store.index_factory == "SQ8"
+    assert _paths(store.search(embeddings[4:5], top_k=1)) == ["image4.jpg"]
+
+
+def test_vector_file_compacts_removed_rows(tmp_path):
+    """Saving after most vectors were removed rewrites the file with the live ones only."""
+    vectors = _unit_vectors(10, dim=8)
+    vector_file = VectorFile(tmp_path / "vectors", 8)
+    vector_file.add(range(10), vectors)
+    vector_file.save()
+    vector_file.remove(range(2, 10))
+    vector_file.add([4], vectors[9:])
+    vector_file.save()
+
+    assert vector_file.data_file.stat().st_size == 3 * 8 * 4
+    np.testing.assert_array_equal(vector_file.get([0, 1, 4]), vectors[[0, 1, 9]])
+    assert vector_file.known([2, 4, 11]).tolist() == [False, True, False]
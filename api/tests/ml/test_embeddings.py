@@ -2,7 +2,7 @@ import pytest
 import torch
 import numpy as np
 from pathlib import Path
-from api.ml.models.store_handlers.numpy_store import EmbeddingStore
+from v1.ml.models.store_handlers.numpy_store import EmbeddingStore
 
 
 @pytest.fixture
@@ -33,11 +33,11 @@ def test_add_and_search_embeddings(embedding_store):
     embedding_store.add_embeddings(embeddings, image_paths)
 
     assert len(embedding_store.metadata) == 3
-    assert all(str(i) in embedding_store.metadata for i in range(3))
+    assert all(i in embedding_store.metadata for i in range(3))
 
     for i in range(3):
-        assert embedding_store.metadata[str(i)]["path"] == image_paths[i]
-        assert embedding_store.metadata[str(i)]["index"] == i
+        assert embedding_store.metadata.get(i)["path"] == image_paths[i]
+        assert embedding_store.metadata.get(i)["index"] == i
 
     # Create and normalize query
     query = torch.randn(1, 512)
@@ -55,3 +55,129 @@ def test_empty_store_search(embedding_store):
     query = torch.randn(1, 512)
     results = embedding_store.search(query, top_k=2)
     assert len(results) == 0
+
+
+def test_search_matches_exhaustive_ranking(embedding_store):
+    """Top-k selection returns the same ranking as a full sort."""
+    embeddings = torch.nn.functional.normalize(torch.randn(50, 512), dim=1)
+    embedding_store.add_embeddings(embeddings, [f"image{i}.jpg" for i in range(50)])
+
+    query = torch.nn.functional.normalize(torch.randn(1, 512), dim=1)
+    results = embedding_store.search(query, top_k=5, threshold=-1.0)
+
+    expected = torch.argsort((embeddings @ query.T).squeeze(), descending=True)[:5]
+    assert [r["path"] for r in results] == [f"image{i}.jpg" for i in expected.tolist()]
+    assert all(a["similarity"] >= b["similarity"] for a, b in zip(results, results[1:]))
+
+
+def test_search_many_batches_queries(embedding_store):
+    """A batch of queries returns one result list per query."""
+    embeddings = torch.nn.functional.normalize(torch.randn(10, 512), dim=1)
+    embedding_store.add_embeddings(embeddings, [f"image{i}.jpg" for i in range(10)])
+
+    results = embedding_store.search_many(embeddings[:3], top_k=2, threshold=-1.0)
+
+    assert len(results) == 3
+    for i, result in enumerate(results):
+        assert result[0]["path"] == f"image{i}.jpg"
+        assert result[0]["similarity"] == pytest.approx(1.0, abs=1e-5)
+
+
+def test_adds_append_segments_and_reload(temp_store_dir):
+    """Each add writes a segment; reopening memory-maps the same contents."""
+    store = EmbeddingStore(temp_store_dir, max_segments=100)
+    batches = [torch.nn.functional.normalize(torch.randn(4, 512), dim=1) for _ in range(3)]
+    for b, batch in enumerate(batches):
+        store.add_embeddings(batch, [f"batch{b}_{i}.jpg" for i in range(4)])
+
+    assert len(store.segments) == 3
+    assert len(store) == 12
+
+    reopened = EmbeddingStore(temp_store_dir)
+    assert len(reopened) == 12
+    assert isinstance(reopened.segments[0]["vectors"], np.memmap)
+    results = reopened.search(batches[2][1:2], top_k=1, threshold=-1.0)
+    assert results[0]["path"] == "batch2_1.jpg"
+
+
+def test_compaction_merges_segments(temp_store_dir):
+    """Compaction leaves one live segment with identical search results."""
+    store = EmbeddingStore(temp_store_dir, max_segments=100)
+    embeddings = torch.nn.functional.normalize(torch.randn(9, 512), dim=1)
+    for start in range(0, 9, 3):
+        store.add_embeddings(embeddings[start:start + 3],
+                             [f"image{i}.jpg" for i in range(start, start + 3)])
+    query = torch.nn.functional.normalize(torch.randn(1, 512), dim=1)
+    before = [r["path"] for r in store.search(query, top_k=9, threshold=-1.0)]
+
+    store.compact()
+
+    assert len(store.segments) == 1
+    for reader in (store, EmbeddingStore(temp_store_dir)):
+        after = reader.search(query, top_k=9, threshold=-1.0)
+        assert [r["path"] for r in after] == before
+
+
+def test_replaced_segments_are_deleted_by_the_next_compaction(temp_store_dir):
+    """Segments stay on disk for readers of the old manifest until the next compaction."""
+    store = EmbeddingStore(temp_store_dir, max_segments=100)
+    segment_files = lambda: sorted(p.name for p in (temp_store_dir / "segments").glob("*.f32"))
+    for start in range(0, 6, 2):
+        store.add_embeddings(torch.nn.functional.normalize(torch.randn(2, 512), dim=1),
+                             [f"image{i}.jpg" for i in range(start, start + 2)])
+    stale_reader = EmbeddingStore(temp_store_dir)
+    original = segment_files()
+
+    store.compact()
+    assert len(segment_files()) == 4
+    assert len(stale_reader.search(torch.randn(1, 512), top_k=6, threshold=-1.0)) == 6
+
+    store.add_embeddings(torch.nn.functional.normalize(torch.randn(2, 512), dim=1),
+                         ["image6.jpg", "image7.jpg"])
+    store.compact()
+    assert not set(original) & set(segment_files())
+    assert len(segment_files()) == 3
+    assert len(EmbeddingStore(temp_store_dir)) == 8
+
+
+def test_legacy_store_is_migrated(temp_store_dir):
+    """A store written as embeddings.npy + metadata.json loads as a segment."""
+    import json
+    embeddings = np.random.randn(2, 512).astype(np.float32)
+    np.save(str(temp_store_dir / "embeddings.npy"), embeddings)
+    (temp_store_dir / "metadata.json").write_text(json.dumps(
+        {"0": {"path": "a.jpg", "index": 0}, "1": {"path": "b.jpg", "index": 1}}))
+
+    store = EmbeddingStore(temp_store_dir)
+
+    assert len(store) == 2
+    assert store.metadata.get(1)["path"] == "b.jpg"
+    assert (temp_store_dir / "manifest.json").exists()
+
+
+def test_get_vectors_reads_rows_across_segments(temp_store_dir):
+    """Stored vectors are returned by id from whichever segment holds them."""
+    store = EmbeddingStore(temp_store_dir, max_segments=100)
+    batches = [torch.nn.functional.normalize(torch.randn(3, 512), dim=1) for _ in range(2)]
+    for b, batch in enumerate(batches):
+        store.add_embeddings(batch, [f"batch{b}_{i}.jpg" for i in range(3)])
+
+    vectors = store.get_vectors([4, 0])
+    assert np.allclose(vectors, torch.stack([batches[1][1], batches[0][0]]).numpy(), atol=1e-6)
+    assert store.find_ids(["batch1_1.jpg"]) == [4]
+    with pytest.raises(KeyError):
+        store.get_vectors([6])
+
+
+def test_filtered_search_masks_rows(embedding_store):
+    """Rows failing the filter are masked out before the top-k selection."""
+    embeddings = torch.nn.functional.normalize(torch.randn(20, 512), dim=1)
+    embedding_store.add_embeddings(
+        embeddings, [f"{'even' if i % 2 == 0 else 'odd'}/img{i}.png" for i in range(20)])
+
+    results = embedding_store.search(embeddings[3:4], top_k=20, threshold=-1.0,
+                                     filters={"folders": ["even"]})
+
+    assert len(results) == 10
+    assert all(result["path"].startswith("even/") for result in results)
+    assert embedding_store.search(embeddings[3:4], filters={"file_types": ["gif"]}) == []
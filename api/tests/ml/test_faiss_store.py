@@ -0,0 +1,154 @@
+import faiss
+import pytest
+import numpy as np
+from v1.ml.models.store_handlers.faiss_store import FaissVectorStore
+from v1.ml.models.store_handlers.faiss_index import _base_index, bitmap_selector, evaluate_index
+
+
+def _unit_vectors(n, dim=64, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _metadata(n):
+    return [{"path": f"image{i}.jpg", "index": i} for i in range(n)]
+
+
+@pytest.fixture
+def store_dir(tmp_path):
+    """Fixture to provide a temporary FAISS store directory."""
+    return tmp_path / "faiss_store"
+
+
+@pytest.mark.parametrize("index_factory", ["Flat", "IVF16,Flat", "HNSW16"])
+def test_index_types_find_exact_match(store_dir, index_factory):
+    """Every configured index type returns the query vector itself first."""
+    embeddings = _unit_vectors(2000)
+    store = FaissVectorStore(64, store_dir, index_factory=index_factory)
+    store.add_embeddings(embeddings, _metadata(2000))
+
+    results = store.search(embeddings[7:8], top_k=3, nprobe=16, ef_search=64)
+
+    assert results[0]["path"] == "image7.jpg"
+    assert results[0]["similarity"] == pytest.approx(1.0, abs=1e-4)
+
+
+def test_untrainable_index_falls_back_to_flat(store_dir):
+    """Too few vectors to train IVF falls back to an exact index."""
+    store = FaissVectorStore(64, store_dir, index_factory="IVF256,Flat")
+    store.add_embeddings(_unit_vectors(10), _metadata(10))
+
+    assert store.index_factory == "Flat"
+    assert len(store) == 10
+
+
+def test_build_report_sweeps_query_knob(store_dir):
+    """The build report gives one recall/latency point per nprobe value."""
+    embeddings = _unit_vectors(2000)
+    store = FaissVectorStore(64, store_dir, index_factory="IVF16,Flat")
+    store.add_embeddings(embeddings, _metadata(2000))
+
+    report = evaluate_index(store.index, embeddings, k=10, n_queries=50)
+
+    assert [point["nprobe"] for point in report["curve"]] == [1, 4, 16]
+    assert report["curve"][-1]["recall@10"] == pytest.approx(1.0)
+    assert all("latency_ms" in point for point in report["curve"])
+
+
+def test_search_many_matches_single_searches(store_dir):
+    """A stacked query matrix returns the same results as one search per query."""
+    embeddings = _unit_vectors(200)
+    store = FaissVectorStore(64, store_dir)
+    store.add_embeddings(embeddings, _metadata(200))
+
+    batched = store.search_many(embeddings[[3, 50, 120]], top_k=4)
+
+    assert batched == [store.search(embeddings[i:i + 1], top_k=4) for i in (3, 50, 120)]
+
+
+@pytest.mark.parametrize("index_factory", ["Flat", "IVF16,Flat", "HNSW16"])
+def test_get_vectors_reconstructs_stored_vectors(store_dir, index_factory):
+    """Stored vectors come back by id, without the model, for every index type."""
+    embeddings = _unit_vectors(2000)
+    store = FaissVectorStore(64, store_dir, index_factory=index_factory)
+    store.add_embeddings(embeddings, _metadata(2000))
+
+    assert np.allclose(store.get_vectors([7, 1500]), embeddings[[7, 1500]], atol=1e-6)
+    assert store.find_ids(["image1500.jpg"]) == [1500]
+    with pytest.raises(KeyError):
+        store.get_vectors([2000])
+
+
+def test_ivf_direct_map_is_built_before_searches(store_dir):
+    """IVF stores build the direct map when created and loaded, not when reconstructing."""
+    store = FaissVectorStore(64, store_dir, index_factory="IVF16,Flat")
+    store.add_embeddings(_unit_vectors(2000), _metadata(2000))
+    store._save_store()
+    reopened = FaissVectorStore(64, store_dir, index_factory="IVF16,Flat")
+
+    for loaded in (store, reopened):
+        ivf = faiss.try_extract_index_ivf(_base_index(loaded.index))
+        assert ivf.direct_map.type != faiss.DirectMap.NoMap
+
+
+def test_bitmap_selector_rejects_ids_past_the_mask():
+    """Ids beyond the mask are never read from past the end of the bitmap."""
+    selector, bitmap = bitmap_selector(np.array([True, False, True] + [False] * 7))
+
+    assert len(bitmap) == 2
+    assert [selector.is_member(i) for i in (0, 1, 2)] == [True, False, True]
+    assert not selector.is_member(16)
+    assert not selector.is_member(10000)
+
+
+def test_ivf_removals_keep_the_remaining_ids(store_dir):
+    """Removing from an IVF index tombstones ids so the others still map to their paths."""
+    embeddings = _unit_vectors(2000)
+    store = FaissVectorStore(64, store_dir, index_factory="IVF16,Flat")
+    store.add_embeddings(embeddings, _metadata(2000))
+
+    store.remove_embeddings([3, 10])
+
+    results = store.search(embeddings[1999:2000], top_k=1, nprobe=16)
+    assert results[0]["path"] == "image1999.jpg"
+    assert np.allclose(store.get_vectors([1999]), embeddings[1999:2000], atol=1e-6)
+    with pytest.raises(KeyError):
+        store.get_vectors([3])
+
+
+@pytest.mark.parametrize("index_factory", ["Flat", "IVF16,Flat", "HNSW16"])
+@pytest.mark.parametrize("exact_filter_limit", [0, 4096])
+def test_filtered_search_matches_filtered_brute_force(store_dir, index_factory,
+                                                      exact_filter_limit):
+    """Filters are applied inside the search, so top-k is full and only holds matches."""
+    embeddings = _unit_vectors(2000)
+    store = FaissVectorStore(64, store_dir, index_factory=index_factory,
+                             exact_filter_limit=exact_filter_limit)
+    store.add_embeddings(embeddings, [
+        {"path": f"{'png' if i % 10 == 0 else 'jpg'}/image{i}.jpg"} for i in range(2000)])
+
+    results = store.search(embeddings[5:6], top_k=10, nprobe=16, ef_search=256,
+                           filters={"folders": ["png"]})
+
+    scores = embeddings[::10] @ embeddings[5]
+    expected = [f"png/image{i * 10}.jpg" for i in np.argsort(-scores)[:10]]
+    assert [result["path"] for result in results] == expected
+
+
+def test_filtered_search_skips_removed_vectors(store_dir):
+    """Removed vectors never match a filter, even on indexes that tombstone them."""
+    embeddings = _unit_vectors(2000)
+    store = FaissVectorStore(64, store_dir, index_factory="HNSW16", exact_filter_limit=0)
+    store.add_embeddings(embeddings, _metadata(2000))
+    store.remove_embeddings([5])
+
+    results = store.search(embeddings[5:6], top_k=3, filters={"file_types": ["jpg"]})
+
+    assert "image5.jpg" not in [result["path"] for result in results]
+    assert len(results) == 3
+    assert store.search(embeddings[5:6], filters={"labels": ["ai"]}) == []
+
+    store._save_store()
+    reopened = FaissVectorStore(64, store_dir, index_factory="HNSW16", exact_filter_limit=0)
+    assert reopened.search(embeddings[5:6], top_k=3, filters={"file_types": ["jpg"]}) == results
@@ -0,0 +1,171 @@
+import pytest
+import numpy as np
+import torch
+from PIL import Image
+from v1.ml.dataset_handler import thumbnails
+from v1.ml.dataset_handler.indexer import FileManifest
+from v1.ml.dataset_handler.pipeline import ImageEmbeddingPipeline
+from v1.ml.models.store_handlers.faiss_store import FaissVectorStore
+
+
+class FakeHandler:
+    """Model handler stand-in embedding images by their pixel statistics."""
+
+    def __init__(self):
+        self.encoded = 0
+
+    def encode_image(self, paths):
+        self.encoded += len(paths)
+        features = []
+        for path in paths:
+            pixels = np.asarray(Image.open(path).convert("RGB"), dtype=np.float32)
+            features.append(np.concatenate([pixels.mean(axis=(0, 1)), pixels.std(axis=(0, 1)), [1.0, 2.0]]))
+        return torch.nn.functional.normalize(torch.tensor(np.array(features)), dim=-1)
+
+
+def _write_image(path, seed):
+    rng = np.random.default_rng(seed)
+    Image.fromarray(rng.integers(0, 255, (16, 16, 3), dtype=np.uint8)).save(path)
+
+
+@pytest.fixture
+def data_dir(tmp_path, settings, monkeypatch):
+    """Fixture pointing the dataset settings at a temporary image directory."""
+    data_dir = tmp_path / "images"
+    data_dir.mkdir()
+    settings.DATASET_SETTINGS = {'DATA_PATH': str(data_dir), 'SAMPLE_SIZE': 1000}
+    settings.ML_SETTINGS = {**settings.ML_SETTINGS, 'INGEST': {'WORKERS': 0, 'BATCH_SIZE': 2}}
+    settings.THUMBNAIL_SETTINGS = {**settings.THUMBNAIL_SETTINGS,
+                                   'CACHE_DIR': tmp_path / "thumbnails"}
+    monkeypatch.setattr(thumbnails, "_thumbnail_cache", None)
+    for i in range(3):
+        _write_image(data_dir / f"image{i}.png", i)
+    return data_dir
+
+
+def _ids_by_path(store):
+    return {path: idx for idx, path in store.metadata.items()}
+
+
+@pytest.mark.parametrize("index_factory", ["Flat", "HNSW16", "IVF2,Flat"])
+def test_sync_embeds_only_changes(tmp_path, data_dir, index_factory):
+    """Only new and modified files are encoded; deleted files disappear."""
+    handler = FakeHandler()
+    store = FaissVectorStore(8, tmp_path / "faiss_store", model_handler=handler,
+                             index_factory=index_factory)
+    assert handler.encoded == 3
+    assert len(store) == 3
+    ids_before = _ids_by_path(store)
+
+    summary = store.sync_with_dataset()
+    assert summary == {"new": 0, "changed": 0, "deleted": 0, "unchanged": 3}
+    assert handler.encoded == 3
+
+    _write_image(data_dir / "image3.png", 3)
+    _write_image(data_dir / "image1.png", 99)
+    (data_dir / "image2.png").unlink()
+
+    summary = store.sync_with_dataset()
+    assert summary == {"new": 1, "changed": 1, "deleted": 1, "unchanged": 1}
+    assert handler.encoded == 5
+    assert len(store) == 3
+
+    ids_after = _ids_by_path(store)
+    image0 = str(data_dir / "image0.png")
+    assert ids_after[image0] == ids_before[image0]
+    assert str(data_dir / "image2.png") not in ids_after
+
+    paths = [r["path"] for r in store.search(np.ones((1, 8), dtype=np.float32), top_k=10,
+                                             threshold=-1.0)]
+    assert sorted(paths) == sorted(ids_after)
+
+
+def test_sync_state_survives_reload(tmp_path, data_dir):
+    """A reopened store with an unchanged dataset encodes nothing."""
+    FaissVectorStore(8, tmp_path / "faiss_store", model_handler=FakeHandler())
+
+    handler = FakeHandler()
+    store = FaissVectorStore(8, tmp_path / "faiss_store", model_handler=handler)
+
+    assert handler.encoded == 0
+    assert len(store) == 3
+
+
+def test_sync_after_a_crash_does_not_duplicate_vectors(tmp_path, data_dir, monkeypatch):
+    """Vectors saved by a sync that died before updating the manifest are replaced, not kept."""
+    store = FaissVectorStore(8, tmp_path / "faiss_store", model_handler=FakeHandler())
+    _write_image(data_dir / "image3.png", 3)
+    _write_image(data_dir / "image1.png", 99)
+    apply = FileManifest.apply
+
+    def crash(*args, **kwargs):
+        raise RuntimeError("killed")
+
+    monkeypatch.setattr(FileManifest, "apply", crash)
+    with pytest.raises(RuntimeError):
+        store.sync_with_dataset()
+    monkeypatch.setattr(FileManifest, "apply", apply)
+
+    assert store.sync_with_dataset()["new"] == 1
+    assert len(store) == 4
+    assert sorted(_ids_by_path(store)) == sorted(str(path) for path in data_dir.iterdir())
+    paths = [r["path"] for r in store.search(np.ones((1, 8), dtype=np.float32), top_k=10,
+                                             threshold=-1.0)]
+    assert len(paths) == len(set(paths)) == 4
+
+
+def test_changed_file_that_fails_to_decode_keeps_its_vector(tmp_path, data_dir, monkeypatch):
+    """A changed file skipped by the pipeline stays in the store under its recorded id."""
+    store = FaissVectorStore(8, tmp_path / "faiss_store", model_handler=FakeHandler())
+    image1 = str(data_dir / "image1.png")
+    ids_before = _ids_by_path(store)
+    _write_image(data_dir / "image1.png", 99)
+    _write_image(data_dir / "image3.png", 3)
+    run = ImageEmbeddingPipeline.run
+    monkeypatch.setattr(ImageEmbeddingPipeline, "run", lambda self, paths: run(
+        self, [path for path in paths if str(path) != image1]))
+
+    summary = store.sync_with_dataset()
+
+    assert summary["changed"] == 1
+    assert _ids_by_path(store)[image1] == ids_before[image1]
+    manifest = FileManifest(tmp_path / "faiss_store" / "file_manifest.sqlite3", create=False)
+    assert manifest.get(image1).id == ids_before[image1]
+
+
+def test_sync_saves_lexical_documents_filled_in_on_load(tmp_path, data_dir):
+    """A store missing its lexical index gets one on the next sync, even a no-op one."""
+    store = FaissVectorStore(8, tmp_path / "faiss_store", model_handler=FakeHandler())
+    store.lexical.postings_file.unlink()
+    store.lexical.vocabulary_file.unlink()
+
+    reader = FaissVectorStore(8, tmp_path / "faiss_store")
+    assert len(reader.lexical) == 3
+    assert not reader.lexical.postings_file.exists()
+
+    store.sync_with_dataset()
+    assert store.lexical.postings_file.exists()
+    hits = FaissVectorStore(8, tmp_path / "faiss_store").lexical_search(["image1.png"])[0]
+    assert hits[0]["path"] == str(data_dir / "image1.png")
+
+
+def test_sync_pregenerates_thumbnails(tmp_path, data_dir):
+    """Every indexed image gets its configured thumbnail variants."""
+    FaissVectorStore(8, tmp_path / "faiss_store", model_handler=FakeHandler())
+
+    variants = list((tmp_path / "thumbnails").glob("*/*.webp"))
+    assert len(variants) == 3 * len(thumbnails.get_thumbnail_cache().pregenerate_variants)
+
+
+def test_sync_pregenerates_only_new_and_changed_files(tmp_path, data_dir, monkeypatch):
+    """A sync renders thumbnails for the files it embedded; a no-op sync renders none."""
+    store = FaissVectorStore(8, tmp_path / "faiss_store", model_handler=FakeHandler())
+    rendered = []
+    monkeypatch.setattr(thumbnails.get_thumbnail_cache(), "pregenerate",
+                        lambda files: rendered.append(sorted(path for path, _ in files)))
+
+    store.sync_with_dataset()
+    _write_image(data_dir / "image3.png", 3)
+    store.sync_with_dataset()
+
+    assert rendered == [[str(data_dir / "image3.png")]]
@@ -0,0 +1,131 @@
+import numpy as np
+import pytest
+from v1.ml.models.store_handlers.faiss_store import FaissVectorStore
+from v1.ml.models.store_handlers.lexical import (
+    LexicalIndex, document_tokens, query_terms, reciprocal_rank_fusion, tokenize)
+from v1.ml.models.store_handlers.sharded_store import ShardedVectorStore
+
+
+def _unit_vectors(n, dim=16, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+PATHS = ["data/IMG_0042.jpg", "data/IMG_0043.jpg", "data/sunset_beach.png",
+         "data/beach/dog-on-beach.jpg", "data/f3a9c1e7.jpg"]
+
+
+@pytest.fixture
+def index(tmp_path):
+    """Fixture for a lexical index over a few file names."""
+    lexical = LexicalIndex(tmp_path / "lexical")
+    lexical.add(range(len(PATHS)), PATHS)
+    return lexical
+
+
+def test_file_names_are_split_into_terms():
+    """File names give whole-name, run and letter/digit terms; stopwords are dropped."""
+    assert tokenize("IMG0042 of the Beach") == ["img0042", "img", "0042", "beach"]
+    assert document_tokens("x/dog-on-beach.jpg") == [
+        "dog", "beach", "dog-on-beach.jpg", "dog-on-beach"]
+    assert query_terms('"sunset_beach.png" a') == [
+        "sunset", "beach", "png", "sunset_beach.png", "sunset_beach"]
+
+
+def test_exact_names_and_ids_rank_first(index):
+    """Whole file names, bare stems and numeric ids find their file first."""
+    assert index.search("IMG_0043.jpg", top_k=1)[0][0] == 1
+    assert index.search("f3a9c1e7", top_k=1)[0][0] == 4
+    assert index.search("0042")[0][0] == 0
+    # Equal scores are ordered by id.
+    assert [idx for idx, _ in index.search("beach")] == [2, 3]
+    assert index.search("a photo of something else") == []
+
+
+def test_mask_restricts_matches(index):
+    """Only ids allowed by the mask are returned."""
+    mask = np.zeros(len(PATHS), dtype=bool)
+    mask[2] = True
+    assert [idx for idx, _ in index.search("beach", mask=mask)] == [2]
+
+
+def test_updates_and_reload(index, tmp_path):
+    """Removed and replaced documents stop matching, and saved postings reload."""
+    index.remove([3])
+    index.add([2], ["data/forest.png"])
+    index.add([9], ["data/beach_9.jpg"])
+    assert [idx for idx, _ in index.search("beach")] == [9]
+    assert len(index) == 5
+
+    index.save()
+    reopened = LexicalIndex(tmp_path / "lexical")
+    assert reopened.search("beach") == index.search("beach")
+    assert reopened.search("forest")[0][0] == 2
+
+
+def test_batched_updates_match_a_single_build(tmp_path):
+    """Postings merged batch by batch, with replacements, rank like a fresh index."""
+    paths = [f"IMG_{i:04d}_{'beach' if i % 3 else 'dog'}.jpg" for i in range(60)]
+    batched = LexicalIndex(tmp_path / "batched")
+    for start in range(0, 60, 7):
+        batched.add(range(start, min(start + 7, 60)), paths[start:start + 7])
+    paths[10] = "cat.jpg"
+    batched.add([10], ["cat.jpg"])
+    batched.remove([20])
+    fresh = LexicalIndex(tmp_path / "fresh")
+    fresh.add([i for i in range(60) if i != 20], [p for i, p in enumerate(paths) if i != 20])
+
+    for query in ("beach", "dog", "cat", "img_0010", "0020", "0033 beach"):
+        assert batched.search(query, top_k=100) == pytest.approx(fresh.search(query, top_k=100))
+
+
+def test_captions_are_searchable(tmp_path):
+    """Captions from the captions CSV are indexed with the file names."""
+    captions = tmp_path / "captions.csv"
+    captions.write_text("file_name,caption\nIMG_0042.jpg,A red kite over the dunes\n")
+    lexical = LexicalIndex(tmp_path / "lexical", captions_file=captions)
+    lexical.add([0, 1], PATHS[:2])
+    assert [idx for idx, _ in lexical.search("red kite")] == [0]
+
+
+def test_reciprocal_rank_fusion_prefers_shared_results():
+    """Results found by both lists come first; the first list's dicts are kept."""
+    semantic = [{"path": "a", "similarity": 0.3}, {"path": "b", "similarity": 0.2}]
+    lexical = [{"path": "c", "similarity": 0.1}, {"path": "b", "similarity": 0.0}]
+    fused = reciprocal_rank_fusion([semantic, lexical])
+    assert [result["path"] for result in fused] == ["b", "a", "c"]
+    assert fused[0]["similarity"] == 0.2
+
+
+@pytest.mark.parametrize("shards", [None, 3])
+def test_stores_keep_the_lexical_index_in_step(tmp_path, shards):
+    """FAISS and sharded stores index, remove and persist file names with their vectors."""
+    def open_store():
+        if shards is None:
+            return FaissVectorStore(16, tmp_path / "store")
+        return ShardedVectorStore(16, tmp_path / "store", shards=shards)
+
+    store = open_store()
+    store.add_embeddings(_unit_vectors(len(PATHS)), [{"path": path} for path in PATHS])
+    assert {hit["path"] for hit in store.lexical_search(["beach"])[0]} == {PATHS[2], PATHS[3]}
+
+    store.remove_embeddings([3])
+    store._save_store()
+    reopened = open_store()
+    results = reopened.lexical_search(["beach", "0043"])
+    assert [[(hit["id"], hit["path"]) for hit in hits] for hits in results] == [
+        [(2, PATHS[2])], [(1, PATHS[1])]]
+    assert reopened.lexical_search(["beach"], filters={"file_types": ["jpg"]}) == [[]]
+
+
+def test_common_terms_only_rescore_rarer_matches(tmp_path):
+    """Terms in most documents add to the score of rarer matches without adding documents."""
+    lexical = LexicalIndex(tmp_path / "lexical")
+    paths = [f"IMG_{i:04d}.jpg" for i in range(1500)] + ["IMG_dog.jpg", "dog.jpg"]
+    lexical.add(range(len(paths)), paths)
+
+    results = dict(lexical.search("img dog"))
+    assert set(results) == {1500, 1501}
+    assert results[1500] > dict(lexical.search("dog"))[1500]
+    assert len(lexical.search("img", top_k=7)) == 7
@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+from v1.ml.models.store_handlers.metadata import MetadataStore
+
+
+@pytest.fixture
+def metadata(tmp_path):
+    """Fixture for an empty metadata store."""
+    return MetadataStore(tmp_path / "paths")
+
+
+def test_get_many_aligns_with_ids(metadata):
+    """Lookups return paths in id order and None for unknown ids."""
+    metadata.add([0, 1, 5], ["a.jpg", "b/ü.jpg", "c.jpg"])
+
+    assert metadata.get_many(np.array([5, -1, 1, 3, 0, 99])) == \
+        ["c.jpg", None, "b/ü.jpg", None, "a.jpg", None]
+    assert metadata.get(1) == {"path": "b/ü.jpg", "index": 1}
+    assert len(metadata) == 3
+
+
+def test_known_marks_live_ids(metadata):
+    """Membership is answered for many ids at once, including removed and unknown ones."""
+    metadata.add([0, 1, 5], ["a.jpg", "b.jpg", "c.jpg"])
+    metadata.remove([1])
+
+    assert metadata.known([5, -1, 1, 3, 0, 99]).tolist() == \
+        [True, False, False, False, True, False]
+
+
+def test_saved_store_is_memory_mapped(tmp_path, metadata):
+    """Saved entries reload from disk without parsing, including later appends."""
+    metadata.add(range(3), ["a.jpg", "b.jpg", "c.jpg"])
+    metadata.save()
+    metadata.add([3], ["d.jpg"])
+    metadata.remove([1])
+    metadata.save()
+
+    reloaded = MetadataStore(tmp_path / "paths")
+
+    assert isinstance(reloaded._table, np.memmap)
+    assert dict(reloaded.items()) == {0: "a.jpg", 2: "c.jpg", 3: "d.jpg"}
+    assert reloaded.next_id == 4
+
+
+def test_replaced_entry_survives_reload(tmp_path, metadata):
+    """Overwriting an id points it at the new path."""
+    metadata.add([0], ["old.jpg"])
+    metadata.save()
+    metadata.add([0], ["new.jpg"])
+    metadata.save()
+
+    assert MetadataStore(tmp_path / "paths").get_path(0) == "new.jpg"
+
+
+def test_clear_starts_a_new_blob(tmp_path, metadata):
+    """Clearing drops entries and the bytes they used."""
+    metadata.add(range(2), ["a.jpg", "b.jpg"])
+    metadata.save()
+    metadata.clear()
+    metadata.add([0], ["z.jpg"])
+    metadata.save()
+
+    assert MetadataStore(tmp_path / "paths").get_many([0, 1]) == ["z.jpg", None]
+    assert metadata.blob_file.stat().st_size == len("z.jpg")
+
+
+def test_find_ids_maps_paths_back_to_ids(metadata):
+    """Reverse lookups follow adds, replacements and removals."""
+    metadata.add([0, 1, 2], ["a.jpg", "b.jpg", "c.jpg"])
+    assert metadata.find_ids(["c.jpg", "x.jpg", "a.jpg"]) == [2, None, 0]
+
+    metadata.add([1], ["b2.jpg"])
+    metadata.remove([0])
+    assert metadata.find_ids(["a.jpg", "b.jpg", "b2.jpg"]) == [None, None, 1]
@@ -0,0 +1,57 @@
+import pytest
+import numpy as np
+import torch
+from types import SimpleNamespace
+from PIL import Image
+from transformers import CLIPImageProcessor
+from v1.ml.dataset_handler.pipeline import ImageEmbeddingPipeline
+
+
+class FakeHandler:
+    """Model handler stand-in that embeds pixel tensors by their channel means."""
+
+    def __init__(self, processor_dir):
+        self.config = SimpleNamespace(model_name=str(processor_dir))
+        self.device = torch.device("cpu")
+        self.batches = []
+
+    def encode_pixel_values(self, pixel_values):
+        self.batches.append(pixel_values.shape[0])
+        features = pixel_values.mean(dim=(2, 3)).repeat(1, 4)
+        return torch.nn.functional.normalize(features, dim=-1)
+
+
+@pytest.fixture
+def image_files(tmp_path):
+    """Fixture writing a handful of small images plus one corrupt file."""
+    paths = []
+    for i in range(7):
+        path = tmp_path / f"image{i}.png"
+        Image.fromarray(np.full((32, 48, 3), i * 30, dtype=np.uint8)).save(path)
+        paths.append(path)
+    corrupt = tmp_path / "corrupt.jpg"
+    corrupt.write_bytes(b"not an image")
+    return paths[:3] + [corrupt] + paths[3:]
+
+
+@pytest.fixture
+def handler(tmp_path):
+    """Fixture for a fake handler backed by a locally saved image processor."""
+    processor_dir = tmp_path / "processor"
+    CLIPImageProcessor().save_pretrained(processor_dir)
+    return FakeHandler(processor_dir)
+
+
+def test_pipeline_embeds_in_order_and_skips_unreadable(handler, image_files):
+    """Worker-decoded batches come back in input order without bad files."""
+    pipeline = ImageEmbeddingPipeline(handler, batch_size=3, num_workers=2,
+                                      prefetch_batches=2)
+
+    results = list(pipeline.run(image_files))
+
+    paths = [path for batch_paths, _ in results for path in batch_paths]
+    assert paths == [str(p) for p in image_files if p.suffix == ".png"]
+    embeddings = np.concatenate([emb for _, emb in results])
+    assert embeddings.shape == (7, 12)
+    assert embeddings.dtype == np.float32
+    assert handler.batches == [3, 2, 2]
@@ -0,0 +1,133 @@
+import threading
+
+import pytest
+import numpy as np
+from v1.ml.models.store_handlers.faiss_store import FaissVectorStore
+from v1.ml.models.store_handlers import sharded_store
+from v1.ml.models.store_handlers.sharded_store import ShardedVectorStore
+
+
+def _unit_vectors(n, dim=32, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _metadata(n, start=0):
+    return [{"path": f"image{i}.jpg", "index": i} for i in range(start, start + n)]
+
+
+def _paths(results):
+    return [result["path"] for result in results]
+
+
+@pytest.fixture
+def store_dir(tmp_path):
+    """Fixture to provide a temporary sharded store directory."""
+    return tmp_path / "sharded_store"
+
+
+def test_results_match_a_single_index(store_dir, tmp_path):
+    """Merged shard results equal an exact search over one index."""
+    embeddings = _unit_vectors(400)
+    sharded = ShardedVectorStore(32, store_dir, shards=3)
+    sharded.add_embeddings(embeddings, _metadata(400))
+    single = FaissVectorStore(32, tmp_path / "single")
+    single.add_embeddings(embeddings, _metadata(400))
+
+    queries = _unit_vectors(10, seed=1)
+    for got, expected in zip(sharded.search_many(queries, top_k=7),
+                             single.search_many(queries, top_k=7)):
+        assert _paths(got) == _paths(expected)
+        assert [r["similarity"] for r in got] == pytest.approx(
+            [r["similarity"] for r in expected], abs=1e-5)
+
+
+def test_vectors_are_spread_evenly(store_dir):
+    """New vectors fill the emptiest shards, keeping shard sizes within one."""
+    store = ShardedVectorStore(32, store_dir, shards=4)
+    store.add_embeddings(_unit_vectors(10), _metadata(10))
+    store.add_embeddings(_unit_vectors(7, seed=1), _metadata(7, start=10))
+
+    sizes = [len(shard) for shard in store.shards]
+    assert len(store) == 17
+    assert max(sizes) - min(sizes) <= 1
+
+
+def test_ids_are_global_across_shards(store_dir):
+    """Lookups, vector reads and removals find ids in whichever shard holds them."""
+    embeddings = _unit_vectors(40)
+    store = ShardedVectorStore(32, store_dir, shards=4)
+    store.add_embeddings(embeddings, _metadata(40), ids=np.arange(100, 140))
+
+    assert store.find_ids(["image3.jpg", "missing.jpg", "image39.jpg"]) == [103, None, 139]
+    assert store.get_path(125) == "image25.jpg"
+    np.testing.assert_allclose(store.get_vectors([139, 100, 117]),
+                               embeddings[[39, 0, 17]], atol=1e-6)
+
+    store.remove_embeddings([103, 117])
+    assert len(store) == 38
+    assert "image3.jpg" not in _paths(store.search(embeddings[3:4], top_k=5))
+    with pytest.raises(KeyError):
+        store.get_vectors([117])
+
+
+def test_reopen_keeps_vectors_and_adds_shards(store_dir):
+    """A saved store reloads its vectors; a larger shard count adds empty shards."""
+    embeddings = _unit_vectors(30)
+    store = ShardedVectorStore(32, store_dir, shards=2)
+    store.add_embeddings(embeddings, _metadata(30))
+    store._save_store()
+
+    grown = ShardedVectorStore(32, store_dir, shards=3)
+    assert [len(shard) for shard in grown.shards] == [15, 15, 0]
+    assert _paths(grown.search(embeddings[4:5], top_k=1)) == ["image4.jpg"]
+
+    grown.add_embeddings(_unit_vectors(6, seed=1), _metadata(6, start=30))
+    assert [len(shard) for shard in grown.shards] == [15, 15, 6]
+    grown._save_store()
+    assert len(ShardedVectorStore(32, store_dir, shards=1).shards) == 3
+
+
+def test_filters_reach_every_shard(store_dir):
+    """Filtered searches only return matching vectors from all shards."""
+    embeddings = _unit_vectors(60)
+    metadata = [{"path": f"image{i}.{'png' if i % 3 == 0 else 'jpg'}"} for i in range(60)]
+    store = ShardedVectorStore(32, store_dir, shards=3)
+    store.add_embeddings(embeddings, metadata)
+
+    results = store.search(embeddings[5:6], top_k=30, threshold=-1.0,
+                           filters={"file_types": ["png"]})
+
+    assert len(results) == 20
+    assert all(path.endswith(".png") for path in _paths(results))
+
+
+def test_shards_are_searched_concurrently(store_dir, monkeypatch):
+    """Every shard's search runs at the same time on the pool."""
+    store = ShardedVectorStore(32, store_dir, shards=3)
+    store.add_embeddings(_unit_vectors(30), _metadata(30))
+    barrier = threading.Barrier(3, timeout=5)
+    for shard in store.shards:
+        search_many = shard.search_many
+
+        def waiting_search(*args, _search_many=search_many, **kwargs):
+            barrier.wait()
+            return _search_many(*args, **kwargs)
+
+        monkeypatch.setattr(shard, "search_many", waiting_search)
+
+    assert len(store.search(_unit_vectors(1, seed=1), top_k=4)) == 4
+
+
+def test_growing_the_pool_keeps_the_old_one_usable(monkeypatch):
+    """A search holding the pool can still submit after another store grows it."""
+    monkeypatch.setattr(sharded_store, "_pool", None)
+    monkeypatch.setattr(sharded_store, "_pool_size", 0)
+    small = sharded_store._search_pool(2)
+    grown = sharded_store._search_pool(4)
+
+    assert grown is not small
+    assert small.submit(lambda: 1).result(timeout=5) == 1
+    grown.shutdown()
+    small.shutdown()
@@ -0,0 +1,104 @@
+import os
+import threading
+
+import pytest
+import torch
+from v1.ml.models import clip
+from v1.ml.models.store_handlers import registry
+from v1.ml.models.store_handlers.base import file_lock
+from v1.ml.models.store_handlers.faiss_store import FaissVectorStore
+from v1.ml.models.store_handlers.numpy_store import EmbeddingStore
+
+
+@pytest.fixture(autouse=True)
+def clear_registry():
+    """Ensure every test starts with an empty registry."""
+    registry.clear_vector_stores()
+    yield
+    registry.clear_vector_stores()
+
+
+@pytest.fixture
+def store_dir(tmp_path):
+    """Fixture to provide a temporary store directory."""
+    return tmp_path / "embeddings"
+
+
+def test_same_instance_is_reused(store_dir):
+    """Repeated lookups must not rebuild the store."""
+    first = registry.get_vector_store("numpy", store_dir)
+    second = registry.get_vector_store("numpy", store_dir)
+
+    assert isinstance(first, EmbeddingStore)
+    assert first is second
+
+
+def test_store_reloads_when_files_change(store_dir):
+    """Changing the files on disk swaps in a freshly loaded store."""
+    first = registry.get_vector_store("numpy", store_dir)
+
+    writer = EmbeddingStore(store_dir)
+    embeddings = torch.nn.functional.normalize(torch.randn(2, 512), dim=1)
+    writer.add_embeddings(embeddings, ["a.jpg", "b.jpg"])
+
+    second = registry.get_vector_store("numpy", store_dir)
+    assert second is not first
+    assert len(second.metadata) == 2
+    assert registry.get_vector_store("numpy", store_dir) is second
+
+
+def test_lock_and_manifest_files_do_not_trigger_reloads(store_dir):
+    """Taking the sync lock or updating the file manifest keeps the loaded store."""
+    first = registry.get_vector_store("numpy", store_dir)
+
+    with file_lock(store_dir / ".sync.lock"):
+        pass
+    (store_dir / "file_manifest.sqlite3").write_bytes(b"manifest")
+
+    assert registry.get_vector_store("numpy", store_dir) is first
+
+
+def test_shared_stores_load_without_syncing(tmp_path, monkeypatch):
+    """Loading or reloading a FAISS store through the registry never syncs the dataset."""
+    def no_model():
+        raise AssertionError("the registry must not load CLIP to sync the store")
+
+    monkeypatch.setattr(clip, "initialize_clip_model", no_model)
+    store = registry.get_vector_store("faiss", tmp_path / "faiss_store")
+
+    assert isinstance(store, FaissVectorStore)
+    assert store.model_handler is None
+
+
+def test_loaded_stores_does_not_wait_for_a_load(store_dir):
+    """Listing loaded stores answers while another thread holds the registry lock."""
+    store = registry.get_vector_store("numpy", store_dir)
+    listed = []
+    with registry._lock:
+        reader = threading.Thread(target=lambda: listed.extend(registry.loaded_stores()))
+        reader.start()
+        reader.join(timeout=5)
+
+    assert listed == [("numpy", store)]
+
+
+def test_forked_child_gets_a_free_lock(store_dir):
+    """A fork while the registry lock is held leaves the child with a usable registry."""
+    store = registry.get_vector_store("numpy", store_dir)
+    next(iter(registry._stores.values())).reloading = True
+    with registry._lock:
+        pid = os.fork()
+        if pid == 0:
+            usable = (registry._lock.acquire(timeout=1)
+                      and not any(entry.reloading for entry in registry._stores.values())
+                      and registry.get_vector_store("numpy", store_dir) is store)
+            os._exit(0 if usable else 1)
+    _, exit_status = os.waitpid(pid, 0)
+
+    assert os.waitstatus_to_exitcode(exit_status) == 0
+
+
+def test_unknown_backend(store_dir):
+    """Unknown backends are rejected."""
+    with pytest.raises(ValueError):
+        registry.get_vector_store("annoy", store_dir)
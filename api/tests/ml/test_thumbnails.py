@@ -0,0 +1,80 @@
+import os
+import numpy as np
+import pytest
+from PIL import Image
+from v1.ml.dataset_handler.thumbnails import ThumbnailCache
+
+
+@pytest.fixture
+def image_file(tmp_path):
+    """Fixture for a 400x200 JPEG image."""
+    path = tmp_path / "image.jpg"
+    rng = np.random.default_rng(0)
+    Image.fromarray(rng.integers(0, 255, (200, 400, 3), dtype=np.uint8)).save(path)
+    return path
+
+
+@pytest.fixture
+def thumbnail_cache(tmp_path):
+    """Fixture for a thumbnail cache in a temporary directory."""
+    return ThumbnailCache(tmp_path / "thumbnails", max_bytes=10 ** 7, widths=[100, 800],
+                          pregenerate=[(100, "webp")])
+
+
+def test_variant_is_resized_once(thumbnail_cache, image_file):
+    """A variant keeps the aspect ratio and is reused on the next request."""
+    path = thumbnail_cache.get(image_file, "hash-a", 100, "webp")
+
+    with Image.open(path) as img:
+        assert img.format == "WEBP"
+        assert img.size == (100, 50)
+    mtime = path.stat().st_mtime_ns
+    assert thumbnail_cache.get(image_file, "hash-a", 100, "webp") == path
+    assert path.stat().st_mtime_ns >= mtime
+
+
+def test_variants_are_content_addressed(thumbnail_cache, image_file):
+    """A new content hash, width or format gets its own variant file."""
+    paths = {
+        thumbnail_cache.variant_path("hash-a", 100, "webp"),
+        thumbnail_cache.variant_path("hash-b", 100, "webp"),
+        thumbnail_cache.variant_path("hash-a", 800, "webp"),
+        thumbnail_cache.variant_path("hash-a", 100, "jpeg"),
+    }
+    assert len(paths) == 4
+
+
+def test_wider_than_original_is_not_upscaled(thumbnail_cache, image_file):
+    """Requesting a width above the original keeps the original size."""
+    path = thumbnail_cache.get(image_file, "hash-a", 800, "png")
+
+    with Image.open(path) as img:
+        assert img.size == (400, 200)
+
+
+def test_unknown_width_is_rejected(thumbnail_cache):
+    """Only configured widths and formats are accepted."""
+    assert thumbnail_cache.validate(100, "webp") is None
+    assert thumbnail_cache.validate(123, "webp") is not None
+    assert thumbnail_cache.validate(100, "gif") is not None
+
+
+def test_least_recently_served_variants_are_evicted(tmp_path, image_file):
+    """Going over the size cap evicts the oldest variants first."""
+    cache = ThumbnailCache(tmp_path / "thumbnails", max_bytes=10 ** 7, widths=[100])
+    first = cache.get(image_file, "hash-0", 100, "png")
+    os.utime(first, ns=(0, 0))
+    second = cache.get(image_file, "hash-1", 100, "png")
+    cache.max_bytes = 2 * second.stat().st_size + 1
+
+    third = cache.get(image_file, "hash-2", 100, "png")
+
+    assert not first.exists()
+    assert third.exists()
+
+
+def test_pregenerate_skips_existing_variants(thumbnail_cache, image_file):
+    """Pregeneration renders each configured variant once."""
+    assert thumbnail_cache.pregenerate([(str(image_file), "hash-a")]) == 1
+    assert thumbnail_cache.pregenerate([(str(image_file), "hash-a")]) == 0
+    assert thumbnail_cache.variant_path("hash-a", 100, "webp").exists()
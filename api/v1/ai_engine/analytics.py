@@ -0,0 +1,345 @@
+"""
+Incremental analytics rollups over search interactions.
+
+Every batch written by the interaction writer is also folded into per-minute,
+per-hour and per-day rollup rows: search volume and latency per model, searches
+per normalized query, and how often each image was returned. Dashboards read
+the rollups, whose size depends on the time range and the number of distinct
+keys, never on how many raw interactions have been stored.
+
+Latency percentiles come from a LatencySketch kept on each rollup row. The
+sketch uses log-spaced buckets with a fixed relative accuracy, so sketches for
+any set of buckets merge exactly and a merged p95 is as accurate as one
+computed from a single bucket.
+"""
+import logging
+import math
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import ImageRollup, QueryRollup, RollupGranularity, SearchRollup
+
+logger = logging.getLogger(__name__)
+
+GRANULARITY_STEPS = {
+    RollupGranularity.MINUTE: timedelta(minutes=1),
+    RollupGranularity.HOUR: timedelta(hours=1),
+    RollupGranularity.DAY: timedelta(days=1),
+}
+
+# Keys per IN (...) lookup, below SQLite's bound-parameter limit.
+_KEY_CHUNK = 500
+
+
+class LatencySketch:
+    """
+    Mergeable quantile sketch with bounded relative error (DDSketch-style).
+
+    Values are counted in buckets whose bounds grow geometrically by
+    ``gamma = (1 + a) / (1 - a)``; any quantile is then reported within a
+    relative error of ``a`` of a value that was actually observed.
+    """
+
+    # Values below this are counted as zero (processing times are in seconds).
+    MIN_VALUE = 1e-6
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins: Dict[int, int] = defaultdict(int)
+        self.zero_count = 0
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value: float, count: int = 1) -> None:
+        """Record value ``count`` times."""
+        if value < self.MIN_VALUE:
+            self.zero_count += count
+        else:
+            self.bins[math.ceil(math.log(value) / self._log_gamma)] += count
+        self.count += count
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other: "LatencySketch") -> None:
+        """Add another sketch's counts to this one."""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+        for index, count in other.bins.items():
+            self.bins[index] += count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Return the q-quantile (0 <= q <= 1), or None for an empty sketch.
+        """
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if seen > rank:
+            return max(self.min, 0.0)
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen > rank:
+                value = 2 * self.gamma ** index / (self.gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def to_dict(self) -> Dict:
+        """Serialize to a JSON-compatible dict."""
+        if self.count == 0:
+            return {}
+        return {
+            "a": self.relative_accuracy,
+            "bins": {str(index): count for index, count in self.bins.items()},
+            "zero": self.zero_count,
+            "count": self.count,
+            "min": self.min,
+            "max": self.max,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict, relative_accuracy: float = 0.01) -> "LatencySketch":
+        """Rebuild a sketch from ``to_dict`` output; an empty dict gives an empty sketch."""
+        sketch = cls(data.get("a", relative_accuracy))
+        for index, count in data.get("bins", {}).items():
+            sketch.bins[int(index)] = count
+        sketch.zero_count = data.get("zero", 0)
+        sketch.count = data.get("count", 0)
+        sketch.min = data.get("min", math.inf)
+        sketch.max = data.get("max", -math.inf)
+        return sketch
+
+
+def _sketch_accuracy() -> float:
+    return getattr(settings, "ANALYTICS", {}).get("SKETCH_RELATIVE_ACCURACY", 0.01)
+
+
+def bucket_start(moment: datetime, granularity: str) -> datetime:
+    """Truncate a timestamp to the start of its UTC minute, hour or day."""
+    if timezone.is_aware(moment):
+        moment = moment.astimezone(dt_timezone.utc)
+    moment = moment.replace(second=0, microsecond=0)
+    if granularity in (RollupGranularity.HOUR, RollupGranularity.DAY):
+        moment = moment.replace(minute=0)
+    if granularity == RollupGranularity.DAY:
+        moment = moment.replace(hour=0)
+    return moment
+
+
+def normalize_query(query: str) -> str:
+    """Fold case and whitespace so trivially different queries share a rollup row."""
+    return " ".join(query.lower().split())[:500]
+
+
+def _increment(model, key_field: str, deltas: Dict[Tuple[str, datetime, str], Dict],
+               apply: Callable, fields: List[str]) -> None:
+    """
+    Add deltas to rollup rows keyed by (granularity, bucket_start, key).
+
+    Missing rows are inserted first, ignoring conflicts with concurrent
+    writers, then the rows are locked and updated, so increments from several
+    processes never overwrite each other.
+    """
+    if not deltas:
+        return
+    model.objects.bulk_create(
+        [model(granularity=granularity, bucket_start=start, **{key_field: key})
+         for granularity, start, key in deltas],
+        ignore_conflicts=True, batch_size=_KEY_CHUNK)
+
+    groups = defaultdict(list)
+    for granularity, start, key in deltas:
+        groups[(granularity, start)].append(key)
+    rows = []
+    for (granularity, start), keys in groups.items():
+        for i in range(0, len(keys), _KEY_CHUNK):
+            rows.extend(model.objects.select_for_update().filter(
+                granularity=granularity, bucket_start=start,
+                **{f"{key_field}__in": keys[i:i + _KEY_CHUNK]}))
+    for row in rows:
+        apply(row, deltas[(row.granularity, row.bucket_start, getattr(row, key_field))])
+    model.objects.bulk_update(rows, fields, batch_size=_KEY_CHUNK)
+
+
+def _apply_search(row: SearchRollup, delta: Dict) -> None:
+    row.search_count += delta["search_count"]
+    row.results_total += delta["results_total"]
+    row.top_similarity_sum += delta["top_similarity_sum"]
+    row.processing_time_sum += delta["processing_time_sum"]
+    sketch = LatencySketch.from_dict(row.latency_sketch, _sketch_accuracy())
+    sketch.merge(delta["sketch"])
+    row.latency_sketch = sketch.to_dict()
+
+
+def _apply_query(row: QueryRollup, delta: Dict) -> None:
+    row.search_count += delta["search_count"]
+    row.zero_result_count += delta["zero_result_count"]
+
+
+def _apply_image(row: ImageRollup, delta: Dict) -> None:
+    row.result_count += delta["result_count"]
+    row.rank_sum += delta["rank_sum"]
+    row.similarity_sum += delta["similarity_sum"]
+
+
+def update_rollups(records: Iterable[Dict]) -> None:
+    """
+    Fold interaction records into the minute, hour and day rollups.
+
+    Args:
+        records: Records as built by ``tracking.interaction_record``.
+    """
+    accuracy = _sketch_accuracy()
+    searches = defaultdict(lambda: {"search_count": 0, "results_total": 0,
+                                    "top_similarity_sum": 0.0, "processing_time_sum": 0.0,
+                                    "sketch": LatencySketch(accuracy)})
+    queries = defaultdict(lambda: {"search_count": 0, "zero_result_count": 0})
+    images = defaultdict(lambda: {"result_count": 0, "rank_sum": 0, "similarity_sum": 0.0})
+
+    for record in records:
+        created_at = record["created_at"]
+        if isinstance(created_at, str):
+            created_at = parse_datetime(created_at)
+        results = record["results"]
+        query = normalize_query(record["query"])
+        for granularity in GRANULARITY_STEPS:
+            start = bucket_start(created_at, granularity)
+            search = searches[(granularity, start, record["model_used"])]
+            search["search_count"] += 1
+            search["results_total"] += len(results)
+            search["top_similarity_sum"] += max(
+                (similarity for _, similarity in results), default=0.0)
+            search["processing_time_sum"] += record["processing_time"]
+            search["sketch"].add(record["processing_time"])
+
+            query_delta = queries[(granularity, start, query)]
+            query_delta["search_count"] += 1
+            query_delta["zero_result_count"] += not results
+
+            for rank, (path, similarity) in enumerate(results, start=1):
+                image = images[(granularity, start, path)]
+                image["result_count"] += 1
+                image["rank_sum"] += rank
+                image["similarity_sum"] += similarity
+
+    with transaction.atomic():
+        _increment(SearchRollup, "model_used", searches, _apply_search,
+                   ["search_count", "results_total", "top_similarity_sum",
+                    "processing_time_sum", "latency_sketch"])
+        _increment(QueryRollup, "query", queries, _apply_query,
+                   ["search_count", "zero_result_count"])
+        _increment(ImageRollup, "image_path", images, _apply_image,
+                   ["result_count", "rank_sum", "similarity_sum"])
+
+
+def prune_rollups(now: datetime) -> Dict[str, int]:
+    """
+    Delete rollups older than ``ANALYTICS['RETENTION_DAYS']`` for their granularity.
+
+    Returns:
+        Number of rows deleted per granularity.
+    """
+    retention = getattr(settings, "ANALYTICS", {}).get("RETENTION_DAYS", {})
+    deleted = {}
+    for granularity in GRANULARITY_STEPS:
+        days = retention.get(granularity)
+        if days is None:
+            continue
+        cutoff = now - timedelta(days=days)
+        deleted[granularity] = sum(
+            model.objects.filter(granularity=granularity, bucket_start__lt=cutoff).delete()[0]
+            for model in (SearchRollup, QueryRollup, ImageRollup))
+    return deleted
+
+
+def _window(model, granularity: str, since: datetime, until: datetime):
+    return model.objects.filter(
+        granularity=granularity,
+        bucket_start__gte=bucket_start(since, granularity),
+        bucket_start__lt=until)
+
+
+def top_queries(granularity: str, since: datetime, until: datetime,
+                limit: int) -> List[Dict]:
+    """Return the most searched normalized queries in the window."""
+    rows = (_window(QueryRollup, granularity, since, until)
+            .values("query")
+            .annotate(searches=Sum("search_count"),
+                      zero_result_searches=Sum("zero_result_count"))
+            .order_by("-searches", "query")[:limit])
+    return list(rows)
+
+
+def top_images(granularity: str, since: datetime, until: datetime,
+               limit: int) -> List[Dict]:
+    """Return the images returned most often in search results in the window."""
+    rows = (_window(ImageRollup, granularity, since, until)
+            .values("image_path")
+            .annotate(results=Sum("result_count"), rank_sum=Sum("rank_sum"),
+                      similarity_sum=Sum("similarity_sum"))
+            .order_by("-results", "image_path")[:limit])
+    return [{
+        "path": row["image_path"],
+        "results": row["results"],
+        "mean_rank": row["rank_sum"] / row["results"],
+        "mean_similarity": row["similarity_sum"] / row["results"],
+    } for row in rows]
+
+
+def _latency_summary(count: int, time_sum: float, sketch: LatencySketch,
+                     quantiles: Iterable[float]) -> Dict:
+    summary = {
+        "searches": count,
+        "mean_processing_time": time_sum / count if count else None,
+        "max_processing_time": sketch.max if sketch.count else None,
+    }
+    for q in quantiles:
+        summary[f"p{round(q * 100):d}"] = sketch.quantile(q)
+    return summary
+
+
+def latency_percentiles(granularity: str, since: datetime, until: datetime,
+                        model_used: Optional[str] = None,
+                        quantiles: Iterable[float] = (0.5, 0.9, 0.95, 0.99)) -> Dict:
+    """
+    Return processing_time percentiles per model over the window, and per bucket.
+
+    Returns:
+        Dict with ``models`` (one summary per model over the whole window) and
+        ``series`` (one summary per bucket and model, oldest first).
+    """
+    quantiles = list(quantiles)
+    rows = _window(SearchRollup, granularity, since, until)
+    if model_used:
+        rows = rows.filter(model_used=model_used)
+
+    accuracy = _sketch_accuracy()
+    totals = {}
+    series = []
+    for row in rows.order_by("bucket_start", "model_used"):
+        sketch = LatencySketch.from_dict(row.latency_sketch, accuracy)
+        series.append({"bucket_start": row.bucket_start, "model_used": row.model_used,
+                       **_latency_summary(row.search_count, row.processing_time_sum,
+                                          sketch, quantiles)})
+        total = totals.setdefault(row.model_used, [0, 0.0, LatencySketch(accuracy)])
+        total[0] += row.search_count
+        total[1] += row.processing_time_sum
+        total[2].merge(sketch)
+
+    models = [{"model_used": model, **_latency_summary(*total, quantiles)}
+              for model, total in sorted(totals.items())]
+    return {"models": models, "series": series}
@@ -0,0 +1,143 @@
+"""
+Two-tier cache for the image search path.
+
+The first tier maps a normalized query, model and inference backend to its
+averaged query embedding, so repeated queries skip CLIP text encoding. The second tier maps an
+embedding hash, top_k and vector store version to the search results, so a
+repeated query against an unchanged store skips the vector search as well.
+
+Both tiers live in Django cache aliases (see ``CACHES`` in settings), which
+provide the size bound, LRU eviction and TTL; pointing them at a shared backend
+such as Redis shares entries across workers.
+"""
+import hashlib
+import logging
+import threading
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import caches
+
+if TYPE_CHECKING:
+    import torch
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_CACHE_ALIAS = "query_embeddings"
+RESULTS_CACHE_ALIAS = "search_results"
+
+
+def normalize_query(query: str) -> str:
+    """Collapse whitespace and case so equivalent queries share a cache entry."""
+    return " ".join(query.lower().split())
+
+
+def _digest(*parts) -> str:
+    hasher = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        hasher.update(part if isinstance(part, bytes) else str(part).encode())
+        hasher.update(b"\x00")
+    return hasher.hexdigest()
+
+
+class SearchCache:
+    """Query embedding and search result caches with hit/miss counters."""
+
+    def __init__(self, embedding_alias: str = EMBEDDING_CACHE_ALIAS,
+                 results_alias: str = RESULTS_CACHE_ALIAS):
+        self.embeddings = caches[embedding_alias]
+        self.results = caches[results_alias]
+        self._lock = threading.Lock()
+        self._counters = {
+            "embedding_hits": 0,
+            "embedding_misses": 0,
+            "result_hits": 0,
+            "result_misses": 0,
+        }
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    def _embedding_key(self, query: str, model_name: str, backend: str) -> str:
+        templates = settings.ML_SETTINGS.get("QUERY_TEMPLATES", ())
+        return "qemb:" + _digest(model_name, backend, normalize_query(query), *templates)
+
+    @staticmethod
+    def embedding_hash(embedding: "torch.Tensor") -> str:
+        """Hash the raw float32 bytes of an embedding."""
+        array = np.ascontiguousarray(embedding.detach().cpu().numpy(), dtype=np.float32)
+        return _digest(array.tobytes())
+
+    def _results_key(self, embedding: "torch.Tensor", top_k: int, store_version: str,
+                     search_params: Optional[Dict]) -> str:
+        params = sorted((search_params or {}).items())
+        return "sres:" + _digest(self.embedding_hash(embedding), top_k, store_version, params)
+
+    def get_query_embedding(self, query: str, model_name: str,
+                            backend: str = "eager") -> Optional["torch.Tensor"]:
+        """
+        Return the cached query embedding, or None on a miss.
+
+        Embeddings are keyed by the inference backend (eager, int8, onnx...)
+        as well as the model, since backends agree only approximately.
+        """
+        cached = self.embeddings.get(self._embedding_key(query, model_name, backend))
+        if cached is None:
+            self._count("embedding_misses")
+            return None
+        self._count("embedding_hits")
+        import torch
+
+        return torch.from_numpy(cached)
+
+    def set_query_embedding(self, query: str, model_name: str,
+                            embedding: "torch.Tensor", backend: str = "eager") -> None:
+        """Store a query embedding."""
+        self.embeddings.set(
+            self._embedding_key(query, model_name, backend),
+            embedding.detach().cpu().numpy().astype(np.float32))
+
+    def get_results(self, embedding: "torch.Tensor", top_k: int, store_version: str,
+                    search_params: Optional[Dict] = None) -> Optional[List[Dict]]:
+        """Return cached search results, or None on a miss."""
+        cached = self.results.get(
+            self._results_key(embedding, top_k, store_version, search_params))
+        if cached is None:
+            self._count("result_misses")
+            return None
+        self._count("result_hits")
+        return cached
+
+    def set_results(self, embedding: "torch.Tensor", top_k: int, store_version: str,
+                    results: List[Dict], search_params: Optional[Dict] = None) -> None:
+        """Store search results for an embedding, store version and search params."""
+        self.results.set(
+            self._results_key(embedding, top_k, store_version, search_params), results)
+
+    def stats(self) -> Dict[str, float]:
+        """Return hit/miss counters and hit rates for this process."""
+        with self._lock:
+            stats = dict(self._counters)
+        for tier in ("embedding", "result"):
+            lookups = stats[f"{tier}_hits"] + stats[f"{tier}_misses"]
+            stats[f"{tier}_hit_rate"] = stats[f"{tier}_hits"] / lookups if lookups else 0.0
+        return stats
+
+    def clear(self) -> None:
+        """Drop every cached entry in both tiers."""
+        self.embeddings.clear()
+        self.results.clear()
+
+
+_cache_instance = None
+
+
+def get_search_cache() -> SearchCache:
+    """Return the process-wide search cache."""
+    global _cache_instance
+
+    if _cache_instance is None:
+        _cache_instance = SearchCache()
+    return _cache_instance
@@ -0,0 +1,160 @@
+"""
+HTTP responses for static files served by the API.
+
+Adds validators and caching headers, answers conditional requests with 304s,
+serves single byte ranges, and can hand the transfer to a front proxy via
+X-Accel-Redirect (nginx) or X-Sendfile (Apache, lighttpd) so no bytes pass
+through Python.
+"""
+import logging
+import re
+from pathlib import Path
+from typing import Callable, Optional, Tuple
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+logger = logging.getLogger(__name__)
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+_RANGE_RE = re.compile(r"bytes=(\d*)-(\d*)")
+_CHUNK_SIZE = 64 * 1024
+
+
+class RangeNotSatisfiable(Exception):
+    """The requested byte range lies outside the file."""
+
+
+def parse_byte_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a ``Range`` header for a file of ``size`` bytes.
+
+    Only single ranges are supported; anything else is ignored so the whole
+    file is served, as RFC 9110 allows.
+
+    Returns:
+        Inclusive (start, end) offsets, or None to serve the whole file.
+
+    Raises:
+        RangeNotSatisfiable: If the range starts past the end of the file.
+    """
+    match = _RANGE_RE.fullmatch(header.strip())
+    if not match or match.groups() == ("", ""):
+        return None
+    start, end = match.groups()
+    if start == "":
+        suffix = int(end)
+        if suffix == 0:
+            raise RangeNotSatisfiable(header)
+        return max(0, size - suffix), size - 1
+    start = int(start)
+    end = int(end) if end else size - 1
+    if start >= size:
+        raise RangeNotSatisfiable(header)
+    if end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+def _if_range_matches(request, etag: str, last_modified: int) -> bool:
+    """Return True if a Range request should be honoured under its If-Range."""
+    if_range = request.headers.get("If-Range")
+    if not if_range:
+        return True
+    if if_range.startswith(('"', "W/")):
+        # Weak validators never match for ranges.
+        return not etag.startswith("W/") and if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def _read_range(path: Path, start: int, length: int):
+    with open(path, "rb") as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def _sendfile_response(path: Path, content_type: str) -> Optional[HttpResponse]:
+    """Return an empty response that tells the front proxy to send the file."""
+    config = getattr(settings, "IMAGE_SERVING", {})
+    mode = config.get("SENDFILE")
+    if not mode:
+        return None
+    if mode == "x-sendfile":
+        response = HttpResponse(content_type=content_type)
+        response["X-Sendfile"] = str(path)
+        return response
+    if mode == "x-accel":
+        for root, location in config.get("ACCEL_LOCATIONS", []):
+            try:
+                relative = path.resolve().relative_to(Path(root).resolve())
+            except ValueError:
+                continue
+            response = HttpResponse(content_type=content_type)
+            response["X-Accel-Redirect"] = location.rstrip("/") + "/" + relative.as_posix()
+            return response
+        logger.warning(f"No X-Accel location covers {path}; serving it from Django")
+        return None
+    raise ValueError(f"Unknown IMAGE_SERVING SENDFILE mode: {mode}")
+
+
+def _local_response(request, path: Path, content_type: str, etag: str,
+                    last_modified: int) -> HttpResponse:
+    """Stream the file, or the single byte range the request asks for."""
+    size = path.stat().st_size
+    range_header = request.headers.get("Range")
+    if not range_header or not _if_range_matches(request, etag, last_modified):
+        return FileResponse(open(path, "rb"), content_type=content_type)
+    try:
+        byte_range = parse_byte_range(range_header, size)
+    except RangeNotSatisfiable:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+        return response
+    if byte_range is None:
+        return FileResponse(open(path, "rb"), content_type=content_type)
+
+    start, end = byte_range
+    response = StreamingHttpResponse(
+        _read_range(path, start, end - start + 1), status=206, content_type=content_type)
+    response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    response["Content-Length"] = str(end - start + 1)
+    return response
+
+
+def file_response(request, get_path: Callable[[], Path], content_type: str, etag: str,
+                  last_modified: float, cache_control: str) -> HttpResponse:
+    """
+    Serve a file with validators, conditional GET and range support.
+
+    Args:
+        request: The incoming request.
+        get_path: Returns the file to send. Only called when a body is needed,
+                  so a 304 never renders a variant.
+        content_type: Content type of the file.
+        etag: Quoted entity tag, e.g. '"abc"' or 'W/"abc"'.
+        last_modified: Modification time as a POSIX timestamp.
+        cache_control: Cache-Control header value.
+    Returns:
+        A 200, 206, 304, 412 or 416 response.
+    """
+    last_modified = int(last_modified)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        path = get_path()
+        response = _sendfile_response(path, content_type)
+        if response is None:
+            response = _local_response(request, path, content_type, etag, last_modified)
+
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    response["Cache-Control"] = cache_control
+    response["Accept-Ranges"] = "bytes"
+    return response
@@ -0,0 +1,110 @@
+"""Run the latency and throughput benchmarks and optionally compare with a baseline."""
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks.harness import compare, load_report, make_report
+from benchmarks.suites import (
+    STORE_BACKENDS,
+    parse_sizes,
+    run_api_benchmarks,
+    run_model_benchmarks,
+    run_store_benchmarks,
+)
+
+SUITES = ("stores", "model", "api")
+
+
+def _int_list(value: str):
+    return [int(part) for part in value.split(",") if part.strip()]
+
+
+class Command(BaseCommand):
+    help = ("Benchmark the vector stores on synthetic corpora, CLIP encoding on CPU and the "
+            "search API, writing p50/p95/p99 latency and QPS as JSON.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--suite", action="append", choices=SUITES,
+                            help="Suite to run; repeat for several (default: stores)")
+        parser.add_argument("--sizes", default="10k,100k",
+                            help="Corpus sizes for the store suite, e.g. '10k,100k,1M'")
+        parser.add_argument("--backends", default=",".join(STORE_BACKENDS),
+                            help="Stores to benchmark (default: numpy,faiss)")
+        parser.add_argument("--dimension", type=int, default=512)
+        parser.add_argument("--queries", type=int, default=200,
+                            help="Queries per store benchmark")
+        parser.add_argument("--top-k", type=int, default=10)
+        parser.add_argument("--search-batch-sizes", default="32",
+                            help="Batch sizes for store search_many benchmarks")
+        parser.add_argument("--index-factory", default="Flat",
+                            help="FAISS factory string for the faiss store")
+        parser.add_argument("--model-batch-sizes", default="1,8,32",
+                            help="Batch sizes for the CLIP encoding benchmarks")
+        parser.add_argument("--model-iterations", type=int, default=10)
+        parser.add_argument("--model-backends", default="eager",
+                            help="CLIP inference backends to compare, e.g. 'eager,int8,onnx'")
+        parser.add_argument("--concurrency", default="1,4",
+                            help="Client threads for the API suite")
+        parser.add_argument("--requests", type=int, default=200,
+                            help="Requests per concurrency level in the API suite")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="Write the JSON report to this file")
+        parser.add_argument("--compare", help="Baseline report to check for regressions")
+        parser.add_argument("--tolerance", type=float, default=0.10,
+                            help="Allowed slowdown as a fraction before flagging (default 0.10)")
+
+    def handle(self, *args, **options):
+        suites = options["suite"] or ["stores"]
+        params = {key: options[key] for key in (
+            "sizes", "backends", "dimension", "queries", "top_k", "search_batch_sizes",
+            "index_factory", "model_batch_sizes", "model_iterations", "model_backends",
+            "concurrency", "requests", "seed")}
+        params["suites"] = suites
+
+        results = {}
+        if "stores" in suites:
+            results.update(run_store_benchmarks(
+                parse_sizes(options["sizes"]),
+                dimension=options["dimension"],
+                queries=options["queries"],
+                top_k=options["top_k"],
+                batch_sizes=_int_list(options["search_batch_sizes"]),
+                backends=[b.strip() for b in options["backends"].split(",") if b.strip()],
+                index_factory=options["index_factory"],
+                seed=options["seed"],
+            ))
+        if "model" in suites:
+            results.update(run_model_benchmarks(
+                _int_list(options["model_batch_sizes"]),
+                iterations=options["model_iterations"],
+                seed=options["seed"],
+                backends=[b.strip() for b in options["model_backends"].split(",") if b.strip()],
+            ))
+        if "api" in suites:
+            results.update(run_api_benchmarks(
+                _int_list(options["concurrency"]),
+                requests=options["requests"],
+            ))
+
+        report = make_report(results, params)
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            Path(options["output"]).write_text(output)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {len(results)} results to "
+                                                 f"{options['output']}"))
+        else:
+            self.stdout.write(output)
+
+        if options["compare"]:
+            regressions = compare(load_report(Path(options["compare"])), report,
+                                  options["tolerance"])
+            for regression in regressions:
+                self.stderr.write(
+                    f"REGRESSION {regression['benchmark']} {regression['metric']}: "
+                    f"{regression['baseline']:.3f} -> {regression['current']:.3f} "
+                    f"({regression['change']:+.1%})")
+            if regressions:
+                raise CommandError(f"{len(regressions)} benchmark regressions against "
+                                   f"{options['compare']}")
+            self.stdout.write(self.style.SUCCESS("No regressions against baseline"))
@@ -0,0 +1,78 @@
+"""Rebuild analytics rollups from raw interactions, or prune old rollups."""
+from datetime import datetime, timezone as dt_timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from v1.ai_engine.analytics import bucket_start, prune_rollups, update_rollups
+from v1.ai_engine.models import (
+    ImageInteraction,
+    ImageRollup,
+    QueryRollup,
+    RollupGranularity,
+    SearchInteraction,
+    SearchRollup,
+)
+
+
+class Command(BaseCommand):
+    help = ("Rebuild the analytics rollups from stored interactions (e.g. for rows written "
+            "before rollups existed) and/or delete rollups past their retention.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rebuild-since",
+            help="Recompute rollups from this date or datetime on (aligned to the UTC day)",
+        )
+        parser.add_argument(
+            "--prune", action="store_true",
+            help="Delete rollups older than ANALYTICS['RETENTION_DAYS']",
+        )
+        parser.add_argument("--chunk-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        if not options["rebuild_since"] and not options["prune"]:
+            raise CommandError("Pass --rebuild-since and/or --prune")
+        if options["rebuild_since"]:
+            since = parse_datetime(options["rebuild_since"]) or parse_datetime(
+                options["rebuild_since"] + "T00:00:00")
+            if since is None:
+                raise CommandError(f"Invalid date: {options['rebuild_since']}")
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since, dt_timezone.utc)
+            self.rebuild(bucket_start(since, RollupGranularity.DAY), options["chunk_size"])
+        if options["prune"]:
+            deleted = prune_rollups(timezone.now())
+            self.stdout.write(self.style.SUCCESS(f"Pruned rollups: {deleted}"))
+
+    def rebuild(self, since: datetime, chunk_size: int) -> None:
+        interactions = (SearchInteraction.objects.filter(created_at__gte=since)
+                        .order_by("id")
+                        .prefetch_related(Prefetch(
+                            "image_interactions",
+                            queryset=ImageInteraction.objects.order_by("rank_position"))))
+        with transaction.atomic():
+            for model in (SearchRollup, QueryRollup, ImageRollup):
+                model.objects.filter(bucket_start__gte=since).delete()
+            total = 0
+            records = []
+            for interaction in interactions.iterator(chunk_size=chunk_size):
+                records.append({
+                    "query": interaction.query,
+                    "model_used": interaction.model_used,
+                    "processing_time": interaction.processing_time,
+                    "created_at": interaction.created_at,
+                    "results": [[image.image_path, image.similarity_score]
+                                for image in interaction.image_interactions.all()],
+                })
+                if len(records) >= chunk_size:
+                    update_rollups(records)
+                    total += len(records)
+                    records = []
+            update_rollups(records)
+            total += len(records)
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt rollups from {total} interactions since {since.isoformat()}"))
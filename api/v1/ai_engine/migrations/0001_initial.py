@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:44
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchInteraction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('query', models.CharField(max_length=500)),
+                ('results_count', models.IntegerField()),
+                ('top_similarity', models.FloatField()),
+                ('model_used', models.CharField(max_length=50)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('processing_time', models.FloatField(help_text='Processing time in seconds')),
+                ('client_ip', models.GenericIPAddressField(blank=True, null=True)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ImageInteraction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('image_path', models.CharField(max_length=1000)),
+                ('similarity_score', models.FloatField()),
+                ('rank_position', models.IntegerField()),
+                ('search', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='image_interactions', to='ai_engine.searchinteraction')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='searchinteraction',
+            index=models.Index(fields=['-created_at'], name='ai_engine_s_created_72dc7f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='searchinteraction',
+            index=models.Index(fields=['user', '-created_at'], name='ai_engine_s_user_id_003672_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='imageinteraction',
+            index=models.Index(fields=['search', 'rank_position'], name='ai_engine_i_search__aba15b_idx'),
+        ),
+    ]
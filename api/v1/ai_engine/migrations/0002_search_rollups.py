@@ -0,0 +1,65 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:58
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_engine', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='searchinteraction',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.CreateModel(
+            name='ImageRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('minute', 'Minute'), ('hour', 'Hour'), ('day', 'Day')], max_length=6)),
+                ('bucket_start', models.DateTimeField()),
+                ('image_path', models.CharField(max_length=1000)),
+                ('result_count', models.BigIntegerField(default=0)),
+                ('rank_sum', models.BigIntegerField(default=0)),
+                ('similarity_sum', models.FloatField(default=0.0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('granularity', 'bucket_start', 'image_path'), name='unique_image_rollup')],
+            },
+        ),
+        migrations.CreateModel(
+            name='QueryRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('minute', 'Minute'), ('hour', 'Hour'), ('day', 'Day')], max_length=6)),
+                ('bucket_start', models.DateTimeField()),
+                ('query', models.CharField(max_length=500)),
+                ('search_count', models.BigIntegerField(default=0)),
+                ('zero_result_count', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('granularity', 'bucket_start', 'query'), name='unique_query_rollup')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SearchRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('minute', 'Minute'), ('hour', 'Hour'), ('day', 'Day')], max_length=6)),
+                ('bucket_start', models.DateTimeField()),
+                ('model_used', models.CharField(max_length=50)),
+                ('search_count', models.BigIntegerField(default=0)),
+                ('results_total', models.BigIntegerField(default=0)),
+                ('top_similarity_sum', models.FloatField(default=0.0)),
+                ('processing_time_sum', models.FloatField(default=0.0)),
+                ('latency_sketch', models.JSONField(default=dict)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('granularity', 'bucket_start', 'model_used'), name='unique_search_rollup')],
+            },
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 
 User = get_user_model()
 
@@ -15,7 +16,8 @@ class SearchInteraction(models.Model):
     results_count = models.IntegerField()
     top_similarity = models.FloatField()
     model_used = models.CharField(max_length=50)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Set from the request time; interactions are written in batches later.
+    created_at = models.DateTimeField(default=timezone.now)
     processing_time = models.FloatField(help_text="Processing time in seconds")
     client_ip = models.GenericIPAddressField(null=True, blank=True)
 
@@ -40,4 +42,62 @@ class ImageInteraction(models.Model):
         indexes = [
             models.Index(fields=['search', 'rank_position']),
         ]
-    
\ No newline at end of file
+    
+
+class RollupGranularity(models.TextChoices):
+    MINUTE = 'minute'
+    HOUR = 'hour'
+    DAY = 'day'
+
+
+class SearchRollup(models.Model):
+    """Search volume and latency per model for one time bucket."""
+    granularity = models.CharField(max_length=6, choices=RollupGranularity.choices)
+    bucket_start = models.DateTimeField()
+    model_used = models.CharField(max_length=50)
+    search_count = models.BigIntegerField(default=0)
+    results_total = models.BigIntegerField(default=0)
+    top_similarity_sum = models.FloatField(default=0.0)
+    processing_time_sum = models.FloatField(default=0.0)
+    # Serialized LatencySketch of processing_time, mergeable across buckets.
+    latency_sketch = models.JSONField(default=dict)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['granularity', 'bucket_start', 'model_used'],
+                name='unique_search_rollup'),
+        ]
+
+
+class QueryRollup(models.Model):
+    """Searches per normalized query for one time bucket."""
+    granularity = models.CharField(max_length=6, choices=RollupGranularity.choices)
+    bucket_start = models.DateTimeField()
+    query = models.CharField(max_length=500)
+    search_count = models.BigIntegerField(default=0)
+    zero_result_count = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['granularity', 'bucket_start', 'query'],
+                name='unique_query_rollup'),
+        ]
+
+
+class ImageRollup(models.Model):
+    """How often an image was returned in search results for one time bucket."""
+    granularity = models.CharField(max_length=6, choices=RollupGranularity.choices)
+    bucket_start = models.DateTimeField()
+    image_path = models.CharField(max_length=1000)
+    result_count = models.BigIntegerField(default=0)
+    rank_sum = models.BigIntegerField(default=0)
+    similarity_sum = models.FloatField(default=0.0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['granularity', 'bucket_start', 'image_path'],
+                name='unique_image_rollup'),
+        ]
@@ -1,22 +1,135 @@
+import json
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
 from rest_framework import serializers
-from .models import SearchInteraction, ImageInteraction
+from .analytics import GRANULARITY_STEPS
+from .models import SearchInteraction, ImageInteraction, RollupGranularity
+
+
+class SearchFiltersSerializer(serializers.Serializer):
+    """Attribute predicates a search result must match; every given one applies."""
+    # A folder relative to the dataset root also matches everything below it.
+    folders = serializers.ListField(
+        child=serializers.CharField(max_length=1024, allow_blank=True),
+        required=False, allow_empty=False, max_length=100)
+    file_types = serializers.ListField(
+        child=serializers.CharField(max_length=16), required=False, allow_empty=False,
+        max_length=20)
+    # "ai" or "human" for the ai-vs-human-generated dataset.
+    labels = serializers.ListField(
+        child=serializers.CharField(max_length=100), required=False, allow_empty=False,
+        max_length=100)
+    modified_after = serializers.DateTimeField(required=False)
+    modified_before = serializers.DateTimeField(required=False)
+
+    def get_value(self, dictionary):
+        # Multipart uploads can only send filters as a JSON string.
+        if hasattr(dictionary, 'getlist') and self.field_name in dictionary:
+            return dictionary[self.field_name]
+        return super().get_value(dictionary)
+
+    def to_internal_value(self, data):
+        if isinstance(data, str):
+            try:
+                data = json.loads(data)
+            except ValueError:
+                raise serializers.ValidationError("Filters must be a JSON object.")
+        return super().to_internal_value(data)
+
+    def validate(self, data):
+        if ('modified_after' in data and 'modified_before' in data
+                and data['modified_after'] >= data['modified_before']):
+            raise serializers.ValidationError(
+                "`modified_after` must be earlier than `modified_before`.")
+        # A canonical order lets equal filters share cached results.
+        for name in ('folders', 'file_types', 'labels'):
+            if name in data:
+                data[name] = sorted(set(data[name]))
+        return data
 
 
 class ImageSearchRequestSerializer(serializers.Serializer):
     query = serializers.CharField(required=True, max_length=500)
     top_k = serializers.IntegerField(
         required=False, default=5, min_value=1, max_value=100)
+    nprobe = serializers.IntegerField(
+        required=False, min_value=1, max_value=65536)
+    ef_search = serializers.IntegerField(
+        required=False, min_value=1, max_value=4096)
+    filters = SearchFiltersSerializer(required=False)
+    # Fuse file name/caption matches into the results (default: HYBRID_SEARCH['ENABLED']).
+    hybrid = serializers.BooleanField(required=False, allow_null=True)
+
+
+class BatchImageSearchRequestSerializer(serializers.Serializer):
+    queries = serializers.ListField(
+        child=serializers.CharField(max_length=500), allow_empty=False)
+    top_k = serializers.IntegerField(
+        required=False, default=5, min_value=1, max_value=100)
+    nprobe = serializers.IntegerField(
+        required=False, min_value=1, max_value=65536)
+    ef_search = serializers.IntegerField(
+        required=False, min_value=1, max_value=4096)
+    filters = SearchFiltersSerializer(required=False)
+    hybrid = serializers.BooleanField(required=False, allow_null=True)
+
+    def validate_queries(self, value):
+        max_queries = settings.ML_SETTINGS.get("MAX_BATCH_QUERIES", 256)
+        if len(value) > max_queries:
+            raise serializers.ValidationError(
+                f"At most {max_queries} queries are allowed per request.")
+        return value
+
+
+class SimilarImageSearchRequestSerializer(serializers.Serializer):
+    # The query image: an indexed image by id or path, or an uploaded file.
+    id = serializers.IntegerField(required=False, min_value=0)
+    path = serializers.CharField(required=False, max_length=1024)
+    image = serializers.ImageField(required=False)
+    top_k = serializers.IntegerField(
+        required=False, default=5, min_value=1, max_value=100)
+    nprobe = serializers.IntegerField(
+        required=False, min_value=1, max_value=65536)
+    ef_search = serializers.IntegerField(
+        required=False, min_value=1, max_value=4096)
+    filters = SearchFiltersSerializer(required=False)
+
+    def validate_image(self, value):
+        max_bytes = settings.ML_SETTINGS.get("MAX_QUERY_IMAGE_BYTES", 10 * 1024 * 1024)
+        if value.size > max_bytes:
+            raise serializers.ValidationError(
+                f"Images larger than {max_bytes} bytes are not accepted.")
+        return value
+
+    def validate(self, data):
+        given = [name for name in ("id", "path", "image") if name in data]
+        if len(given) != 1:
+            raise serializers.ValidationError(
+                "Provide exactly one of `id`, `path` or `image`.")
+        return data
 
 
 class ImageSearchResultSerializer(serializers.Serializer):
     path = serializers.CharField()
     similarity = serializers.FloatField()
+    # Content hash of the image; append as ?v= for an immutable image URL.
+    version = serializers.CharField(required=False)
 
 
 class ImageSearchResponseSerializer(serializers.Serializer):
     results = ImageSearchResultSerializer(many=True)
 
 
+class BatchImageSearchItemSerializer(serializers.Serializer):
+    query = serializers.CharField()
+    results = ImageSearchResultSerializer(many=True)
+
+
+class BatchImageSearchResponseSerializer(serializers.Serializer):
+    results = BatchImageSearchItemSerializer(many=True)
+
+
 class DatasetInfoSerializer(serializers.Serializer):
     status = serializers.CharField()
     exists = serializers.BooleanField()
@@ -24,6 +137,36 @@ class DatasetInfoSerializer(serializers.Serializer):
     data_path = serializers.CharField()
 
 
+class AnalyticsQuerySerializer(serializers.Serializer):
+    granularity = serializers.ChoiceField(
+        choices=RollupGranularity.choices, default=RollupGranularity.HOUR)
+    since = serializers.DateTimeField(required=False)
+    until = serializers.DateTimeField(required=False)
+    limit = serializers.IntegerField(
+        required=False, default=20, min_value=1, max_value=1000)
+    model_used = serializers.CharField(required=False, max_length=50)
+
+    # Window used when `since` is omitted.
+    DEFAULT_WINDOWS = {
+        RollupGranularity.MINUTE: timedelta(hours=1),
+        RollupGranularity.HOUR: timedelta(days=1),
+        RollupGranularity.DAY: timedelta(days=30),
+    }
+
+    def validate(self, data):
+        granularity = data['granularity']
+        data.setdefault('until', timezone.now())
+        data.setdefault('since', data['until'] - self.DEFAULT_WINDOWS[granularity])
+        if data['since'] >= data['until']:
+            raise serializers.ValidationError("`since` must be earlier than `until`.")
+        max_buckets = getattr(settings, 'ANALYTICS', {}).get('MAX_BUCKETS', 1500)
+        if (data['until'] - data['since']) / GRANULARITY_STEPS[granularity] > max_buckets:
+            raise serializers.ValidationError(
+                f"At most {max_buckets} {granularity} buckets can be requested; "
+                f"use a coarser granularity.")
+        return data
+
+
 class SearchInteractionSerializer(serializers.ModelSerializer):
     class Meta:
         model = SearchInteraction
@@ -0,0 +1,255 @@
+"""
+Background warm-up of the search stack.
+
+``AppConfig.ready`` runs for every management command, so it no longer loads
+CLIP or downloads the dataset. Instead the WSGI and ASGI entry points call
+``start_warmup()``, which checks (and if needed downloads) the dataset, loads
+CLIP and opens the vector store in a daemon thread while the server is already
+accepting connections. Health endpoints report progress, and search requests
+wait up to STARTUP['SEARCH_WAIT_SECONDS'] for warm-up before being answered
+with 503.
+
+A failing stage is retried with exponential backoff up to
+STARTUP['MAX_RETRIES'] times (a dataset download can fail transiently); once
+the retries are used up the warm-up stays FAILED and the liveness probe fails,
+so the orchestrator restarts the worker.
+
+Processes that never start a warm-up (tests, management commands, or servers
+with STARTUP['WARMUP'] off) load each component lazily on first use.
+"""
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+from ..metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+NOT_STARTED = "not_started"
+DISABLED = "disabled"
+WARMING = "warming"
+READY = "ready"
+FAILED = "failed"
+
+STARTUP_STAGE_DURATION = REGISTRY.gauge(
+    "startup_stage_duration_seconds",
+    "Seconds spent in each warm-up stage of this worker.",
+    ["stage"])
+
+
+def ensure_dataset() -> None:
+    """Download the dataset if the dataset directory has no images."""
+    from ..ml.dataset_handler.dataset import DatasetManager
+    from .utils import DatasetService
+
+    dataset_service = DatasetService(DatasetManager())
+    if dataset_service.load_dataset_images():
+        return
+    if not settings.STARTUP.get('DOWNLOAD_DATASET', True):
+        logger.warning("Dataset not found and automatic download is disabled")
+        return
+
+    logger.info("Dataset not found. Starting download...")
+    dataset_service.trigger_download()
+    images = dataset_service.load_dataset_images()
+    if images:
+        logger.info(f"Successfully downloaded {len(images)} images")
+    else:
+        logger.error("Download completed but no images found")
+
+
+def load_model() -> None:
+    """Load the CLIP model singleton."""
+    from ..ml.models.clip import initialize_clip_model
+
+    initialize_clip_model()
+
+
+def load_vector_store() -> None:
+    """Open the configured vector store, syncing it with the dataset."""
+    from ..ml.models.store_handlers.registry import warm_vector_store
+
+    warm_vector_store()
+
+
+DEFAULT_STAGES = [
+    ("dataset", ensure_dataset),
+    ("model", load_model),
+    ("vector_store", load_vector_store),
+]
+
+
+class WarmupManager:
+    """Runs warm-up stages in order in a background thread and reports their progress."""
+
+    def __init__(self, stages: Optional[List[Tuple[str, Callable[[], None]]]] = None,
+                 max_retries: int = 0, retry_backoff: float = 5.0,
+                 max_retry_backoff: float = 300.0):
+        """
+        Args:
+            stages: (name, callable) pairs run in order; defaults to dataset,
+                    model and vector store.
+            max_retries: Times a failing stage is retried before the warm-up
+                         fails for good.
+            retry_backoff: Seconds before the first retry; doubled for each
+                           further retry of the same stage.
+            max_retry_backoff: Upper bound on the delay between retries.
+        """
+        self.stages = list(DEFAULT_STAGES if stages is None else stages)
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.max_retry_backoff = max_retry_backoff
+        self.retries = 0
+        self.state = NOT_STARTED
+        self.error = None
+        self._stage_status = {name: {"state": "pending", "seconds": None}
+                              for name, _ in self.stages}
+        self._started_at = None
+        self._finished_at = None
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self) -> bool:
+        """
+        Start warming up in a daemon thread.
+
+        Returns:
+            True if a warm-up was started, False if one is running or finished.
+        """
+        with self._lock:
+            if self.state not in (NOT_STARTED, DISABLED, FAILED):
+                return False
+            self.state = WARMING
+            self.error = None
+            self.retries = 0
+            self._started_at = time.monotonic()
+            self._finished_at = None
+            self._done.clear()
+            for status in self._stage_status.values():
+                status.update(state="pending", seconds=None)
+            self._thread = threading.Thread(target=self._run, name="warmup", daemon=True)
+            self._thread.start()
+        logger.info("Warm-up started")
+        return True
+
+    def disable(self) -> None:
+        """Skip warm-up; components load on first use."""
+        with self._lock:
+            if self.state == NOT_STARTED:
+                self.state = DISABLED
+
+    def _run(self) -> None:
+        for name, stage in self.stages:
+            status = self._stage_status[name]
+            failures = 0
+            while True:
+                status["state"] = "running"
+                started = time.monotonic()
+                try:
+                    stage()
+                    break
+                except Exception as e:
+                    status.update(state="failed", seconds=time.monotonic() - started)
+                    logger.exception(f"Warm-up stage '{name}' failed: {str(e)}")
+                    if failures >= self.max_retries:
+                        self._finish(FAILED, f"{name}: {str(e)}")
+                        return
+                    delay = min(self.retry_backoff * 2 ** failures, self.max_retry_backoff)
+                    failures += 1
+                    with self._lock:
+                        self.error = f"{name}: {str(e)}"
+                        self.retries += 1
+                    logger.warning(f"Retrying warm-up stage '{name}' in {delay:.1f}s "
+                                   f"(retry {failures} of {self.max_retries})")
+                    time.sleep(delay)
+            status.update(state="done", seconds=time.monotonic() - started)
+            STARTUP_STAGE_DURATION.set(status["seconds"], stage=name)
+            logger.info(f"Warm-up stage '{name}' done in {status['seconds']:.2f}s")
+        self._finish(READY)
+
+    def _finish(self, state: str, error: Optional[str] = None) -> None:
+        with self._lock:
+            self.state = state
+            self.error = error
+            self._finished_at = time.monotonic()
+        self._done.set()
+        if state == READY:
+            logger.info(f"Warm-up finished in {self._finished_at - self._started_at:.2f}s")
+
+    @property
+    def ready(self) -> bool:
+        """Whether searches can be served now (warm-up done, or not used)."""
+        return self.state in (NOT_STARTED, DISABLED, READY)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        Block until warm-up finishes or timeout seconds pass.
+
+        Returns:
+            True if searches can be served.
+        """
+        if self.state == WARMING:
+            self._done.wait(timeout)
+        return self.ready
+
+    def status(self) -> Dict:
+        """Return the overall state, per-stage state and durations, and any error."""
+        with self._lock:
+            elapsed = None
+            if self._started_at is not None:
+                elapsed = (self._finished_at or time.monotonic()) - self._started_at
+            return {
+                "state": self.state,
+                "ready": self.ready,
+                "elapsed_seconds": elapsed,
+                "stages": {name: dict(status) for name, status in self._stage_status.items()},
+                "error": self.error,
+                "retries": self.retries,
+            }
+
+
+_warmup_instance = None
+_warmup_lock = threading.Lock()
+
+
+def get_warmup_manager() -> WarmupManager:
+    """Return the process-wide warm-up manager."""
+    global _warmup_instance
+
+    with _warmup_lock:
+        if _warmup_instance is None:
+            _warmup_instance = WarmupManager(
+                max_retries=settings.STARTUP.get('MAX_RETRIES', 5),
+                retry_backoff=settings.STARTUP.get('RETRY_BACKOFF_SECONDS', 5.0),
+                max_retry_backoff=settings.STARTUP.get('RETRY_BACKOFF_MAX_SECONDS', 300.0))
+    return _warmup_instance
+
+
+def _restart_in_child() -> None:
+    """Threads do not survive fork: rerun an unfinished warm-up in the child process."""
+    global _warmup_instance, _warmup_lock
+
+    _warmup_lock = threading.Lock()
+    inherited = _warmup_instance
+    if inherited is not None and inherited.state == WARMING:
+        _warmup_instance = WarmupManager(inherited.stages, inherited.max_retries,
+                                         inherited.retry_backoff, inherited.max_retry_backoff)
+        _warmup_instance.start()
+
+
+os.register_at_fork(after_in_child=_restart_in_child)
+
+
+def start_warmup() -> WarmupManager:
+    """Start the process-wide warm-up, or mark it disabled when STARTUP['WARMUP'] is off."""
+    manager = get_warmup_manager()
+    if settings.STARTUP.get('WARMUP', True):
+        manager.start()
+    else:
+        manager.disable()
+    return manager
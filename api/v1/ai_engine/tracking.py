@@ -0,0 +1,313 @@
+"""
+Background writer for search interaction tracking.
+
+Search requests hand their interaction records to an in-memory queue and
+return immediately. A daemon thread drains the queue and writes batches with
+one ``bulk_create`` per table, flushing when BATCH_SIZE records are waiting or
+FLUSH_INTERVAL seconds have passed, so search latency no longer depends on
+database write latency.
+
+When the database cannot keep up (the queue is full, or a flush fails) records
+are appended to a spill file, bounded by SPILL_MAX_BYTES, and replayed once
+writes succeed again. Records that do not fit in the spill file are dropped
+and counted.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .analytics import update_rollups
+from .models import ImageInteraction, SearchInteraction
+
+logger = logging.getLogger(__name__)
+
+
+def interaction_record(user_id: Optional[int], query: str, results: List[Dict],
+                       model_used: str, processing_time: float,
+                       client_ip: Optional[str]) -> Dict:
+    """Build a JSON-serializable record of one search and its results."""
+    return {
+        "user_id": user_id,
+        "query": query,
+        "model_used": model_used,
+        "processing_time": processing_time,
+        "client_ip": client_ip,
+        "created_at": timezone.now().isoformat(),
+        "results": [[result["path"], result["similarity"]] for result in results],
+    }
+
+
+def write_interactions(records: List[Dict]) -> None:
+    """
+    Insert records with one bulk_create per table and fold them into the
+    analytics rollups, all in a single transaction.
+    """
+    with transaction.atomic():
+        interactions = SearchInteraction.objects.bulk_create([
+            SearchInteraction(
+                user_id=record["user_id"],
+                query=record["query"],
+                results_count=len(record["results"]),
+                top_similarity=max(
+                    (similarity for _, similarity in record["results"]), default=0.0),
+                model_used=record["model_used"],
+                processing_time=record["processing_time"],
+                client_ip=record["client_ip"],
+                created_at=parse_datetime(record["created_at"]),
+            )
+            for record in records
+        ])
+        ImageInteraction.objects.bulk_create([
+            ImageInteraction(
+                search=interaction,
+                image_path=path,
+                similarity_score=similarity,
+                rank_position=rank + 1,
+            )
+            for interaction, record in zip(interactions, records)
+            for rank, (path, similarity) in enumerate(record["results"])
+        ])
+        update_rollups(records)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class InteractionWriter:
+    """Buffers interaction records and writes them in batches off the request path."""
+
+    def __init__(self, spill_dir: Path, queue_size: int = 10000, batch_size: int = 500,
+                 flush_interval: float = 1.0, spill_max_bytes: int = 64 * 1024 * 1024,
+                 start: bool = True):
+        self.spill_dir = Path(spill_dir)
+        self.spill_dir.mkdir(parents=True, exist_ok=True)
+        self.spill_file = self.spill_dir / f"interactions-{os.getpid()}.jsonl"
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spill_max_bytes = spill_max_bytes
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._flush_lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._counters = {"written": 0, "spilled": 0, "replayed": 0,
+                          "dropped": 0, "failed_flushes": 0}
+        self._counter_lock = threading.Lock()
+        self._thread = None
+        if start:
+            self.start()
+
+    @classmethod
+    def from_settings(cls) -> "InteractionWriter":
+        """Build a writer configured from ``INTERACTION_TRACKING``."""
+        from django.conf import settings
+
+        config = settings.INTERACTION_TRACKING
+        return cls(
+            spill_dir=config['SPILL_DIR'],
+            queue_size=config.get('QUEUE_SIZE', 10000),
+            batch_size=config.get('BATCH_SIZE', 500),
+            flush_interval=config.get('FLUSH_INTERVAL', 1.0),
+            spill_max_bytes=config.get('SPILL_MAX_BYTES', 64 * 1024 * 1024),
+        )
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._counter_lock:
+            self._counters[name] += amount
+
+    def start(self) -> None:
+        """Start the background flush thread."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="interaction-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stop the background thread after a final flush."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def submit(self, record: Dict) -> None:
+        """Queue a record without blocking; spills to disk if the queue is full."""
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self._spill([record])
+
+    def queue_depth(self) -> int:
+        """Number of records waiting to be written."""
+        return self._queue.qsize()
+
+    def stats(self) -> Dict[str, int]:
+        """Return queue depth, spill size and write counters for this process."""
+        with self._counter_lock:
+            stats = dict(self._counters)
+        stats["queue_depth"] = self.queue_depth()
+        stats["spill_bytes"] = sum(path.stat().st_size for path in self._spill_files())
+        return stats
+
+    def _drain(self, limit: int) -> List[Dict]:
+        records = []
+        while len(records) < limit:
+            try:
+                records.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return records
+
+    def flush(self) -> int:
+        """
+        Write everything currently queued, then replay spilled records.
+
+        Returns:
+            Number of records written to the database.
+        """
+        written = 0
+        with self._flush_lock:
+            while True:
+                records = self._drain(self.batch_size)
+                if not records:
+                    break
+                if not self._write(records):
+                    self._spill(records)
+                    return written
+                written += len(records)
+            written += self._replay_spill()
+        return written
+
+    def _write(self, records: List[Dict]) -> bool:
+        try:
+            write_interactions(records)
+        except Exception as e:
+            self._count("failed_flushes")
+            logger.error(f"Failed to write {len(records)} interactions: {str(e)}")
+            return False
+        self._count("written", len(records))
+        return True
+
+    def _spill(self, records: List[Dict]) -> None:
+        """Append records to this process's spill file, dropping what does not fit."""
+        lines = [json.dumps(record) + "\n" for record in records]
+        with self._spill_lock:
+            size = self.spill_file.stat().st_size if self.spill_file.exists() else 0
+            kept = []
+            for line in lines:
+                if size + len(line) > self.spill_max_bytes:
+                    break
+                kept.append(line)
+                size += len(line)
+            if kept:
+                with open(self.spill_file, "a") as f:
+                    f.writelines(kept)
+        self._count("spilled", len(kept))
+        if len(kept) < len(lines):
+            self._count("dropped", len(lines) - len(kept))
+            logger.warning(
+                f"Interaction spill file is full; dropped {len(lines) - len(kept)} records")
+
+    def _spill_files(self) -> List[Path]:
+        return sorted(self.spill_dir.glob("interactions-*.jsonl*"))
+
+    def _owner_pid(self, path: Path) -> int:
+        """Return the pid of the process that last wrote or claimed a spill file."""
+        if path.name.endswith(".replaying"):
+            return int(path.name.split(".")[-2])
+        return int(path.name[len("interactions-"):].split(".")[0])
+
+    def _replay_spill(self) -> int:
+        """Write back this process's spilled records and those left by exited processes."""
+        replayed = 0
+        for path in self._spill_files():
+            written, complete = self._replay_file(path)
+            replayed += written
+            if not complete:
+                break
+        if replayed:
+            self._count("replayed", replayed)
+            logger.info(f"Replayed {replayed} spilled interactions")
+        return replayed
+
+    def _replay_file(self, path: Path):
+        """
+        Replay one spill file, stopping at the first failed write.
+
+        Returns:
+            Tuple of (records written, whether the file was fully replayed)
+        """
+        try:
+            owner = self._owner_pid(path)
+        except ValueError:
+            return 0, True
+        if owner != os.getpid() and _pid_alive(owner):
+            return 0, True
+        claimed = path.with_name(f"{path.name.split('.jsonl')[0]}.jsonl.{os.getpid()}.replaying")
+        if claimed != path:
+            try:
+                # Claim the file so new spills start a fresh one.
+                with self._spill_lock:
+                    os.replace(path, claimed)
+            except FileNotFoundError:
+                return 0, True
+
+        with open(claimed) as f:
+            records = [json.loads(line) for line in f if line.strip()]
+        for i in range(0, len(records), self.batch_size):
+            if not self._write(records[i:i + self.batch_size]):
+                # Keep the unwritten tail for the next attempt.
+                with open(claimed, "w") as f:
+                    f.writelines(json.dumps(record) + "\n" for record in records[i:])
+                return i, False
+        claimed.unlink(missing_ok=True)
+        return len(records), True
+
+    def _run(self) -> None:
+        deadline = time.monotonic() + self.flush_interval
+        while not self._stop.is_set():
+            timeout = max(0.0, deadline - time.monotonic())
+            self._stop.wait(min(timeout, 0.05))
+            if self.queue_depth() >= self.batch_size or time.monotonic() >= deadline:
+                self.flush()
+                # Drop broken or expired connections held by this thread.
+                close_old_connections()
+                deadline = time.monotonic() + self.flush_interval
+        self.flush()
+        close_old_connections()
+
+
+_writer_instance = None
+_writer_lock = threading.Lock()
+
+
+def loaded_interaction_writer() -> Optional[InteractionWriter]:
+    """Return the interaction writer if it has been started, without starting it."""
+    return _writer_instance
+
+
+def get_interaction_writer() -> InteractionWriter:
+    """Return the process-wide interaction writer, starting it on first use."""
+    global _writer_instance
+
+    with _writer_lock:
+        if _writer_instance is None:
+            _writer_instance = InteractionWriter.from_settings()
+            atexit.register(_writer_instance.stop)
+    return _writer_instance
@@ -1,9 +1,28 @@
 """API URL configuration."""
 from django.urls import path
-from .views import ImageSearchView, DatasetManagementView
+from .views import (
+    BatchImageSearchView,
+    DatasetManagementView,
+    ImageSearchView,
+    LatencyView,
+    LivenessView,
+    ReadinessView,
+    SearchStatsView,
+    SimilarImageSearchView,
+    TopImagesView,
+    TopQueriesView,
+)
 
 urlpatterns = [
     path('search/', ImageSearchView.as_view(), name='image-search'),
+    path('search/batch/', BatchImageSearchView.as_view(), name='image-search-batch'),
+    path('search/similar/', SimilarImageSearchView.as_view(), name='image-search-similar'),
+    path('search/stats/', SearchStatsView.as_view(), name='search-stats'),
+    path('analytics/queries/', TopQueriesView.as_view(), name='analytics-queries'),
+    path('analytics/images/', TopImagesView.as_view(), name='analytics-images'),
+    path('analytics/latency/', LatencyView.as_view(), name='analytics-latency'),
+    path('health/live/', LivenessView.as_view(), name='health-live'),
+    path('health/ready/', ReadinessView.as_view(), name='health-ready'),
     path('dataset/', DatasetManagementView.as_view(), name='dataset-management'),
     path('dataset/stream/', DatasetManagementView.as_view(
         http_method_names=['get']), name='dataset-stream'),
@@ -1,71 +1,346 @@
 import logging
-import torch
+import mimetypes
+import os
+import threading
 import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+import numpy as np
 from django.conf import settings
 from rest_framework.response import Response
 from rest_framework import status
-from .models import SearchInteraction, ImageInteraction
+from ..ml.dataset_handler.indexer import FileManifest, stream_hash
+from ..ml.dataset_handler.thumbnails import FORMATS, file_signature, normalize_format
+from ..ml.models.clip import loaded_clip_model
+from ..ml.models.store_handlers.lexical import reciprocal_rank_fusion
+from ..ml.models.store_handlers.registry import get_indexed_backend, get_store_dir, loaded_stores
+from ..metrics import REGISTRY, SEARCH_STAGE_DURATION
+from .cache import get_search_cache
+from .file_responses import IMMUTABLE_CACHE_CONTROL, file_response
+from .tracking import get_interaction_writer, interaction_record, loaded_interaction_writer
+from . import analytics
 from .serializers import (
+    AnalyticsQuerySerializer,
+    BatchImageSearchRequestSerializer,
+    BatchImageSearchResponseSerializer,
     ImageSearchRequestSerializer,
-    ImageSearchResponseSerializer
+    ImageSearchResponseSerializer,
+    SimilarImageSearchRequestSerializer,
 )
 
+if TYPE_CHECKING:
+    import torch
+
 logger = logging.getLogger(__name__)
 
+SEARCH_CACHE_EVENTS = REGISTRY.counter(
+    "search_cache_events_total",
+    "Search cache lookups by tier and outcome.",
+    ["tier", "result"])
+VECTOR_STORE_SIZE = REGISTRY.gauge(
+    "vector_store_vectors",
+    "Vectors in each loaded vector store.",
+    ["backend"])
+MODEL_DEVICE = REGISTRY.gauge(
+    "model_device_info",
+    "Device and inference backend of each loaded model (value is always 1).",
+    ["model", "device", "backend"])
+TRACKING_QUEUE_DEPTH = REGISTRY.gauge(
+    "interaction_tracking_queue_depth",
+    "Search interactions waiting to be written.",
+    multiprocess_mode="sum")
+
+
+def collect_service_metrics() -> None:
+    """Copy cache, store, model and tracking state into metrics before a snapshot."""
+    cache_stats = get_search_cache().stats()
+    for tier in ("embedding", "result"):
+        for result in ("hits", "misses"):
+            SEARCH_CACHE_EVENTS.set_total(
+                cache_stats[f"{tier}_{result}"], tier=tier, result=result)
+
+    VECTOR_STORE_SIZE.clear()
+    for backend, store in loaded_stores():
+        VECTOR_STORE_SIZE.set(len(store), backend=backend)
+
+    MODEL_DEVICE.clear()
+    model = loaded_clip_model()
+    if model is not None:
+        MODEL_DEVICE.set(1, model="clip", device=str(model.device),
+                         backend=model.backend.name)
+
+    writer = loaded_interaction_writer()
+    if writer is not None:
+        TRACKING_QUEUE_DEPTH.set(writer.queue_depth())
+
+
+REGISTRY.add_collector(collect_service_metrics)
+
+
+_file_manifest = None
+
+
+def get_file_manifest() -> Optional[FileManifest]:
+    """
+    Return the indexer's file manifest, if the dataset has been indexed.
+
+    One instance is kept per process and only replaced when the manifest
+    file itself is replaced (e.g. the store directory was wiped).
+    """
+    global _file_manifest
+
+    manifest_file = get_store_dir(get_indexed_backend()) / "file_manifest.sqlite3"
+    try:
+        identity = (str(manifest_file), manifest_file.stat().st_ino)
+    except FileNotFoundError:
+        return None
+    cached = _file_manifest
+    if cached is None or cached[0] != identity:
+        cached = _file_manifest = (identity, FileManifest(manifest_file, create=False))
+    return cached[1]
+
+
+_lexical_pool = None
+_lexical_pool_lock = threading.Lock()
+
+
+def get_lexical_pool() -> ThreadPoolExecutor:
+    """Return the threads that run lexical lookups while queries are encoded."""
+    global _lexical_pool
+
+    with _lexical_pool_lock:
+        if _lexical_pool is None:
+            _lexical_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="lexical-search")
+        return _lexical_pool
+
+
+def _reset_lexical_pool_in_child() -> None:
+    global _lexical_pool, _lexical_pool_lock
+
+    _lexical_pool, _lexical_pool_lock = None, threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_lexical_pool_in_child)
+
 
 class ImageSearchService:
     """Service class containing logic for image searches."""
 
-    def __init__(self, model_handler, vectorstore):
+    def __init__(self, model_handler, vectorstore, cache=None, tracker=None):
         self.model_handler = model_handler
         self.vectorstore = vectorstore
+        self.cache = cache or get_search_cache()
+        self.tracker = tracker
 
-    def validate_search_request(self, request_data):
+    def validate_search_request(self, request_data,
+                                serializer_class=ImageSearchRequestSerializer):
         """Validate search request data using serializer."""
-        serializer = ImageSearchRequestSerializer(data=request_data)
+        serializer = serializer_class(data=request_data)
         if not serializer.is_valid():
             return None, Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         return serializer.validated_data, None
 
     def preprocess_query(self, query: str) -> list:
-        """Enhance query with descriptive context."""
+        """
+        Enhance query with descriptive context from ``ML_SETTINGS["QUERY_TEMPLATES"]``.
+
+        Without templates the query is encoded as written.
+        """
         logger.info(f"Preprocessing query: {query}")
-        context_templates = [
-            f"a photograph of {query}",
-            f"a photo showing {query}",
-            f"a clear image of {query}",
-            f"a scene with {query}",
-        ]
+        templates = settings.ML_SETTINGS.get("QUERY_TEMPLATES") or ["{query}"]
+        context_templates = [template.format(query=query)
+                             for template in templates]
         logger.debug(f"Generated templates: {context_templates}")
         return context_templates
 
-    def track_search_interaction(self, request, query, results, processing_time):
-        """Track search interaction and results."""
+    def encode_query(self, query: str) -> "torch.Tensor":
+        """
+        Encode a query as the normalized mean of its template embeddings.
+
+        All templates go through the model as one batch.
+
+        Returns:
+            torch.Tensor: Query embedding of shape (1, embedding_dim)
+        """
+        return self.encode_queries([query])
+
+    def encode_queries(self, queries: List[str]) -> "torch.Tensor":
+        """
+        Encode many queries with a single forward pass over all their templates.
+
+        Returns:
+            torch.Tensor: Query embeddings of shape (n_queries, embedding_dim)
+        """
+        import torch
+
+        query_templates = [self.preprocess_query(query) for query in queries]
+        embeddings = self.model_handler.encode_texts(
+            [template for templates in query_templates for template in templates])
+        embeddings = embeddings.reshape(len(queries), len(query_templates[0]), -1)
+        return torch.nn.functional.normalize(embeddings.mean(dim=1), dim=-1)
+
+    def get_query_embeddings(self, queries: List[str]) -> "torch.Tensor":
+        """
+        Return embeddings for queries, encoding only cache misses.
+
+        Returns:
+            torch.Tensor: Query embeddings of shape (n_queries, embedding_dim)
+        """
+        import torch
+
+        model_name = settings.ML_SETTINGS.get("DEFAULT_MODEL", "clip")
+        backend = str(getattr(getattr(self.model_handler, "backend", None), "name", "eager"))
+        embeddings = {}
+        for query in dict.fromkeys(queries):
+            cached = self.cache.get_query_embedding(query, model_name, backend)
+            if cached is not None:
+                embeddings[query] = cached.reshape(1, -1)
+
+        missing = [query for query in dict.fromkeys(queries) if query not in embeddings]
+        if missing:
+            logger.debug(f"Encoding {len(missing)} queries for semantic search")
+            encoded = self.encode_queries(missing)
+            for i, query in enumerate(missing):
+                embeddings[query] = encoded[i:i + 1]
+                self.cache.set_query_embedding(query, model_name, embeddings[query], backend)
+        return torch.cat([embeddings[query] for query in queries])
+
+    def search_embeddings(self, query_embeddings: "torch.Tensor", top_k: int,
+                          search_params: Dict) -> List[List[Dict]]:
+        """
+        Return results per query, searching the store once for all cache misses.
+
+        Args:
+            query_embeddings: Tensor of shape (n_queries, embedding_dim)
+            top_k: Number of results per query
+            search_params: Index tuning parameters such as nprobe
+        """
+        store_version = self.vectorstore.version
+        results = [self.cache.get_results(query_embeddings[i:i + 1], top_k,
+                                          store_version, search_params)
+                   for i in range(len(query_embeddings))]
+        missing = [i for i, cached in enumerate(results) if cached is None]
+        if missing:
+            logger.info(f"Searching for similar images for {len(missing)} queries...")
+            found = self.vectorstore.search_many(
+                query_embeddings[missing], top_k=top_k, threshold=0.0, **search_params)
+            self.add_image_versions(found)
+            for i, query_results in zip(missing, found):
+                results[i] = query_results
+                self.cache.set_results(query_embeddings[i:i + 1], top_k, store_version,
+                                       query_results, search_params)
+        return results
+
+    def start_lexical_search(self, queries: List[str], top_k: int,
+                             validated_data) -> Optional[Future]:
+        """
+        Start BM25 lookups for queries on a background thread, so they run
+        while the queries are encoded and searched.
+
+        Returns:
+            A future resolving to one lexical result list per query, or None
+            when hybrid search is off for this request.
+        """
+        hybrid = validated_data.get("hybrid")
+        if hybrid is None:
+            hybrid = settings.ML_SETTINGS.get("HYBRID_SEARCH", {}).get("ENABLED", False)
+        if not hybrid:
+            return None
+        return get_lexical_pool().submit(
+            self.lexical_search, queries, top_k, self._search_params(validated_data).get("filters"))
+
+    def lexical_search(self, queries: List[str], top_k: int,
+                       filters: Optional[Dict] = None) -> List[List[Dict]]:
+        """Return the store's BM25 matches for each query."""
+        with SEARCH_STAGE_DURATION.time(stage="lexical_search"):
+            return self.vectorstore.lexical_search(queries, top_k=top_k, filters=filters)
+
+    def fuse_results(self, query_embeddings: "torch.Tensor", results: List[List[Dict]],
+                     lexical_future: Future, top_k: int) -> List[List[Dict]]:
+        """
+        Merge each query's vector results with its lexical matches by reciprocal rank fusion.
+
+        Lexical matches the vector search did not return get their similarity
+        from their stored vector, so every result reports a cosine similarity.
+        If the lexical search failed the vector results are returned as they are.
+        """
         try:
-            interaction = SearchInteraction.objects.create(
-                user=request.user if request.user.is_authenticated else None,
-                query=query,
-                results_count=len(results),
-                top_similarity=max([r['similarity']
-                                   for r in results]) if results else 0.0,
-                model_used=settings.ML_SETTINGS["DEFAULT_MODEL"],
-                processing_time=processing_time,
-                client_ip=request.META.get('REMOTE_ADDR')
-            )
+            lexical_results = lexical_future.result()
+        except Exception as e:
+            logger.warning(f"Lexical search failed; using vector results only: {str(e)}")
+            return results
+
+        rrf_k = settings.ML_SETTINGS.get("HYBRID_SEARCH", {}).get("RRF_K", 60)
+        fused, added = [], []
+        with SEARCH_STAGE_DURATION.time(stage="fusion"):
+            for i, semantic in enumerate(results):
+                found = {result["path"] for result in semantic}
+                extra = [hit for hit in lexical_results[i] if hit["path"] not in found]
+                similarities = self._stored_similarities(query_embeddings[i], extra)
+                lexical = [{"path": hit["path"], "similarity": similarities[hit["path"]]}
+                           for hit in extra if hit["path"] in similarities]
+                # Order the lexical list by BM25 rank, reusing the vector result dicts.
+                by_path = {result["path"]: result for result in semantic + lexical}
+                ranking = [by_path[hit["path"]] for hit in lexical_results[i]
+                           if hit["path"] in by_path]
+                fused.append(reciprocal_rank_fusion([semantic, ranking], rrf_k)[:top_k])
+                added.extend(lexical)
+        if added:
+            self.add_image_versions([added])
+        return fused
 
-            # Track individual image interactions
-            for rank, result in enumerate(results):
-                ImageInteraction.objects.create(
-                    search=interaction,
-                    image_path=result['path'],
-                    similarity_score=result['similarity'],
-                    rank_position=rank + 1
-                )
+    def _stored_similarities(self, query_embedding, hits: List[Dict]) -> Dict[str, float]:
+        """Cosine similarity between a query and the stored vectors of lexical hits."""
+        if not hits:
+            return {}
+        try:
+            vectors = self.vectorstore.get_vectors([hit["id"] for hit in hits])
+        except (KeyError, RuntimeError) as e:
+            logger.warning(f"Skipping lexical matches without stored vectors: {str(e)}")
+            return {}
+        query = np.asarray(query_embedding, dtype=np.float32).reshape(-1)
+        return {hit["path"]: float(similarity) for hit, similarity in zip(hits, vectors @ query)}
 
-            return interaction
+    def add_image_versions(self, results_per_query: List[List[Dict]]) -> None:
+        """Attach each result's indexed content hash so clients can use immutable URLs."""
+        try:
+            manifest = get_file_manifest()
+            if manifest is None:
+                return
+            with SEARCH_STAGE_DURATION.time(stage="version_lookup"):
+                hashes = manifest.content_hashes(
+                    {result['path'] for results in results_per_query for result in results})
+        except Exception as e:
+            logger.warning(f"Could not look up image versions: {str(e)}")
+            return
+        for results in results_per_query:
+            for result in results:
+                if result['path'] in hashes:
+                    result['version'] = hashes[result['path']]
+
+    def track_search_interaction(self, request, query, results, processing_time):
+        """Queue a search interaction and its results for the background writer."""
+        self.track_batch_interactions(request, [query], [results], processing_time)
+
+    def track_batch_interactions(self, request, queries, results_per_query, processing_time):
+        """
+        Queue a batch of search interactions for the background writer.
+
+        The batch processing time is split evenly across its queries.
+        """
+        try:
+            user_id = request.user.pk if request.user.is_authenticated else None
+            model_used = settings.ML_SETTINGS.get("DEFAULT_MODEL", "clip")
+            client_ip = request.META.get('REMOTE_ADDR')
+            tracker = self.tracker or get_interaction_writer()
+            for query, results in zip(queries, results_per_query):
+                tracker.submit(interaction_record(
+                    user_id, query, results, model_used,
+                    processing_time / len(queries), client_ip))
         except Exception as e:
             logger.error(f"Failed to track interaction: {str(e)}")
-            return None
 
     def search_images(self, request) -> Response:
         """
@@ -82,8 +357,9 @@ class ImageSearchService:
             start_time = time.time()
 
             logger.debug("Validating search request data")
-            validated_data, error_response = self.validate_search_request(
-                request.data)
+            with SEARCH_STAGE_DURATION.time(stage="validation"):
+                validated_data, error_response = self.validate_search_request(
+                    request.data)
             if error_response:
                 logger.warning("Search request validation failed")
                 return error_response
@@ -92,36 +368,32 @@ class ImageSearchService:
             top_k = validated_data.get('top_k', settings.ML_SETTINGS["TOP_K"])
             logger.info(f"Processing search for query: '{query}' with top_k={top_k}")
 
-            logger.debug("Generating query templates for semantic search")
-            query_templates = self.preprocess_query(query)
-            all_embeddings = []
-            for template in query_templates:
-                logger.debug(f"Encoding template: {template}")
-                embedding = self.model_handler.encode_text(template)
-                all_embeddings.append(embedding)
-
-            logger.debug("Computing averaged query embedding")
-            query_embedding = torch.mean(torch.stack(all_embeddings), dim=0)
-            query_embedding = query_embedding / torch.norm(query_embedding)
-
-            logger.info("Searching for similar images...")
-            results = self.vectorstore.search(
-                query_embedding, top_k=top_k, threshold=0.0)
+            lexical = self.start_lexical_search([query], top_k, validated_data)
+            with SEARCH_STAGE_DURATION.time(stage="text_encoding"):
+                query_embedding = self.get_query_embeddings([query])
+            results = self.search_embeddings(
+                query_embedding, top_k, self._search_params(validated_data))
+            if lexical is not None:
+                results = self.fuse_results(query_embedding, results, lexical, top_k)
+            results = results[0]
             logger.info(f"Found {len(results)} matching images")
             logger.debug(f"Search results: {results}")
 
             processing_time = time.time() - start_time
             logger.info(f"Search completed in {processing_time:.2f} seconds")
 
-            logger.debug("Tracking search interaction in database")
-            self.track_search_interaction(
-                request, query, results, processing_time)
+            logger.debug("Queueing search interaction for tracking")
+            with SEARCH_STAGE_DURATION.time(stage="tracking"):
+                self.track_search_interaction(
+                    request, query, results, processing_time)
 
             logger.debug("Serializing response data")
-            response_serializer = ImageSearchResponseSerializer(
-                data={'results': results})
-            response_serializer.is_valid(raise_exception=True)
-            return Response(response_serializer.data)
+            with SEARCH_STAGE_DURATION.time(stage="serialization"):
+                response_serializer = ImageSearchResponseSerializer(
+                    data={'results': results})
+                response_serializer.is_valid(raise_exception=True)
+                data = response_serializer.data
+            return Response(data)
 
         except Exception as e:
             logger.error(f"Search failed: {str(e)}", exc_info=True)
@@ -130,6 +402,321 @@ class ImageSearchService:
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+    def search_many(self, request) -> Response:
+        """
+        Handle a batch of text queries with one encoder pass and one index search.
+
+        Args:
+            request: HTTP request object containing a list of queries
+
+        Returns:
+            Response: JSON response with one result list per query, in order
+        """
+        try:
+            start_time = time.time()
+            with SEARCH_STAGE_DURATION.time(stage="validation"):
+                validated_data, error_response = self.validate_search_request(
+                    request.data, BatchImageSearchRequestSerializer)
+            if error_response:
+                logger.warning("Batch search request validation failed")
+                return error_response
+
+            queries = validated_data['queries']
+            top_k = validated_data.get('top_k', settings.ML_SETTINGS["TOP_K"])
+            logger.info(f"Processing batch search for {len(queries)} queries with top_k={top_k}")
+
+            lexical = self.start_lexical_search(queries, top_k, validated_data)
+            with SEARCH_STAGE_DURATION.time(stage="text_encoding"):
+                query_embeddings = self.get_query_embeddings(queries)
+            results = self.search_embeddings(
+                query_embeddings, top_k, self._search_params(validated_data))
+            if lexical is not None:
+                results = self.fuse_results(query_embeddings, results, lexical, top_k)
+
+            processing_time = time.time() - start_time
+            logger.info(f"Batch search completed in {processing_time:.2f} seconds")
+            with SEARCH_STAGE_DURATION.time(stage="tracking"):
+                self.track_batch_interactions(request, queries, results, processing_time)
+
+            with SEARCH_STAGE_DURATION.time(stage="serialization"):
+                response_serializer = BatchImageSearchResponseSerializer(data={'results': [
+                    {'query': query, 'results': query_results}
+                    for query, query_results in zip(queries, results)
+                ]})
+                response_serializer.is_valid(raise_exception=True)
+                data = response_serializer.data
+            return Response(data)
+
+        except Exception as e:
+            logger.error(f"Batch search failed: {str(e)}", exc_info=True)
+            return Response(
+                {"error": "Search failed"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+    def get_indexed_embedding(self, validated_data) -> Optional[Tuple["torch.Tensor", str]]:
+        """
+        Return the stored vector and path of an indexed image given by id or path.
+
+        The vector is read back from the store, so no model call is made; only
+        stores that cannot return vectors fall back to encoding the file.
+
+        Returns:
+            (embedding of shape (1, embedding_dim), path), or None if the image
+            is not indexed.
+        """
+        import torch
+
+        if 'id' in validated_data:
+            idx = validated_data['id']
+            path = self.vectorstore.get_path(idx)
+        else:
+            path = validated_data['path']
+            idx = self.vectorstore.find_ids([path])[0]
+        if idx is None or path is None:
+            return None
+
+        try:
+            with SEARCH_STAGE_DURATION.time(stage="vector_lookup"):
+                vector = self.vectorstore.get_vectors([idx])
+        except KeyError:
+            return None
+        except RuntimeError as e:
+            logger.warning(f"Could not read stored vector {idx}, encoding {path}: {str(e)}")
+            with SEARCH_STAGE_DURATION.time(stage="image_encoding"):
+                return self.model_handler.encode_image([path]).reshape(1, -1).cpu(), path
+        return torch.from_numpy(np.asarray(vector, dtype=np.float32)).reshape(1, -1), path
+
+    def encode_uploaded_image(self, upload) -> Tuple["torch.Tensor", str]:
+        """
+        Encode an uploaded query image once.
+
+        Returns:
+            (embedding of shape (1, embedding_dim), content hash of the upload)
+        """
+        from PIL import Image
+
+        upload.seek(0)
+        digest = stream_hash(upload)
+        upload.seek(0)
+        with Image.open(upload) as image:
+            image = image.convert("RGB")
+        with SEARCH_STAGE_DURATION.time(stage="image_encoding"):
+            embedding = self.model_handler.encode_image([image])
+        return embedding.reshape(1, -1).cpu(), digest
+
+    def search_similar(self, request) -> Response:
+        """
+        Find images similar to a query image, leaving the query image out.
+
+        Indexed images (by id or path) reuse their stored vector; uploads are
+        encoded once. Both then go through the same cached top-k search.
+
+        Args:
+            request: HTTP request with an image id, path or uploaded image
+
+        Returns:
+            Response: JSON response with the matching images, or 404 if the
+            given id or path is not indexed
+        """
+        import torch
+
+        try:
+            start_time = time.time()
+            with SEARCH_STAGE_DURATION.time(stage="validation"):
+                validated_data, error_response = self.validate_search_request(
+                    request.data, SimilarImageSearchRequestSerializer)
+            if error_response:
+                logger.warning("Similar image search request validation failed")
+                return error_response
+
+            top_k = validated_data.get('top_k', settings.ML_SETTINGS["TOP_K"])
+            exclude_path = exclude_version = None
+            if 'image' in validated_data:
+                query_embedding, exclude_version = self.encode_uploaded_image(
+                    validated_data['image'])
+            else:
+                indexed = self.get_indexed_embedding(validated_data)
+                if indexed is None:
+                    return Response({"error": "Image is not indexed"},
+                                    status=status.HTTP_404_NOT_FOUND)
+                query_embedding, exclude_path = indexed
+
+            query_embedding = torch.nn.functional.normalize(query_embedding, dim=-1)
+            # One extra result makes room for the query image itself.
+            results = self.search_embeddings(
+                query_embedding, top_k + 1, self._search_params(validated_data))[0]
+            results = [result for result in results
+                       if result['path'] != exclude_path
+                       and (exclude_version is None
+                            or result.get('version') != exclude_version)][:top_k]
+            logger.info(f"Similar image search found {len(results)} images in "
+                        f"{time.time() - start_time:.2f} seconds")
+
+            with SEARCH_STAGE_DURATION.time(stage="serialization"):
+                response_serializer = ImageSearchResponseSerializer(data={'results': results})
+                response_serializer.is_valid(raise_exception=True)
+                data = response_serializer.data
+            return Response(data)
+
+        except Exception as e:
+            logger.error(f"Similar image search failed: {str(e)}", exc_info=True)
+            return Response(
+                {"error": "Search failed"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+    @staticmethod
+    def _search_params(validated_data) -> Dict:
+        """Pick the index tuning parameters and attribute filters given in the request."""
+        params = {name: validated_data[name]
+                  for name in ("nprobe", "ef_search") if name in validated_data}
+        if validated_data.get("filters"):
+            params["filters"] = dict(validated_data["filters"])
+        return params
+
+
+class ImageFileService:
+    """
+    Service class containing logic for serving dataset images and their variants.
+    """
+
+    def __init__(self, thumbnail_cache):
+        self.thumbnail_cache = thumbnail_cache
+        self.data_path = Path(settings.DATASET_SETTINGS["DATA_PATH"])
+
+    def resolve(self, filename: str) -> Path:
+        """Return the dataset file for a URL filename, rejecting anything outside DATA_PATH."""
+        path = self.data_path / filename
+        if path.parent != self.data_path or not path.is_file():
+            raise FileNotFoundError(filename)
+        return path
+
+    def file_version(self, path: Path):
+        """
+        Return the content hash recorded for a file when it was indexed.
+
+        Files the index has not seen fall back to a size/mtime signature, so
+        nothing is read or hashed on the request path.
+
+        Returns:
+            Tuple of (hash, whether it is a content hash)
+        """
+        manifest = get_file_manifest()
+        record = manifest.get(str(path)) if manifest is not None else None
+        if record is not None:
+            return record.content_hash, True
+        return file_signature(path), False
+
+    @staticmethod
+    def content_type(path: Path) -> str:
+        """Guess a file's content type from its extension."""
+        return mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+
+    def parse_variant(self, query_params) -> Optional[Dict]:
+        """
+        Read the ``w`` and ``fmt`` query parameters.
+
+        Returns:
+            None when the original is requested, else a dict with ``width`` and ``fmt``.
+
+        Raises:
+            ValueError: If the width or format is not allowed.
+        """
+        width, fmt = query_params.get("w"), query_params.get("fmt")
+        if width is None and fmt is None:
+            return None
+        try:
+            width = int(width) if width is not None else None
+        except ValueError:
+            raise ValueError("Width must be an integer")
+        fmt = normalize_format(fmt or "webp")
+        error = self.thumbnail_cache.validate(width, fmt)
+        if error:
+            raise ValueError(error)
+        return {"width": width, "fmt": fmt}
+
+    def serve(self, request, path: Path, variant: Optional[Dict] = None):
+        """
+        Serve an image or one of its variants with HTTP caching support.
+
+        The ETag is the indexed content hash (plus the variant), so it is strong
+        and costs no hashing; unindexed files get a weak ETag from their
+        signature. Requests whose ``v`` parameter matches the content hash are
+        content-addressed and marked immutable.
+
+        Args:
+            request: HTTP request object
+            path: Original image file
+            variant: ``width`` and ``fmt`` of a resized variant, or None
+
+        Returns:
+            Response: 200, 206, 304 or 416 response for the file
+        """
+        version, is_content_hash = self.file_version(path)
+        if variant is None:
+            tag, content_type = version, self.content_type(path)
+            get_path = lambda: path
+        else:
+            width, fmt = variant["width"], variant["fmt"]
+            tag, content_type = f"{version}-{width or 'full'}-{fmt}", FORMATS[fmt][1]
+            get_path = lambda: self.thumbnail_cache.get(path, version, width, fmt)
+
+        if is_content_hash and request.GET.get("v") == version:
+            cache_control = IMMUTABLE_CACHE_CONTROL
+        else:
+            max_age = getattr(settings, "IMAGE_SERVING", {}).get("MAX_AGE", 3600)
+            cache_control = f"public, max-age={max_age}"
+        etag = f'"{tag}"' if is_content_hash else f'W/"{tag}"'
+        return file_response(request, get_path, content_type, etag,
+                             path.stat().st_mtime, cache_control)
+
+
+class AnalyticsService:
+    """Service class serving aggregates from the analytics rollup tables."""
+
+    def validate_query(self, query_params):
+        """Validate the window and granularity given as query parameters."""
+        serializer = AnalyticsQuerySerializer(data=query_params)
+        if not serializer.is_valid():
+            return None, Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        return serializer.validated_data, None
+
+    def _respond(self, request, name: str, build) -> Response:
+        try:
+            params, error_response = self.validate_query(request.query_params)
+            if error_response:
+                return error_response
+            window = {"granularity": params['granularity'],
+                      "since": params['since'], "until": params['until']}
+            return Response({**window, **build(params)})
+        except Exception as e:
+            logger.error(f"Failed to load {name} analytics: {str(e)}", exc_info=True)
+            return Response(
+                {"error": "Failed to load analytics"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+    def top_queries(self, request) -> Response:
+        """Return the most searched queries in the requested window."""
+        return self._respond(request, "query", lambda params: {
+            "results": analytics.top_queries(
+                params['granularity'], params['since'], params['until'], params['limit']),
+        })
+
+    def top_images(self, request) -> Response:
+        """Return the images most often returned in the requested window."""
+        return self._respond(request, "image", lambda params: {
+            "results": analytics.top_images(
+                params['granularity'], params['since'], params['until'], params['limit']),
+        })
+
+    def latency(self, request) -> Response:
+        """Return processing time percentiles per model in the requested window."""
+        return self._respond(request, "latency", lambda params: analytics.latency_percentiles(
+            params['granularity'], params['since'], params['until'],
+            model_used=params.get('model_used')))
+
 
 class DatasetService:
     """
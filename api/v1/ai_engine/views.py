@@ -1,22 +1,52 @@
 import logging
-import os
+from typing import Optional
 from django.conf import settings
-from django.http import FileResponse, StreamingHttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 from rest_framework import status
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
 
-from ..ml.dataset_handler.dataset import DatasetManager
-from ..ml.models.store_handlers.numpy_store import EmbeddingStore
-from ..ml.models.clip import initialize_clip_model
-from ..ml.models.store_handlers.faiss_store import FaissVectorStore
-from .utils import ImageSearchService, DatasetService
+from ..metrics import get_metrics_exporter
+from ..ml.dataset_handler.thumbnails import get_thumbnail_cache
+from ..ml.models.batching import get_text_encoder, loaded_text_batcher
+from ..ml.models.store_handlers.registry import get_vector_store
+from .cache import get_search_cache
+from .startup import FAILED, get_warmup_manager
+from .tracking import get_interaction_writer
+from .utils import AnalyticsService, ImageSearchService, ImageFileService, DatasetService
 
 logger = logging.getLogger(__name__)
 
+SEARCH_FILTERS_SCHEMA = openapi.Schema(
+    type=openapi.TYPE_OBJECT,
+    description='Only return images matching every given predicate',
+    properties={
+        'folders': openapi.Schema(
+            type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_STRING),
+            description='Dataset subfolders (including everything below them)'),
+        'file_types': openapi.Schema(
+            type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_STRING),
+            description='File extensions, e.g. jpg or png'),
+        'labels': openapi.Schema(
+            type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_STRING),
+            description='Image labels, e.g. ai or human'),
+        'modified_after': openapi.Schema(
+            type=openapi.TYPE_STRING, format=openapi.FORMAT_DATETIME,
+            description='Only images modified at or after this time'),
+        'modified_before': openapi.Schema(
+            type=openapi.TYPE_STRING, format=openapi.FORMAT_DATETIME,
+            description='Only images modified before this time'),
+    }
+)
+HYBRID_SCHEMA = openapi.Schema(
+    type=openapi.TYPE_BOOLEAN,
+    description='Fuse exact file name and caption matches (BM25) into the semantic '
+                'results (default: HYBRID_SEARCH setting)')
+
 
 class ImageSearchView(APIView):
     """
@@ -28,34 +58,45 @@ class ImageSearchView(APIView):
     permission_classes = [AllowAny]
 
     def __init__(self, *args, **kwargs):
-        """Initialize the ImageSearchView with required services."""
+        """Initialize the ImageSearchView; the search service is created once warm-up allows."""
         super().__init__(*args, **kwargs)
-        self.search_service = self._initialize_search_service()
+        self.search_service = None
+
+    def _wait_for_warmup(self) -> Optional[Response]:
+        """
+        Wait for the background warm-up, then create the search service.
+
+        Returns:
+            None when the service is ready, otherwise a 503 response with
+            Retry-After and the warm-up status.
+        """
+        manager = get_warmup_manager()
+        if not manager.wait(settings.STARTUP.get('SEARCH_WAIT_SECONDS', 10.0)):
+            response = Response(
+                {"error": "Service is warming up. Please try again shortly.",
+                 "warmup": manager.status()},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE)
+            response["Retry-After"] = str(settings.STARTUP.get('RETRY_AFTER', 5))
+            return response
+        if self.search_service is None:
+            self.search_service = self._initialize_search_service()
+        return None
 
     def _initialize_search_service(self) -> ImageSearchService:
         """
-        Initialize the search service with appropriate vector store.
-        
+        Initialize the search service with the shared vector store.
+
+        The store comes from the process-wide registry, so it is loaded from
+        disk once and reused across requests. Query text goes through the
+        shared micro-batcher, which coalesces concurrent requests' encodes.
+
         Returns:
             ImageSearchService: Configured service for handling image searches
         """
-        model_handler = initialize_clip_model() 
-        
-        if settings.ML_SETTINGS.get("VECTORSTORE", "numpy") == "faiss":
-            vectorstore = FaissVectorStore(
-                dimension=settings.ML_SETTINGS['MODELS']['clip']['embedding_dim'],
-                store_dir=settings.BASE_DIR / "vectorstore" / "faiss_store",
-                model_handler=model_handler,
-            )
-            logger.info("Using FAISS vector store for similarity search")
-        else:
-            vectorstore = EmbeddingStore(
-                settings.BASE_DIR / "vectorstore" / "embeddings")
-            logger.info("Using Numpy-based embedding store for similarity search")
-
+        model_handler = get_text_encoder()
+        vectorstore = get_vector_store()
         return ImageSearchService(model_handler, vectorstore)
 
-
     @swagger_auto_schema(
         tags=['search'],
         operation_summary="Search images by text description",
@@ -72,6 +113,16 @@ class ImageSearchView(APIView):
                     type=openapi.TYPE_INTEGER,
                     description='Number of results to return (default: 5)'
                 ),
+                'nprobe': openapi.Schema(
+                    type=openapi.TYPE_INTEGER,
+                    description='Inverted lists to visit (IVF FAISS indexes only)'
+                ),
+                'ef_search': openapi.Schema(
+                    type=openapi.TYPE_INTEGER,
+                    description='HNSW candidate list size (HNSW FAISS indexes only)'
+                ),
+                'filters': SEARCH_FILTERS_SCHEMA,
+                'hybrid': HYBRID_SCHEMA,
             }
         ),
         responses={
@@ -94,7 +145,8 @@ class ImageSearchView(APIView):
                 )
             ),
             400: 'Invalid request parameters',
-            500: 'Server error during search'
+            500: 'Server error during search',
+            503: 'Service is still warming up'
         }
     )
     def post(self, request):
@@ -103,9 +155,321 @@ class ImageSearchView(APIView):
         
         Accepts a text query and returns matching images based on semantic similarity.
         """
+        unavailable = self._wait_for_warmup()
+        if unavailable is not None:
+            return unavailable
         return self.search_service.search_images(request)
 
 
+class BatchImageSearchView(ImageSearchView):
+    """
+    API endpoint for running many text queries in one request.
+
+    All queries are encoded in one model pass and searched with one index call.
+    """
+
+    @swagger_auto_schema(
+        tags=['search'],
+        operation_summary="Search images for a batch of text descriptions",
+        operation_description="Run up to MAX_BATCH_QUERIES text queries in one request; "
+                              "results are returned per query in request order",
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            required=['queries'],
+            properties={
+                'queries': openapi.Schema(
+                    type=openapi.TYPE_ARRAY,
+                    items=openapi.Schema(type=openapi.TYPE_STRING),
+                    description='Text descriptions to search for'
+                ),
+                'top_k': openapi.Schema(
+                    type=openapi.TYPE_INTEGER,
+                    description='Number of results to return per query (default: 5)'
+                ),
+                'nprobe': openapi.Schema(
+                    type=openapi.TYPE_INTEGER,
+                    description='Inverted lists to visit (IVF FAISS indexes only)'
+                ),
+                'ef_search': openapi.Schema(
+                    type=openapi.TYPE_INTEGER,
+                    description='HNSW candidate list size (HNSW FAISS indexes only)'
+                ),
+                'filters': SEARCH_FILTERS_SCHEMA,
+                'hybrid': HYBRID_SCHEMA,
+            }
+        ),
+        responses={
+            200: openapi.Response(
+                description='Search results per query',
+                schema=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        'results': openapi.Schema(
+                            type=openapi.TYPE_ARRAY,
+                            items=openapi.Schema(
+                                type=openapi.TYPE_OBJECT,
+                                properties={
+                                    'query': openapi.Schema(type=openapi.TYPE_STRING),
+                                    'results': openapi.Schema(
+                                        type=openapi.TYPE_ARRAY,
+                                        items=openapi.Schema(
+                                            type=openapi.TYPE_OBJECT,
+                                            properties={
+                                                'path': openapi.Schema(type=openapi.TYPE_STRING),
+                                                'similarity': openapi.Schema(type=openapi.TYPE_NUMBER)
+                                            }
+                                        )
+                                    )
+                                }
+                            )
+                        )
+                    }
+                )
+            ),
+            400: 'Invalid request parameters',
+            500: 'Server error during search',
+            503: 'Service is still warming up'
+        }
+    )
+    def post(self, request):
+        """
+        Search for images for each query in a batch.
+        """
+        unavailable = self._wait_for_warmup()
+        if unavailable is not None:
+            return unavailable
+        return self.search_service.search_many(request)
+
+
+class SimilarImageSearchView(ImageSearchView):
+    """
+    API endpoint for query-by-example searches.
+
+    The query is an indexed image, given by id or path, whose stored vector is
+    reused without a model call, or an uploaded image, which is encoded once.
+    """
+    parser_classes = [MultiPartParser, FormParser, JSONParser]
+
+    @swagger_auto_schema(
+        tags=['search'],
+        operation_summary="Search images similar to an example image",
+        operation_description="Give exactly one of `id` or `path` (an indexed image) or "
+                              "`image` (an upload). The query image is left out of the "
+                              "results. JSON bodies are accepted for `id` and `path`.",
+        consumes=['multipart/form-data', 'application/x-www-form-urlencoded'],
+        manual_parameters=[
+            openapi.Parameter('id', openapi.IN_FORM, type=openapi.TYPE_INTEGER,
+                              description='Vector id of an indexed image'),
+            openapi.Parameter('path', openapi.IN_FORM, type=openapi.TYPE_STRING,
+                              description='Path of an indexed image, as returned in results'),
+            openapi.Parameter('image', openapi.IN_FORM, type=openapi.TYPE_FILE,
+                              description='Query image to upload'),
+            openapi.Parameter('top_k', openapi.IN_FORM, type=openapi.TYPE_INTEGER,
+                              description='Number of results to return (default: 5)'),
+            openapi.Parameter('nprobe', openapi.IN_FORM, type=openapi.TYPE_INTEGER,
+                              description='Inverted lists to visit (IVF FAISS indexes only)'),
+            openapi.Parameter('ef_search', openapi.IN_FORM, type=openapi.TYPE_INTEGER,
+                              description='HNSW candidate list size (HNSW FAISS indexes only)'),
+            openapi.Parameter('filters', openapi.IN_FORM, type=openapi.TYPE_STRING,
+                              description='Attribute filters as a JSON object '
+                                          '(see the filters of /search/)'),
+        ],
+        responses={
+            200: openapi.Response(
+                description='Similar images',
+                schema=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        'results': openapi.Schema(
+                            type=openapi.TYPE_ARRAY,
+                            items=openapi.Schema(
+                                type=openapi.TYPE_OBJECT,
+                                properties={
+                                    'path': openapi.Schema(type=openapi.TYPE_STRING),
+                                    'similarity': openapi.Schema(type=openapi.TYPE_NUMBER)
+                                }
+                            )
+                        )
+                    }
+                )
+            ),
+            400: 'Invalid request parameters',
+            404: 'The given id or path is not indexed',
+            500: 'Server error during search',
+            503: 'Service is still warming up'
+        }
+    )
+    def post(self, request):
+        """
+        Search for images similar to an indexed or uploaded image.
+        """
+        unavailable = self._wait_for_warmup()
+        if unavailable is not None:
+            return unavailable
+        return self.search_service.search_similar(request)
+
+
+class SearchStatsView(APIView):
+    """
+    API endpoint exposing search cache and tracking counters for this worker process.
+    """
+    permission_classes = [AllowAny]
+
+    @swagger_auto_schema(
+        tags=['search'],
+        operation_summary="Search cache statistics",
+        operation_description="Hit/miss counters and hit rates for the query embedding and result "
+                              "caches, the interaction tracking queue depth and text encode "
+                              "batching counters",
+    )
+    def get(self, request):
+        """Return search cache hit/miss counters, interaction writer and text batching stats."""
+        batcher = loaded_text_batcher()
+        return Response({
+            "cache": get_search_cache().stats(),
+            "tracking": get_interaction_writer().stats(),
+            "text_batching": batcher.stats() if batcher is not None else None,
+        })
+
+
+ANALYTICS_PARAMETERS = [
+    openapi.Parameter('granularity', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                      enum=['minute', 'hour', 'day'],
+                      description='Rollup bucket size (default: hour)'),
+    openapi.Parameter('since', openapi.IN_QUERY, type=openapi.TYPE_STRING, format='date-time',
+                      description='Window start (default: 1 hour, 1 day or 30 days '
+                                  'before `until` for minute, hour or day)'),
+    openapi.Parameter('until', openapi.IN_QUERY, type=openapi.TYPE_STRING, format='date-time',
+                      description='Window end (default: now)'),
+]
+ANALYTICS_LIMIT_PARAMETER = openapi.Parameter(
+    'limit', openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+    description='Number of rows to return (default: 20)')
+
+
+class AnalyticsView(APIView):
+    """
+    Base class for read-only analytics endpoints.
+
+    All aggregates are read from rollup tables, so response time depends on
+    the window and granularity, not on the number of stored interactions.
+    """
+    permission_classes = [AllowAny]
+
+    def __init__(self, *args, **kwargs):
+        """Initialize the view with the analytics service."""
+        super().__init__(*args, **kwargs)
+        self.analytics_service = AnalyticsService()
+
+
+class TopQueriesView(AnalyticsView):
+    """API endpoint listing the most searched queries."""
+
+    @swagger_auto_schema(
+        tags=['analytics'],
+        operation_summary="Top search queries",
+        operation_description="Most searched queries (case and whitespace folded) in a time "
+                              "window, with how many of those searches returned no results",
+        manual_parameters=ANALYTICS_PARAMETERS + [ANALYTICS_LIMIT_PARAMETER],
+    )
+    def get(self, request):
+        """Return the most searched queries."""
+        return self.analytics_service.top_queries(request)
+
+
+class TopImagesView(AnalyticsView):
+    """API endpoint listing the images returned most often."""
+
+    @swagger_auto_schema(
+        tags=['analytics'],
+        operation_summary="Most returned images",
+        operation_description="Images that appeared most often in search results in a time "
+                              "window, with their mean rank and similarity",
+        manual_parameters=ANALYTICS_PARAMETERS + [ANALYTICS_LIMIT_PARAMETER],
+    )
+    def get(self, request):
+        """Return the images returned most often."""
+        return self.analytics_service.top_images(request)
+
+
+class LatencyView(AnalyticsView):
+    """API endpoint reporting search processing time percentiles."""
+
+    @swagger_auto_schema(
+        tags=['analytics'],
+        operation_summary="Search latency percentiles",
+        operation_description="p50/p90/p95/p99 processing time per model over a time window "
+                              "and per bucket",
+        manual_parameters=ANALYTICS_PARAMETERS + [
+            openapi.Parameter('model_used', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                              description='Only report this model'),
+        ],
+    )
+    def get(self, request):
+        """Return processing time percentiles."""
+        return self.analytics_service.latency(request)
+
+
+class LivenessView(APIView):
+    """
+    Liveness probe: answers 200 as long as the worker can serve HTTP, unless
+    warm-up failed after all its retries; then 503 so the worker is restarted.
+    """
+    permission_classes = [AllowAny]
+
+    @swagger_auto_schema(
+        tags=['health'],
+        operation_summary="Liveness probe",
+        operation_description="200 while the process is serving requests, 503 once warm-up "
+                              "has failed for good; includes the warm-up state",
+    )
+    def get(self, request):
+        """Return the worker's warm-up state, with 503 if warm-up failed."""
+        warmup = get_warmup_manager().status()
+        if warmup["state"] == FAILED:
+            return Response({"status": "failed", "warmup": warmup},
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return Response({"status": "alive", "warmup": warmup})
+
+
+class ReadinessView(APIView):
+    """
+    Readiness probe: 200 once the model and vector store are warm, 503 while
+    warming up or after a failed warm-up.
+    """
+    permission_classes = [AllowAny]
+
+    @swagger_auto_schema(
+        tags=['health'],
+        operation_summary="Readiness probe",
+        operation_description="200 when searches can be served, 503 with per-stage progress "
+                              "while the model and vector store are loading",
+    )
+    def get(self, request):
+        """Return the warm-up status with 200 if ready, else 503."""
+        warmup = get_warmup_manager().status()
+        return Response(
+            {"status": "ready" if warmup["ready"] else "unavailable", "warmup": warmup},
+            status=status.HTTP_200_OK if warmup["ready"] else status.HTTP_503_SERVICE_UNAVAILABLE)
+
+
+class MetricsView(APIView):
+    """
+    Prometheus scrape endpoint.
+
+    Returns request latency histograms, search stage timers, cache counters,
+    index size and model device, merged across all worker processes that
+    share ``METRICS['DIR']``.
+    """
+    permission_classes = [AllowAny]
+    swagger_schema = None
+
+    def get(self, request):
+        """Return all metrics in the Prometheus text exposition format."""
+        return HttpResponse(get_metrics_exporter().render(),
+                            content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 class DatasetManagementView(APIView):
     """
     API endpoint for managing the image dataset.
@@ -118,6 +482,8 @@ class DatasetManagementView(APIView):
     def __init__(self, *args, **kwargs):
         """Initialize the DatasetManagementView with required services."""
         super().__init__(*args, **kwargs)
+        from ..ml.dataset_handler.dataset import DatasetManager
+
         dataset_manager = DatasetManager()
         self.dataset_service = DatasetService(dataset_manager)
 
@@ -182,12 +548,36 @@ class DatasetManagementView(APIView):
 class ImageFileView(APIView):
     """
     API endpoint for serving individual image files from the dataset.
+
+    ``?w=<width>&fmt=<webp|jpeg|png>`` serves a resized variant from the
+    thumbnail cache instead of the original.
     """
     permission_classes = [AllowAny]
 
+    def __init__(self, *args, **kwargs):
+        """Initialize the ImageFileView with required services."""
+        super().__init__(*args, **kwargs)
+        self.file_service = ImageFileService(get_thumbnail_cache())
+
+    @swagger_auto_schema(
+        tags=['images'],
+        operation_summary="Serve a dataset image",
+        manual_parameters=[
+            openapi.Parameter('w', openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                              description='Resize to this width (see THUMBNAIL_SETTINGS WIDTHS)'),
+            openapi.Parameter('fmt', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                              description='Output format: webp (default with w), jpeg or png'),
+            openapi.Parameter('v', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                              description='Content hash from search results; makes the '
+                                          'response cacheable as immutable'),
+        ],
+    )
     def get(self, request, filename):
         """
-        Serve an individual image file.
+        Serve an individual image file or a resized variant of it.
+
+        Responses carry ETag, Last-Modified and Cache-Control headers, answer
+        conditional requests with 304 and support single byte ranges.
         
         Args:
             filename (str): Name of the image file to retrieve
@@ -196,9 +586,13 @@ class ImageFileView(APIView):
             FileResponse: The requested image file
         """
         try:
-            image_path = os.path.join(
-                settings.DATASET_SETTINGS["DATA_PATH"], filename)
-            return FileResponse(open(image_path, "rb"), content_type="image/jpeg")
+            variant = self.file_service.parse_variant(request.query_params)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            image_path = self.file_service.resolve(filename)
+            return self.file_service.serve(request, image_path, variant)
         except Exception as e:
             logger.error(f"Failed to serve image: {str(e)}")
             return Response({"error": "Image not found"}, status=status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,397 @@
+"""
+In-process metrics exported in the Prometheus text format.
+
+Counters, gauges and histograms are plain dicts guarded by one uncontended
+lock per metric, so recording a value costs well under a microsecond.
+Collectors registered with ``REGISTRY.add_collector`` run only when a snapshot
+is taken, for values that are cheaper to read than to track (cache counters,
+index size).
+
+With several worker processes each one periodically writes its snapshot to
+``METRICS['DIR']`` and ``/metrics`` merges the files of all workers: counters
+and histograms are summed (including workers that have exited, so totals never
+go backwards), gauges are combined across live workers only. Clear the
+directory when the server is redeployed.
+"""
+import atexit
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def values(self) -> Dict[Tuple[str, ...], object]:
+        """Return a copy of the recorded values keyed by label values."""
+        with self._lock:
+            return {key: list(value) if isinstance(value, list) else value
+                    for key, value in self._values.items()}
+
+    def describe(self) -> Dict:
+        return {"kind": self.kind, "help": self.documentation, "labels": list(self.labelnames)}
+
+
+class Counter(_Metric):
+    """Monotonically increasing count."""
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set_total(self, total: float, **labels) -> None:
+        """Mirror a count kept elsewhere (used by collectors)."""
+        with self._lock:
+            self._values[self._key(labels)] = total
+
+
+class Gauge(_Metric):
+    """
+    Value that can go up and down.
+
+    ``multiprocess_mode`` says how values from several workers combine:
+    "max", "min" or "sum".
+    """
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 multiprocess_mode: str = "max"):
+        super().__init__(name, documentation, labelnames)
+        self.multiprocess_mode = multiprocess_mode
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def clear(self) -> None:
+        """Drop all label combinations, e.g. before a collector sets fresh ones."""
+        with self._lock:
+            self._values.clear()
+
+    def describe(self) -> Dict:
+        return {**super().describe(), "mode": self.multiprocess_mode}
+
+
+class Histogram(_Metric):
+    """Distribution of observations counted in fixed buckets."""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                # Per-bucket counts (the last one is +Inf) followed by the sum.
+                row = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            row[index] += 1
+            row[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the enclosed block in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def describe(self) -> Dict:
+        return {**super().describe(), "buckets": list(self.buckets)}
+
+
+class MetricsRegistry:
+    """Named metrics plus collectors, snapshotted and rendered together."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if existing.kind != metric.kind or existing.labelnames != metric.labelnames:
+                    raise ValueError(f"Metric {metric.name} is already registered differently")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+              multiprocess_mode: str = "max") -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames, multiprocess_mode))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector: Callable[[], None]) -> None:
+        """Register a callable that updates metrics right before each snapshot."""
+        with self._lock:
+            if collector not in self._collectors:
+                self._collectors.append(collector)
+
+    def snapshot(self) -> Dict:
+        """Run the collectors and return all metrics as a JSON-serializable dict."""
+        for collector in list(self._collectors):
+            try:
+                collector()
+            except Exception as e:
+                logger.warning(f"Metrics collector {collector.__name__} failed: {str(e)}")
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {
+            "pid": os.getpid(),
+            "metrics": {
+                metric.name: {**metric.describe(),
+                              "values": [[list(key), value]
+                                         for key, value in metric.values().items()]}
+                for metric in metrics
+            },
+        }
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def merge_snapshots(snapshots: Iterable[Dict], live_pids: Optional[set] = None) -> Dict:
+    """
+    Combine snapshots from several processes into one.
+
+    Args:
+        snapshots: Outputs of ``MetricsRegistry.snapshot``.
+        live_pids: Processes whose gauges count; None counts every snapshot.
+    """
+    merged: Dict[str, Dict] = {}
+    for snapshot in snapshots:
+        gauges_count = live_pids is None or snapshot["pid"] in live_pids
+        for name, metric in snapshot["metrics"].items():
+            target = merged.setdefault(name, {**metric, "values": {}})
+            values = target["values"]
+            for labels, value in metric["values"]:
+                key = tuple(labels)
+                if metric["kind"] == "histogram":
+                    row = values.get(key)
+                    values[key] = value if row is None else [a + b for a, b in zip(row, value)]
+                elif metric["kind"] == "counter":
+                    values[key] = values.get(key, 0) + value
+                elif gauges_count:
+                    if key not in values:
+                        values[key] = value
+                    elif metric.get("mode") == "sum":
+                        values[key] += value
+                    elif metric.get("mode") == "min":
+                        values[key] = min(values[key], value)
+                    else:
+                        values[key] = max(values[key], value)
+    for metric in merged.values():
+        metric["values"] = [[list(key), value] for key, value in metric["values"].items()]
+    return {"metrics": merged}
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(snapshot: Dict) -> str:
+    """Render a snapshot in the Prometheus text exposition format (0.0.4)."""
+    lines = []
+    for name in sorted(snapshot["metrics"]):
+        metric = snapshot["metrics"][name]
+        labels = metric["labels"]
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['kind']}")
+        for label_values, value in sorted(metric["values"]):
+            if metric["kind"] != "histogram":
+                lines.append(f"{name}{_format_labels(labels, label_values)} "
+                             f"{_format_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(list(metric["buckets"]) + [float("inf")], value[:-1]):
+                cumulative += count
+                le = 'le="' + _format_number(float(bound)) + '"'
+                lines.append(f"{name}_bucket{_format_labels(labels, label_values, le)} "
+                             f"{cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels, label_values)} "
+                         f"{_format_number(value[-1])}")
+            lines.append(f"{name}_count{_format_labels(labels, label_values)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+class MetricsExporter:
+    """Writes this process's snapshot to a shared directory and merges all of them."""
+
+    def __init__(self, registry: MetricsRegistry, directory: Optional[Path] = None,
+                 flush_interval: float = 5.0, start: bool = True):
+        """
+        Args:
+            registry: Registry to export.
+            directory: Directory shared by all workers; None exports only
+                       this process's metrics.
+            flush_interval: Seconds between snapshot writes.
+            start: Start the background writer thread.
+        """
+        self.registry = registry
+        self.directory = Path(directory) if directory else None
+        self.flush_interval = flush_interval
+        self._stop = threading.Event()
+        self._thread = None
+        if self.directory is not None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            if start:
+                self._thread = threading.Thread(
+                    target=self._run, name="metrics-exporter", daemon=True)
+                self._thread.start()
+
+    @classmethod
+    def from_settings(cls, registry: MetricsRegistry) -> "MetricsExporter":
+        """Build an exporter configured from ``METRICS``."""
+        from django.conf import settings
+
+        config = getattr(settings, "METRICS", {})
+        return cls(registry, directory=config.get("DIR"),
+                   flush_interval=config.get("FLUSH_INTERVAL", 5.0))
+
+    @property
+    def snapshot_file(self) -> Path:
+        return self.directory / f"metrics-{os.getpid()}.json"
+
+    def write_snapshot(self) -> Dict:
+        """Write this process's snapshot to the shared directory and return it."""
+        snapshot = self.registry.snapshot()
+        tmp_path = self.snapshot_file.with_name(self.snapshot_file.name + ".tmp")
+        tmp_path.write_text(json.dumps(snapshot))
+        os.replace(tmp_path, self.snapshot_file)
+        return snapshot
+
+    def collect(self) -> Dict:
+        """Return the metrics of every worker sharing the directory, merged."""
+        if self.directory is None:
+            return self.registry.snapshot()
+        own = self.write_snapshot()
+        snapshots = [own]
+        for path in self.directory.glob("metrics-*.json"):
+            if path == self.snapshot_file:
+                continue
+            try:
+                snapshots.append(json.loads(path.read_text()))
+            except (OSError, ValueError) as e:
+                logger.warning(f"Skipping unreadable metrics file {path.name}: {str(e)}")
+        live_pids = {snapshot["pid"] for snapshot in snapshots if _pid_alive(snapshot["pid"])}
+        return merge_snapshots(snapshots, live_pids)
+
+    def render(self) -> str:
+        """Return the merged metrics in the Prometheus text format."""
+        return render(self.collect())
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.write_snapshot()
+            except Exception as e:
+                logger.warning(f"Failed to write metrics snapshot: {str(e)}")
+
+    def stop(self) -> None:
+        """Stop the background writer after a final snapshot."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self.write_snapshot()
+
+
+REGISTRY = MetricsRegistry()
+
+HTTP_REQUEST_DURATION = REGISTRY.histogram(
+    "http_request_duration_seconds",
+    "Time spent handling API requests.",
+    ["method", "route", "status"])
+
+SEARCH_STAGE_DURATION = REGISTRY.histogram(
+    "search_stage_duration_seconds",
+    "Time spent in each stage of a search request.",
+    ["stage"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5))
+
+
+_exporter_instance = None
+_exporter_lock = threading.Lock()
+
+
+def get_metrics_exporter() -> MetricsExporter:
+    """Return the process-wide exporter, starting its writer on first use."""
+    global _exporter_instance
+
+    with _exporter_lock:
+        if _exporter_instance is None:
+            _exporter_instance = MetricsExporter.from_settings(REGISTRY)
+            atexit.register(_exporter_instance.stop)
+    return _exporter_instance
+
+
+def _restart_exporter_in_child() -> None:
+    """
+    The writer thread does not survive fork (e.g. ``gunicorn --preload``): give
+    the child a fresh lock and, if the parent exported, its own running exporter.
+    """
+    global _exporter_instance, _exporter_lock
+
+    _exporter_lock = threading.Lock()
+    inherited, _exporter_instance = _exporter_instance, None
+    if inherited is not None:
+        _exporter_instance = MetricsExporter(inherited.registry, inherited.directory,
+                                             inherited.flush_interval)
+        atexit.register(_exporter_instance.stop)
+
+
+os.register_at_fork(after_in_child=_restart_exporter_in_child)
@@ -4,11 +4,5 @@ from django.apps import AppConfig
 class MLConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'v1.ml'
-
-    def ready(self):
-        """Initialize ML models when Django starts."""
-        from .models.clip import initialize_clip_model
-        from .models.blip2 import initialize_blip2_model
-        
-        initialize_clip_model()
-        # initialize_blip2_model()
+    # Models load in the background warm-up started by the WSGI/ASGI entry
+    # points (see v1.ai_engine.startup) or on first use.
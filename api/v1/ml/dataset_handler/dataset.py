@@ -32,36 +32,58 @@ class DatasetManager:
             raise
 
     def download_dataset(self) -> None:
-        """Download dataset from Kaggle."""
+        """Download dataset from Kaggle.
+
+        Files are synced into the dataset directory rather than re-copied:
+        unchanged files (same size and mtime) are left alone and files that are
+        no longer in the download are removed, so the incremental indexer only
+        sees real changes.
+        """
         try:
             self._ensure_directories()
 
-            # Clear existing files
-            if any(self.dataset_path.iterdir()):
-                logger.info("Removing existing dataset files")
-                for item in self.dataset_path.iterdir():
-                    if item.is_file():
-                        item.unlink()
-                    elif item.is_dir():
-                        shutil.rmtree(item)
-
             # Download dataset
             logger.info("Starting dataset download...")
             base_path = kagglehub.dataset_download(self.dataset_name)
             test_data_path = Path(base_path) / "test_data_v2"
             
             if test_data_path.exists():
-                # Copy all files from test_data_v2 to our dataset path
-                for file_path in test_data_path.glob("*"):
-                    if file_path.is_file():
-                        shutil.copy2(file_path, self.dataset_path)
-                
+                self._sync_directory(test_data_path, self.dataset_path)
 
             logger.info(f"Dataset downloaded to {self.dataset_path}")
         except Exception as e:
             logger.error(f"Failed to download dataset: {str(e)}")
             raise
 
+    def _sync_directory(self, source: Path, target: Path) -> None:
+        """Mirror the files of source into target, copying only what changed."""
+        copied = 0
+        source_names = set()
+        for file_path in source.glob("*"):
+            if not file_path.is_file():
+                continue
+            source_names.add(file_path.name)
+            destination = target / file_path.name
+            if destination.exists():
+                src_stat, dst_stat = file_path.stat(), destination.stat()
+                if (src_stat.st_size == dst_stat.st_size
+                        and int(src_stat.st_mtime) == int(dst_stat.st_mtime)):
+                    continue
+            # copy2 preserves mtime so the next sync sees the file as unchanged.
+            shutil.copy2(file_path, destination)
+            copied += 1
+
+        removed = 0
+        for item in target.iterdir():
+            if item.name in source_names:
+                continue
+            if item.is_file():
+                item.unlink()
+            elif item.is_dir():
+                shutil.rmtree(item)
+            removed += 1
+        logger.info(f"Synced dataset: {copied} files copied, {removed} removed")
+
     def load_images(self) -> List[Path]:
         """Load image paths from the dataset directory."""
         try:
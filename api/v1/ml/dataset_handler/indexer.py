@@ -0,0 +1,270 @@
+"""
+Incremental indexing of the dataset directory.
+
+A SQLite manifest records the size, mtime, content hash and vector id of every
+indexed file. Each sync compares the dataset against it: files whose size and
+mtime are unchanged are skipped without being read, new or modified files are
+embedded, and deleted files are removed from the vector store. Adding a few
+images to a large corpus therefore costs only those few encodes.
+"""
+import hashlib
+import logging
+import sqlite3
+import threading
+from contextlib import closing
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .thumbnails import get_thumbnail_cache
+
+logger = logging.getLogger(__name__)
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def content_hash(path: Path) -> str:
+    """Return the BLAKE2b hex digest of a file's contents."""
+    with open(path, "rb") as f:
+        return stream_hash(f)
+
+
+def stream_hash(stream: BinaryIO) -> str:
+    """Return the BLAKE2b hex digest of a binary stream, as content_hash does for files."""
+    hasher = hashlib.blake2b(digest_size=16)
+    for chunk in iter(lambda: stream.read(_HASH_CHUNK_SIZE), b""):
+        hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+@dataclass
+class FileRecord:
+    path: str
+    id: int
+    size: int
+    mtime_ns: int
+    content_hash: str
+
+
+@dataclass
+class DatasetDiff:
+    """Changes between the dataset directory and the manifest."""
+    new: List[Tuple[str, int, int, str]] = field(default_factory=list)
+    changed: List[Tuple[str, int, int, str]] = field(default_factory=list)
+    deleted: List[FileRecord] = field(default_factory=list)
+    touched: List[Tuple[str, int]] = field(default_factory=list)
+    unchanged: int = 0
+    replaced_ids: Dict[str, int] = field(default_factory=dict)
+
+
+class FileManifest:
+    """SQLite table of indexed files keyed by path."""
+
+    def __init__(self, db_file: Path, create: bool = True):
+        """
+        Args:
+            db_file: SQLite database file.
+            create: Create the tables if missing; readers of an existing
+                    manifest pass False to skip the DDL.
+        """
+        self.db_file = db_file
+        self._local = threading.local()
+        if not create:
+            return
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS files ("
+                " path TEXT PRIMARY KEY, id INTEGER NOT NULL UNIQUE,"
+                " size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL,"
+                " content_hash TEXT NOT NULL)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(str(self.db_file))
+
+    def _reader(self) -> sqlite3.Connection:
+        """Per-thread connection kept open for the lookups made on every request."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def records(self) -> Dict[str, FileRecord]:
+        """Return every indexed file keyed by path."""
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT path, id, size, mtime_ns, content_hash FROM files").fetchall()
+        return {row[0]: FileRecord(*row) for row in rows}
+
+    def get(self, path: str) -> Optional[FileRecord]:
+        """Return the record for one path, if indexed."""
+        row = self._reader().execute(
+            "SELECT path, id, size, mtime_ns, content_hash FROM files WHERE path = ?",
+            (path,)).fetchone()
+        return FileRecord(*row) if row else None
+
+    def content_hashes(self, paths: List[str]) -> Dict[str, str]:
+        """Return the recorded content hash for each indexed path."""
+        paths = list(paths)
+        hashes = {}
+        conn = self._reader()
+        # Stay under SQLite's bound-parameter limit.
+        for i in range(0, len(paths), 500):
+            chunk = paths[i:i + 500]
+            hashes.update(conn.execute(
+                "SELECT path, content_hash FROM files WHERE path IN "
+                f"({','.join('?' * len(chunk))})", chunk).fetchall())
+        return hashes
+
+    def allocate_ids(self, count: int) -> np.ndarray:
+        """Reserve ``count`` new vector ids; ids are never reused."""
+        with closing(self._connect()) as conn, conn:
+            row = conn.execute("SELECT value FROM counters WHERE name = 'next_id'").fetchone()
+            start = row[0] if row else 0
+            conn.execute(
+                "INSERT OR REPLACE INTO counters (name, value) VALUES ('next_id', ?)",
+                (start + count,))
+        return np.arange(start, start + count, dtype=np.int64)
+
+    def apply(self, upserts: List[FileRecord], deleted_paths: List[str],
+              touched: List[Tuple[str, int]]) -> None:
+        """Record indexed, deleted and touched files in one transaction."""
+        with closing(self._connect()) as conn, conn:
+            conn.executemany("DELETE FROM files WHERE path = ?",
+                             [(path,) for path in deleted_paths])
+            conn.executemany(
+                "INSERT OR REPLACE INTO files (path, id, size, mtime_ns, content_hash)"
+                " VALUES (?, ?, ?, ?, ?)",
+                [(r.path, r.id, r.size, r.mtime_ns, r.content_hash) for r in upserts])
+            conn.executemany("UPDATE files SET mtime_ns = ? WHERE path = ?",
+                             [(mtime_ns, path) for path, mtime_ns in touched])
+
+    def clear(self) -> None:
+        """Forget every indexed file (ids keep increasing)."""
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM files")
+
+
+class IncrementalIndexer:
+    """Keeps a FaissVectorStore in step with the files in DATA_PATH."""
+
+    def __init__(self, store, model_handler, manifest: Optional[FileManifest] = None,
+                 thumbnails=None):
+        self.store = store
+        self.model_handler = model_handler
+        self.manifest = manifest or FileManifest(store.store_dir / "file_manifest.sqlite3")
+        self.thumbnails = thumbnails
+
+    def diff(self, image_paths: List[Path]) -> DatasetDiff:
+        """Classify dataset files against the manifest, hashing only when stat changed."""
+        records = self.manifest.records()
+        diff = DatasetDiff()
+        seen = set()
+        for path in image_paths:
+            path = str(path)
+            seen.add(path)
+            stat = Path(path).stat()
+            record = records.get(path)
+            if record and record.size == stat.st_size and record.mtime_ns == stat.st_mtime_ns:
+                diff.unchanged += 1
+                continue
+
+            digest = content_hash(Path(path))
+            if record is None:
+                diff.new.append((path, stat.st_size, stat.st_mtime_ns, digest))
+            elif record.content_hash == digest:
+                # Only the mtime moved (e.g. re-copied); nothing to re-embed.
+                diff.touched.append((path, stat.st_mtime_ns))
+                diff.unchanged += 1
+            else:
+                diff.changed.append((path, stat.st_size, stat.st_mtime_ns, digest))
+                diff.replaced_ids[path] = record.id
+
+        diff.deleted = [record for path, record in records.items() if path not in seen]
+        return diff
+
+    def sync(self) -> Dict[str, int]:
+        """
+        Bring the store up to date with the dataset directory.
+
+        Returns:
+            Counts of new, changed, deleted and unchanged files.
+        """
+        if len(self.store) == 0:
+            # Nothing is indexed (first build or a wiped index): start over.
+            self.manifest.clear()
+
+        from .dataset import DatasetManager
+
+        image_paths = DatasetManager().load_images() or []
+        diff = self.diff(image_paths)
+        summary = {
+            "new": len(diff.new),
+            "changed": len(diff.changed),
+            "deleted": len(diff.deleted),
+            "unchanged": diff.unchanged,
+        }
+        logger.info(f"Dataset sync: {summary}")
+
+        if not (diff.new or diff.changed or diff.deleted):
+            if diff.touched:
+                self.manifest.apply([], [], diff.touched)
+            return summary
+
+        pending = {path: (size, mtime_ns, digest)
+                   for path, size, mtime_ns, digest in diff.new + diff.changed}
+        embedded_paths, batches = [], []
+        if pending:
+            from .pipeline import ImageEmbeddingPipeline
+
+            pipeline = ImageEmbeddingPipeline.from_settings(self.model_handler)
+            for batch_paths, embeddings in pipeline.run(list(pending)):
+                embedded_paths.extend(batch_paths)
+                batches.append(embeddings)
+
+        was_empty = len(self.store) == 0
+        # Drop deleted files and the old vectors of files embedded again. A
+        # changed file that failed to decode keeps its old vector, matching its
+        # manifest record. Vectors stored by a sync that crashed before
+        # recording them in the manifest are found by path and dropped too.
+        stale_ids = [record.id for record in diff.deleted]
+        stale_ids += [diff.replaced_ids[path] for path in embedded_paths
+                      if path in diff.replaced_ids]
+        stale_ids += [idx for idx in self.store.find_ids(embedded_paths) if idx is not None]
+        stale_ids = list(dict.fromkeys(stale_ids))
+        if stale_ids:
+            self.store.remove_embeddings(stale_ids)
+
+        upserts = []
+        if batches:
+            embeddings = np.ascontiguousarray(np.concatenate(batches), dtype=np.float32)
+            # Leave all-zero rows at zero rather than dividing them into NaN.
+            embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+            ids = self.manifest.allocate_ids(len(embedded_paths))
+            self.store.add_embeddings(
+                embeddings,
+                [{"path": path, "index": int(idx)} for path, idx in zip(embedded_paths, ids)],
+                ids=ids)
+            upserts = [FileRecord(path, int(idx), *pending[path])
+                       for path, idx in zip(embedded_paths, ids)]
+
+        self.store._save_store()
+        self.manifest.apply(upserts, [record.path for record in diff.deleted], diff.touched)
+
+        if was_empty and batches:
+            self.store._write_build_report(embeddings, ids)
+        self.pregenerate_thumbnails(upserts)
+        return summary
+
+    def pregenerate_thumbnails(self, records: List[FileRecord]) -> None:
+        """Render the configured thumbnail variants for files this sync added or changed."""
+        if not records:
+            return
+        try:
+            thumbnails = self.thumbnails or get_thumbnail_cache()
+            thumbnails.pregenerate([(record.path, record.content_hash) for record in records])
+        except Exception as e:
+            logger.warning(f"Thumbnail pregeneration failed: {str(e)}")
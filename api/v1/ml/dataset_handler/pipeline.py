@@ -0,0 +1,161 @@
+"""
+Parallel image embedding pipeline used to build vector indexes.
+
+A pool of worker processes decodes and preprocesses image files into pixel
+tensors while the main process runs the model over batches that are already
+prepared. At most ``prefetch_batches`` batches are in flight, so workers block
+(backpressure) instead of filling memory when the model falls behind.
+"""
+import logging
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import torch
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Rough per-image working set for a ViT-B/32 forward pass on CPU: pixel tensor,
+# patch activations and attention buffers.
+_BYTES_PER_IMAGE = 8 * 1024 * 1024
+_MEMORY_FRACTION = 0.25
+
+_processor = None
+
+
+def _init_worker(model_name: str) -> None:
+    """Load the image processor once per worker process."""
+    global _processor
+    from transformers import CLIPImageProcessor
+
+    # Workers only decode and resize; keep them off the model's threads.
+    torch.set_num_threads(1)
+    _processor = CLIPImageProcessor.from_pretrained(model_name)
+
+
+def _preprocess_batch(paths: Sequence[str]) -> Tuple[List[str], Optional[np.ndarray]]:
+    """Decode and preprocess a batch of image files in a worker process."""
+    images, loaded = [], []
+    for path in paths:
+        try:
+            with Image.open(path) as img:
+                images.append(img.convert("RGB"))
+            loaded.append(path)
+        except Exception as e:
+            logger.warning(f"Skipping unreadable image {path}: {str(e)}")
+    if not images:
+        return loaded, None
+    pixel_values = _processor(images=images, return_tensors="np")["pixel_values"]
+    return loaded, pixel_values.astype(np.float32)
+
+
+def available_memory() -> Optional[int]:
+    """Return available physical memory in bytes, if the platform reports it."""
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def auto_batch_size(max_batch_size: int, min_batch_size: int = 8) -> int:
+    """Pick a batch size that fits in a fraction of the available memory."""
+    memory = available_memory()
+    if memory is None:
+        return max_batch_size
+    fitted = int(memory * _MEMORY_FRACTION // _BYTES_PER_IMAGE)
+    return max(min_batch_size, min(max_batch_size, fitted))
+
+
+class ImageEmbeddingPipeline:
+    """Embeds image files with decoding in worker processes and inference in the caller."""
+
+    def __init__(self, model_handler, batch_size: Optional[int] = None,
+                 num_workers: Optional[int] = None, prefetch_batches: int = 4,
+                 torch_threads: Optional[int] = None, max_batch_size: int = 256):
+        cpu_count = os.cpu_count() or 1
+        self.model_handler = model_handler
+        self.num_workers = num_workers if num_workers is not None else max(1, cpu_count // 4)
+        self.batch_size = batch_size or auto_batch_size(max_batch_size)
+        self.prefetch_batches = max(1, prefetch_batches)
+        self.torch_threads = torch_threads or max(1, cpu_count - self.num_workers)
+
+    @classmethod
+    def from_settings(cls, model_handler) -> "ImageEmbeddingPipeline":
+        """Build a pipeline configured from ``ML_SETTINGS['INGEST']``."""
+        from django.conf import settings
+
+        ingest = settings.ML_SETTINGS.get('INGEST', {})
+        return cls(
+            model_handler,
+            batch_size=ingest.get('BATCH_SIZE'),
+            num_workers=ingest.get('WORKERS'),
+            prefetch_batches=ingest.get('PREFETCH_BATCHES', 4),
+            torch_threads=ingest.get('TORCH_THREADS'),
+        )
+
+    def _to_device(self, pixel_values: np.ndarray) -> torch.Tensor:
+        tensor = torch.from_numpy(pixel_values)
+        device = getattr(self.model_handler, "device", torch.device("cpu"))
+        if device.type == "cuda":
+            # Pinned host memory lets the copy overlap with the previous batch.
+            return tensor.pin_memory().to(device, non_blocking=True)
+        return tensor
+
+    def run(self, image_paths: Sequence[Path]) -> Iterator[Tuple[List[str], np.ndarray]]:
+        """
+        Embed images batch by batch.
+
+        Args:
+            image_paths: Files to embed.
+        Yields:
+            (paths, embeddings) per batch, where embeddings is a float32 array of
+            unit-norm rows aligned with paths. Unreadable files are skipped.
+        """
+        paths = [str(path) for path in image_paths]
+        batches = [paths[i:i + self.batch_size] for i in range(0, len(paths), self.batch_size)]
+        if not batches:
+            return
+
+        if not hasattr(self.model_handler, "encode_pixel_values") or self.num_workers == 0:
+            yield from self._run_serial(batches)
+            return
+
+        logger.info(
+            f"Embedding {len(paths)} images in {len(batches)} batches of {self.batch_size} "
+            f"with {self.num_workers} decode workers and {self.torch_threads} torch threads")
+        previous_threads = torch.get_num_threads()
+        torch.set_num_threads(self.torch_threads)
+        try:
+            with ProcessPoolExecutor(
+                    max_workers=self.num_workers,
+                    mp_context=get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.model_handler.config.model_name,)) as pool:
+                pending = deque()
+                next_batch = 0
+                while pending or next_batch < len(batches):
+                    while next_batch < len(batches) and len(pending) < self.prefetch_batches:
+                        pending.append(pool.submit(_preprocess_batch, batches[next_batch]))
+                        next_batch += 1
+
+                    loaded, pixel_values = pending.popleft().result()
+                    if pixel_values is None:
+                        continue
+                    embeddings = self.model_handler.encode_pixel_values(
+                        self._to_device(pixel_values))
+                    yield loaded, embeddings.cpu().numpy().astype(np.float32)
+        finally:
+            torch.set_num_threads(previous_threads)
+
+    def _run_serial(self, batches: List[List[str]]) -> Iterator[Tuple[List[str], np.ndarray]]:
+        """Fallback for handlers that only accept file paths."""
+        for batch in batches:
+            embeddings = self.model_handler.encode_image(batch)
+            embeddings = embeddings.reshape(len(batch), -1).cpu().numpy().astype(np.float32)
+            embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+            yield batch, embeddings
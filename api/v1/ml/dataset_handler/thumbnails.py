@@ -0,0 +1,241 @@
+"""
+Resized image variants for serving search results.
+
+Variants are addressed by the original's content hash, the target width and
+the output format, so an unchanged image maps to the same file no matter how
+often it is re-indexed, and an edited one gets a new address automatically.
+Variants are produced once by a worker pool (concurrent requests for the same
+variant share one job) and kept on disk under a size cap; the least recently
+served files are evicted first.
+"""
+import hashlib
+import logging
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {
+    "webp": ("WEBP", "image/webp"),
+    "jpeg": ("JPEG", "image/jpeg"),
+    "png": ("PNG", "image/png"),
+}
+_FORMAT_ALIASES = {"jpg": "jpeg"}
+
+# After eviction the cache is trimmed to this fraction of its cap, so a full
+# cache does not scan the directory on every write.
+_EVICT_TO = 0.9
+
+
+def normalize_format(fmt: str) -> str:
+    """Map a requested format name (e.g. 'JPG') to a key of FORMATS."""
+    fmt = fmt.lower()
+    return _FORMAT_ALIASES.get(fmt, fmt)
+
+
+def file_signature(path: Path) -> str:
+    """Cheap stand-in for a content hash: path, size and mtime."""
+    stat = path.stat()
+    return hashlib.blake2b(
+        f"{path}:{stat.st_size}:{stat.st_mtime_ns}".encode(), digest_size=16).hexdigest()
+
+
+def render_variant(source: Path, target: Path, width: Optional[int], fmt: str,
+                   quality: int) -> None:
+    """Resize source to width (never upscaling) and write it to target in fmt."""
+    pil_format, _ = FORMATS[fmt]
+    with Image.open(source) as img:
+        size = None
+        if width is not None and width < img.width:
+            size = (width, max(1, round(img.height * width / img.width)))
+            # Lets the JPEG decoder downscale by a power of two while decoding.
+            img.draft("RGB", size)
+        if fmt == "jpeg" or img.mode not in ("RGB", "RGBA"):
+            has_alpha = "A" in img.mode or "transparency" in img.info
+            img = img.convert("RGBA" if has_alpha and fmt != "jpeg" else "RGB")
+        if size is not None:
+            img = img.resize(size, Image.LANCZOS)
+
+        tmp_path = target.with_name(f"{target.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            img.save(tmp_path, format=pil_format, quality=quality)
+            os.replace(tmp_path, target)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+
+
+class ThumbnailCache:
+    """On-disk cache of resized image variants with a size cap and LRU eviction."""
+
+    def __init__(self, cache_dir: Path, max_bytes: int, widths: Sequence[int],
+                 formats: Sequence[str] = tuple(FORMATS), quality: int = 80,
+                 workers: Optional[int] = None,
+                 pregenerate: Sequence[Tuple[int, str]] = ()):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.widths = set(widths)
+        self.formats = {normalize_format(fmt) for fmt in formats} & set(FORMATS)
+        self.quality = quality
+        self.pregenerate_variants = [(width, normalize_format(fmt)) for width, fmt in pregenerate]
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._pool = ThreadPoolExecutor(
+            max_workers=workers or min(4, os.cpu_count() or 1),
+            thread_name_prefix="thumbnails")
+        # Re-entrant: a job that is already done runs its callback immediately.
+        self._lock = threading.RLock()
+        self._inflight: Dict[Path, Future] = {}
+        self._size = None
+
+    @classmethod
+    def from_settings(cls) -> "ThumbnailCache":
+        """Build a cache configured from ``THUMBNAIL_SETTINGS``."""
+        from django.conf import settings
+
+        config = settings.THUMBNAIL_SETTINGS
+        return cls(
+            cache_dir=config['CACHE_DIR'],
+            max_bytes=config['MAX_BYTES'],
+            widths=config['WIDTHS'],
+            formats=config.get('FORMATS', tuple(FORMATS)),
+            quality=config.get('QUALITY', 80),
+            workers=config.get('WORKERS'),
+            pregenerate=config.get('PREGENERATE', ()),
+        )
+
+    def validate(self, width: Optional[int], fmt: str) -> Optional[str]:
+        """Return an error message if the variant is not allowed, else None."""
+        if width is not None and width not in self.widths:
+            return f"Width must be one of {sorted(self.widths)}"
+        if fmt not in self.formats:
+            return f"Format must be one of {sorted(self.formats)}"
+        return None
+
+    def variant_path(self, content_hash: str, width: Optional[int], fmt: str) -> Path:
+        """Return the content-addressed location of a variant."""
+        key = hashlib.blake2b(
+            f"{content_hash}:{width or 'full'}:{fmt}:{self.quality}".encode(),
+            digest_size=16).hexdigest()
+        return self.cache_dir / key[:2] / f"{key}.{fmt}"
+
+    def get(self, source: Path, content_hash: str, width: Optional[int], fmt: str) -> Path:
+        """
+        Return the cached variant, generating it first if needed.
+
+        Args:
+            source: Original image file.
+            content_hash: Hash identifying the original's contents.
+            width: Target width in pixels, or None to keep the original size.
+            fmt: Output format, a key of FORMATS.
+        Returns:
+            Path to the variant file.
+        """
+        target = self.variant_path(content_hash, width, fmt)
+        try:
+            # Serving a variant refreshes its mtime, which eviction uses as LRU order.
+            os.utime(target)
+            return target
+        except FileNotFoundError:
+            pass
+        self._submit(source, target, width, fmt).result()
+        return target
+
+    def _submit(self, source: Path, target: Path, width: Optional[int], fmt: str) -> Future:
+        """Schedule a variant, sharing the job with any identical one in flight."""
+        with self._lock:
+            future = self._inflight.get(target)
+            if future is None:
+                future = self._pool.submit(self._generate, source, target, width, fmt)
+                self._inflight[target] = future
+                future.add_done_callback(lambda _: self._forget(target))
+            return future
+
+    def _forget(self, target: Path) -> None:
+        with self._lock:
+            self._inflight.pop(target, None)
+
+    def _generate(self, source: Path, target: Path, width: Optional[int], fmt: str) -> None:
+        if target.exists():
+            return
+        target.parent.mkdir(parents=True, exist_ok=True)
+        render_variant(source, target, width, fmt, self.quality)
+        self._account(target)
+
+    def pregenerate(self, items: List[Tuple[str, str]]) -> int:
+        """
+        Generate the configured PREGENERATE variants for many images.
+
+        Args:
+            items: (path, content_hash) pairs.
+        Returns:
+            Number of variants generated; existing ones are skipped.
+        """
+        futures = []
+        for path, content_hash in items:
+            for width, fmt in self.pregenerate_variants:
+                target = self.variant_path(content_hash, width, fmt)
+                if not target.exists():
+                    futures.append(self._submit(Path(path), target, width, fmt))
+
+        generated = 0
+        for future in futures:
+            try:
+                future.result()
+                generated += 1
+            except Exception as e:
+                logger.warning(f"Could not generate thumbnail: {str(e)}")
+        if generated:
+            logger.info(f"Generated {generated} thumbnails in {self.cache_dir}")
+        return generated
+
+    def _files(self) -> List[os.DirEntry]:
+        entries = []
+        for shard in os.scandir(self.cache_dir):
+            if shard.is_dir():
+                entries.extend(entry for entry in os.scandir(shard.path)
+                               if entry.is_file() and not entry.name.endswith(".tmp"))
+        return entries
+
+    def _account(self, added: Path) -> None:
+        """Track the cache size and evict the least recently used files over the cap."""
+        with self._lock:
+            if self._size is None:
+                self._size = sum(entry.stat().st_size for entry in self._files())
+            else:
+                self._size += added.stat().st_size
+            if self._size <= self.max_bytes:
+                return
+
+            entries = sorted(self._files(), key=lambda entry: entry.stat().st_mtime_ns)
+            size = sum(entry.stat().st_size for entry in entries)
+            evicted = 0
+            for entry in entries:
+                if size <= self.max_bytes * _EVICT_TO:
+                    break
+                if entry.path == str(added):
+                    # About to be served.
+                    continue
+                try:
+                    size -= entry.stat().st_size
+                    os.unlink(entry.path)
+                    evicted += 1
+                except FileNotFoundError:
+                    pass
+            self._size = size
+        logger.info(f"Evicted {evicted} thumbnails; cache is {size} bytes")
+
+
+_thumbnail_cache = None
+
+
+def get_thumbnail_cache() -> ThumbnailCache:
+    """Return the process-wide thumbnail cache."""
+    global _thumbnail_cache
+
+    if _thumbnail_cache is None:
+        _thumbnail_cache = ThumbnailCache.from_settings()
+    return _thumbnail_cache
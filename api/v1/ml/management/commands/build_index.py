@@ -0,0 +1,28 @@
+"""Rebuild the FAISS index from the dataset and print its build report."""
+import json
+
+from django.core.management.base import BaseCommand
+
+from v1.ml.models.clip import initialize_clip_model
+from v1.ml.models.store_handlers.registry import create_store, get_indexed_backend
+
+
+class Command(BaseCommand):
+    help = "Rebuild the FAISS index from the dataset using the configured index type."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--index-factory",
+            help="FAISS factory string, e.g. 'IVF4096,PQ64' or 'HNSW32' "
+                 "(default: ML_SETTINGS['FAISS']['INDEX_FACTORY'])",
+        )
+
+    def handle(self, *args, **options):
+        backend = get_indexed_backend()
+        store = create_store(backend, index_factory=options["index_factory"])
+        store.model_handler = initialize_clip_model()
+        store.rebuild()
+
+        if store.build_report_file.exists():
+            self.stdout.write(json.dumps(json.loads(store.build_report_file.read_text()), indent=2))
+        self.stdout.write(self.style.SUCCESS(f"Built index with {len(store)} vectors"))
@@ -0,0 +1,20 @@
+"""Incrementally bring the FAISS index up to date with the dataset."""
+from django.core.management.base import BaseCommand
+
+from v1.ml.models.clip import initialize_clip_model
+from v1.ml.models.store_handlers.registry import create_store, get_indexed_backend
+
+
+class Command(BaseCommand):
+    help = "Embed new or changed dataset images and drop deleted ones from the FAISS index."
+
+    def handle(self, *args, **options):
+        backend = get_indexed_backend()
+        store = create_store(backend)
+        store.model_handler = initialize_clip_model()
+        summary = store.sync_with_dataset()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Index has {len(store)} vectors "
+            f"({summary['new']} new, {summary['changed']} changed, "
+            f"{summary['deleted']} deleted, {summary['unchanged']} unchanged)"))
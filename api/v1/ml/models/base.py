@@ -12,6 +12,15 @@ class BaseModelHandler(ABC):
         """Encode text query into embeddings."""
         pass
 
+    def encode_texts(self, texts: List[str]) -> torch.Tensor:
+        """
+        Encode a batch of texts into embeddings of shape (len(texts), dim).
+
+        Handlers that can run several texts through one forward pass should
+        override this; the default falls back to one call per text.
+        """
+        return torch.cat([self.encode_text(text).reshape(1, -1) for text in texts])
+
     @abstractmethod
     def encode_image(self, images: Union[List[Image.Image], List[str]]) -> torch.Tensor:
         """Encode images into embeddings."""
@@ -0,0 +1,215 @@
+"""
+Request-coalescing scheduler for text encoding.
+
+Each search encodes a handful of query templates, which on its own is a tiny
+forward pass; concurrent searches running those passes side by side contend
+for the same model and CPU cores. ``MicroBatcher`` puts a queue in front of
+the model: one worker thread takes the first waiting request, keeps
+collecting requests for up to MAX_WAIT_MS or until MAX_BATCH texts are
+queued, encodes the distinct texts as one padded batch and hands each caller
+its rows through a future. Under load throughput grows with batch size
+instead of degrading with the number of request threads.
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+from v1.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+TEXT_BATCH_SIZE = REGISTRY.histogram(
+    "text_encode_batch_size",
+    "Distinct texts per coalesced text encoder forward pass.",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+TEXT_BATCH_REQUESTS = REGISTRY.histogram(
+    "text_encode_batch_requests",
+    "Requests coalesced into one text encoder forward pass.",
+    buckets=(1, 2, 4, 8, 16, 32, 64))
+
+
+class MicroBatcher:
+    """Coalesces concurrent encode_texts calls into batched forward passes."""
+
+    def __init__(self, handler, max_batch: int = 64, max_wait_ms: float = 2.0,
+                 start: bool = True):
+        """
+        Args:
+            handler: Model handler with encode_texts(texts) -> Tensor.
+            max_batch: Stop collecting once this many texts are queued; a
+                       single larger request runs as its own batch.
+            max_wait_ms: How long to wait for more requests after the first.
+            start: Start the worker thread now.
+        """
+        self.handler = handler
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._counters = {"requests": 0, "batches": 0, "texts": 0, "encoded": 0}
+        if start:
+            self.start()
+
+    @classmethod
+    def from_settings(cls, handler) -> "MicroBatcher":
+        """Build a batcher configured from ``ML_SETTINGS['TEXT_BATCHING']``."""
+        config = settings.ML_SETTINGS.get('TEXT_BATCHING', {})
+        return cls(handler, max_batch=config.get('MAX_BATCH', 64),
+                   max_wait_ms=config.get('MAX_WAIT_MS', 2.0))
+
+    def start(self) -> None:
+        """Start the worker thread (again, e.g. in a forked child)."""
+        with self._lock:
+            self._stop.clear()
+            self._start_worker()
+
+    def _start_worker(self) -> None:
+        """Start the worker thread unless it is running; the caller holds self._lock."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name="text-batcher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stop the worker once queued requests are done; later calls run inline."""
+        with self._lock:
+            self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        # Requests queued while the worker was exiting would otherwise never resolve.
+        leftovers = []
+        while True:
+            try:
+                leftovers.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if leftovers:
+            self._execute(leftovers)
+
+    def submit(self, texts: List[str]) -> Future:
+        """Queue texts for encoding; the future resolves to their embeddings in order."""
+        future = Future()
+        # Checked and queued under the lock so stop() cannot slip in between.
+        with self._lock:
+            if not self._stop.is_set():
+                self._start_worker()
+                self._queue.put((list(texts), future))
+                return future
+        future.set_result(self.handler.encode_texts(texts))
+        return future
+
+    @property
+    def backend(self):
+        """The wrapped handler's inference backend, so callers can key caches by it."""
+        return self.handler.backend
+
+    def encode_texts(self, texts: List[str]):
+        """Encode texts as part of the next coalesced batch, blocking until done."""
+        return self.submit(texts).result()
+
+    def encode_text(self, text: str):
+        return self.encode_texts([text])
+
+    def encode_image(self, images: list):
+        """Encode images directly with the model; image encodes are not coalesced."""
+        return self.handler.encode_image(images)
+
+    def stats(self) -> Dict[str, float]:
+        """Return request, batch and text counters and the mean batch sizes for this process."""
+        with self._lock:
+            stats = dict(self._counters)
+        batches = stats["batches"] or 1
+        stats["mean_requests_per_batch"] = stats["requests"] / batches
+        stats["mean_texts_per_batch"] = stats["encoded"] / batches
+        stats["queue_depth"] = self._queue.qsize()
+        return stats
+
+    def _collect(self) -> List[Tuple[List[str], Future]]:
+        """Wait for a request, then gather more until max_batch texts or max_wait pass."""
+        try:
+            first = self._queue.get(timeout=0.1)
+        except queue.Empty:
+            return []
+        batch = [first]
+        size = len(first[0])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 \
+                    else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(item)
+            size += len(item[0])
+        return batch
+
+    def _execute(self, batch: List[Tuple[List[str], Future]]) -> None:
+        batch = [(texts, future) for texts, future in batch
+                 if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        # Concurrent searches for the same query share their template texts.
+        index = {}
+        for texts, _ in batch:
+            for text in texts:
+                index.setdefault(text, len(index))
+        try:
+            embeddings = self.handler.encode_texts(list(index))
+        except Exception as e:
+            logger.error(f"Batched text encoding of {len(index)} texts failed: {str(e)}")
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        for texts, future in batch:
+            future.set_result(embeddings[[index[text] for text in texts]])
+        TEXT_BATCH_SIZE.observe(len(index))
+        TEXT_BATCH_REQUESTS.observe(len(batch))
+        with self._lock:
+            self._counters["requests"] += len(batch)
+            self._counters["batches"] += 1
+            self._counters["texts"] += sum(len(texts) for texts, _ in batch)
+            self._counters["encoded"] += len(index)
+
+    def _run(self) -> None:
+        while not (self._stop.is_set() and self._queue.empty()):
+            batch = self._collect()
+            if batch:
+                self._execute(batch)
+
+
+_batcher_instance = None
+_batcher_lock = threading.Lock()
+
+
+def loaded_text_batcher() -> Optional[MicroBatcher]:
+    """Return the text batcher if it has been created, without creating it."""
+    return _batcher_instance
+
+
+def get_text_encoder():
+    """
+    Return what searches should encode query text with: the process-wide
+    micro-batcher around CLIP, or CLIP itself when TEXT_BATCHING is disabled.
+    """
+    from .clip import initialize_clip_model
+
+    global _batcher_instance
+
+    model_handler = initialize_clip_model()
+    if not settings.ML_SETTINGS.get('TEXT_BATCHING', {}).get('ENABLED', True):
+        return model_handler
+    with _batcher_lock:
+        if _batcher_instance is None:
+            _batcher_instance = MicroBatcher.from_settings(model_handler)
+            atexit.register(_batcher_instance.stop)
+    return _batcher_instance
@@ -1,36 +1,67 @@
 import logging
+import os
+import threading
 from pathlib import Path
-import torch
+from typing import TYPE_CHECKING, Optional
 
 from django.conf import settings
-from .config import CLIPConfig
-from .model import CLIPModelHandler
+
+if TYPE_CHECKING:
+    from .model import CLIPModelHandler
 
 logger = logging.getLogger(__name__)
 
+# torch and transformers are imported on first initialization, so importing
+# this package (e.g. from URL configuration) stays cheap.
 _model_instance = None
+_model_lock = threading.Lock()
+
+
+def _reset_lock() -> None:
+    # A fork during loading would otherwise leave the child's lock held forever.
+    global _model_lock
+    _model_lock = threading.Lock()
 
 
-def initialize_clip_model() -> CLIPModelHandler:
+os.register_at_fork(after_in_child=_reset_lock)
+
+
+def initialize_clip_model() -> "CLIPModelHandler":
     """Initialize and return CLIP model singleton instance."""
     global _model_instance
 
-    if _model_instance is None:
-        config = CLIPConfig(
-            model_name=settings.ML_SETTINGS['MODELS']['clip']['name'],
-            embedding_dim=settings.ML_SETTINGS['MODELS']['clip']['embedding_dim'],
-            batch_size=settings.ML_SETTINGS['MODELS']['clip']['batch_size'],
-            device="cuda" if torch.cuda.is_available() else "cpu",
-            cache_dir=Path(settings.BASE_DIR) / "ml" / "models" / "cache"
-        )
+    if _model_instance is not None:
+        return _model_instance
+
+    with _model_lock:
+        if _model_instance is None:
+            import torch
+            from .config import CLIPConfig
+            from .model import CLIPModelHandler
+
+            clip_settings = settings.ML_SETTINGS['MODELS']['clip']
+            config = CLIPConfig(
+                model_name=clip_settings['name'],
+                embedding_dim=clip_settings['embedding_dim'],
+                batch_size=clip_settings['batch_size'],
+                device="cuda" if torch.cuda.is_available() else "cpu",
+                cache_dir=Path(settings.BASE_DIR) / "ml" / "models" / "cache",
+                backend=clip_settings.get('backend', 'eager'),
+                min_agreement=clip_settings.get('min_agreement', 0.99),
+            )
+
+            _model_instance = CLIPModelHandler(config)
+            logger.info("CLIP model initialized successfully")
+
+    return _model_instance
 
-        _model_instance = CLIPModelHandler(config)
-        logger.info("CLIP model initialized successfully")
 
+def loaded_clip_model() -> Optional["CLIPModelHandler"]:
+    """Return the CLIP model if it has been initialized, without loading it."""
     return _model_instance
 
 
-def get_clip_model() -> CLIPModelHandler:
+def get_clip_model() -> "CLIPModelHandler":
     """Get the initialized CLIP model instance."""
     if _model_instance is None:
         raise RuntimeError(
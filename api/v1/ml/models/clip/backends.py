@@ -0,0 +1,269 @@
+"""
+Inference backends for the CLIP text and vision towers.
+
+Every backend maps token ids / pixel values to unnormalized projected
+features, exactly like ``CLIPModel.get_text_features`` and
+``get_image_features``:
+
+- ``eager``: the fp32 model as loaded.
+- ``int8``: dynamic int8 quantization of every ``nn.Linear`` (CPU only).
+- ``compile``: both towers wrapped in ``torch.compile`` with dynamic shapes.
+- ``torchscript``: both towers traced with ``torch.jit.trace``.
+- ``onnx``: both towers exported to ONNX and run with ONNX Runtime (CPU).
+  Needs the optional ``onnx`` and ``onnxruntime`` packages.
+
+A non-eager backend is only used after its embeddings agree with the fp32
+ones on a fixed probe set of captions and images (see ``check_agreement``).
+"""
+import inspect
+import logging
+import re
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import torch
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("eager", "int8", "compile", "torchscript", "onnx")
+ONNX_OPSET = 17
+
+PROBE_TEXTS = [
+    "a photograph of a dog running on the beach",
+    "a photo showing a city skyline at night",
+    "a close-up portrait of an old man smiling",
+    "a bowl of fresh fruit on a wooden table",
+    "a red sports car parked on the street",
+    "snow covered mountains under a blue sky",
+    "a cat sleeping on a sofa",
+    "an abstract painting with bright colors",
+    "a crowded market in the afternoon",
+    "two children playing football in a park",
+    "a plate of pasta with tomato sauce",
+    "an airplane taking off from a runway",
+    "a forest path in autumn",
+    "a black and white photo of a bridge",
+    "a computer generated image of a futuristic city",
+    "a sunset over the ocean",
+]
+
+
+def probe_images(count: int = 8, size: int = 224, seed: int = 0) -> List[Image.Image]:
+    """Return a fixed set of synthetic images (gradients, stripes and noise) for probing."""
+    rng = np.random.default_rng(seed)
+    ramp = np.linspace(0, 255, size, dtype=np.float32)
+    images = []
+    for i in range(count):
+        pattern = i % 4
+        if pattern == 0:
+            array = np.stack([np.tile(ramp, (size, 1)), np.tile(ramp[:, None], (1, size)),
+                              np.full((size, size), 128.0)], axis=-1)
+        elif pattern == 1:
+            stripes = (np.arange(size) // (8 + 4 * i) % 2 * 255).astype(np.float32)
+            array = np.stack([np.tile(stripes, (size, 1))] * 3, axis=-1)
+        elif pattern == 2:
+            array = rng.uniform(0, 255, (size // 16, size // 16, 3)).repeat(16, 0).repeat(16, 1)
+        else:
+            array = rng.uniform(0, 255, (size, size, 3))
+        images.append(Image.fromarray(np.clip(array, 0, 255).astype(np.uint8)))
+    return images
+
+
+def _features(output) -> torch.Tensor:
+    """Projected features from get_*_features, which newer transformers wrap in an output object."""
+    return output if isinstance(output, torch.Tensor) else output.pooler_output
+
+
+class _TextTower(torch.nn.Module):
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+        return _features(self.model.get_text_features(
+            input_ids=input_ids, attention_mask=attention_mask))
+
+
+class _VisionTower(torch.nn.Module):
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, pixel_values: torch.Tensor) -> torch.Tensor:
+        return _features(self.model.get_image_features(pixel_values=pixel_values))
+
+
+class EagerBackend:
+    """Runs the towers as regular PyTorch modules."""
+    name = "eager"
+
+    def __init__(self, model):
+        self.model = model
+        self.text = _TextTower(model).eval()
+        self.vision = _VisionTower(model).eval()
+
+    def encode_text(self, input_ids: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+        with torch.no_grad():
+            return self.text(input_ids, attention_mask)
+
+    def encode_image(self, pixel_values: torch.Tensor) -> torch.Tensor:
+        with torch.no_grad():
+            return self.vision(pixel_values)
+
+
+class QuantizedBackend(EagerBackend):
+    """Dynamic int8 quantization of the linear layers (weights once, activations per call)."""
+    name = "int8"
+
+    def __init__(self, model):
+        super().__init__(torch.ao.quantization.quantize_dynamic(
+            model, {torch.nn.Linear}, dtype=torch.qint8))
+
+
+class CompiledBackend(EagerBackend):
+    """Towers compiled with torch.compile; compilation happens on the first calls."""
+    name = "compile"
+
+    def __init__(self, model):
+        super().__init__(model)
+        self.text = torch.compile(self.text, dynamic=True)
+        self.vision = torch.compile(self.vision, dynamic=True)
+
+
+class TorchScriptBackend(EagerBackend):
+    """Towers traced with torch.jit.trace on example inputs."""
+    name = "torchscript"
+
+    def __init__(self, model, text_inputs: Dict[str, torch.Tensor], pixel_values: torch.Tensor):
+        super().__init__(model)
+        with torch.no_grad():
+            self.text = torch.jit.freeze(torch.jit.trace(
+                self.text, (text_inputs["input_ids"], text_inputs["attention_mask"]),
+                strict=False, check_trace=False))
+            self.vision = torch.jit.freeze(torch.jit.trace(
+                self.vision, (pixel_values,), check_trace=False))
+
+
+class OnnxBackend:
+    """Towers exported to ONNX once per model and run with ONNX Runtime."""
+    name = "onnx"
+
+    def __init__(self, model, model_name: str, export_dir: Path,
+                 text_inputs: Dict[str, torch.Tensor], pixel_values: torch.Tensor):
+        import onnxruntime
+
+        export_dir = Path(export_dir)
+        export_dir.mkdir(parents=True, exist_ok=True)
+        # Exports made with another opset (or by an older version) are not reused.
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", f"{model_name}-{self.name}-opset{ONNX_OPSET}")
+        text_path = export_dir / f"{slug}-text.onnx"
+        vision_path = export_dir / f"{slug}-vision.onnx"
+        if not text_path.exists():
+            self._export(_TextTower(model).eval(),
+                         (text_inputs["input_ids"], text_inputs["attention_mask"]),
+                         ["input_ids", "attention_mask"], text_path)
+        if not vision_path.exists():
+            self._export(_VisionTower(model).eval(), (pixel_values,), ["pixel_values"],
+                         vision_path)
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = torch.get_num_threads()
+        self.text = onnxruntime.InferenceSession(
+            str(text_path), options, providers=["CPUExecutionProvider"])
+        self.vision = onnxruntime.InferenceSession(
+            str(vision_path), options, providers=["CPUExecutionProvider"])
+
+    @staticmethod
+    def _export(module: torch.nn.Module, args, input_names: List[str], path: Path) -> None:
+        logger.info(f"Exporting {path.name} to ONNX")
+        dynamic_axes = {name: {0: "batch", 1: "sequence"} if name != "pixel_values"
+                        else {0: "batch"} for name in input_names}
+        dynamic_axes["features"] = {0: "batch"}
+        kwargs = {}
+        if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+            # The TorchScript-based exporter handles dynamic_axes without onnxscript.
+            kwargs["dynamo"] = False
+        # A temporary file of its own, so workers exporting at the same time
+        # never write into each other's file; the last rename wins.
+        with tempfile.NamedTemporaryFile(dir=path.parent, prefix=f".{path.name}.",
+                                         suffix=".tmp", delete=False) as tmp:
+            tmp_path = Path(tmp.name)
+        try:
+            with torch.no_grad():
+                torch.onnx.export(module, args, str(tmp_path), input_names=input_names,
+                                  output_names=["features"], dynamic_axes=dynamic_axes,
+                                  opset_version=ONNX_OPSET, **kwargs)
+            tmp_path.replace(path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+
+    def encode_text(self, input_ids: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+        (features,) = self.text.run(None, {
+            "input_ids": input_ids.cpu().numpy().astype(np.int64),
+            "attention_mask": attention_mask.cpu().numpy().astype(np.int64),
+        })
+        return torch.from_numpy(features)
+
+    def encode_image(self, pixel_values: torch.Tensor) -> torch.Tensor:
+        (features,) = self.vision.run(None, {
+            "pixel_values": pixel_values.cpu().numpy().astype(np.float32)})
+        return torch.from_numpy(features)
+
+
+def build_backend(name: str, model, text_inputs: Dict[str, torch.Tensor],
+                  pixel_values: torch.Tensor, model_name: str = "clip",
+                  export_dir: Optional[Path] = None):
+    """
+    Build an inference backend for a loaded CLIPModel.
+
+    Args:
+        name: One of BACKENDS.
+        model: CLIPModel in eval mode.
+        text_inputs: Tokenized probe texts (input_ids, attention_mask), used
+                     as example inputs for tracing and export.
+        pixel_values: Preprocessed probe images, likewise.
+        model_name: Used to name exported ONNX files.
+        export_dir: Directory for exported ONNX files.
+    Returns:
+        Backend with encode_text(input_ids, attention_mask) and encode_image(pixel_values).
+    """
+    if name == "eager":
+        return EagerBackend(model)
+    if name == "int8":
+        return QuantizedBackend(model)
+    if name == "compile":
+        return CompiledBackend(model)
+    if name == "torchscript":
+        return TorchScriptBackend(model, text_inputs, pixel_values)
+    if name == "onnx":
+        if export_dir is None:
+            raise ValueError("The onnx backend needs an export directory")
+        return OnnxBackend(model, model_name, export_dir, text_inputs, pixel_values)
+    raise ValueError(f"Unknown CLIP backend '{name}'; expected one of {', '.join(BACKENDS)}")
+
+
+def cosine_agreement(reference: torch.Tensor, candidate: torch.Tensor) -> Dict[str, float]:
+    """Return the min and mean row-wise cosine similarity between two embedding batches."""
+    similarity = torch.nn.functional.cosine_similarity(
+        reference.float().cpu(), candidate.float().cpu(), dim=-1)
+    return {"min": float(similarity.min()), "mean": float(similarity.mean())}
+
+
+def check_agreement(backend, reference, text_inputs: Dict[str, torch.Tensor],
+                    pixel_values: torch.Tensor) -> Dict[str, Dict[str, float]]:
+    """
+    Compare a backend's probe embeddings against a reference backend's.
+
+    Returns:
+        {"text": {"min", "mean"}, "image": {"min", "mean"}}
+    """
+    input_ids, attention_mask = text_inputs["input_ids"], text_inputs["attention_mask"]
+    return {
+        "text": cosine_agreement(reference.encode_text(input_ids, attention_mask),
+                                 backend.encode_text(input_ids, attention_mask)),
+        "image": cosine_agreement(reference.encode_image(pixel_values),
+                                  backend.encode_image(pixel_values)),
+    }
@@ -12,3 +12,10 @@ class CLIPConfig:
     device: str = "cuda" if torch.cuda.is_available() else "cpu"
     cache_dir: Optional[Path] = None
     max_length: int = 77  # CLIP's default max token length
+    # Inference backend: "eager", "int8", "compile", "torchscript" or "onnx"
+    # (see backends.py). Non-eager backends fall back to eager if they fail to
+    # build or their probe embeddings' cosine similarity to fp32 drops below
+    # min_agreement.
+    backend: str = "eager"
+    min_agreement: float = 0.99
+    export_dir: Optional[Path] = None  # ONNX exports; defaults to cache_dir / "onnx"
@@ -1,10 +1,13 @@
 import logging
-import numpy as np
+import tempfile
+from pathlib import Path
+from typing import Dict, List
 import torch
 from PIL import Image
 from ..base import BaseModelHandler
 from transformers import CLIPProcessor, CLIPModel
 
+from .backends import PROBE_TEXTS, EagerBackend, build_backend, check_agreement, probe_images
 from .config import CLIPConfig
 
 logger = logging.getLogger(__name__)
@@ -20,24 +23,82 @@ class CLIPModelHandler(BaseModelHandler):
 
         try:
             self.model = CLIPModel.from_pretrained(
-                config.model_name).to(self.device)
+                config.model_name).to(self.device).eval()
             self.processor = CLIPProcessor.from_pretrained(config.model_name)
             logger.info(f"CLIP model loaded successfully on {self.device}")
         except Exception as e:
             logger.error(f"Failed to load CLIP model: {str(e)}")
             raise
 
+        self.agreement = None
+        self.backend = self._load_backend()
+
+    def _load_backend(self):
+        """
+        Build the configured inference backend, falling back to eager if it
+        cannot be built or disagrees with fp32 on the probe set.
+        """
+        name = self.config.backend
+        eager = EagerBackend(self.model)
+        if name == "eager":
+            return eager
+        if name in ("int8", "onnx") and self.device.type != "cpu":
+            logger.warning(
+                f"The {name} CLIP backend only runs on CPU; using eager on {self.device}")
+            return eager
+
+        text_inputs, pixel_values = self.probe_inputs()
+        try:
+            backend = build_backend(
+                name, self.model, text_inputs, pixel_values, model_name=self.config.model_name,
+                export_dir=self.config.export_dir or Path(
+                    self.config.cache_dir or tempfile.gettempdir()) / "onnx")
+            agreement = check_agreement(backend, eager, text_inputs, pixel_values)
+        except Exception as e:
+            logger.error(f"Failed to build {name} CLIP backend, using eager: {str(e)}")
+            return eager
+
+        worst = min(agreement["text"]["min"], agreement["image"]["min"])
+        if worst < self.config.min_agreement:
+            logger.warning(f"{name} CLIP backend agreement {worst:.4f} is below "
+                           f"{self.config.min_agreement}; using eager")
+            return eager
+        logger.info(f"Using {name} CLIP backend (probe agreement: {agreement})")
+        self.agreement = agreement
+        if name == "int8":
+            # Drop the fp32 weights; the quantized copy replaces them.
+            self.model = backend.model
+        return backend
+
+    def probe_inputs(self):
+        """
+        Tokenize the probe captions and preprocess the probe images.
+
+        Returns:
+            Tuple of (text inputs dict, pixel values) on the model's device
+        """
+        text_inputs = self._tokenize(PROBE_TEXTS)
+        pixel_values = self.processor(
+            images=probe_images(), return_tensors="pt")["pixel_values"].to(self.device)
+        return text_inputs, pixel_values
+
+    def _tokenize(self, texts: List[str]) -> Dict[str, torch.Tensor]:
+        inputs = self.processor(
+            text=texts, return_tensors="pt", padding=True,
+            truncation=True, max_length=self.config.max_length)
+        return {k: v.to(self.device) for k, v in inputs.items()}
+
     def encode_text(self, text: str) -> torch.Tensor:
-        inputs = self.processor(text=text, return_tensors="pt", padding=True)
-        inputs = {k: v.to(self.device) for k, v in inputs.items()}
-        
-        with torch.no_grad():
-            text_features = self.model.get_text_features(**inputs)
-        
+        return self.encode_texts([text])
+
+    def encode_texts(self, texts: List[str]) -> torch.Tensor:
+        """Encode a batch of texts as one padded forward pass."""
+        inputs = self._tokenize(texts)
+        text_features = self.backend.encode_text(inputs["input_ids"], inputs["attention_mask"])
+
         # Normalize features
-        text_features = text_features.cpu().numpy()
-        text_features = text_features / np.linalg.norm(text_features, axis=1, keepdims=True)
-        return torch.from_numpy(text_features)
+        text_features = torch.nn.functional.normalize(text_features, dim=-1)
+        return text_features.cpu()
 
     def encode_image(self, images: list) -> torch.Tensor:
         if isinstance(images[0], str):
@@ -45,12 +106,14 @@ class CLIPModelHandler(BaseModelHandler):
                       for img_path in images]
             
         inputs = self.processor(images=images, return_tensors="pt")
-        inputs = {key: tensor.to(self.device)
-                  for key, tensor in inputs.items()}
-        
+        return self.encode_pixel_values(inputs["pixel_values"])
+
+    def encode_pixel_values(self, pixel_values: torch.Tensor) -> torch.Tensor:
+        """Encode already preprocessed pixel tensors into normalized embeddings."""
+        pixel_values = pixel_values.to(self.device)
+
         # Get image features and normalize.
-        with torch.no_grad():
-            outputs = self.model.get_image_features(**inputs)
+        outputs = self.backend.encode_image(pixel_values)
         outputs = outputs / outputs.norm(dim=-1, keepdim=True)
         return outputs
 
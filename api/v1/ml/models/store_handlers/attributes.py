@@ -0,0 +1,297 @@
+"""
+Per-vector attributes for filtered search.
+
+Every vector id has a folder (relative to the dataset root), a file type, a
+label and a modification time. They are kept in a fixed-width table indexed by
+id (``<prefix>.npy``, memory-mapped like the path offsets) with the folder,
+file type and label vocabularies in ``<prefix>.json``.
+
+A filter is evaluated with vectorized comparisons into a boolean mask over ids.
+Masks are cached per filter until the attributes change, and the stores pass
+them into the search itself (an ``IDSelectorBitmap`` for FAISS, a row mask for
+the numpy store), so a filtered query scans no more vectors than an unfiltered
+one and never needs an inflated top-k.
+"""
+import csv
+import io
+import json
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from .metadata import MetadataStore, _atomic_write
+
+logger = logging.getLogger(__name__)
+
+ATTRIBUTE_DTYPE = np.dtype([("folder", "<i4"), ("file_type", "<i4"), ("label", "<i4"),
+                            ("mtime", "<i8")])
+CATEGORICAL = ("folder", "file_type", "label")
+FILTER_FIELDS = ("folders", "file_types", "labels", "modified_after", "modified_before")
+# Label values used by the ai-vs-human-generated dataset's CSV files.
+LABEL_NAMES = {"0": "human", "1": "ai"}
+_MISSING = -1
+_MASK_CACHE_SIZE = 64
+
+
+def normalize_file_type(value: str) -> str:
+    """Lowercase extension without the dot; ``jpeg`` counts as ``jpg``."""
+    value = value.lower().lstrip(".")
+    return "jpg" if value == "jpeg" else value
+
+
+def file_type(path: str) -> str:
+    """Normalized file type of a path."""
+    return normalize_file_type(Path(path).suffix)
+
+
+def folder_of(path: str, root: Optional[Path] = None) -> str:
+    """Directory of path relative to root, as a POSIX string ("" for the root itself)."""
+    parent = Path(path).parent
+    if root is not None:
+        try:
+            parent = parent.relative_to(root)
+        except ValueError:
+            pass
+    folder = parent.as_posix()
+    return "" if folder == "." else folder
+
+
+def load_labels(labels_file: Path) -> Dict[str, str]:
+    """
+    Read image labels from a CSV file with ``file_name`` and ``label`` columns.
+
+    Returns:
+        Labels keyed by file name (without directories); 0/1 become human/ai.
+    """
+    labels = {}
+    with open(labels_file, newline="") as f:
+        for row in csv.DictReader(f):
+            label = str(row["label"]).strip()
+            labels[Path(row["file_name"]).name] = LABEL_NAMES.get(label, label)
+    return labels
+
+
+def filter_key(filters: Dict) -> str:
+    """Canonical form of a filter, used to cache its mask."""
+    return json.dumps({name: filters[name] for name in FILTER_FIELDS if name in filters},
+                      sort_keys=True, default=str)
+
+
+class AttributeStore:
+    """Folder, file type, label and mtime keyed by integer vector id."""
+
+    def __init__(self, prefix: Path, root: Optional[Path] = None,
+                 labels_file: Optional[Path] = None):
+        """
+        Args:
+            prefix: Path prefix for the ``.npy`` table and ``.json`` vocabularies.
+            root: Dataset root that folders are given relative to.
+            labels_file: Optional CSV of image labels (see load_labels).
+        """
+        self.table_file = prefix.with_name(prefix.name + ".npy")
+        self.vocabulary_file = prefix.with_name(prefix.name + ".json")
+        self.root = Path(root) if root is not None else None
+        self.labels_file = Path(labels_file) if labels_file else None
+        self._labels = None
+        self._lock = threading.Lock()
+        self.load()
+
+    @classmethod
+    def from_settings(cls, prefix: Path) -> "AttributeStore":
+        """Build a store using DATA_PATH and LABELS_FILE from ``DATASET_SETTINGS``."""
+        from django.conf import settings
+
+        dataset_settings = getattr(settings, "DATASET_SETTINGS", {})
+        return cls(prefix, root=dataset_settings.get("DATA_PATH"),
+                   labels_file=dataset_settings.get("LABELS_FILE"))
+
+    def load(self) -> None:
+        """Memory-map the attribute table and read the vocabularies from disk."""
+        if self.table_file.exists():
+            self._table = np.load(str(self.table_file), mmap_mode="r")
+        else:
+            self._table = np.empty(0, dtype=ATTRIBUTE_DTYPE)
+        if self.vocabulary_file.exists():
+            self._vocabularies = json.loads(self.vocabulary_file.read_text())
+        else:
+            self._vocabularies = {name: [] for name in CATEGORICAL}
+        self._codes = {name: {value: code for code, value in enumerate(values)}
+                       for name, values in self._vocabularies.items()}
+        self._masks = OrderedDict()
+        self._generation = 0
+
+    def _writable_table(self, size: int) -> np.ndarray:
+        """Return an in-memory table with at least ``size`` rows."""
+        if not self._table.flags.writeable:
+            self._table = np.array(self._table)
+        if len(self._table) < size:
+            grown = np.full(max(size, 2 * len(self._table)), _MISSING, dtype=ATTRIBUTE_DTYPE)
+            grown[:len(self._table)] = self._table
+            self._table = grown
+        return self._table
+
+    def _code(self, name: str, value: str) -> int:
+        codes = self._codes[name]
+        if value not in codes:
+            codes[value] = len(self._vocabularies[name])
+            self._vocabularies[name].append(value)
+        return codes[value]
+
+    def _label(self, path: str) -> str:
+        if self._labels is None:
+            self._labels = {}
+            if self.labels_file is not None and self.labels_file.exists():
+                try:
+                    self._labels = load_labels(self.labels_file)
+                except Exception as e:
+                    logger.warning(f"Could not read labels from {self.labels_file}: {str(e)}")
+        return self._labels.get(Path(path).name, "")
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self._table["folder"] >= 0))
+
+    def __contains__(self, idx) -> bool:
+        idx = int(idx)
+        return 0 <= idx < len(self._table) and self._table[idx]["folder"] >= 0
+
+    def get(self, idx: int) -> Optional[Dict]:
+        """Return ``{"folder", "file_type", "label", "mtime"}`` for an id, or None."""
+        if idx not in self:
+            return None
+        row = self._table[int(idx)]
+        attributes = {name: self._vocabularies[name][int(row[name])] for name in CATEGORICAL}
+        attributes["mtime"] = int(row["mtime"])
+        return attributes
+
+    def add(self, ids: Iterable[int], paths: Iterable[str]) -> None:
+        """
+        Record the attributes of new or replaced vectors.
+
+        Args:
+            ids: Vector ids.
+            paths: Image paths aligned with ids; modification times are read
+                   from the files.
+        """
+        ids = np.asarray(list(ids), dtype=np.int64)
+        paths = [str(path) for path in paths]
+        rows = np.empty(len(ids), dtype=ATTRIBUTE_DTYPE)
+        rows["folder"] = [self._code("folder", folder_of(path, self.root)) for path in paths]
+        rows["file_type"] = [self._code("file_type", file_type(path)) for path in paths]
+        rows["label"] = [self._code("label", self._label(path)) for path in paths]
+        rows["mtime"] = [_file_mtime(path) for path in paths]
+        with self._lock:
+            table = self._writable_table(int(ids.max()) + 1 if len(ids) else 0)
+            table[ids] = rows
+            self._changed()
+
+    def remove(self, ids: Iterable[int]) -> None:
+        """Mark ids as missing so no filter selects them."""
+        ids = np.asarray(list(ids), dtype=np.int64)
+        ids = ids[(ids >= 0) & (ids < len(self._table))]
+        with self._lock:
+            if len(ids):
+                self._writable_table(0)["folder"][ids] = _MISSING
+            self._changed()
+
+    def clear(self) -> None:
+        """Drop every entry."""
+        with self._lock:
+            self._table = np.empty(0, dtype=ATTRIBUTE_DTYPE)
+            self._changed()
+
+    def _changed(self) -> None:
+        """Drop cached masks; masks being computed from older contents are not cached."""
+        self._generation += 1
+        self._masks.clear()
+
+    def backfill(self, metadata: MetadataStore) -> int:
+        """
+        Add attributes for stored paths that have none, e.g. stores built
+        before attributes existed.
+
+        Returns:
+            Number of ids that were filled in.
+        """
+        ids = metadata.ids()
+        known = ids < len(self._table)
+        known[known] = self._table["folder"][ids[known]] >= 0
+        missing = ids[~known]
+        if len(missing):
+            self.add(missing, metadata.get_many(missing))
+            logger.info(f"Recorded search attributes for {len(missing)} existing vectors")
+        return len(missing)
+
+    def save(self) -> None:
+        """Atomically write the vocabularies, then the table that refers to them."""
+        _atomic_write(self.vocabulary_file, json.dumps(self._vocabularies).encode())
+        live = np.flatnonzero(self._table["folder"] >= 0)
+        buffer = io.BytesIO()
+        np.save(buffer, np.ascontiguousarray(self._table[:live[-1] + 1 if len(live) else 0]))
+        _atomic_write(self.table_file, buffer.getvalue())
+        self.load()
+
+    def mask(self, filters: Dict) -> np.ndarray:
+        """
+        Evaluate a filter into a boolean mask over ids.
+
+        Args:
+            filters: Any of ``folders`` (a folder and everything below it),
+                     ``file_types``, ``labels`` (lists of accepted values) and
+                     ``modified_after`` / ``modified_before`` (datetimes).
+        Returns:
+            Array with one entry per id up to the largest stored id; True
+            where the vector matches every given predicate.
+        """
+        key = filter_key(filters)
+        with self._lock:
+            cached = self._masks.get(key)
+            if cached is not None:
+                self._masks.move_to_end(key)
+                return cached
+            table, generation = self._table, self._generation
+
+        mask = table["folder"] >= 0
+        if filters.get("folders") is not None:
+            wanted = [folder.rstrip("/") for folder in filters["folders"]]
+            mask &= np.isin(table["folder"], self._matching_codes(
+                "folder", lambda value: any(value == folder or value.startswith(folder + "/")
+                                            or folder == "" for folder in wanted)))
+        if filters.get("file_types") is not None:
+            wanted = {normalize_file_type(value) for value in filters["file_types"]}
+            mask &= np.isin(table["file_type"],
+                            self._matching_codes("file_type", wanted.__contains__))
+        if filters.get("labels") is not None:
+            wanted = set(filters["labels"])
+            mask &= np.isin(table["label"], self._matching_codes("label", wanted.__contains__))
+        if filters.get("modified_after") is not None:
+            mask &= table["mtime"] >= _timestamp(filters["modified_after"])
+        if filters.get("modified_before") is not None:
+            mask &= table["mtime"] < _timestamp(filters["modified_before"])
+
+        with self._lock:
+            if generation == self._generation:
+                self._masks[key] = mask
+                if len(self._masks) > _MASK_CACHE_SIZE:
+                    self._masks.popitem(last=False)
+        return mask
+
+    def _matching_codes(self, name: str, predicate) -> List[int]:
+        return [code for code, value in enumerate(self._vocabularies[name]) if predicate(value)]
+
+
+def _file_mtime(path: str) -> int:
+    try:
+        return int(Path(path).stat().st_mtime)
+    except OSError:
+        return 0
+
+
+def _timestamp(value) -> int:
+    if isinstance(value, datetime):
+        return int(value.timestamp())
+    return int(value)
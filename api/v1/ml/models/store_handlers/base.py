@@ -0,0 +1,132 @@
+import hashlib
+import os
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: store writers are not serialized across processes.
+    fcntl = None
+
+
+@contextmanager
+def file_lock(lock_file: Path):
+    """
+    Hold an exclusive lock on lock_file, serializing writers across processes.
+
+    The file is opened without truncating it, so taking the lock does not
+    change the file's size or mtime.
+    """
+    fd = os.open(str(lock_file), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+
+class BaseVectorStore(ABC):
+    """Base class for all vector stores."""
+
+    # LexicalIndex over file names and captions, for stores that keep one.
+    lexical = None
+
+    @abstractmethod
+    def search(self, query_embedding, top_k: int = 5, threshold: float = 0.0,
+               **search_params) -> List[Dict]:
+        """
+        Return the top_k most similar items to the query embedding.
+
+        Backends ignore search parameters (e.g. nprobe) they do not support.
+        A ``filters`` parameter restricts results to vectors whose attributes
+        match (see AttributeStore.mask).
+        """
+        pass
+
+    def search_many(self, query_embeddings, top_k: int = 5, threshold: float = 0.0,
+                    **search_params) -> List[List[Dict]]:
+        """
+        Search a batch of query embeddings of shape (n_queries, dim).
+
+        Backends override this to search the stacked matrix in one call.
+
+        Returns:
+            One result list per query, in query order.
+        """
+        return [self.search(query.reshape(1, -1), top_k, threshold, **search_params)
+                for query in query_embeddings]
+
+    def lexical_search(self, queries: List[str], top_k: int = 5,
+                       filters: Optional[Dict] = None) -> List[List[Dict]]:
+        """
+        Rank images by BM25 over their file names and captions.
+
+        Args:
+            queries: Query texts.
+            top_k: Number of results per query.
+            filters: Attribute predicates results must match (see AttributeStore.mask).
+        Returns:
+            One list of ``{"id", "path", "score"}`` per query; empty for queries
+            matching no indexed term and for stores without a lexical index.
+        """
+        if self.lexical is None:
+            return [[] for _ in queries]
+        mask = self.attributes.mask(filters) if filters else None
+        all_results = []
+        for query in queries:
+            hits = self.lexical.search(query, top_k, mask)
+            paths = self.metadata.get_many([idx for idx, _ in hits])
+            all_results.append([{"id": idx, "path": path, "score": score}
+                                for (idx, score), path in zip(hits, paths) if path is not None])
+        return all_results
+
+    def find_ids(self, paths: List[str]) -> List[Optional[int]]:
+        """Return the vector id stored for each image path (None if not indexed)."""
+        return self.metadata.find_ids(paths)
+
+    def get_path(self, idx: int) -> Optional[str]:
+        """Return the image path stored for a vector id, or None."""
+        return self.metadata.get_path(idx)
+
+    def get_vectors(self, ids: List[int]) -> np.ndarray:
+        """
+        Return the stored, unit-norm vectors for ids as an (n, dim) float32 array.
+
+        Raises:
+            KeyError: If an id is not in the store.
+            RuntimeError: If the backend cannot return stored vectors.
+        """
+        raise RuntimeError(f"{type(self).__name__} cannot return stored vectors")
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """Return the number of vectors held by the store."""
+        pass
+
+    def _store_files(self) -> List[Path]:
+        """Return the files that back the store on disk."""
+        return []
+
+    @property
+    def version(self) -> str:
+        """
+        Identifier that changes whenever the store contents change.
+
+        Derived from the size and mtime of the backing files plus the number of
+        vectors held in memory, so workers that loaded the same files agree on
+        it without coordinating.
+        """
+        signature = []
+        for path in self._store_files():
+            if path.exists():
+                stat = path.stat()
+                signature.append((path.name, stat.st_size, stat.st_mtime_ns))
+        signature.append(len(self))
+        return hashlib.blake2b(repr(signature).encode(), digest_size=8).hexdigest()
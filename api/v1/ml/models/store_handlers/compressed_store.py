@@ -0,0 +1,131 @@
+"""
+Two-stage FAISS vector store: compressed first pass, exact re-rank.
+
+The FAISS index holds only compressed codes (4-bit scalar quantization by
+default, 8× smaller than float32; ``PQ64`` gives 32×), so a full scan of
+millions of vectors fits in modest RAM. Every search asks the index for
+``rerank_depth`` candidates and re-scores them exactly against the
+full-precision vectors, which live in a memory-mapped VectorFile and are read
+only for those candidates. Results therefore carry exact similarities, and
+recall is limited only by how often a true top-k vector falls outside the
+candidates.
+"""
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import faiss
+import numpy as np
+
+from v1.metrics import SEARCH_STAGE_DURATION
+
+from .faiss_index import _base_index, build_index, evaluate_index
+from .faiss_store import FaissVectorStore
+from .vector_file import VectorFile
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_COMPRESSED_INDEX_FACTORY = "SQ4"
+DEFAULT_RERANK_DEPTH = 256
+
+
+class CompressedVectorStore(FaissVectorStore):
+    """FAISS store that searches compressed codes and re-ranks with the full vectors.
+
+       Accepts any FAISS factory string; compressed ones (``SQ4``, ``SQ8``,
+       ``PQ64``, ``IVF4096,PQ64``...) are the point. Codes that need more
+       training data than the first batch provides fall back to ``SQ8``.
+       Stored vectors, exact filtered searches and the re-rank all read the
+       full-precision vectors, never decoded codes.
+    """
+
+    fallback_index_factory = "SQ8"
+
+    def __init__(self, dimension: int, store_dir: Path, model_handler=None,
+                 index_factory: str = DEFAULT_COMPRESSED_INDEX_FACTORY,
+                 rerank_depth: int = DEFAULT_RERANK_DEPTH,
+                 train_sample_size: int = 100000, exact_filter_limit: int = 4096):
+        """
+        Args:
+            dimension: Embedding dimension.
+            store_dir: Directory holding the index, vectors and metadata.
+            model_handler: If given, the store syncs with the dataset on load.
+            index_factory: FAISS factory string of the compressed first pass.
+            rerank_depth: Candidates taken from the first pass and re-scored
+                          exactly per query (at least top_k).
+            train_sample_size: Maximum vectors used to train the codes.
+            exact_filter_limit: Filters matching at most this many vectors
+                                are scored exactly instead of searched.
+        """
+        self.rerank_depth = rerank_depth
+        self.vectors = VectorFile(store_dir / "vectors", dimension)
+        super().__init__(dimension, store_dir, model_handler=model_handler,
+                         index_factory=index_factory, train_sample_size=train_sample_size,
+                         exact_filter_limit=exact_filter_limit)
+
+    def _new_index(self) -> faiss.Index:
+        # Vectors are never reconstructed from the codes, so the id map does
+        # not need IDMap2's reverse table.
+        return build_index(self.index_factory, self.dimension, id_map="IDMap")
+
+    def _load_store(self) -> None:
+        self.vectors.load()
+        super()._load_store()
+
+    def clear(self) -> None:
+        super().clear()
+        self.vectors.clear()
+
+    def _store_files(self) -> List[Path]:
+        return super()._store_files() + [self.vectors.rows_file]
+
+    def add_embeddings(self, embeddings: np.ndarray, metadata_items: List[Dict],
+                       ids: np.ndarray = None) -> None:
+        """Add embeddings to the compressed index and their full vectors to the vector file."""
+        ids = self._next_ids(len(embeddings)) if ids is None else np.asarray(ids, dtype=np.int64)
+        super().add_embeddings(embeddings, metadata_items, ids=ids)
+        self.vectors.add(ids, embeddings)
+
+    def remove_embeddings(self, ids: List[int]) -> None:
+        super().remove_embeddings(ids)
+        self.vectors.remove(ids)
+
+    def _stored_vectors(self, ids: np.ndarray) -> np.ndarray:
+        return self.vectors.get(ids)
+
+    def _search_ids(self, query_np: np.ndarray, top_k: int, nprobe: int = None,
+                    ef_search: int = None, filters: Optional[Dict] = None):
+        """Take rerank_depth candidates from the index and keep the exact top_k."""
+        _, candidates = super()._search_ids(query_np, max(top_k, self.rerank_depth),
+                                            nprobe=nprobe, ef_search=ef_search, filters=filters)
+        distances = np.full((len(query_np), top_k), -np.inf, dtype=np.float32)
+        indices = np.full((len(query_np), top_k), -1, dtype=np.int64)
+        with SEARCH_STAGE_DURATION.time(stage="rerank"):
+            for row, (query, ids) in enumerate(zip(query_np, candidates)):
+                ids = ids[ids >= 0]
+                ids = ids[self.vectors.known(ids)]
+                scores = self.vectors.get(ids) @ query
+                order = np.argsort(-scores, kind="stable")[:top_k]
+                distances[row, :len(order)] = scores[order]
+                indices[row, :len(order)] = ids[order]
+        return distances, indices
+
+    def build_report(self, embeddings: np.ndarray, ids: np.ndarray = None) -> Dict:
+        """Compare the two-stage search with an exact flat search and report code sizes."""
+        def two_stage_search(queries, k, **setting):
+            return self._search_ids(queries, k, **setting)[1]
+
+        code_bytes = _base_index(self.index).sa_code_size()
+        return {
+            "index_factory": self.index_factory,
+            "rerank_depth": self.rerank_depth,
+            "code_bytes_per_vector": code_bytes,
+            "float32_bytes_per_vector": 4 * self.dimension,
+            "compression": round(4 * self.dimension / code_bytes, 2),
+            **evaluate_index(self.index, embeddings, ids=ids, search=two_stage_search),
+        }
+
+    def _save_store(self) -> None:
+        # Vectors first, so a saved index never refers to vectors not yet on disk.
+        self.vectors.save()
+        super()._save_store()
@@ -0,0 +1,241 @@
+"""
+Index construction helpers for the FAISS vector store.
+
+Indexes are described with FAISS factory strings (e.g. ``Flat``,
+``IVF4096,PQ64`` or ``HNSW32``) and always use inner-product similarity,
+which equals cosine similarity for the unit-norm embeddings we store.
+"""
+import logging
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+import faiss
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_FACTORY = "Flat"
+NPROBE_SWEEP = (1, 4, 16, 64, 256)
+EF_SEARCH_SWEEP = (16, 32, 64, 128, 256)
+
+
+def build_index(index_factory: str, dimension: int, id_map: str = "IDMap2") -> faiss.Index:
+    """
+    Create an empty index from a FAISS factory string.
+
+    The index is wrapped in ``IndexIDMap2`` so vectors keep caller-assigned,
+    stable ids across incremental updates. Stores that never reconstruct
+    vectors from the index can pass ``id_map="IDMap"``, which skips the
+    reverse id table.
+    """
+    return faiss.index_factory(
+        dimension, f"{id_map},{index_factory}", faiss.METRIC_INNER_PRODUCT)
+
+
+def is_id_mapped(index: faiss.Index) -> bool:
+    """Return True if the index carries its own id mapping."""
+    return isinstance(faiss.downcast_index(index), (faiss.IndexIDMap, faiss.IndexIDMap2))
+
+
+def train_index(index: faiss.Index, embeddings: np.ndarray, sample_size: int) -> None:
+    """
+    Train the index on a random sample of embeddings if it needs training.
+
+    Args:
+        index: Index to train in place.
+        embeddings: Float32 array of shape (n, dimension).
+        sample_size: Maximum number of rows used for training.
+    """
+    if index.is_trained:
+        return
+    if embeddings.shape[0] > sample_size:
+        rng = np.random.default_rng(0)
+        sample = embeddings[rng.choice(embeddings.shape[0], sample_size, replace=False)]
+    else:
+        sample = embeddings
+    logger.info(f"Training FAISS index on {sample.shape[0]} embeddings")
+    start_time = time.time()
+    index.train(np.ascontiguousarray(sample, dtype=np.float32))
+    logger.info(f"FAISS index trained in {time.time() - start_time:.2f} seconds")
+
+
+def _base_index(index: faiss.Index) -> faiss.Index:
+    """Strip ID-mapping wrappers to reach the index that does the search."""
+    index = faiss.downcast_index(index)
+    while isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        index = faiss.downcast_index(index.index)
+    return index
+
+
+def removal_keeps_ids(index: faiss.Index) -> bool:
+    """
+    Return True if ``remove_ids`` through the id map leaves the remaining ids intact.
+
+    IndexIDMap2 compacts its id table on removal, which is only right for
+    flat-code indexes that renumber their vectors the same way. Other indexes
+    (IVF, HNSW) must keep removed ids as tombstones instead.
+    """
+    return isinstance(_base_index(index), faiss.IndexFlatCodes)
+
+
+def is_exhaustive(index: faiss.Index) -> bool:
+    """Return True if the index scores every vector exactly (Flat)."""
+    return isinstance(_base_index(index), faiss.IndexFlat)
+
+
+def bitmap_selector(mask: np.ndarray) -> Tuple[faiss.IDSelector, np.ndarray]:
+    """
+    Build a selector accepting the ids where mask is True.
+
+    Returns:
+        (selector, bitmap); keep the bitmap alive as long as the selector.
+    """
+    bitmap = np.packbits(np.asarray(mask, dtype=bool), bitorder="little")
+    # The selector takes the bitmap's size in bytes; ids past it are rejected.
+    return faiss.IDSelectorBitmap(len(bitmap), faiss.swig_ptr(bitmap)), bitmap
+
+
+def ensure_direct_map(index: faiss.Index) -> faiss.Index:
+    """
+    Give an IVF index wrapped in ``IndexIDMap2`` its direct map (id to list
+    position), which ``reconstruct`` needs.
+
+    Call it when the index is created or loaded, never on the search path:
+    building the map changes the index that concurrent searches read. Later
+    adds keep the map up to date and it is saved with the index.
+
+    Returns:
+        The index, for chaining.
+    """
+    if isinstance(faiss.downcast_index(index), faiss.IndexIDMap2):
+        ivf = faiss.try_extract_index_ivf(_base_index(index))
+        if ivf is not None and ivf.direct_map.type == faiss.DirectMap.NoMap:
+            ivf.make_direct_map()
+    return index
+
+
+def reconstruct(index: faiss.Index, ids: np.ndarray) -> np.ndarray:
+    """Return the stored vectors for ids (decoded, so approximate for compressed indexes)."""
+    return index.reconstruct_batch(np.ascontiguousarray(ids, dtype=np.int64))
+
+
+def search_parameters(index: faiss.Index, nprobe: Optional[int] = None,
+                      ef_search: Optional[int] = None,
+                      selector: Optional[faiss.IDSelector] = None) -> Optional[faiss.SearchParameters]:
+    """
+    Build per-call search parameters for an index.
+
+    Parameters are passed to ``index.search`` instead of being set on the
+    shared index, so concurrent requests can use different values.
+
+    Args:
+        index: Index the parameters are for.
+        nprobe: Number of inverted lists to visit (IVF indexes).
+        ef_search: Size of the HNSW candidate list (HNSW indexes).
+        selector: ID selector restricting which vectors can be returned.
+    Returns:
+        A SearchParameters object, or None when nothing is set.
+    """
+    base = _base_index(index)
+    try:
+        ivf = faiss.extract_index_ivf(base)
+    except RuntimeError:
+        ivf = None
+
+    if ivf is not None:
+        params = faiss.SearchParametersIVF()
+        if nprobe is not None:
+            params.nprobe = min(nprobe, ivf.nlist)
+        else:
+            params.nprobe = ivf.nprobe
+    elif isinstance(base, faiss.IndexHNSW):
+        params = faiss.SearchParametersHNSW()
+        params.efSearch = ef_search if ef_search is not None else base.hnsw.efSearch
+    elif selector is not None:
+        params = faiss.SearchParameters()
+    else:
+        return None
+
+    if selector is not None:
+        params.sel = selector
+    return params
+
+
+def _timed_search(search, queries, k, setting):
+    start_time = time.perf_counter()
+    indices = search(queries, k, **setting)
+    elapsed_ms = (time.perf_counter() - start_time) * 1000 / queries.shape[0]
+    return indices, elapsed_ms
+
+
+def _recall(indices: np.ndarray, ground_truth: np.ndarray) -> float:
+    hits = sum(len(set(row) & set(truth)) for row, truth in zip(indices, ground_truth))
+    return hits / ground_truth.size
+
+
+def evaluate_index(index: faiss.Index, embeddings: np.ndarray, k: int = 10,
+                   n_queries: int = 200, ids: Optional[np.ndarray] = None,
+                   search: Optional[Callable[..., np.ndarray]] = None) -> Dict:
+    """
+    Compare an index against an exact flat baseline over the same vectors.
+
+    Queries are drawn from the indexed embeddings. For IVF and HNSW indexes the
+    query-time knob is swept to produce a recall-vs-latency curve.
+
+    Args:
+        index: Populated index to evaluate.
+        embeddings: The vectors held by ``index``.
+        k: Recall cut-off.
+        n_queries: Number of sampled queries.
+        ids: Index ids of ``embeddings`` rows; defaults to their positions.
+        search: ``search(queries, k, **setting)`` returning result ids, for
+                stores that do more than ``index.search``; the settings are
+                the swept nprobe/ef_search values.
+    Returns:
+        Report with the flat baseline latency and one entry per setting.
+    """
+    n = embeddings.shape[0]
+    k = min(k, n)
+    rng = np.random.default_rng(0)
+    queries = np.ascontiguousarray(
+        embeddings[rng.choice(n, min(n_queries, n), replace=False)], dtype=np.float32)
+
+    flat = faiss.IndexFlatIP(embeddings.shape[1])
+    flat.add(np.ascontiguousarray(embeddings, dtype=np.float32))
+    ground_truth, flat_ms = _timed_search(lambda q, k: flat.search(q, k)[1], queries, k, {})
+    if ids is not None:
+        ground_truth = np.asarray(ids)[ground_truth]
+
+    base = _base_index(index)
+    try:
+        ivf = faiss.extract_index_ivf(base)
+    except RuntimeError:
+        ivf = None
+
+    if ivf is not None:
+        sweep = [{"nprobe": p} for p in NPROBE_SWEEP if p <= ivf.nlist]
+    elif isinstance(base, faiss.IndexHNSW):
+        sweep = [{"ef_search": ef} for ef in EF_SEARCH_SWEEP]
+    else:
+        sweep = [{}]
+
+    if search is None:
+        def search(queries, k, **setting):
+            return index.search(queries, k, params=search_parameters(index, **setting))[1]
+
+    curve = []
+    for setting in sweep:
+        indices, latency_ms = _timed_search(search, queries, k, setting)
+        curve.append({
+            **setting,
+            f"recall@{k}": round(_recall(indices, ground_truth), 4),
+            "latency_ms": round(latency_ms, 4),
+        })
+
+    return {
+        "vectors": n,
+        "queries": queries.shape[0],
+        "k": k,
+        "flat_latency_ms": round(flat_ms, 4),
+        "curve": curve,
+    }
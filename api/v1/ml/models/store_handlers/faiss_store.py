@@ -2,152 +2,374 @@ import faiss
 import numpy as np
 import json
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Optional
 import logging
 
-from v1.ml.dataset_handler.dataset import DatasetManager
-import torch
+from v1.metrics import SEARCH_STAGE_DURATION
+from v1.ml.dataset_handler.indexer import IncrementalIndexer
+
+from .attributes import AttributeStore
+from .base import BaseVectorStore, file_lock
+from .lexical import LexicalIndex
+from .metadata import MetadataStore
+from .faiss_index import (
+    DEFAULT_INDEX_FACTORY,
+    bitmap_selector,
+    build_index,
+    ensure_direct_map,
+    evaluate_index,
+    is_exhaustive,
+    is_id_mapped,
+    reconstruct,
+    removal_keeps_ids,
+    search_parameters,
+    train_index,
+)
 
 logger = logging.getLogger(__name__)
 
 
-class FaissVectorStore:
+class FaissVectorStore(BaseVectorStore):
     """Vector store using FAISS for efficient similarity search.
        If a model_handler is provided on initialization, this class will automatically
-       load image paths from the dataset and create embeddings for them.
+       bring the index up to date with the dataset, embedding only new or changed
+       images and dropping deleted ones (see IncrementalIndexer).
+
+       The index type is given as a FAISS factory string (e.g. "Flat",
+       "IVF4096,PQ64", "HNSW32"); indexes that need training are trained on a
+       sample of the embeddings when they are first built.
+
+       Vectors carry stable ids through IndexIDMap2. Index types that cannot
+       remove vectors (e.g. HNSW) keep deleted ids as tombstones that are
+       excluded at search time.
+
+       Filtered searches pass a bitmap of the matching ids (see AttributeStore)
+       into the index search. Filters that match at most exact_filter_limit
+       vectors are instead scored exactly against those vectors, because IVF
+       probes and HNSW walks can miss a few scattered matches.
+
+       File names and captions are kept in a LexicalIndex alongside the
+       vectors for keyword lookups (see lexical_search).
     """
 
-    def __init__(self, dimension: int, store_dir: Path, model_handler=None):
+    # Used when the configured index cannot be trained on the first batch.
+    fallback_index_factory = DEFAULT_INDEX_FACTORY
+
+    def __init__(self, dimension: int, store_dir: Path, model_handler=None,
+                 index_factory: str = DEFAULT_INDEX_FACTORY,
+                 train_sample_size: int = 100000, exact_filter_limit: int = 4096):
         self.dimension = dimension
         self.store_dir = store_dir
-        self.model_handler = model_handler 
+        self.model_handler = model_handler
+        self.index_factory = index_factory
+        self.train_sample_size = train_sample_size
+        self.exact_filter_limit = exact_filter_limit
         self.index_file = store_dir / "faiss.index"
-        self.metadata_file = store_dir / "faiss_metadata.json"
-        self.metadata = {}
+        # JSON metadata written by earlier versions; converted on load.
+        self.legacy_metadata_file = store_dir / "faiss_metadata.json"
+        self.tombstones_file = store_dir / "faiss_tombstones.npy"
+        self.build_report_file = store_dir / "build_report.json"
+        self.lock_file = store_dir / ".sync.lock"
+        self.tombstones = set()
+        self._tombstone_selector = None
 
         # Create the store directory if it does not exist.
         store_dir.mkdir(parents=True, exist_ok=True)
+        self.metadata = MetadataStore(store_dir / "faiss_metadata")
+        self.attributes = AttributeStore.from_settings(store_dir / "faiss_attributes")
+        self.lexical = LexicalIndex.from_settings(store_dir / "faiss_lexical")
         self._load_store()
 
-        if self.index.ntotal == 0 and self.model_handler is not None:
-            logger.info(
-                "FAISS index is empty. Initializing embeddings from dataset.")
-            self._initialize_embeddings()
+        if self.model_handler is not None:
+            self.sync_with_dataset()
 
     def _load_store(self) -> None:
         """Load the FAISS index and metadata from disk.
-        
+
         Loads the FAISS index from the index file and metadata from the metadata file.
         If the index file exists, loads the existing index, otherwise creates a new one.
-        
+        Indexes written before ids were stable are discarded so they get rebuilt.
+
         Returns:
             None
-            
+
         Raises:
-            Warning: If metadata file cannot be loaded, creates empty metadata dict
+            Warning: If legacy JSON metadata cannot be converted, starts with empty metadata
         """
+        self.metadata.load()
+        self.attributes.load()
+        self.lexical.load()
+        self.tombstones = set()
+        self._backfilled = False
         if self.index_file.exists():
-            self.index = faiss.read_index(str(self.index_file))
-            try:
-                self.metadata = json.loads(self.metadata_file.read_text())
-            except Exception:
-                self.metadata = {}
+            self.index = ensure_direct_map(faiss.read_index(str(self.index_file)))
+            if not self.metadata.exists() and self.legacy_metadata_file.exists():
+                try:
+                    self.metadata = MetadataStore.from_dict(
+                        self.store_dir / "faiss_metadata",
+                        json.loads(self.legacy_metadata_file.read_text()))
+                except Exception as e:
+                    logger.warning(f"Could not convert {self.legacy_metadata_file.name}: {str(e)}")
+            if self.tombstones_file.exists():
+                self.tombstones = set(np.load(str(self.tombstones_file)).tolist())
             logger.info(
                 f"Loaded FAISS index with {self.index.ntotal} vectors.")
+            if not is_id_mapped(self.index):
+                logger.warning(
+                    "FAISS index has no stable ids; it will be rebuilt from the dataset.")
+                self.index = self._new_index()
+                self.metadata.clear()
+                self.attributes.clear()
+                self.lexical.clear()
+            self._backfilled = bool(self.attributes.backfill(self.metadata)
+                                    + self.lexical.backfill(self.metadata))
         else:
-            self.index = faiss.IndexFlatIP(self.dimension)
-            logger.info("Created new FAISS index.")
+            self.index = self._new_index()
+            logger.info(f"Created new FAISS index ({self.index_factory}).")
+        self._refresh_tombstone_selector()
+
+    def _new_index(self) -> faiss.Index:
+        """Create an empty, untrained index of the configured type."""
+        return ensure_direct_map(build_index(self.index_factory, self.dimension))
 
+    def _sync_lock(self):
+        """Serialize dataset syncs across processes sharing the store directory."""
+        return file_lock(self.lock_file)
 
-    def _initialize_embeddings(self) -> None:
-        """Initialize embeddings from dataset in batches.
-        
-        Loads images from the dataset, generates embeddings using the model handler,
-        and adds them to the FAISS index with metadata.
+    def sync_with_dataset(self) -> Dict[str, int]:
+        """
+        Embed new or changed dataset images and drop deleted ones.
+
+        The store is reloaded under an exclusive lock first, so a sync that
+        another worker just finished is not repeated.
 
-        The method processes images in batches of 32 to manage memory efficiently.
-        
         Returns:
-            None
-            
-        Raises:
-            Warning: If no images are found in the dataset
+            Counts of new, changed, deleted and unchanged files.
         """
-        dataset = DatasetManager()
-        image_paths = dataset.load_images()
-        if not image_paths:
-            logger.warning(
-                "No images found in dataset; cannot initialize embeddings.")
-            return
+        with self._sync_lock():
+            self._load_store()
+            self._save_backfill()
+            return IncrementalIndexer(self, self.model_handler).sync()
+
+    def _save_backfill(self) -> None:
+        """
+        Save the attributes and lexical documents the last load filled in.
 
-        logger.info(
-            f"Initializing embeddings for {len(image_paths)} images from {dataset.dataset_path}")
+        Only called under the sync lock, so it never overwrites a newer save;
+        stores loaded without syncing keep the backfill in memory until then.
+        """
+        if self._backfilled:
+            self.attributes.save()
+            self.lexical.save()
+            self._backfilled = False
 
-        # Process images in batches of 32
-        batch_size = 32
-        for i in range(0, len(image_paths), batch_size):
-            batch_paths = image_paths[i:i + batch_size]
-            logger.info(
-                f"Processing batch {i//batch_size + 1} of {len(image_paths)//batch_size + 1}")
+    def rebuild(self) -> Dict[str, int]:
+        """Discard the current index and rebuild it from the dataset."""
+        with self._sync_lock():
+            self.clear()
+            return IncrementalIndexer(self, self.model_handler).sync()
 
-            # Get embeddings for the batch
-            embeddings = self.model_handler.encode_image(
-                [str(path) for path in batch_paths])
-            embeddings_np = embeddings.squeeze().cpu().numpy()
+    def clear(self) -> None:
+        """Drop every vector and start a new, untrained index (saved by _save_store)."""
+        self.index = self._new_index()
+        self.metadata.clear()
+        self.attributes.clear()
+        self.lexical.clear()
+        self.tombstones = set()
+        self._refresh_tombstone_selector()
 
-            # Normalize embeddings
-            norms = np.linalg.norm(embeddings_np, axis=1, keepdims=True)
-            embeddings_np = embeddings_np / norms
+    def build_report(self, embeddings: np.ndarray, ids: np.ndarray = None) -> Dict:
+        """Compare the index with an exact flat search over the given vectors."""
+        return {"index_factory": self.index_factory,
+                **evaluate_index(self.index, embeddings, ids=ids)}
 
-            metadata_items = []
-            for idx, path in enumerate(batch_paths):
-                metadata_items.append({
-                    "path": str(path),
-                    "index": i + idx
-                })
+    def _write_build_report(self, embeddings: np.ndarray, ids: np.ndarray = None) -> None:
+        """Compare the built index with an exact flat search and save the report."""
+        report = self.build_report(embeddings, ids)
+        self.build_report_file.write_text(json.dumps(report, indent=2))
+        logger.info(f"FAISS build report: {json.dumps(report)}")
 
-            self.add_embeddings(embeddings_np, metadata_items)
+    def __len__(self) -> int:
+        return self.index.ntotal - len(self.tombstones)
+
+    def _store_files(self) -> List[Path]:
+        return [self.index_file, self.metadata.offsets_file, self.tombstones_file,
+                self.attributes.table_file, self.lexical.postings_file]
+
+    def _refresh_tombstone_selector(self) -> None:
+        """Rebuild the selector that hides tombstoned ids from searches."""
+        if not self.tombstones:
+            self._tombstone_selector = None
+            return
+        dead = faiss.IDSelectorBatch(np.fromiter(self.tombstones, dtype=np.int64))
+        # Keep the inner selector alive alongside the wrapper that points to it.
+        self._tombstone_selector = (faiss.IDSelectorNot(dead), dead)
 
-        self._save_store()
+    def _next_ids(self, count: int) -> np.ndarray:
+        """Allocate ids after the largest id currently known."""
+        start = max([self.metadata.next_id] + [idx + 1 for idx in self.tombstones])
+        return np.arange(start, start + count, dtype=np.int64)
 
-    def add_embeddings(self, embeddings: np.ndarray, metadata_items: List[Dict]) -> None:
+    def add_embeddings(self, embeddings: np.ndarray, metadata_items: List[Dict],
+                       ids: np.ndarray = None) -> None:
         """
         Add embeddings to the FAISS index.
-        
+
         Args:
             embeddings: A numpy array of shape (n, dimension) containing normalized embeddings.
             metadata_items: A list of dictionaries with metadata for each embedding.
+            ids: Stable ids for the embeddings; allocated after the largest
+                 known id when omitted.
         """
         n = embeddings.shape[0]
-        self.index.add(embeddings)
-        start_idx = self.index.ntotal - n
-        for i, item in enumerate(metadata_items):
-            self.metadata[str(start_idx + i)] = item
+        if not self.index.is_trained:
+            try:
+                train_index(self.index, embeddings, self.train_sample_size)
+            except RuntimeError as e:
+                logger.warning(
+                    f"Could not train {self.index_factory} index on {n} embeddings "
+                    f"({str(e)}); falling back to {self.fallback_index_factory}")
+                self.index_factory = self.fallback_index_factory
+                self.index = self._new_index()
+                train_index(self.index, embeddings, self.train_sample_size)
+        ids = self._next_ids(n) if ids is None else np.asarray(ids, dtype=np.int64)
+        self.index.add_with_ids(embeddings, ids)
+        paths = [item["path"] for item in metadata_items]
+        self.metadata.add(ids, paths)
+        self.attributes.add(ids, paths)
+        self.lexical.add(ids, paths)
+
+    def remove_embeddings(self, ids: List[int]) -> None:
+        """
+        Remove vectors by id.
+
+        Index types whose removal would shift the remaining ids (IVF) or that
+        cannot remove at all (HNSW) keep the ids as tombstones, which searches
+        skip until the next rebuild.
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        try:
+            if not removal_keeps_ids(self.index):
+                raise RuntimeError("remove_ids would shift the remaining ids")
+            self.index.remove_ids(faiss.IDSelectorBatch(ids))
+        except RuntimeError:
+            self.tombstones.update(ids.tolist())
+            self._refresh_tombstone_selector()
+        self.metadata.remove(ids)
+        self.attributes.remove(ids)
+        self.lexical.remove(ids)
+
+    def get_vectors(self, ids: List[int]) -> np.ndarray:
+        """
+        Return the stored vectors for ids without calling the model.
+
+        Raises:
+            KeyError: If an id is not in the store.
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        unknown = [idx for idx in ids.tolist()
+                   if idx in self.tombstones or idx not in self.metadata]
+        if unknown:
+            raise KeyError(f"Ids not in the store: {unknown}")
+        return self._stored_vectors(ids)
+
+    def _stored_vectors(self, ids: np.ndarray) -> np.ndarray:
+        """Return the vectors of known ids, as held by the index."""
+        return reconstruct(self.index, ids)
 
-    def search(self, query_embedding: np.ndarray, top_k: int = 5, threshold: float = 0.0) -> List[Dict]:
+    def search(self, query_embedding: np.ndarray, top_k: int = 5, threshold: float = 0.0,
+               nprobe: int = None, ef_search: int = None,
+               filters: Optional[Dict] = None) -> List[Dict]:
         """
         Search for similar embeddings in the FAISS index.
-        
+
         Args:
             query_embedding: A numpy array of shape (1, dimension), normalized.
             top_k: Number of top results to return.
             threshold: Minimum similarity score.
+            nprobe: Inverted lists to visit; only used by IVF indexes.
+            ef_search: HNSW candidate list size; only used by HNSW indexes.
+            filters: Attribute predicates results must match (see AttributeStore.mask).
         Returns:
             A list of dictionaries with metadata and similarity scores.
         """
-        distances, indices = self.index.search(query_embedding, top_k)
-        results = []
-        for sim, idx in zip(distances[0], indices[0]):
-            if sim >= threshold:
-                results.append({
-                    "path": self.metadata.get(str(idx), {}).get("path", "Unknown"),
-                    "similarity": float(sim)
-                })
-        return results
+        return self.search_many(query_embedding, top_k, threshold,
+                                nprobe=nprobe, ef_search=ef_search, filters=filters)[0]
+
+    def search_many(self, query_embeddings: np.ndarray, top_k: int = 5, threshold: float = 0.0,
+                    nprobe: int = None, ef_search: int = None,
+                    filters: Optional[Dict] = None) -> List[List[Dict]]:
+        """
+        Search a batch of queries with a single ``index.search`` call.
+
+        Args:
+            query_embeddings: A numpy array of shape (n_queries, dimension), normalized.
+            top_k: Number of top results to return per query.
+            threshold: Minimum similarity score.
+            nprobe: Inverted lists to visit; only used by IVF indexes.
+            ef_search: HNSW candidate list size; only used by HNSW indexes.
+            filters: Attribute predicates results must match (see AttributeStore.mask).
+        Returns:
+            One result list per query, in query order.
+        """
+        query_np = np.ascontiguousarray(query_embeddings, dtype=np.float32).reshape(-1, self.dimension)
+        distances, indices = self._search_ids(query_np, top_k, nprobe, ef_search, filters)
+        return self._results(distances, indices, threshold)
+
+    def _search_ids(self, query_np: np.ndarray, top_k: int, nprobe: int = None,
+                    ef_search: int = None, filters: Optional[Dict] = None):
+        """Run the index search for search_many; returns (distances, indices)."""
+        selector = self._tombstone_selector[0] if self._tombstone_selector else None
+        if filters:
+            with SEARCH_STAGE_DURATION.time(stage="filter"):
+                # Removed and tombstoned ids have no attributes, so the mask
+                # already leaves them out.
+                mask = self.attributes.mask(filters)
+                matches = int(np.count_nonzero(mask))
+            if matches <= self.exact_filter_limit and not is_exhaustive(self.index):
+                return self._search_exact(query_np, np.flatnonzero(mask), top_k)
+            # The bitmap backs the selector until this search returns.
+            selector, bitmap = bitmap_selector(mask)
+        params = search_parameters(self.index, nprobe=nprobe, ef_search=ef_search,
+                                   selector=selector)
+        with SEARCH_STAGE_DURATION.time(stage="vector_search"):
+            return self.index.search(query_np, top_k, params=params)
+
+    def _search_exact(self, query_np: np.ndarray, ids: np.ndarray, top_k: int):
+        """Score queries against the vectors of ids only; returns (distances, indices)."""
+        with SEARCH_STAGE_DURATION.time(stage="vector_search"):
+            if len(ids) == 0:
+                empty = np.empty((len(query_np), 0))
+                return empty, empty.astype(np.int64)
+            vectors = self._stored_vectors(ids)
+            scores = query_np @ vectors.T
+            order = np.argsort(-scores, axis=1, kind="stable")[:, :top_k]
+            return np.take_along_axis(scores, order, axis=1), ids[order]
+
+    def _results(self, distances: np.ndarray, indices: np.ndarray,
+                 threshold: float) -> List[List[Dict]]:
+        """Turn search distances and ids into result lists with paths."""
+        all_results = []
+        with SEARCH_STAGE_DURATION.time(stage="metadata_lookup"):
+            for row_distances, row_indices in zip(distances, indices):
+                results = []
+                for sim, path in zip(row_distances, self.metadata.get_many(row_indices)):
+                    if path is not None and sim >= threshold:
+                        results.append({
+                            "path": path,
+                            "similarity": float(sim)
+                        })
+                all_results.append(results)
+        return all_results
 
     def _save_store(self) -> None:
         """Save the FAISS index and metadata to disk."""
         faiss.write_index(self.index, str(self.index_file))
-        with open(self.metadata_file, "w") as f:
-            json.dump(self.metadata, f, indent=2)
+        self.metadata.save()
+        self.attributes.save()
+        self.lexical.save()
+        if self.tombstones:
+            np.save(str(self.tombstones_file), np.fromiter(self.tombstones, dtype=np.int64))
+        elif self.tombstones_file.exists():
+            self.tombstones_file.unlink()
         logger.info("Saved FAISS index to disk.")
@@ -0,0 +1,340 @@
+"""
+BM25 index over image file names and captions.
+
+CLIP similarity ranks images by what they show, so it misses queries that name
+a file, an id or a rare token. Every vector id gets a document made of its
+file name (whole, without the extension, and split into alphanumeric runs and
+their letter/digit parts) and, when a captions CSV is configured, its caption.
+
+Postings are kept in CSR form: for each term a contiguous slice of document
+ids and term frequencies (``<prefix>.npz``), with the term vocabulary in
+``<prefix>.json``. A query touches only the postings of its own terms, so
+lookups for file names and rare tokens take microseconds however large the
+collection is. Updates sort only their own postings, which are then inserted
+into the sorted arrays by bisection.
+"""
+import csv
+import io
+import json
+import logging
+import re
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .metadata import MetadataStore, _atomic_write
+
+logger = logging.getLogger(__name__)
+
+_RUN = re.compile(r"[a-z0-9]+")
+_PARTS = re.compile(r"[a-z]+|[0-9]+")
+_MAX_PARTS = 3
+# Terms in more than this share of documents only rescore the documents
+# matched by a query's rarer terms instead of being scanned in full.
+_COMMON_TERM_SHARE = 0.01
+STOPWORDS = frozenset(
+    "a an and are as at be by for from in into is it of on or the this to with".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercase alphanumeric runs, each followed by its letter and digit parts
+    when it joins two or three (``IMG0042`` gives img0042, img, 0042). Hashes
+    and other runs of many parts are kept whole. Stopwords are dropped.
+    """
+    tokens = []
+    for run in _RUN.findall(text.lower()):
+        if run in STOPWORDS:
+            continue
+        tokens.append(run)
+        parts = _PARTS.findall(run)
+        if 1 < len(parts) <= _MAX_PARTS:
+            tokens.extend(part for part in parts if len(part) > 1)
+    return tokens
+
+
+def document_tokens(path: str, caption: str = "") -> List[str]:
+    """Tokens indexed for an image: its file name in full and in pieces, and its caption."""
+    name = Path(path).name.lower()
+    stem = Path(name).stem
+    tokens = tokenize(stem)
+    for term in (name, stem):
+        if term not in tokens and term not in STOPWORDS:
+            tokens.append(term)
+    return tokens + tokenize(caption)
+
+
+def query_terms(query: str) -> List[str]:
+    """Distinct terms of a query, including whole file names it mentions."""
+    terms = tokenize(query)
+    for word in query.lower().split():
+        word = word.strip("\"'`,;()")
+        terms.extend((word, Path(word).stem))
+    return list(dict.fromkeys(term for term in terms if term and term not in STOPWORDS))
+
+
+def load_captions(captions_file: Path) -> Dict[str, str]:
+    """
+    Read image captions from a CSV file with ``file_name`` and ``caption`` columns.
+
+    Returns:
+        Captions keyed by file name (without directories).
+    """
+    with open(captions_file, newline="") as f:
+        return {Path(row["file_name"]).name: row["caption"] or ""
+                for row in csv.DictReader(f)}
+
+
+def reciprocal_rank_fusion(rankings: List[List[Dict]], k: int = 60) -> List[Dict]:
+    """
+    Merge ranked result lists by reciprocal rank fusion.
+
+    Each result scores ``sum(1 / (k + rank))`` over the lists it appears in
+    (rank starting at 1), so results ranked well by several lists come first
+    without comparing their raw scores. Results are matched by ``path``; the
+    first list's dict is kept for results found in several lists.
+
+    Returns:
+        The distinct results by descending fused score, ties in list order.
+    """
+    fused, scores = {}, Counter()
+    for ranking in rankings:
+        for rank, result in enumerate(ranking, start=1):
+            fused.setdefault(result["path"], result)
+            scores[result["path"]] += 1.0 / (k + rank)
+    return [fused[path] for path in sorted(fused, key=lambda path: -scores[path])]
+
+
+class LexicalIndex:
+    """Okapi BM25 over file name and caption tokens, keyed by integer vector id."""
+
+    def __init__(self, prefix: Path, captions_file: Optional[Path] = None,
+                 k1: float = 1.2, b: float = 0.75):
+        """
+        Args:
+            prefix: Path prefix for the ``.npz`` postings and ``.json`` vocabulary.
+            captions_file: Optional CSV of image captions (see load_captions).
+            k1: BM25 term frequency saturation.
+            b: BM25 document length normalization.
+        """
+        self.postings_file = prefix.with_name(prefix.name + ".npz")
+        self.vocabulary_file = prefix.with_name(prefix.name + ".json")
+        self.captions_file = Path(captions_file) if captions_file else None
+        self.k1 = k1
+        self.b = b
+        self._captions = None
+        self._lock = threading.Lock()
+        self.load()
+
+    @classmethod
+    def from_settings(cls, prefix: Path) -> "LexicalIndex":
+        """Build an index using ``DATASET_SETTINGS['CAPTIONS_FILE']`` and the BM25 settings."""
+        from django.conf import settings
+
+        hybrid = settings.ML_SETTINGS.get("HYBRID_SEARCH", {})
+        dataset_settings = getattr(settings, "DATASET_SETTINGS", {})
+        return cls(prefix, captions_file=dataset_settings.get("CAPTIONS_FILE"),
+                   k1=hybrid.get("BM25_K1", 1.2), b=hybrid.get("BM25_B", 0.75))
+
+    def load(self) -> None:
+        """Read the postings and vocabulary from disk."""
+        if self.postings_file.exists() and self.vocabulary_file.exists():
+            with np.load(str(self.postings_file)) as arrays:
+                self._set(arrays["indptr"], arrays["doc_ids"], arrays["tfs"], arrays["lengths"])
+            self._vocabulary = json.loads(self.vocabulary_file.read_text())
+        else:
+            self._set(np.zeros(1, dtype=np.int64), np.empty(0, dtype=np.int64),
+                      np.empty(0, dtype=np.float32), np.empty(0, dtype=np.float32))
+            self._vocabulary = []
+        self._terms = {term: code for code, term in enumerate(self._vocabulary)}
+
+    def _set(self, indptr: np.ndarray, doc_ids: np.ndarray, tfs: np.ndarray,
+             lengths: np.ndarray) -> None:
+        """Swap in new postings; searches read them without taking the lock."""
+        live = lengths > 0
+        self._postings = (indptr, doc_ids, tfs, lengths, int(np.count_nonzero(live)),
+                          float(lengths[live].mean()) if live.any() else 0.0)
+
+    def __len__(self) -> int:
+        return self._postings[4]
+
+    def _caption(self, path: str) -> str:
+        if self._captions is None:
+            self._captions = {}
+            if self.captions_file is not None and self.captions_file.exists():
+                try:
+                    self._captions = load_captions(self.captions_file)
+                except Exception as e:
+                    logger.warning(f"Could not read captions from {self.captions_file}: {str(e)}")
+        return self._captions.get(Path(path).name, "")
+
+    def _code(self, term: str) -> int:
+        if term not in self._terms:
+            self._terms[term] = len(self._vocabulary)
+            self._vocabulary.append(term)
+        return self._terms[term]
+
+    def add(self, ids: Iterable[int], paths: Iterable[str]) -> None:
+        """
+        Index new or replaced documents.
+
+        Args:
+            ids: Vector ids.
+            paths: Image paths aligned with ids.
+        """
+        ids = np.asarray(list(ids), dtype=np.int64)
+        documents = [Counter(document_tokens(str(path), self._caption(str(path))))
+                     for path in paths]
+        with self._lock:
+            terms = np.fromiter((self._code(term) for counts in documents for term in counts),
+                                dtype=np.int64)
+            docs = np.repeat(ids, [len(counts) for counts in documents])
+            tfs = np.fromiter((tf for counts in documents for tf in counts.values()),
+                              dtype=np.float32, count=len(terms))
+            lengths = np.array([sum(counts.values()) for counts in documents], dtype=np.float32)
+            self._merge(ids, terms, docs, tfs, lengths)
+
+    def remove(self, ids: Iterable[int]) -> None:
+        """Drop documents by id."""
+        ids = np.asarray(list(ids), dtype=np.int64)
+        empty = np.empty(0, dtype=np.int64)
+        with self._lock:
+            self._merge(ids, empty, empty, np.empty(0, dtype=np.float32),
+                        np.zeros(len(ids), dtype=np.float32))
+
+    def _merge(self, ids: np.ndarray, terms: np.ndarray, docs: np.ndarray, tfs: np.ndarray,
+               lengths: np.ndarray) -> None:
+        """Replace the postings of ids with the given (term, doc, tf) triples."""
+        indptr, old_docs, old_tfs, old_lengths = self._postings[:4]
+        old_terms = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+        present = ids[ids < len(old_lengths)]
+        if np.any(old_lengths[present] > 0):
+            replaced = np.zeros(len(old_lengths), dtype=bool)
+            replaced[present] = True
+            keep = ~replaced[old_docs]
+            old_terms, old_docs, old_tfs = old_terms[keep], old_docs[keep], old_tfs[keep]
+
+        # The old postings are sorted by (term, doc) already: sort only the new
+        # ones and insert them where their keys fall.
+        order = np.lexsort((docs, terms))
+        terms, docs, tfs = terms[order], docs[order], tfs[order]
+        stride = max(int(old_docs.max(initial=-1)), int(docs.max(initial=-1))) + 1
+        positions = np.searchsorted(old_terms * stride + old_docs, terms * stride + docs)
+        counts = (np.bincount(old_terms, minlength=len(self._vocabulary))
+                  + np.bincount(terms, minlength=len(self._vocabulary)))
+
+        table = np.zeros(max(len(old_lengths), int(ids.max()) + 1 if len(ids) else 0),
+                         dtype=np.float32)
+        table[:len(old_lengths)] = old_lengths
+        table[ids] = lengths
+        self._set(np.concatenate([[0], np.cumsum(counts)]).astype(np.int64),
+                  np.insert(old_docs, positions, docs), np.insert(old_tfs, positions, tfs),
+                  table)
+
+    def clear(self) -> None:
+        """Drop every document."""
+        with self._lock:
+            self._vocabulary = []
+            self._terms = {}
+            self._set(np.zeros(1, dtype=np.int64), np.empty(0, dtype=np.int64),
+                      np.empty(0, dtype=np.float32), np.empty(0, dtype=np.float32))
+
+    def backfill(self, metadata: MetadataStore) -> int:
+        """
+        Index stored paths that have no document, e.g. stores built before
+        the lexical index existed.
+
+        Returns:
+            Number of ids that were indexed.
+        """
+        ids = metadata.ids()
+        lengths = self._postings[3]
+        known = ids < len(lengths)
+        known[known] = lengths[ids[known]] > 0
+        missing = ids[~known]
+        if len(missing):
+            self.add(missing, metadata.get_many(missing))
+            logger.info(f"Indexed file names of {len(missing)} existing vectors for lexical search")
+        return len(missing)
+
+    def save(self) -> None:
+        """Atomically write the vocabulary, then the postings that refer to it."""
+        indptr, doc_ids, tfs, lengths = self._postings[:4]
+        _atomic_write(self.vocabulary_file, json.dumps(self._vocabulary).encode())
+        buffer = io.BytesIO()
+        np.savez(buffer, indptr=indptr, doc_ids=doc_ids, tfs=tfs, lengths=lengths)
+        _atomic_write(self.postings_file, buffer.getvalue())
+
+    def _bm25(self, tf: np.ndarray, lengths: np.ndarray, df: int, count: int,
+              mean_length: float) -> np.ndarray:
+        idf = np.log1p((count - df + 0.5) / (df + 0.5))
+        return idf * tf * (self.k1 + 1) / (
+            tf + self.k1 * (1 - self.b + self.b * lengths / mean_length))
+
+    def search(self, query: str, top_k: int = 5,
+               mask: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """
+        Rank documents for a query with BM25.
+
+        Args:
+            query: Free text; file names may be given with or without extension.
+            top_k: Number of documents to return.
+            mask: Optional boolean array over ids; only True ids are returned.
+        Returns:
+            (id, score) pairs by descending score; empty when no term matches.
+        """
+        indptr, doc_ids, tfs, lengths, count, mean_length = self._postings
+        codes = [self._terms[term] for term in query_terms(query) if term in self._terms]
+        codes = [code for code in codes if code < len(indptr) - 1]
+        if not codes or count == 0:
+            return []
+
+        codes = np.asarray(codes)
+        dfs = indptr[codes + 1] - indptr[codes]
+        common = dfs > max(_COMMON_TERM_SHARE * count, 1000)
+        if common.all():
+            rare_codes, common_codes = codes, []
+        else:
+            rare_codes = [code for code, is_common in zip(codes, common) if not is_common]
+            common_codes = [code for code, is_common in zip(codes, common) if is_common]
+
+        docs, scores = [], []
+        for code in rare_codes:
+            start, end = indptr[code], indptr[code + 1]
+            if start < end:
+                docs.append(doc_ids[start:end])
+                scores.append(self._bm25(tfs[start:end], lengths[doc_ids[start:end]],
+                                         end - start, count, mean_length))
+        if common_codes and not docs:
+            return []
+        candidates = np.unique(np.concatenate(docs)) if common_codes else None
+        for code in common_codes:
+            # Postings are sorted by id, so candidates are found by bisection.
+            start, end = indptr[code], indptr[code + 1]
+            positions = start + np.searchsorted(doc_ids[start:end], candidates)
+            found = positions < end
+            found[found] = doc_ids[positions[found]] == candidates[found]
+            positions = positions[found]
+            docs.append(doc_ids[positions])
+            scores.append(self._bm25(tfs[positions], lengths[doc_ids[positions]],
+                                     end - start, count, mean_length))
+        if not docs:
+            return []
+
+        several = len(docs) > 1
+        docs, scores = np.concatenate(docs), np.concatenate(scores)
+        if mask is not None:
+            keep = docs < len(mask)
+            keep[keep] = mask[docs[keep]]
+            docs, scores = docs[keep], scores[keep]
+        if len(docs) and several:
+            docs, inverse = np.unique(docs, return_inverse=True)
+            scores = np.bincount(inverse, weights=scores)
+        if len(docs) > top_k:
+            top = np.argpartition(-scores, top_k - 1)[:top_k]
+            docs, scores = docs[top], scores[top]
+        order = np.lexsort((docs, -scores))
+        return [(int(docs[i]), float(scores[i])) for i in order]
@@ -0,0 +1,244 @@
+"""
+Compact metadata storage for the vector stores.
+
+Image paths are packed into a single UTF-8 blob and addressed through an int64
+table of (offset, length) rows indexed directly by vector id, so a lookup is
+two array reads instead of a dict probe on a string key. Both files are
+memory-mapped on load: startup does not parse anything, and worker processes
+share the page-cached bytes instead of each holding millions of Python objects.
+
+The blob is append-only. Rewriting an entry appends the new bytes and moves the
+row; removing one marks the row as missing. ``clear`` starts a fresh blob.
+
+Reverse lookups (path to id) use a sorted array of 64-bit path hashes that is
+built on first use and dropped whenever the entries change.
+"""
+import hashlib
+import io
+import logging
+import os
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_MISSING = -1
+
+
+def _path_key(path: str) -> int:
+    """64-bit hash of a path for the reverse lookup table."""
+    return int.from_bytes(hashlib.blake2b(path.encode("utf-8"), digest_size=8).digest(),
+                          "little", signed=True)
+
+
+def _atomic_write(path: Path, data: bytes) -> None:
+    """Write data to path via a temporary file and an atomic rename."""
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class MetadataStore:
+    """Image paths keyed by integer vector id."""
+
+    def __init__(self, prefix: Path):
+        """
+        Args:
+            prefix: Path prefix for the ``.offsets.npy`` and ``.blob`` files.
+        """
+        self.offsets_file = prefix.with_name(prefix.name + ".offsets.npy")
+        self.blob_file = prefix.with_name(prefix.name + ".blob")
+        self.load()
+
+    def exists(self) -> bool:
+        """Return True if the store has been saved to disk."""
+        return self.offsets_file.exists()
+
+    def load(self) -> None:
+        """Memory-map the offset table and blob from disk."""
+        self._tail = bytearray()
+        self._reverse = None
+        if self.offsets_file.exists():
+            self._table = np.load(str(self.offsets_file), mmap_mode="r")
+        else:
+            self._table = np.empty((0, 2), dtype=np.int64)
+        if self.blob_file.exists() and self.blob_file.stat().st_size > 0:
+            self._blob = np.memmap(str(self.blob_file), dtype=np.uint8, mode="r")
+        else:
+            self._blob = np.empty(0, dtype=np.uint8)
+        self._blob_size = len(self._blob)
+
+    def _writable_table(self, size: int) -> np.ndarray:
+        """Return an in-memory table with at least ``size`` rows."""
+        if not self._table.flags.writeable:
+            self._table = np.array(self._table)
+        if len(self._table) < size:
+            grown = np.full((max(size, 2 * len(self._table)), 2), _MISSING, dtype=np.int64)
+            grown[:len(self._table)] = self._table
+            self._table = grown
+        return self._table
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self._table[:, 1] >= 0))
+
+    def __contains__(self, idx) -> bool:
+        idx = int(idx)
+        return 0 <= idx < len(self._table) and self._table[idx, 1] >= 0
+
+    def known(self, ids: Iterable[int]) -> np.ndarray:
+        """Return a boolean array, True where an id has a live entry."""
+        ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        found = (ids >= 0) & (ids < len(self._table))
+        found[found] = self._table[ids[found], 1] >= 0
+        return found
+
+    @property
+    def next_id(self) -> int:
+        """One past the largest id ever stored (removed ids are not reused)."""
+        ids = np.flatnonzero(self._table[:, 0] >= 0)
+        return int(ids[-1]) + 1 if len(ids) else 0
+
+    def ids(self) -> np.ndarray:
+        """Return the ids of all live entries in ascending order."""
+        return np.flatnonzero(self._table[:, 1] >= 0)
+
+    def _decode(self, start: int, length: int) -> str:
+        end = start + length
+        if start >= self._blob_size:
+            return self._tail[start - self._blob_size:end - self._blob_size].decode("utf-8")
+        return self._blob[start:end].tobytes().decode("utf-8")
+
+    def get_path(self, idx: int) -> Optional[str]:
+        """Return the path stored for an id, or None."""
+        if idx not in self:
+            return None
+        start, length = self._table[int(idx)]
+        return self._decode(int(start), int(length))
+
+    def get(self, idx: int) -> Optional[Dict]:
+        """Return ``{"path", "index"}`` for an id, or None."""
+        path = self.get_path(idx)
+        return None if path is None else {"path": path, "index": int(idx)}
+
+    def get_many(self, ids: Iterable[int]) -> List[Optional[str]]:
+        """
+        Return the paths for many ids at once.
+
+        Args:
+            ids: Vector ids, e.g. a row of FAISS search results. Negative or
+                 unknown ids map to None.
+        Returns:
+            Paths aligned with ids.
+        """
+        ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        valid = (ids >= 0) & (ids < len(self._table))
+        rows = self._table[np.where(valid, ids, 0)] if len(self._table) else \
+            np.full((len(ids), 2), _MISSING, dtype=np.int64)
+        valid &= rows[:, 1] >= 0
+        return [self._decode(int(start), int(length)) if ok else None
+                for (start, length), ok in zip(rows.tolist(), valid.tolist())]
+
+    def find_ids(self, paths: Iterable[str]) -> List[Optional[int]]:
+        """
+        Return the id stored for each path.
+
+        Args:
+            paths: Image paths as returned in search results.
+        Returns:
+            Ids aligned with paths; None for paths that are not stored.
+        """
+        if self._reverse is None:
+            ids = self.ids()
+            keys = np.fromiter((_path_key(path) for path in self.get_many(ids)),
+                               dtype=np.int64, count=len(ids))
+            order = np.argsort(keys, kind="stable")
+            self._reverse = (keys[order], ids[order])
+        keys, ids = self._reverse
+        found = []
+        for path in paths:
+            key = _path_key(path)
+            lo, hi = np.searchsorted(keys, key, "left"), np.searchsorted(keys, key, "right")
+            # Hashes can collide, so confirm the stored path.
+            found.append(next((int(ids[i]) for i in range(lo, hi)
+                               if self.get_path(ids[i]) == path), None))
+        return found
+
+    def items(self) -> Iterator[Tuple[int, str]]:
+        """Iterate over (id, path) for all live entries."""
+        ids = self.ids()
+        return zip(ids.tolist(), self.get_many(ids))
+
+    def add(self, ids: Iterable[int], paths: Iterable[str]) -> None:
+        """Store paths for ids, replacing any existing entries."""
+        ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        encoded = [str(path).encode("utf-8") for path in paths]
+        if len(ids) != len(encoded):
+            raise ValueError(f"Got {len(ids)} ids for {len(encoded)} paths")
+        if not len(ids):
+            return
+        if ids.min() < 0:
+            raise ValueError("Metadata ids must be non-negative")
+
+        lengths = np.fromiter((len(b) for b in encoded), dtype=np.int64, count=len(encoded))
+        starts = self._blob_size + len(self._tail) + np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        table = self._writable_table(int(ids.max()) + 1)
+        table[ids, 0] = starts
+        table[ids, 1] = lengths
+        self._tail += b"".join(encoded)
+        self._reverse = None
+
+    def remove(self, ids: Iterable[int]) -> None:
+        """Mark ids as missing; their bytes are reclaimed by ``clear``."""
+        ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        ids = ids[(ids >= 0) & (ids < len(self._table))]
+        if len(ids):
+            # Keep the offset so next_id still counts the removed id.
+            self._writable_table(0)[ids, 1] = _MISSING
+            self._reverse = None
+
+    def clear(self) -> None:
+        """Drop every entry and start a new blob on the next save."""
+        self._table = np.empty((0, 2), dtype=np.int64)
+        self._blob = np.empty(0, dtype=np.uint8)
+        self._blob_size = 0
+        self._tail = bytearray()
+        self._reverse = None
+
+    def save(self) -> None:
+        """
+        Persist pending changes.
+
+        New bytes are appended to the blob before the offset table is
+        atomically replaced, so a reader never sees rows pointing past the end
+        of the blob it maps.
+        """
+        table = self._table
+        used = np.flatnonzero(table[:, 0] >= 0)
+        table = np.ascontiguousarray(table[:used[-1] + 1] if len(used) else table[:0])
+        if self._blob_size == 0:
+            _atomic_write(self.blob_file, bytes(self._tail))
+        elif self._tail:
+            with open(self.blob_file, "ab") as f:
+                f.write(self._tail)
+                f.flush()
+                os.fsync(f.fileno())
+        buffer = io.BytesIO()
+        np.save(buffer, table)
+        _atomic_write(self.offsets_file, buffer.getvalue())
+        self.load()
+
+    @classmethod
+    def from_dict(cls, prefix: Path, metadata: Dict[str, Dict]) -> "MetadataStore":
+        """Build and save a store from the legacy ``{str(id): {"path": ...}}`` layout."""
+        store = cls(prefix)
+        store.clear()
+        ids = [int(idx) for idx in metadata]
+        store.add(ids, [metadata[str(idx)]["path"] for idx in ids])
+        store.save()
+        logger.info(f"Converted {len(ids)} metadata entries to {store.offsets_file.name}")
+        return store
@@ -1,75 +1,268 @@
 """
 Embedding store for managing and searching image embeddings.
+
+Vectors live in append-only segment files of raw, unit-norm float32 rows. A
+small manifest lists the live segments; each add writes one new segment and
+rewrites only the manifest. Image paths are kept in a MetadataStore indexed by
+row position, which compaction preserves, and filterable attributes in an
+AttributeStore keyed the same way. Segments are opened with ``np.memmap``, so worker
+processes share a single page-cached copy, and a background compaction merges
+them once too many accumulate. Compactions are serialized across processes by
+a file lock, and the segments a compaction replaces are only deleted by the
+next one, so readers that loaded the previous manifest can still map them.
 """
+import json
 import logging
+import threading
 from pathlib import Path
-from typing import List, Tuple, Dict
+from typing import List, Tuple, Dict, Optional
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 import torch
-import json
+
+from v1.metrics import SEARCH_STAGE_DURATION
+
+from .attributes import AttributeStore
+from .lexical import LexicalIndex
+from .base import BaseVectorStore, file_lock
+from .metadata import MetadataStore, _atomic_write
 
 logger = logging.getLogger(__name__)
 
 
-class EmbeddingStore:
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """Return a C-contiguous float32 copy of matrix with unit-norm rows."""
+    matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def top_k_indices(scores: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Select the top_k highest scores per row in O(N).
+
+    Args:
+        scores: Array of shape (n_queries, n_items).
+        top_k: Number of winners to keep per row.
+    Returns:
+        (indices, scores) of shape (n_queries, k), sorted by descending score.
+    """
+    k = min(top_k, scores.shape[1])
+    if k < scores.shape[1]:
+        candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.broadcast_to(np.arange(k), (scores.shape[0], k))
+    candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+    order = np.argsort(-candidate_scores, axis=1)
+    return (np.take_along_axis(candidates, order, axis=1),
+            np.take_along_axis(candidate_scores, order, axis=1))
+
+
+class EmbeddingStore(BaseVectorStore):
     """Manages storage and retrieval of image embeddings."""
 
-    def __init__(self, store_dir: Path):
+    def __init__(self, store_dir: Path, max_segments: int = 8):
         """Initialize embedding store."""
         self.store_dir = store_dir
+        self.segments_dir = store_dir / "segments"
+        self.manifest_file = store_dir / "manifest.json"
+        # Single-file layout written by earlier versions; migrated on load.
         self.embeddings_file = store_dir / "embeddings.npy"
         self.metadata_file = store_dir / "metadata.json"
-        self.embeddings = None
-        self.metadata = {}
+        self.lock_file = store_dir / ".sync.lock"
+        self.max_segments = max_segments
+        self.dimension = None
+        self.segments = []
+        # Segments replaced by the last compaction; deleted by the next one.
+        self._retired = []
+        self._next_segment = 1
+        self._write_lock = threading.Lock()
+        self._compaction_thread = None
 
         # Create store directory if it doesn't exist
-        self.store_dir.mkdir(parents=True, exist_ok=True)
+        self.segments_dir.mkdir(parents=True, exist_ok=True)
+        self.metadata = MetadataStore(store_dir / "paths")
+        self.attributes = AttributeStore.from_settings(store_dir / "attributes")
+        self.lexical = LexicalIndex.from_settings(store_dir / "lexical")
         self._load_store()
 
     def _load_store(self) -> None:
-        """Load embeddings and metadata from disk."""
+        """Memory-map the live segments listed in the manifest."""
         try:
-            if self.embeddings_file.exists():
-                self.embeddings = np.load(str(self.embeddings_file))
-                self.metadata = json.loads(self.metadata_file.read_text())
+            if not self.manifest_file.exists() and self.embeddings_file.exists():
+                self._migrate_legacy_store()
+
+            if self.manifest_file.exists():
+                manifest = json.loads(self.manifest_file.read_text())
+                self.dimension = manifest["dimension"]
+                self._next_segment = manifest["next_segment"]
+                self._retired = manifest.get("retired", [])
+                self.segments = [self._open_segment(entry)
+                                 for entry in manifest["segments"]]
+                if not self.metadata.exists():
+                    self._migrate_segment_paths(manifest["segments"])
+                self.attributes.backfill(self.metadata)
+                self.lexical.backfill(self.metadata)
                 logger.info(
-                    f"Loaded {len(self.metadata)} embeddings from store")
+                    f"Loaded {len(self.metadata)} embeddings from "
+                    f"{len(self.segments)} segments")
             else:
-                self.embeddings = np.array([])
                 logger.info("Created new embedding store")
         except Exception as e:
             logger.error(f"Failed to load embedding store: {str(e)}")
             raise
 
+    def _migrate_legacy_store(self) -> None:
+        """Convert a single embeddings.npy/metadata.json store into a segment."""
+        embeddings = np.load(str(self.embeddings_file))
+        metadata = json.loads(self.metadata_file.read_text())
+        paths = [metadata[str(i)]["path"] for i in range(embeddings.shape[0])]
+        self.dimension = int(np.prod(embeddings.shape[1:]))
+        entry = self._write_segment(
+            _normalize_rows(embeddings.reshape(embeddings.shape[0], -1)))
+        self.metadata.clear()
+        self.metadata.add(range(len(paths)), paths)
+        self.metadata.save()
+        self._write_manifest([entry])
+        logger.info(
+            f"Migrated {len(paths)} embeddings from {self.embeddings_file.name} "
+            "to the segment store; the old files can be removed")
+
+    def _migrate_segment_paths(self, entries: List[Dict]) -> None:
+        """Move per-segment JSON path lists written by earlier versions into the metadata store."""
+        paths = []
+        for entry in entries:
+            paths.extend(json.loads(self._segment_file(entry["name"], "json").read_text()))
+        self.metadata.add(range(len(paths)), paths)
+        self.metadata.save()
+        logger.info(f"Moved {len(paths)} segment paths to {self.metadata.offsets_file.name}")
+
+    def _segment_file(self, name: str, suffix: str = "f32") -> Path:
+        return self.segments_dir / f"{name}.{suffix}"
+
+    def _open_segment(self, entry: Dict) -> Dict:
+        """Memory-map one segment."""
+        vectors = np.memmap(str(self._segment_file(entry["name"])), dtype=np.float32,
+                            mode="r", shape=(entry["rows"], self.dimension))
+        return {"name": entry["name"], "vectors": vectors}
+
+    def _write_segment(self, vectors: np.ndarray) -> Dict:
+        """Write vectors as a new immutable segment."""
+        name = f"seg-{self._next_segment:06d}"
+        self._next_segment += 1
+        _atomic_write(self._segment_file(name), vectors.tobytes())
+        return {"name": name, "rows": vectors.shape[0]}
+
+    @staticmethod
+    def _entry(segment: Dict) -> Dict:
+        return {"name": segment["name"], "rows": segment["vectors"].shape[0]}
+
+    def _write_manifest(self, entries: List[Dict]) -> None:
+        """Atomically replace the manifest listing the live segments."""
+        manifest = {
+            "dimension": self.dimension,
+            "next_segment": self._next_segment,
+            "segments": entries,
+            "retired": self._retired,
+        }
+        _atomic_write(self.manifest_file, json.dumps(manifest, indent=2).encode())
+
+    def __len__(self) -> int:
+        return sum(segment["vectors"].shape[0] for segment in self.segments)
+
+    def _store_files(self) -> List[Path]:
+        return [self.manifest_file, self.attributes.table_file, self.lexical.postings_file]
+
     def add_embeddings(self, embeddings: torch.Tensor, image_paths: List[str]) -> None:
-        """Add new embeddings to the store."""
-
-        embeddings_np = embeddings.squeeze().numpy()
-        if len(embeddings_np.shape) == 1:
-            embeddings_np = embeddings_np.reshape(1, -1)
-        
-        # normalize before storing
-        embeddings_np = embeddings_np / \
-            np.linalg.norm(embeddings_np, axis=1, keepdims=True)
-
-        if self.embeddings.size == 0:
-            self.embeddings = embeddings_np
-        else:
-            # append or stack to existing embeddings
-            self.embeddings = np.vstack([self.embeddings, embeddings_np])
-
-        # Update metadata
-        for idx, path in enumerate(image_paths):
-            current_idx = str(idx)  
-            self.metadata[current_idx] = {
-                "path": str(path),
-                "index": idx
-            }
-
-        self._save_store()
-
-    def search(self, query_embedding: torch.Tensor, top_k: int = 5, threshold: float = 0.0) -> List[Dict]:
+        """Append new embeddings to the store as a new segment."""
+        embeddings_np = embeddings.detach().cpu().numpy()
+        embeddings_np = _normalize_rows(embeddings_np.reshape(-1, embeddings_np.shape[-1]))
+        paths = [str(path) for path in image_paths]
+        if not paths:
+            return
+
+        with self._write_lock:
+            if self.dimension is None:
+                self.dimension = embeddings_np.shape[1]
+            start_idx = len(self)
+            entry = self._write_segment(embeddings_np)
+            # Paths are saved before the manifest that makes their rows visible.
+            self.metadata.add(range(start_idx, start_idx + len(paths)), paths)
+            self.metadata.save()
+            self.attributes.add(range(start_idx, start_idx + len(paths)), paths)
+            self.attributes.save()
+            self.lexical.add(range(start_idx, start_idx + len(paths)), paths)
+            self.lexical.save()
+            self._write_manifest([self._entry(seg) for seg in self.segments] + [entry])
+            # Replace rather than mutate the list so concurrent searches see
+            # either the old or the new set of segments.
+            self.segments = self.segments + [self._open_segment(entry)]
+
+        logger.info(f"Added segment {entry['name']} with {entry['rows']} embeddings")
+        if len(self.segments) > self.max_segments:
+            self._schedule_compaction()
+
+    def _schedule_compaction(self) -> None:
+        """Start a background compaction unless one is already running."""
+        if self._compaction_thread is not None and self._compaction_thread.is_alive():
+            return
+        self._compaction_thread = threading.Thread(
+            target=self.compact, name="embedding-store-compaction", daemon=True)
+        self._compaction_thread.start()
+
+    def compact(self) -> None:
+        """
+        Merge all current segments into one and retire the old files.
+
+        Retired segments stay on disk until the following compaction, giving
+        other processes time to reload the manifest that no longer lists them.
+        """
+        with file_lock(self.lock_file):
+            segments = self.segments
+            if len(segments) < 2:
+                return
+            on_disk = json.loads(self.manifest_file.read_text())["segments"]
+            if [entry["name"] for entry in on_disk[:len(segments)]] != \
+                    [seg["name"] for seg in segments]:
+                logger.info("Embedding segments changed on disk; skipping compaction")
+                return
+
+            logger.info(f"Compacting {len(segments)} embedding segments")
+            merged_vectors = np.concatenate([seg["vectors"] for seg in segments])
+
+            with self._write_lock:
+                merged_entry = self._write_segment(merged_vectors)
+                # Segments appended while we were merging stay live after the merge.
+                added = self.segments[len(segments):]
+                stale, self._retired = self._retired, [seg["name"] for seg in segments]
+                self._write_manifest([merged_entry] + [self._entry(seg) for seg in added])
+                self.segments = [self._open_segment(merged_entry)] + added
+
+            # Readers holding the old memmaps keep the unlinked inodes alive.
+            for name in stale:
+                self._segment_file(name).unlink(missing_ok=True)
+                self._segment_file(name, "json").unlink(missing_ok=True)
+        logger.info(f"Compacted into segment {merged_entry['name']}")
+
+    def get_vectors(self, ids: List[int]) -> np.ndarray:
+        """
+        Return the stored rows for ids, reading them from the segment memmaps.
+
+        Raises:
+            KeyError: If an id is not in the store.
+        """
+        ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        segments = self.segments
+        starts = np.cumsum([0] + [segment["vectors"].shape[0] for segment in segments])
+        unknown = ids[(ids < 0) | (ids >= starts[-1])]
+        if len(unknown):
+            raise KeyError(f"Ids not in the store: {unknown.tolist()}")
+        owners = np.searchsorted(starts, ids, side="right") - 1
+        return np.stack([segments[owner]["vectors"][idx - starts[owner]]
+                         for idx, owner in zip(ids.tolist(), owners.tolist())])
+
+    def search(self, query_embedding: torch.Tensor, top_k: int = 5, threshold: float = 0.0,
+               filters: Optional[Dict] = None, **search_params) -> List[Dict]:
         """
         Retrieve the top_k images whose embeddings are most similar to the query embedding.
 
@@ -79,52 +272,67 @@ class EmbeddingStore:
             top_k: Number of top results to return.
             threshold: Minimal similarity score to include a result.
                        Setting this to 0.0 will simply return the top_k.
+            filters: Attribute predicates results must match (see AttributeStore.mask).
+            search_params: Index tuning knobs such as nprobe; ignored because
+                           the search is always exhaustive.
         Returns:
             A list of dictionaries each containing image path and similarity score.
         """
-        if self.embeddings.size == 0:
-            logger.warning("Empty embedding store - no images to search")
-            return []
+        return self.search_many(query_embedding.reshape(1, -1), top_k, threshold, filters)[0]
 
-        logger.debug(
-            f"Searching through {self.embeddings.shape[0]} embeddings")
+    def search_many(self, query_embeddings: torch.Tensor, top_k: int = 5,
+                    threshold: float = 0.0, filters: Optional[Dict] = None,
+                    **search_params) -> List[List[Dict]]:
+        """
+        Search a batch of queries with one matmul against the stored matrix.
 
-        query_np = query_embedding.squeeze().numpy().reshape(1, -1)
-        query_norm = np.linalg.norm(query_np, axis=1, keepdims=True)
-        if (query_norm == 0).any():
+        Args:
+            query_embeddings: Tensor of shape (n_queries, dim).
+            top_k: Number of top results to return per query.
+            threshold: Minimal similarity score to include a result.
+            filters: Attribute predicates results must match; rows that fail
+                     them are masked out before the top-k selection.
+        Returns:
+            One result list per query, in query order.
+        """
+        query_np = query_embeddings.detach().cpu().numpy().reshape(-1, query_embeddings.shape[-1])
+        zero_norm = np.linalg.norm(query_np, axis=1) == 0
+        if zero_norm.any():
             logger.error("Query embedding norm is zero!")
-            return []
-        query_np = query_np / query_norm
-
-        # enforce or ensure embeddings are 2D and normalized.
-        embeddings_2d = self.embeddings.reshape(self.embeddings.shape[0], -1)
-        embeddings_norm = np.linalg.norm(embeddings_2d, axis=1, keepdims=True)
-        embeddings_2d = embeddings_2d / embeddings_norm
-
-        # Calculate cosine similarity 
-        similarities = cosine_similarity(query_np, embeddings_2d)[0]
-        sorted_indices = np.argsort(similarities)[::-1]
-
-        results = []
-        for idx in sorted_indices:
-            if similarities[idx] >= threshold:
-                results.append({
-                    "path": self.metadata[str(idx)]["path"],
-                    "similarity": float(similarities[idx])
-                })
-            if len(results) >= top_k:
-                break
+        query_np = _normalize_rows(query_np)
+        if len(self) == 0:
+            logger.warning("Empty embedding store - no images to search")
+            return [[] for _ in range(query_np.shape[0])]
 
-        logger.info(
-            f"Found {len(results)} results above threshold {threshold}")
-        return results
+        logger.debug(f"Searching through {len(self)} embeddings")
 
-    def _save_store(self) -> None:
-        """Save embeddings and metadata to disk."""
-        try:
-            np.save(str(self.embeddings_file), self.embeddings)
-            self.metadata_file.write_text(json.dumps(self.metadata, indent=2))
-            logger.info("Saved embedding store to disk")
-        except Exception as e:
-            logger.error(f"Failed to save embedding store: {str(e)}")
-            raise
+        with SEARCH_STAGE_DURATION.time(stage="vector_search"):
+            # Rows are unit-norm, so the inner product is the cosine similarity.
+            similarities = np.concatenate(
+                [query_np @ segment["vectors"].T for segment in self.segments], axis=1)
+            if filters:
+                mask = self.attributes.mask(filters)[:similarities.shape[1]]
+                rejected = np.ones(similarities.shape[1], dtype=bool)
+                rejected[:len(mask)] = ~mask
+                similarities[:, rejected] = -np.inf
+            indices, scores = top_k_indices(similarities, top_k)
+
+        all_results = []
+        with SEARCH_STAGE_DURATION.time(stage="metadata_lookup"):
+            for row_indices, row_scores, skip in zip(indices, scores, zero_norm):
+                results = []
+                if skip:
+                    all_results.append(results)
+                    continue
+                for path, sim in zip(self.metadata.get_many(row_indices), row_scores):
+                    if sim < threshold or sim == -np.inf:
+                        break
+                    results.append({
+                        "path": path,
+                        "similarity": float(sim)
+                    })
+                all_results.append(results)
+
+        logger.info(
+            f"Found {sum(len(r) for r in all_results)} results above threshold {threshold}")
+        return all_results
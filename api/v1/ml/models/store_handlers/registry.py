@@ -0,0 +1,237 @@
+"""
+Process-wide registry of vector stores.
+
+Stores are loaded once per (backend, store directory) and the same instance is
+handed to every request. When the files backing a store change on disk, the
+first caller to notice rebuilds the store and swaps it in atomically; concurrent
+callers keep using the previous instance until the replacement is ready.
+
+Loading a store never syncs it with the dataset: that is left to the warm-up
+(warm_vector_store) and the ``reindex``/``build_index`` commands, so a reload
+triggered by another worker's sync does not start a sync of its own.
+"""
+import logging
+import os
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_STORE_SUBDIRS = {
+    "faiss": "faiss_store",
+    "sharded": "sharded_store",
+    "compressed": "compressed_store",
+    "numpy": "embeddings",
+}
+
+# Backends that sync with the dataset through IncrementalIndexer.
+INDEXED_BACKENDS = ("faiss", "sharded", "compressed")
+
+# Files that change without the store's contents changing: the sync lock and
+# the indexer's file manifest (with its SQLite journal files).
+_UNTRACKED_PREFIXES = (".", "file_manifest.sqlite3")
+
+_lock = threading.Lock()
+_stores: Dict[Tuple[str, str], "_StoreEntry"] = {}
+
+
+@dataclass
+class _StoreEntry:
+    store: Any
+    signature: Tuple
+    reloading: bool = field(default=False)
+
+
+def _reset_in_child() -> None:
+    """
+    A fork while another thread loads a store (e.g. the warm-up under
+    ``gunicorn --preload``) would leave the child's lock held forever and a
+    reload marked as running; the child gets a free lock and fresh entries.
+    """
+    global _lock, _stores
+
+    _lock = threading.Lock()
+    _stores = {key: _StoreEntry(entry.store, entry.signature) for key, entry in _stores.items()}
+
+
+os.register_at_fork(after_in_child=_reset_in_child)
+
+
+def get_backend() -> str:
+    """Return the configured vector store backend name."""
+    return settings.ML_SETTINGS.get("VECTORSTORE", "numpy")
+
+
+def get_indexed_backend() -> str:
+    """Return the configured backend if it syncs with the dataset, else "faiss"."""
+    backend = get_backend()
+    return backend if backend in INDEXED_BACKENDS else "faiss"
+
+
+def get_store_dir(backend: str) -> Path:
+    """Return the on-disk directory used by the given backend."""
+    return Path(settings.BASE_DIR) / "vectorstore" / _STORE_SUBDIRS[backend]
+
+
+def _disk_signature(store_dir: Path) -> Tuple:
+    """Fingerprint the files at the top level of a store directory.
+
+    Only ``stat`` calls are made, so this is cheap enough to run per request.
+    """
+    if not store_dir.exists():
+        return ()
+    signature = []
+    for path in sorted(store_dir.iterdir()):
+        if path.is_file() and not path.name.startswith(_UNTRACKED_PREFIXES):
+            stat = path.stat()
+            signature.append((path.name, stat.st_size, stat.st_mtime_ns))
+    return tuple(signature)
+
+
+def create_store(backend: str, store_dir: Optional[Path] = None, model_handler=None,
+                 index_factory: Optional[str] = None):
+    """
+    Construct a new, unshared store instance configured from ``ML_SETTINGS``.
+
+    Args:
+        backend: Store backend name ("faiss", "sharded", "compressed" or "numpy").
+        store_dir: Directory holding the store files. Defaults to the
+                   backend's directory under ``BASE_DIR / "vectorstore"``.
+        model_handler: Passed to FAISS-based stores, which then sync with the
+                       dataset on load. The shared stores are built without one.
+        index_factory: FAISS factory string overriding
+                       ``ML_SETTINGS["FAISS"]["INDEX_FACTORY"]`` (or
+                       ``ML_SETTINGS["COMPRESSED"]["INDEX_FACTORY"]``).
+    Returns:
+        The new store.
+    """
+    store_dir = Path(store_dir) if store_dir else get_store_dir(backend)
+    if backend in INDEXED_BACKENDS:
+        faiss_settings = settings.ML_SETTINGS.get('FAISS', {})
+        options = dict(
+            dimension=settings.ML_SETTINGS['MODELS']['clip']['embedding_dim'],
+            store_dir=store_dir,
+            model_handler=model_handler,
+            index_factory=index_factory or faiss_settings.get('INDEX_FACTORY', 'Flat'),
+            train_sample_size=faiss_settings.get('TRAIN_SAMPLE_SIZE', 100000),
+        )
+        if backend == "compressed":
+            from .compressed_store import CompressedVectorStore
+
+            compressed = settings.ML_SETTINGS.get('COMPRESSED', {})
+            options["index_factory"] = index_factory or compressed.get('INDEX_FACTORY', 'SQ4')
+            logger.info("Using compressed FAISS vector store with exact re-ranking")
+            return CompressedVectorStore(rerank_depth=compressed.get('RERANK_DEPTH', 256),
+                                         **options)
+        if backend == "sharded":
+            from .sharded_store import ShardedVectorStore
+
+            sharding = settings.ML_SETTINGS.get('SHARDING', {})
+            logger.info("Using sharded FAISS vector store for similarity search")
+            return ShardedVectorStore(shards=sharding.get('SHARDS', 4),
+                                      search_threads=sharding.get('SEARCH_THREADS'), **options)
+
+        from .faiss_store import FaissVectorStore
+
+        logger.info("Using FAISS vector store for similarity search")
+        return FaissVectorStore(**options)
+
+    from .numpy_store import EmbeddingStore
+
+    logger.info("Using Numpy-based embedding store for similarity search")
+    return EmbeddingStore(store_dir)
+
+
+def _build_store(backend: str, store_dir: Path):
+    """Load a store instance for the backend from disk, without syncing it."""
+    return create_store(backend, store_dir)
+
+
+def get_vector_store(backend: Optional[str] = None, store_dir: Optional[Path] = None):
+    """
+    Return the shared store for a backend, loading it on first use.
+
+    Args:
+        backend: Store backend name ("faiss", "sharded", "compressed" or
+                 "numpy"). Defaults to ``ML_SETTINGS["VECTORSTORE"]``.
+        store_dir: Directory holding the store files. Defaults to the
+                   backend's directory under ``BASE_DIR / "vectorstore"``.
+    Returns:
+        The store instance shared by the whole process.
+    """
+    backend = backend or get_backend()
+    if backend not in _STORE_SUBDIRS:
+        raise ValueError(f"Unknown vector store backend: {backend}")
+    store_dir = Path(store_dir) if store_dir else get_store_dir(backend)
+    key = (backend, str(store_dir.resolve()))
+
+    entry = _stores.get(key)
+    if entry is None:
+        with _lock:
+            entry = _stores.get(key)
+            if entry is None:
+                store = _build_store(backend, store_dir)
+                entry = _StoreEntry(store, _disk_signature(store_dir))
+                _stores[key] = entry
+        return entry.store
+
+    signature = _disk_signature(store_dir)
+    if signature == entry.signature:
+        return entry.store
+
+    with _lock:
+        if entry.reloading or _stores.get(key) is not entry:
+            return _stores[key].store
+        entry.reloading = True
+
+    try:
+        logger.info(f"Vector store files changed in {store_dir}; reloading")
+        store = _build_store(backend, store_dir)
+    except Exception as e:
+        logger.error(f"Failed to reload vector store: {str(e)}")
+        with _lock:
+            entry.signature = signature
+            entry.reloading = False
+        return entry.store
+
+    with _lock:
+        _stores[key] = _StoreEntry(store, _disk_signature(store_dir))
+    return store
+
+
+def warm_vector_store() -> None:
+    """
+    Load the configured store so the first request does not pay for it.
+
+    Stores that sync with the dataset are synced first (serialized across
+    workers by the store's lock) and then shared.
+    """
+    backend = get_backend()
+    if backend not in INDEXED_BACKENDS:
+        get_vector_store(backend)
+        return
+
+    from ..clip import initialize_clip_model
+
+    store_dir = get_store_dir(backend)
+    store = create_store(backend, store_dir, model_handler=initialize_clip_model())
+    with _lock:
+        _stores[(backend, str(store_dir.resolve()))] = _StoreEntry(
+            store, _disk_signature(store_dir))
+
+
+def loaded_stores() -> List[Tuple[str, Any]]:
+    """Return (backend, store) for every store loaded in this process, without loading any."""
+    # No lock: get_vector_store holds it while a store loads, and metrics
+    # must not wait for that. Copying the dict is atomic under the GIL.
+    return [(backend, entry.store) for (backend, _), entry in list(_stores.items())]
+
+
+def clear_vector_stores() -> None:
+    """Drop every cached store; the next lookup reloads from disk."""
+    with _lock:
+        _stores.clear()
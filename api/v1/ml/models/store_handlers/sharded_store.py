@@ -0,0 +1,324 @@
+"""
+Vector store split across several FAISS shards.
+
+Each shard is a complete FaissVectorStore (index, paths, attributes and
+tombstones) in its own ``shard-NNN`` directory; ``shards.json`` records how
+many there are. Searches run on every shard at once in a shared thread pool
+(FAISS releases the GIL while it scans), and the per-shard top-k lists, each
+already sorted, are merged with a heap. Vector ids stay global, so callers see
+the same interface as a single FaissVectorStore.
+
+New vectors go to the least filled shards. Raising the shard count adds empty
+shards that take new vectors first; existing vectors stay where they are until
+the next rebuild spreads everything evenly.
+"""
+import heapq
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from v1.metrics import SEARCH_STAGE_DURATION
+from v1.ml.dataset_handler.indexer import IncrementalIndexer
+
+from .base import BaseVectorStore, file_lock
+from .faiss_index import DEFAULT_INDEX_FACTORY
+from .faiss_store import FaissVectorStore
+from .metadata import _atomic_write
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_pool_size = 0
+_pool_lock = threading.Lock()
+
+
+def _search_pool(workers: int) -> ThreadPoolExecutor:
+    """
+    Return the process-wide shard search pool, growing it to ``workers`` threads.
+
+    A grown pool replaces the old one without shutting it down: searches that
+    already hold the old pool may still submit to it. Its idle threads exit
+    once the last of them drops it.
+    """
+    global _pool, _pool_size
+
+    with _pool_lock:
+        if _pool is None or _pool_size < workers:
+            _pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="shard-search")
+            _pool_size = workers
+        return _pool
+
+
+def _reset_pool_in_child() -> None:
+    """Forked workers cannot use the parent's threads; they build their own pool."""
+    global _pool, _pool_size, _pool_lock
+
+    _pool, _pool_size, _pool_lock = None, 0, threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_pool_in_child)
+
+
+class ShardedVectorStore(BaseVectorStore):
+    """FAISS vector store partitioned into shards that are searched in parallel."""
+
+    def __init__(self, dimension: int, store_dir: Path, model_handler=None, shards: int = 4,
+                 index_factory: str = DEFAULT_INDEX_FACTORY, train_sample_size: int = 100000,
+                 exact_filter_limit: int = 4096, search_threads: Optional[int] = None):
+        """
+        Args:
+            dimension: Embedding dimension.
+            store_dir: Directory holding ``shards.json`` and the shard directories.
+            model_handler: If given, the store is synced with the dataset on load.
+            shards: Number of shards. A store on disk with more shards keeps them.
+            index_factory: FAISS factory string used by every shard.
+            train_sample_size: Vectors used to train each shard's index.
+            exact_filter_limit: Per-shard limit for exact filtered search.
+            search_threads: Threads searching shards concurrently (default:
+                            one per shard).
+        """
+        self.dimension = dimension
+        self.store_dir = store_dir
+        self.model_handler = model_handler
+        self.index_factory = index_factory
+        self.train_sample_size = train_sample_size
+        self.exact_filter_limit = exact_filter_limit
+        self.manifest_file = store_dir / "shards.json"
+        self.build_report_file = store_dir / "build_report.json"
+        self.lock_file = store_dir / ".sync.lock"
+        store_dir.mkdir(parents=True, exist_ok=True)
+
+        shard_count = shards
+        if self.manifest_file.exists():
+            stored = json.loads(self.manifest_file.read_text())["shards"]
+            if stored > shards:
+                logger.warning(f"Store has {stored} shards; keeping them although "
+                               f"{shards} are configured (rebuild to shrink it)")
+            shard_count = max(stored, shards)
+        self.shards = [self._open_shard(i) for i in range(shard_count)]
+        self.search_threads = search_threads or shard_count
+        logger.info(f"Loaded sharded vector store with {len(self)} vectors "
+                    f"in {shard_count} shards")
+
+        if self.model_handler is not None:
+            self.sync_with_dataset()
+
+    def _open_shard(self, number: int) -> FaissVectorStore:
+        return FaissVectorStore(
+            self.dimension, self.store_dir / f"shard-{number:03d}",
+            index_factory=self.index_factory, train_sample_size=self.train_sample_size,
+            exact_filter_limit=self.exact_filter_limit)
+
+    def _sync_lock(self):
+        """Serialize dataset syncs across processes sharing the store directory."""
+        return file_lock(self.lock_file)
+
+    def _load_store(self) -> None:
+        """Reload every shard from disk."""
+        for shard in self.shards:
+            shard._load_store()
+
+    def sync_with_dataset(self) -> Dict[str, int]:
+        """
+        Embed new or changed dataset images and drop deleted ones.
+
+        Returns:
+            Counts of new, changed, deleted and unchanged files.
+        """
+        with self._sync_lock():
+            self._load_store()
+            for shard in self.shards:
+                shard._save_backfill()
+            return IncrementalIndexer(self, self.model_handler).sync()
+
+    def rebuild(self) -> Dict[str, int]:
+        """Discard every shard and rebuild them from the dataset, spread evenly."""
+        with self._sync_lock():
+            for shard in self.shards:
+                shard.clear()
+            return IncrementalIndexer(self, self.model_handler).sync()
+
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self.shards)
+
+    def _store_files(self) -> List[Path]:
+        return [self.manifest_file] + [path for shard in self.shards
+                                       for path in shard._store_files()]
+
+    def _owners(self, ids: np.ndarray) -> np.ndarray:
+        """Return the shard number holding each id, or -1 for unknown ids."""
+        owners = np.full(len(ids), -1, dtype=np.int64)
+        for number, shard in enumerate(self.shards):
+            owners[shard.metadata.known(ids)] = number
+        return owners
+
+    def _assign(self, count: int) -> np.ndarray:
+        """Pick a shard for each of count new vectors, filling the emptiest shards first."""
+        sizes = np.array([len(shard) for shard in self.shards], dtype=np.int64)
+        # Raise the emptiest shards to the highest common level count allows,
+        # then hand the remainder out one per shard at that level.
+        low, high = int(sizes.min()), int(sizes.min()) + count
+        while low < high:
+            level = (low + high + 1) // 2
+            if np.maximum(level - sizes, 0).sum() <= count:
+                low = level
+            else:
+                high = level - 1
+        room = np.maximum(low - sizes, 0)
+        at_level = np.flatnonzero(sizes + room == low)
+        room[at_level[:count - int(room.sum())]] += 1
+        return np.repeat(np.arange(len(sizes)), room)
+
+    def _next_ids(self, count: int) -> np.ndarray:
+        """Allocate ids after the largest id known to any shard."""
+        start = max(int(shard._next_ids(1)[0]) for shard in self.shards)
+        return np.arange(start, start + count, dtype=np.int64)
+
+    def add_embeddings(self, embeddings: np.ndarray, metadata_items: List[Dict],
+                       ids: np.ndarray = None) -> None:
+        """
+        Add embeddings, spreading them over the shards.
+
+        Args:
+            embeddings: A numpy array of shape (n, dimension) containing normalized embeddings.
+            metadata_items: A list of dictionaries with metadata for each embedding.
+            ids: Stable ids for the embeddings; allocated after the largest
+                 known id when omitted.
+        """
+        n = embeddings.shape[0]
+        ids = self._next_ids(n) if ids is None else np.asarray(ids, dtype=np.int64)
+        owners = self._assign(n)
+        for number, shard in enumerate(self.shards):
+            rows = np.flatnonzero(owners == number)
+            if len(rows):
+                shard.add_embeddings(embeddings[rows], [metadata_items[row] for row in rows],
+                                     ids=ids[rows])
+
+    def remove_embeddings(self, ids: List[int]) -> None:
+        """Remove vectors by id from whichever shards hold them."""
+        ids = np.asarray(ids, dtype=np.int64)
+        owners = self._owners(ids)
+        for number, shard in enumerate(self.shards):
+            if np.any(owners == number):
+                shard.remove_embeddings(ids[owners == number])
+
+    def get_path(self, idx: int) -> Optional[str]:
+        for shard in self.shards:
+            path = shard.get_path(idx)
+            if path is not None:
+                return path
+        return None
+
+    def find_ids(self, paths: List[str]) -> List[Optional[int]]:
+        found = [None] * len(paths)
+        for shard in self.shards:
+            for i, idx in enumerate(shard.find_ids(paths)):
+                if idx is not None:
+                    found[i] = idx
+        return found
+
+    def get_vectors(self, ids: List[int]) -> np.ndarray:
+        """
+        Return the stored vectors for ids from the shards holding them.
+
+        Raises:
+            KeyError: If an id is not in the store.
+        """
+        ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        owners = self._owners(ids)
+        if np.any(owners < 0):
+            raise KeyError(f"Ids not in the store: {ids[owners < 0].tolist()}")
+        vectors = np.empty((len(ids), self.dimension), dtype=np.float32)
+        for number in np.unique(owners).tolist():
+            rows = owners == number
+            vectors[rows] = self.shards[number].get_vectors(ids[rows])
+        return vectors
+
+    def search(self, query_embedding: np.ndarray, top_k: int = 5, threshold: float = 0.0,
+               **search_params) -> List[Dict]:
+        """
+        Search every shard for the top_k most similar vectors.
+
+        Args:
+            query_embedding: A numpy array of shape (1, dimension), normalized.
+            top_k: Number of top results to return.
+            threshold: Minimum similarity score.
+            search_params: nprobe, ef_search and filters, passed to every shard.
+        Returns:
+            A list of dictionaries with metadata and similarity scores.
+        """
+        return self.search_many(query_embedding, top_k, threshold, **search_params)[0]
+
+    def search_many(self, query_embeddings: np.ndarray, top_k: int = 5, threshold: float = 0.0,
+                    **search_params) -> List[List[Dict]]:
+        """
+        Search all shards concurrently and merge their results.
+
+        Args:
+            query_embeddings: A numpy array of shape (n_queries, dimension), normalized.
+            top_k: Number of top results to return per query.
+            threshold: Minimum similarity score.
+            search_params: nprobe, ef_search and filters, passed to every shard.
+        Returns:
+            One result list per query, in query order.
+        """
+        query_np = np.ascontiguousarray(query_embeddings, dtype=np.float32).reshape(
+            -1, self.dimension)
+        shards = [shard for shard in self.shards if shard.index.ntotal > 0]
+        if not shards:
+            return [[] for _ in range(len(query_np))]
+        if len(shards) == 1:
+            return shards[0].search_many(query_np, top_k, threshold, **search_params)
+
+        pool = _search_pool(self.search_threads)
+        futures = [pool.submit(shard.search_many, query_np, top_k, threshold, **search_params)
+                   for shard in shards]
+        per_shard = [future.result() for future in futures]
+
+        with SEARCH_STAGE_DURATION.time(stage="shard_merge"):
+            # Each shard's list is sorted by descending similarity already.
+            return [list(islice(heapq.merge(*(results[i] for results in per_shard),
+                                            key=lambda result: -result["similarity"]), top_k))
+                    for i in range(len(query_np))]
+
+    def lexical_search(self, queries: List[str], top_k: int = 5,
+                       filters: Optional[Dict] = None) -> List[List[Dict]]:
+        """
+        Rank images by BM25 in every shard and merge the lists by score.
+
+        Each shard scores with its own term statistics, which even filling
+        keeps close to those of the whole collection.
+        """
+        per_shard = [shard.lexical_search(queries, top_k, filters)
+                     for shard in self.shards if len(shard)]
+        return [list(islice(heapq.merge(*(results[i] for results in per_shard),
+                                        key=lambda result: -result["score"]), top_k))
+                for i in range(len(queries))]
+
+    def _save_store(self) -> None:
+        """Save every shard, then the manifest, whose change tells other workers to reload."""
+        for shard in self.shards:
+            shard._save_store()
+        _atomic_write(self.manifest_file, json.dumps({
+            "shards": len(self.shards),
+            "index_factory": self.index_factory,
+            "vectors": [len(shard) for shard in self.shards],
+        }, indent=2).encode())
+
+    def _write_build_report(self, embeddings: np.ndarray, ids: np.ndarray = None) -> None:
+        """Save a build report per shard, each comparing it with an exact search."""
+        ids = np.arange(len(embeddings)) if ids is None else np.asarray(ids, dtype=np.int64)
+        owners = self._owners(ids)
+        report = {"index_factory": self.index_factory, "shards": [
+            shard.build_report(embeddings[owners == number], ids[owners == number])
+            for number, shard in enumerate(self.shards) if np.any(owners == number)]}
+        self.build_report_file.write_text(json.dumps(report, indent=2))
+        logger.info(f"Sharded FAISS build report: {json.dumps(report)}")
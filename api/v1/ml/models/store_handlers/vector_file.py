@@ -0,0 +1,195 @@
+"""
+Full-precision vectors on disk for the compressed vector store.
+
+Vectors are float32 rows in an append-only file (``<prefix>.f32``) addressed
+through an int64 table of row numbers indexed by vector id
+(``<prefix>.rows.npy``, -1 for missing ids). Both are memory-mapped on load,
+so the full vectors cost page cache rather than process memory, and only the
+rows a query re-ranks are ever read.
+
+Like the metadata blob, the file only grows in place: new rows are appended
+before the row table is atomically replaced, and ``clear`` and compaction write
+a new file that replaces the old one by rename. Processes that still map the
+old file keep reading it until they reload.
+"""
+import io
+import logging
+import os
+from pathlib import Path
+from typing import Iterable, List
+
+import numpy as np
+
+from .metadata import _atomic_write
+
+logger = logging.getLogger(__name__)
+
+_MISSING = -1
+_WRITE_CHUNK_ROWS = 65536
+
+
+class VectorFile:
+    """Float32 vectors keyed by integer vector id."""
+
+    def __init__(self, prefix: Path, dimension: int):
+        """
+        Args:
+            prefix: Path prefix for the ``.f32`` and ``.rows.npy`` files.
+            dimension: Length of every vector.
+        """
+        self.data_file = prefix.with_name(prefix.name + ".f32")
+        self.rows_file = prefix.with_name(prefix.name + ".rows.npy")
+        self.dimension = dimension
+        self.row_bytes = 4 * dimension
+        self.load()
+
+    def load(self) -> None:
+        """Memory-map the row table and vectors from disk."""
+        self._tail: List[np.ndarray] = []
+        self._tail_starts = np.empty(0, dtype=np.int64)
+        self._tail_rows = 0
+        if self.rows_file.exists():
+            self._rows = np.load(str(self.rows_file), mmap_mode="r")
+        else:
+            self._rows = np.empty(0, dtype=np.int64)
+        size = self.data_file.stat().st_size if self.data_file.exists() else 0
+        # A partial row left by an interrupted append is not mapped.
+        data_rows = size // self.row_bytes
+        if data_rows:
+            self._data = np.memmap(str(self.data_file), dtype=np.float32, mode="r",
+                                   shape=(data_rows, self.dimension))
+        else:
+            self._data = np.empty((0, self.dimension), dtype=np.float32)
+        self._data_rows = data_rows
+
+    def _writable_rows(self, size: int) -> np.ndarray:
+        """Return an in-memory row table with at least ``size`` entries."""
+        if not self._rows.flags.writeable:
+            self._rows = np.array(self._rows)
+        if len(self._rows) < size:
+            grown = np.full(max(size, 2 * len(self._rows)), _MISSING, dtype=np.int64)
+            grown[:len(self._rows)] = self._rows
+            self._rows = grown
+        return self._rows
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self._rows >= 0))
+
+    def known(self, ids: Iterable[int]) -> np.ndarray:
+        """Return a boolean array, True where an id has a stored vector."""
+        ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        found = (ids >= 0) & (ids < len(self._rows))
+        found[found] = self._rows[ids[found]] >= 0
+        return found
+
+    def get(self, ids: Iterable[int]) -> np.ndarray:
+        """
+        Return the vectors of ids as an (n, dimension) float32 array.
+
+        Raises:
+            KeyError: If an id has no stored vector.
+        """
+        ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        found = self.known(ids)
+        if not found.all():
+            raise KeyError(f"Ids without stored vectors: {ids[~found].tolist()}")
+        rows = np.asarray(self._rows[ids])
+        vectors = np.empty((len(ids), self.dimension), dtype=np.float32)
+        on_disk = rows < self._data_rows
+        vectors[on_disk] = self._data[rows[on_disk]]
+        pending = np.flatnonzero(~on_disk)
+        if len(pending):
+            offsets = rows[pending] - self._data_rows
+            chunks = np.searchsorted(self._tail_starts, offsets, "right") - 1
+            for chunk in np.unique(chunks):
+                selected = chunks == chunk
+                vectors[pending[selected]] = \
+                    self._tail[chunk][offsets[selected] - self._tail_starts[chunk]]
+        return vectors
+
+    def add(self, ids: Iterable[int], vectors: np.ndarray) -> None:
+        """Store vectors for ids, replacing any existing ones."""
+        ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32).reshape(-1, self.dimension)
+        if len(ids) != len(vectors):
+            raise ValueError(f"Got {len(ids)} ids for {len(vectors)} vectors")
+        if not len(ids):
+            return
+        if ids.min() < 0:
+            raise ValueError("Vector ids must be non-negative")
+
+        start = self._data_rows + self._tail_rows
+        self._writable_rows(int(ids.max()) + 1)[ids] = np.arange(start, start + len(ids))
+        self._tail.append(vectors)
+        self._tail_starts = np.append(self._tail_starts, self._tail_rows)
+        self._tail_rows += len(vectors)
+
+    def remove(self, ids: Iterable[int]) -> None:
+        """Mark ids as missing; their rows are reclaimed by compaction or ``clear``."""
+        ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        ids = ids[(ids >= 0) & (ids < len(self._rows))]
+        if len(ids):
+            self._writable_rows(0)[ids] = _MISSING
+
+    def clear(self) -> None:
+        """Drop every vector and start a new file on the next save."""
+        self._rows = np.empty(0, dtype=np.int64)
+        self._data = np.empty((0, self.dimension), dtype=np.float32)
+        self._data_rows = 0
+        self._tail = []
+        self._tail_starts = np.empty(0, dtype=np.int64)
+        self._tail_rows = 0
+
+    def save(self) -> None:
+        """
+        Persist pending changes.
+
+        New rows are appended to the vector file before the row table is
+        atomically replaced, so a reader never sees rows past the end of the
+        file it maps. When more than half of the file's rows belong to removed
+        or replaced vectors, the live ones are copied to a new file instead.
+        """
+        live = len(self)
+        if self._data_rows and self._data_rows + self._tail_rows > 2 * live:
+            self._compact()
+            return
+        if self._data_rows == 0:
+            self._replace_data(self._tail)
+        elif self._tail:
+            with open(self.data_file, "ab") as f:
+                # Drop a partial row left by an interrupted append.
+                f.truncate(self._data_rows * self.row_bytes)
+                for vectors in self._tail:
+                    f.write(vectors.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+        self._write_rows(self._rows)
+
+    def _compact(self) -> None:
+        """Rewrite the file with only the live vectors, in id order."""
+        ids = np.flatnonzero(self._rows >= 0)
+        logger.info(f"Compacting {self.data_file.name}: keeping {len(ids)} of "
+                    f"{self._data_rows + self._tail_rows} rows")
+        self._replace_data(self.get(ids[start:start + _WRITE_CHUNK_ROWS])
+                           for start in range(0, len(ids), _WRITE_CHUNK_ROWS))
+        rows = np.full(ids[-1] + 1 if len(ids) else 0, _MISSING, dtype=np.int64)
+        rows[ids] = np.arange(len(ids))
+        self._write_rows(rows)
+
+    def _replace_data(self, chunks: Iterable[np.ndarray]) -> None:
+        """Write vectors to a new file and rename it over the old one."""
+        tmp_path = self.data_file.with_name(self.data_file.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            for vectors in chunks:
+                f.write(vectors.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.data_file)
+
+    def _write_rows(self, rows: np.ndarray) -> None:
+        """Atomically replace the row table, trimmed after the last live id, and reload."""
+        live = np.flatnonzero(rows >= 0)
+        buffer = io.BytesIO()
+        np.save(buffer, np.ascontiguousarray(rows[:live[-1] + 1 if len(live) else 0]))
+        _atomic_write(self.rows_file, buffer.getvalue())
+        self.load()
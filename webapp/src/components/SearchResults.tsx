@@ -1,7 +1,16 @@
 import React from "react";
 import { motion } from "framer-motion";
 import { API_URL } from "../lib/constants";
-import { SearchResponse } from "../types";
+import { SearchResponse, SearchResult } from "../types";
+
+// Result paths may come from a Windows or POSIX host.
+const fileName = (path: string) => path.split(/[\\/]/).pop() ?? path;
+
+// Resized variants served by the API; the browser picks one from the card width.
+// With the content hash as `v` the URL is content-addressed and cached as immutable.
+const imageUrl = ({ path, version }: SearchResult, width: number) =>
+  `${API_URL}/api/v1/images/${encodeURIComponent(fileName(path))}?w=${width}&fmt=webp` +
+  (version ? `&v=${version}` : "");
 
 export const SearchResults: React.FC<SearchResponse> = ({
   results,
@@ -57,7 +66,11 @@ export const SearchResults: React.FC<SearchResponse> = ({
           transition={{ delay: index * 0.1 }}
         >
           <img
-            src={`${API_URL}/api/v1/images/${result.path.split("\\").pop()}`}
+            src={imageUrl(result, 512)}
+            srcSet={`${imageUrl(result, 256)} 256w, ${imageUrl(result, 512)} 512w, ${imageUrl(result, 1024)} 1024w`}
+            sizes="(min-width: 1024px) 33vw, (min-width: 640px) 50vw, 100vw"
+            loading="lazy"
+            decoding="async"
             alt={`Search result ${index + 1}`}
             className="w-full h-48 object-cover"
             onError={(e) => {
@@ -67,7 +80,7 @@ export const SearchResults: React.FC<SearchResponse> = ({
           />
           <div className="p-4">
             <p className="text-sm font-medium text-gray-900 dark:text-white">
-              {result.path.split("\\").pop()}
+              {fileName(result.path)}
             </p>
             <p className="mt-1 text-xs text-indigo-600 dark:text-indigo-400">
               Similarity: {(result.similarity * 100).toFixed(1)}%
@@ -21,6 +21,8 @@ export interface SearchBarProps {
 export interface SearchResult {
   path: string;
   similarity: number;
+  // Content hash of the image, used for immutable image URLs.
+  version?: string;
   // model? : string
 }
 